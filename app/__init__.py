@@ -7,7 +7,27 @@ from . import config
 from .config import Settings
 from .error_handlers import register_error_handlers
 from .featured_keywords import EXTENSION_KEY, FeaturedKeywordsManager
+from .gemini_limiter import EXTENSION_KEY as GEMINI_LIMITER_KEY
+from .gemini_limiter import GeminiLimiter
+from .generator_registry import EXTENSION_KEY as GENERATOR_REGISTRY_KEY
+from .generator_registry import GeneratorRegistry
 from .main import main_bp
+from .metrics import count_gemini_retries
+from .metrics_exporter import EXTENSION_KEY as METRICS_EXPORTER_KEY
+from .metrics_exporter import MetricsExporter
+from .outcome_cache import EXTENSION_KEY as OUTCOME_CACHE_KEY
+from .outcome_cache import OutcomeCache
+from .scraper_pool import EXTENSION_KEY as SCRAPER_POOL_KEY
+from .scraper_pool import ScraperPool
+from .services.template_service import outcome_from_json, outcome_to_json
+from .shared_cache import EXTENSION_KEY as SHARED_CACHE_KEY
+from .shared_cache import SharedCache
+from .single_flight import EXTENSION_KEY as SINGLE_FLIGHT_KEY
+from .single_flight import SingleFlight
+from .usage_ledger import EXTENSION_KEY as USAGE_LEDGER_KEY
+from .usage_ledger import UsageLedger
+from .warmer import EXTENSION_KEY as CACHE_WARMER_KEY
+from .warmer import CacheWarmer, warm_app
 
 # 二重登録を検出するためのマーカー。同一プロセスで create_app() が複数回呼ばれても
 # ログハンドラが積み上がらないようにする。
@@ -29,10 +49,55 @@ def create_app(settings: Settings | None = None) -> Flask:
 
     setup_logging(app, settings)
 
-    # 特集キーワードはワーカープロセスごとに一度だけ読み込む。
+    # 特集キーワードはワーカープロセスごとにここで読み込む。
     # 以前は main.py のモジュールレベルで生成しており、import 時にファイル I/O が走り、
     # かつ相対パス解決だったため実行時の CWD に依存していた。
-    app.extensions[EXTENSION_KEY] = FeaturedKeywordsManager(settings.featured_keywords_path)
+    # ファイルの変更の監視は lifespan startup から始まる
+    app.extensions[EXTENSION_KEY] = FeaturedKeywordsManager(
+        settings.featured_keywords_path, reload_interval=settings.featured_reload_interval
+    )
+    # ワーカー間で共有するキャッシュ。ファイルは初回使用時に開く（ここでは I/O しない）
+    shared_cache = None
+    if settings.shared_cache_enabled:
+        shared_cache = SharedCache(
+            settings.cache_dir / config.SHARED_CACHE_FILENAME, config.SHARED_CACHE_MAX_ENTRIES
+        )
+    app.extensions[SHARED_CACHE_KEY] = shared_cache
+    # スクレイパーの共有セッション。セッション自体は ASGI の lifespan startup で作る
+    # （app/lifespan.py）。lifespan の無い開発サーバーではリクエスト単位にフォールバックする。
+    app.extensions[SCRAPER_POOL_KEY] = ScraperPool(settings, shared_cache)
+    # Gemini 呼び出しの同時実行数・待ち行列・1 分あたりの上限（ワーカー内で 1 つ）
+    gemini_limiter = GeminiLimiter.from_settings(settings)
+    app.extensions[GEMINI_LIMITER_KEY] = gemini_limiter
+    # Gemini の呼び出しごとのトークン使用量（集計は python usage_report.py）
+    usage_ledger = UsageLedger.from_settings(settings)
+    app.extensions[USAGE_LEDGER_KEY] = usage_ledger
+    # Gemini クライアントとモデルごとの生成器。共有は lifespan startup から始まる
+    app.extensions[GENERATOR_REGISTRY_KEY] = GeneratorRegistry(
+        settings, limiter=gemini_limiter, ledger=usage_ledger
+    )
+    # 同じ内容の生成リクエストが同時に来たら 1 回の処理にまとめる
+    app.extensions[SINGLE_FLIGHT_KEY] = SingleFlight()
+    # 完成した生成結果の使い回し（OUTCOME_CACHE_TTL を設定したときだけ働く）
+    # 共有キャッシュがあればワーカー間（と事前生成の app/warmer.py）で結果を共有する
+    app.extensions[OUTCOME_CACHE_KEY] = OutcomeCache(
+        settings.outcome_cache_ttl,
+        settings.outcome_cache_max_entries,
+        shared_cache=shared_cache,
+        encode=outcome_to_json,
+        decode=outcome_from_json,
+    )
+    # 特集キーワードの結果の事前生成。定期実行は lifespan startup から始まる
+    # （生成結果のキャッシュが無効なら、書き込み先が無いので定期実行しない）
+    app.extensions[CACHE_WARMER_KEY] = CacheWarmer(
+        lambda: warm_app(app),
+        settings.cache_dir / config.WARMER_LOCK_FILENAME,
+        settings.warmer_interval if settings.outcome_cache_ttl > 0 else 0,
+    )
+
+    # /metrics。各部品の stats() はここで登録した app.extensions から集める
+    app.extensions[METRICS_EXPORTER_KEY] = MetricsExporter.for_app(app, settings)
+    count_gemini_retries()
 
     register_error_handlers(app)
     app.register_blueprint(main_bp)
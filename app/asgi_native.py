@@ -0,0 +1,280 @@
+"""よく呼ばれる API を、WsgiToAsgi を通さずにイベントループ上で直接処理する ASGI アプリ。
+
+asgi.py は Flask を asgiref の WsgiToAsgi で包んでいる。この経路では 1 リクエストごとに
+WSGI アプリをスレッドプールのスレッドで動かし、async ビューはそのスレッドから
+イベントループへ戻して実行する。SSE も EventChannel のスレッド間キューを経由する。
+
+NativeRoutes は /api/generate（JSON と SSE）と /api/featured-keywords を ASGI のまま受け、
+ワーカーのイベントループ上で処理する。リクエストの検証（parse_generate_request）、
+生成処理、応答の本文、エラーの形とログは main.py / error_handlers.py の Flask の経路と
+同じ関数を使うので、応答は Flask の経路と変わらない。それ以外のパス（トップページ、
+静的ファイル、未知の URL）とメソッドは、これまでどおり WsgiToAsgi 経由の Flask へ渡す。
+
+NATIVE_ASGI=false なら NativeRoutes を挟まず、すべて Flask で処理する。
+"""
+
+import asyncio
+import json
+import logging
+from collections.abc import Awaitable, Callable
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import Flask
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header, parse_etags
+
+from . import config
+from .config import FEATURED_KEYWORDS_MAX_AGE_SECONDS
+from .deadline import Deadline
+from .error_handlers import error_response
+from .errors import AppError
+from .main import (
+    featured_keywords_payload,
+    generate_response_body,
+    generation_dependencies,
+    log_generate_request,
+    parse_generate_request,
+    prefers_event_stream,
+    produce_generation_events,
+)
+from .streaming import KEEPALIVE, format_event
+from .streaming import MIMETYPE as EVENT_STREAM_MIMETYPE
+from .streaming import RESPONSE_HEADERS as EVENT_STREAM_HEADERS
+from .timing import timing
+
+logger = logging.getLogger(__name__)
+
+ASGIApp = Callable[[dict, Callable, Callable], Awaitable[None]]
+
+# ストリームの終わりを表す番兵
+_CLOSED = object()
+
+
+class NativeRequest:
+    """ASGI の http スコープと本文の読み出し。"""
+
+    def __init__(self, scope: dict, receive: Callable):
+        self.scope = scope
+        self.receive = receive
+        self._headers: dict[str, str] = {}
+        for name, value in scope.get('headers', ()):
+            key = name.decode('latin-1').lower()
+            value = value.decode('latin-1')
+            # 同名のヘッダが複数あれば、HTTP の規則どおりカンマでつなぐ
+            self._headers[key] = f'{self._headers[key]},{value}' if key in self._headers else value
+
+    def header(self, name: str) -> str | None:
+        return self._headers.get(name.lower())
+
+    def arg(self, name: str, default: str) -> str:
+        """クエリ文字列の値（同名が複数あれば最初のもの）。"""
+        query = self.scope.get('query_string', b'').decode('latin-1')
+        for key, value in parse_qsl(query, keep_blank_values=True):
+            if key == name:
+                return value
+        return default
+
+    @property
+    def accept(self) -> MIMEAccept:
+        return parse_accept_header(self.header('accept'), MIMEAccept)
+
+    async def body(self) -> bytes:
+        chunks = []
+        while True:
+            message = await self.receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        return b''.join(chunks)
+
+    async def json(self) -> object:
+        """Flask の request.get_json(silent=True) と同じく、JSON でなければ None を返す。"""
+        mimetype = (self.header('content-type') or '').split(';', 1)[0].strip().lower()
+        is_json = mimetype == 'application/json' or (
+            mimetype.startswith('application/') and mimetype.endswith('+json')
+        )
+        if not is_json:
+            return None
+        try:
+            return json.loads(await self.body())
+        except ValueError:
+            return None
+
+
+class NativeRoutes:
+    """一部のパスを直接処理し、それ以外を fallback（WsgiToAsgi で包んだ Flask）へ渡す。"""
+
+    def __init__(
+        self,
+        flask_app: Flask,
+        fallback: ASGIApp,
+        keepalive: float = config.SSE_KEEPALIVE_SECONDS,
+    ):
+        """
+        Args:
+            flask_app: 共有リソース（app.extensions）と JSON の書き出しに使う Flask アプリ
+            fallback: 直接処理しないリクエストを渡す ASGI アプリ
+            keepalive: SSE で送るイベントが無いとき、コメント行を送るまでの秒数
+        """
+        self.flask_app = flask_app
+        self.fallback = fallback
+        self.keepalive = keepalive
+        self._routes = {
+            ('POST', '/api/generate'): self._generate,
+            ('GET', '/api/featured-keywords'): self._featured_keywords,
+        }
+
+    async def __call__(self, scope, receive, send):
+        handler = None
+        if scope['type'] == 'http':
+            handler = self._routes.get((scope['method'], scope['path']))
+        if handler is None:
+            await self.fallback(scope, receive, send)
+            return
+
+        started = False
+
+        async def send_tracked(message: dict) -> None:
+            nonlocal started
+            if message['type'] == 'http.response.start':
+                started = True
+            await send(message)
+
+        try:
+            await handler(NativeRequest(scope, receive), send_tracked)
+        except Exception as e:
+            if started:
+                raise
+            payload, status = error_response(e)
+            headers = e.response_headers() if isinstance(e, AppError) else None
+            await self._send_json(send, payload, status, headers)
+
+    def _dependencies(self) -> dict:
+        with self.flask_app.app_context():
+            return generation_dependencies()
+
+    async def _send_json(
+        self, send, payload: dict, status: int = 200, headers: dict[str, str] | None = None
+    ) -> None:
+        # jsonify と同じ書き出し（アプリの JSON プロバイダ、区切りの空白なし、末尾の改行）
+        body = f'{self.flask_app.json.dumps(payload, separators=(",", ":"))}\n'.encode()
+        await _send_body(send, status, 'application/json', body, headers)
+
+    async def _generate(self, request: NativeRequest, send) -> None:
+        # Flask の経路と同じく、受け付けた時点から締め切りを数える
+        deadline = Deadline.after(self.flask_app.config['REQUEST_DEADLINE'])
+        req = parse_generate_request(await request.json())
+        log_generate_request(req)
+        dependencies = self._dependencies()
+
+        if prefers_event_stream(request.accept):
+            await self._stream_generation(req, dependencies, deadline, request.receive, send)
+            return
+
+        with timing(self.flask_app.config['SERVER_TIMING']) as timings:
+            body = await generate_response_body(req, dependencies, deadline)
+        headers = {'Server-Timing': timings.header()} if timings is not None else None
+        await self._send_json(send, body, headers=headers)
+
+    async def _stream_generation(
+        self, req, dependencies: dict, deadline: Deadline | None, receive, send
+    ) -> None:
+        """SSE で返す。生成処理はこのループ上のタスクで動かし、キューから順に送る。"""
+        events: asyncio.Queue = asyncio.Queue()
+
+        timed = self.flask_app.config['SERVER_TIMING']
+
+        async def produce() -> None:
+            try:
+                with timing(timed):
+                    await produce_generation_events(
+                        req,
+                        dependencies,
+                        lambda event, data: events.put_nowait(format_event(event, data)),
+                        deadline,
+                    )
+            finally:
+                events.put_nowait(_CLOSED)
+
+        producer = asyncio.create_task(produce())
+        # 本文は読み終えているので、次に届くのは切断だけ。切断されたら生成も止める
+        disconnected = asyncio.create_task(_wait_for_disconnect(receive))
+
+        def on_disconnect(_: asyncio.Task) -> None:
+            if not producer.done():
+                logger.info('ストリーミングの送信が打ち切られたため、生成を取り消します')
+                producer.cancel()
+
+        disconnected.add_done_callback(on_disconnect)
+
+        try:
+            await send(
+                {
+                    'type': 'http.response.start',
+                    'status': 200,
+                    'headers': _headers(
+                        f'{EVENT_STREAM_MIMETYPE}; charset=utf-8', EVENT_STREAM_HEADERS
+                    ),
+                }
+            )
+            while True:
+                try:
+                    item = await asyncio.wait_for(events.get(), self.keepalive)
+                except TimeoutError:
+                    item = KEEPALIVE
+                if item is _CLOSED:
+                    break
+                await send({'type': 'http.response.body', 'body': item.encode(), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            disconnected.remove_done_callback(on_disconnect)
+            disconnected.cancel()
+            if not producer.done():
+                producer.cancel()
+
+    async def _featured_keywords(self, request: NativeRequest, send) -> None:
+        with self.flask_app.app_context():
+            payload = featured_keywords_payload(request.arg('gender', 'ladies'))
+
+        headers = {
+            'ETag': f'"{payload.etag}"',
+            'Cache-Control': f'public, max-age={FEATURED_KEYWORDS_MAX_AGE_SECONDS}',
+        }
+        if parse_etags(request.header('if-none-match')).contains_weak(payload.etag):
+            await _send_body(send, 304, None, b'', headers)
+            return
+        await _send_body(send, 200, 'application/json', payload.body, headers)
+
+
+async def _wait_for_disconnect(receive) -> None:
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def _headers(content_type: str | None, extra: dict[str, str] | None = None) -> list:
+    headers = {} if content_type is None else {'Content-Type': content_type}
+    headers.update(extra or {})
+    return [
+        (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()
+    ]
+
+
+async def _send_body(
+    send, status: int, content_type: str | None, body: bytes, extra: dict[str, str] | None = None
+) -> None:
+    headers = _headers(content_type, extra)
+    headers.append((b'content-length', str(len(body)).encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def build_asgi_app(flask_app: Flask, settings: config.Settings | None = None) -> ASGIApp:
+    """Flask アプリを ASGI アプリにする（lifespan は含まない。asgi.py で包む）。"""
+    settings = settings or config.get_settings()
+    fallback = WsgiToAsgi(flask_app)
+    if not settings.native_asgi:
+        return fallback
+    return NativeRoutes(flask_app, fallback)
@@ -0,0 +1,176 @@
+"""ワーカー内のメモリキャッシュ（TTL + LRU + stale-while-revalidate）。
+
+検索結果は 1 時間程度ではほとんど変わらないのに、同じキーワード（特に特集キーワード）が
+繰り返し入力され、そのたびに HotPepper を数秒かけてスクレイピングしていた。
+TTLCache はその結果をワーカー内に保持する。
+
+- TTL を過ぎても stale_ttl の間は古い値をそのまま返し、裏で取り直す（stale-while-revalidate）
+- 上限件数を超えたら最も長く使われていないものから捨てる（LRU）
+- ヒット・ミスなどの件数を stats() で取れる
+
+開発サーバーではリクエストごとに別スレッドのループから呼ばれるので、状態はスレッドロックで守る。
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Generic, TypeVar
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar('V')
+
+
+class TTLCache(Generic[V]):
+    """TTL つきの LRU キャッシュ。"""
+
+    def __init__(
+        self,
+        ttl: float,
+        stale_ttl: float = 0.0,
+        max_entries: int = 256,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            ttl: 値を新しいとみなす秒数（0 以下ならキャッシュしない）
+            stale_ttl: TTL 切れの後、古い値を返しつつ裏で取り直す猶予秒数
+            max_entries: 保持する件数の上限
+            clock: 現在時刻（秒）を返す関数。テストから差し替える
+        """
+        self.ttl = ttl
+        self.stale_ttl = max(0.0, stale_ttl)
+        self.max_entries = max(1, max_entries)
+        self._clock = clock
+        # key -> (値, 格納時刻)。末尾ほど最近使われたもの
+        self._entries: OrderedDict[Hashable, tuple[V, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        # 取り直し中のキー（同じキーの取り直しを重ねない）
+        self._refreshing: set[Hashable] = set()
+        # 実行中の取り直しタスク（参照を持たないと GC で消えることがある）
+        self._tasks: set[asyncio.Task] = set()
+        self._counts = dict.fromkeys(
+            ('hits', 'stale_hits', 'misses', 'refreshes', 'refresh_failures', 'evictions'), 0
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _count(self, name: str) -> None:
+        self._counts[name] += 1
+
+    def _lookup(self, key: Hashable) -> tuple[V, bool] | None:
+        """(値, 新しいか) を返す。期限切れ・未登録なら None。ロックを持って呼ぶ。"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, stored_at = entry
+        age = self._clock() - stored_at
+        if age >= self.ttl + self.stale_ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value, age < self.ttl
+
+    def get(self, key: Hashable) -> V | None:
+        """新しい値だけを返す（古い値や未登録は None）。件数は数えない。"""
+        with self._lock:
+            found = self._lookup(key)
+        return found[0] if found and found[1] else None
+
+    def put(self, key: Hashable, value: V, stored_at: float | None = None) -> None:
+        """値を保持する。stored_at（clock の時刻）を渡すと、その時点に格納したものとして期限を数える。"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (value, self._clock() if stored_at is None else stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._count('evictions')
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[V]],
+        cache_if: Callable[[V], bool] | None = None,
+        refresh_loader: Callable[[], Awaitable[V]] | None = None,
+    ) -> V:
+        """キャッシュにあればそれを、無ければ loader() の結果を返して保持する。
+
+        古い値（TTL 切れ・猶予内）は即座に返し、同じループ上で取り直しを裏で走らせて
+        差し替える。読み込みの例外は、ミス時は呼び出し元へ送出し、取り直し時はログに残して
+        古い値を持ち続ける。
+
+        Args:
+            key: キャッシュのキー
+            loader: 値を取得するコルーチンを返す関数（取り直しでも呼ぶので毎回新しく作る）
+            cache_if: 取得した値を保持するかの判定。省略時は常に保持する
+            refresh_loader: 裏での取り直しに使う関数。省略時は loader。
+                            呼び出し元のリクエストに縛られる引数（締め切りなど）を外すときに渡す
+        """
+        if not self.enabled:
+            return await loader()
+
+        with self._lock:
+            found = self._lookup(key)
+            if found is not None:
+                value, fresh = found
+                self._count('hits' if fresh else 'stale_hits')
+                refresh = not fresh and key not in self._refreshing
+                if refresh:
+                    self._refreshing.add(key)
+            else:
+                self._count('misses')
+
+        if found is None:
+            value = await loader()
+            if cache_if is None or cache_if(value):
+                self.put(key, value)
+            return value
+
+        if refresh:
+            # 取り直しはこのリクエストの処理ではないので、リクエスト単位のコンテキスト変数
+            # （処理段階の記録先など）を引き継がない空のコンテキストで動かす
+            task = asyncio.create_task(
+                self._refresh(key, refresh_loader or loader, cache_if),
+                context=contextvars.Context(),
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return value
+
+    async def _refresh(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[V]],
+        cache_if: Callable[[V], bool] | None,
+    ) -> None:
+        try:
+            value = await loader()
+        except Exception as e:
+            with self._lock:
+                self._count('refresh_failures')
+            logger.warning(f'キャッシュの取り直しに失敗しました（古い値を使い続けます）: {e}')
+        else:
+            if cache_if is None or cache_if(value):
+                self.put(key, value)
+            with self._lock:
+                self._count('refreshes')
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """キャッシュの計測値のスナップショット。"""
+        with self._lock:
+            return {'size': len(self._entries), **self._counts}
@@ -26,6 +26,40 @@ MENS_URL = 'https://beauty.hotpepper.jp/CSP/bt/hairCatalogSearch/mens/condtion/'
 # --- 性別 ---
 GENDERS = ('ladies', 'mens')
 
+# --- スクレイパーの接続プール（ワーカー存続期間で共有する aiohttp セッション） ---
+# 同時接続の上限。ワーカーあたりの同時リクエスト数はたかだか数件なので小さく抑える
+SCRAPER_POOL_LIMIT = 10
+# 同一ホストへの同時接続の上限（対象は beauty.hotpepper.jp の1ホストだけ）
+SCRAPER_POOL_LIMIT_PER_HOST = 4
+# DNS 解決結果のキャッシュ秒数（aiohttp の既定 10 秒では毎分のように引き直す）
+SCRAPER_DNS_CACHE_TTL = 300
+# アイドル接続を保持する秒数。短すぎると次のリクエストで TLS ハンドシェイクをやり直す
+SCRAPER_KEEPALIVE_TIMEOUT = 30
+# 1 ページ取得のタイムアウト（秒）
+SCRAPER_PAGE_TIMEOUT = 10
+# 解析プール（app/parse_executor.py）に実行待ちとして積める件数。
+# これを超えた解析はプールに積まず、イベントループ上で空きを待つ
+PARSE_QUEUE_LIMIT = 16
+# スクレイピング結果（タイトル）のキャッシュに保持する件数の上限（キーワード × 性別 × ページ数）
+TITLE_CACHE_MAX_ENTRIES = 256
+# ワーカー間で共有するキャッシュ（CACHE_DIR 配下の SQLite。app/shared_cache.py）
+SHARED_CACHE_FILENAME = 'shared_cache.sqlite3'
+SHARED_CACHE_MAX_ENTRIES = 2048
+# 生成結果（GenerationOutcome）のキャッシュに保持する件数の上限の既定値（app/outcome_cache.py）
+OUTCOME_CACHE_MAX_ENTRIES = 128
+
+# --- 特集キーワードの事前生成（app/warmer.py） ---
+# 特集キーワードごとに事前生成する季節・カラーの組み合わせ（メンズでは選択なしだけになる）。
+# 季節・カラーの付け替え（template_service）により、春の結果は夏・秋・冬の単独選択にも使われる
+WARMER_SEASON_COMBOS = ((), ('spring',), ('bleach_free',))
+# 1 件あたりの再試行回数と、最初の再試行までの秒数（回ごとに倍にする）。該当なしは再試行しない
+WARMER_RETRIES = 2
+WARMER_BACKOFF_SECONDS = 5.0
+# 定期実行の要否を確かめる間隔の上限（秒）。実行の間隔は WARMER_INTERVAL
+WARMER_CHECK_SECONDS = 300
+# ワーカー・CLI の間で実行を 1 つにするロックファイル（CACHE_DIR 配下。前回の完了時刻も書く）
+WARMER_LOCK_FILENAME = 'warmer.lock'
+
 # --- キーワード解析 ---
 # 複合キーワードの区切りとして扱う文字（半角/全角スペース、カンマ、読点、スラッシュ、プラス）
 KEYWORD_SEPARATORS = (' ', '　', ',', '、', '/', '＋', '+')
@@ -37,20 +71,68 @@ GEMINI_TEMPERATURE = 1.0  # Gemini 3 系は 1.0 未満にすると出力品質
 GEMINI_MAX_OUTPUT_TOKENS = 32768
 # タイムアウトとリトライの予算:
 #   gunicorn.conf.py の timeout=120 と、フロントエンドの AbortController(120秒) が上限。
-#   これは「スクレイピング + 生成」を合わせたリクエスト全体に掛かる上限である点に注意。
-#     生成: 40秒 × 2回 + 最大バックオフ4秒 ≒ 84秒
-#     スクレイピング: MAX_PAGES × (1ページ10秒 + 待機最大3秒)
-#   本番の MAX_PAGES=1 なら 13 + 84 ≒ 97秒で収まるが、既定の MAX_PAGES=3 では
-#   39 + 84 ≒ 123秒となり 120秒を超え得るため、MAX_PAGES を増やす場合は
-#   gunicorn の timeout とフロントエンドの AbortController も併せて見直すこと。
-#   attempts=3 かつ 45秒 にすると生成だけで 138秒となりワーカーが先に殺されるため不可。
+#   これは「スクレイピング + 生成」を合わせたリクエスト全体に掛かる上限なので、
+#   /api/generate は受け付けた時点から REQUEST_DEADLINE 秒（既定 110 秒）の締め切りを持ち
+#   （app/deadline.py）、各段階はその残り時間で動く:
+#     スクレイピング: Gemini の 1 回分（DEADLINE_GENERATION_RESERVE_SECONDS）を残して打ち切る。
+#       1 ページの待ち時間も残り時間で縮める
+#     生成: 1 回 40秒 × 2回 + 最大バックオフ4秒 ≒ 84秒が収まらなければ、1 回の待ち時間と
+#       回数を残り時間に合わせて縮める（1 回が GEMINI_MIN_ATTEMPT_SECONDS を割るなら再試行しない）
+#   締め切りを過ぎれば 504 DEADLINE_EXCEEDED で返すので、MAX_PAGES を増やしても
+#   ワーカーが殺されることはない（取れるページ数が減るだけ）。REQUEST_DEADLINE を
+#   gunicorn の timeout や AbortController 以上にはしないこと。
 GEMINI_REQUEST_TIMEOUT_MS = 40_000
 GEMINI_RETRY_ATTEMPTS = 2  # 初回 + リトライ1回
 GEMINI_RETRY_INITIAL_DELAY = 1.0
 GEMINI_RETRY_MAX_DELAY = 4.0
+# スクレイピングが Gemini のために残しておく秒数（1 回分の待ち時間）
+DEADLINE_GENERATION_RESERVE_SECONDS = GEMINI_REQUEST_TIMEOUT_MS / 1000
+# 締め切りに合わせて縮めた 1 回の待ち時間の下限。これを割るなら再試行せず 1 回に絞り、
+# 1 回分も残っていなければ呼び出さずに打ち切る
+GEMINI_MIN_ATTEMPT_SECONDS = 10.0
+# Gemini 呼び出しの受け付け（app/gemini_limiter.py）。同時実行数・待ち行列の長さ・待てる秒数・
+# 1 分あたりの呼び出し数とトークン数の上限は Settings（GEMINI_MAX_CONCURRENCY など）で決める。
+# 待ち行列が満杯のときの 503 に付ける Retry-After の秒数
+GEMINI_RETRY_AFTER_SECONDS = 5
+# 呼び出し数・トークン数の上限を数える時間幅（秒）
+GEMINI_BUDGET_WINDOW_SECONDS = 60
+# ワーカー間で共有する同時実行の枠（CACHE_DIR 配下のロックファイル）と、空きを確かめる間隔（秒）
+GEMINI_SLOT_DIRNAME = 'gemini_slots'
+GEMINI_SLOT_POLL_SECONDS = 0.05
+# google-genai が再試行のたびにログを書くロガー（app/metrics.py が再試行の回数を数える）
+GEMINI_SDK_LOGGER = 'google_genai._api_client'
+
+# --- トークン使用量の台帳（app/usage_ledger.py） ---
+# CACHE_DIR 配下の追記ファイル。USAGE_LEDGER_MAX_BYTES を超えたら .1 〜 .N へ回す
+# （1 件は 100 バイト前後なので、1MB で 1 万回分ほど）
+USAGE_LEDGER_FILENAME = 'usage.jsonl'
+USAGE_LEDGER_MAX_BYTES = 1024 * 1024
+USAGE_LEDGER_BACKUP_COUNT = 5
+# ワーカーごとにメモリへ残す直近の件数
+USAGE_LEDGER_CAPACITY = 1024
+
+# --- /metrics（app/metrics.py, app/metrics_exporter.py） ---
+# ワーカーごとの計測値を書き出すディレクトリ（CACHE_DIR 配下）
+METRICS_DIRNAME = 'metrics'
+# ヒストグラムの区間の上限（秒）。HTTP と Gemini は 120 秒の予算まで、スクレイピングは 1 ページ分
+METRICS_HTTP_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120)
+METRICS_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 10)
+
+# --- 参照タイトルの選別（app/title_selection.py） ---
+# 記号・空白などを除いた文字バイグラムの Jaccard 係数がこれ以上なら近似重複とみなす
+TITLE_SIMILARITY_THRESHOLD = 0.8
+# トークン数の見積もりに使う、1 トークンあたりの文字数（ASCII, それ以外）。
+# Gemini 3 系は同じトークナイザなので値も同じ。載っていないモデルは DEFAULT_MODEL の値で見積もる
+TOKEN_ESTIMATE_CHARS_PER_TOKEN = {
+    'gemini-3.1-flash-lite': (4.0, 1.5),
+    'gemini-3-flash-preview': (4.0, 1.5),
+}
 
 # --- テンプレート生成 ---
 MAX_TEMPLATES = 20
+# ストリーミング生成（/api/generate の SSE。app/streaming.py）で、イベントが途切れたときに
+# 送るコメント行の間隔（秒）。Render などのプロキシにアイドル接続として切られないようにする
+SSE_KEEPALIVE_SECONDS = 15
 CHAR_LIMITS = {
     'title': 30,
     'menu': 50,
@@ -69,6 +151,9 @@ FEATURED_NAME_MAX = 50
 FEATURED_KEYWORD_MAX = 50
 FEATURED_CONDITION_MAX = 500
 FEATURED_FILE_MAX_BYTES = 1024 * 1024
+# /api/featured-keywords の応答をブラウザが再検証なしで使ってよい秒数。
+# 過ぎた後は If-None-Match で問い合わせ、内容が同じなら 304 が返る
+FEATURED_KEYWORDS_MAX_AGE_SECONDS = 60
 
 # 季節・カラー付加キーワード（レディースのみ。UIのチェックボックスで複数選択できる）
 # キーは index.html の input[name="season"] の value と一対一で対応する
@@ -100,6 +185,9 @@ SEASON_APPEND_THRESHOLD = 26  # この文字数未満のタイトルのみ付加
 SHORT_TITLE_BAND_WIDTH = 2
 SHORT_TITLE_SLOTS_PER_CHOICE = 4  # チェック1つあたりの短尺枠数
 SHORT_TITLE_SLOTS_MAX = 12  # 短尺枠の合計上限（MAX_TEMPLATES のうち）
+# 季節・カラーの選択だけが違うリクエストに、キャッシュ済みの生成結果を付け替えて返すとき
+# （app/services/template_service.py）、付加されずに残ってよい短尺タイトルの数
+SEASON_REUSE_MAX_EXTRA_SHORT_SLOTS = SHORT_TITLE_SLOTS_PER_CHOICE
 
 
 def normalize_seasons(seasons: list[str] | None, gender: str) -> list[str]:
@@ -143,35 +231,123 @@ class Settings:
     """環境変数に由来する設定値。"""
 
     gemini_api_key: str | None
+    gemini_warmup: bool
+    gemini_max_concurrency: int
+    gemini_queue_size: int
+    gemini_queue_timeout: float
+    gemini_rpm: int
+    gemini_tpm: int
+    gemini_global_concurrency: int
+    request_deadline: float
     scraping_delay_min: float
     scraping_delay_max: float
     max_pages: int
+    scraping_concurrency: int
+    scraping_rate: float
+    scraping_burst: int
     scraper_verify_ssl: bool
+    scraper_parser: str
+    scraper_parse_executor: str
+    scraper_parse_workers: int
+    title_cache_ttl: float
+    title_cache_stale_ttl: float
+    outcome_cache_ttl: float
+    outcome_cache_max_entries: int
+    reference_title_token_budget: int
+    warmer_interval: float
+    warmer_concurrency: int
     secret_key: str
     debug: bool
     host: str
     port: int
     log_dir: Path
+    cache_dir: Path
+    shared_cache_enabled: bool
     featured_keywords_path: Path
+    featured_reload_interval: float
+    native_asgi: bool
+    server_timing: bool
+    metrics_enabled: bool
+    metrics_flush_interval: float
+    usage_ledger: bool
 
     @classmethod
     def from_env(cls) -> 'Settings':
         load_dotenv()
         return cls(
             gemini_api_key=os.getenv('GEMINI_API_KEY'),
+            # ワーカー起動時に Gemini への接続を先に張る（app/generator_registry.py）
+            gemini_warmup=_env_bool('GEMINI_WARMUP', False),
+            # ワーカー内で同時に送る Gemini 呼び出しの上限（0 で無制限）と、空きを待てる件数・秒数。
+            # 待ち行列が満杯か、待ちきれなければ 503 + Retry-After で返す（app/gemini_limiter.py）
+            gemini_max_concurrency=int(os.getenv('GEMINI_MAX_CONCURRENCY', 4)),
+            gemini_queue_size=int(os.getenv('GEMINI_QUEUE_SIZE', 16)),
+            gemini_queue_timeout=float(os.getenv('GEMINI_QUEUE_TIMEOUT', 20)),
+            # ワーカー内の 1 分あたりの呼び出し数・トークン数の上限（0 で無制限）
+            gemini_rpm=int(os.getenv('GEMINI_RPM', 0)),
+            gemini_tpm=int(os.getenv('GEMINI_TPM', 0)),
+            # ワーカー全体で同時に送る呼び出しの上限（0 でワーカー間では数えない）
+            gemini_global_concurrency=int(os.getenv('GEMINI_GLOBAL_CONCURRENCY', 0)),
+            # /api/generate の受け付けから応答までの締め切り（秒、0 で設けない）。
+            # gunicorn の timeout（120 秒）より短くしておく（app/deadline.py）
+            request_deadline=float(os.getenv('REQUEST_DEADLINE', 110)),
             scraping_delay_min=float(os.getenv('SCRAPING_DELAY_MIN', 1)),
             scraping_delay_max=float(os.getenv('SCRAPING_DELAY_MAX', 3)),
             max_pages=int(os.getenv('MAX_PAGES', 3)),
+            # 2 以上で 2 ページ目以降を並行取得する。1 なら従来どおり逐次取得
+            scraping_concurrency=int(os.getenv('SCRAPING_CONCURRENCY', 1)),
+            # 並行取得時の送出上限（平均 リクエスト/秒 と、瞬間的に許す件数）
+            scraping_rate=float(os.getenv('SCRAPING_RATE', 1)),
+            scraping_burst=int(os.getenv('SCRAPING_BURST', 2)),
             # SSL 検証は既定で有効（fail-closed）。ローカル開発でのみ明示的に無効化する。
             scraper_verify_ssl=_env_bool('SCRAPER_VERIFY_SSL', True),
+            # 検索結果ページの HTML パーサー（auto / selectolax / lxml / html.parser）。
+            # auto はインストール済みの中で最速のもの（app/html_parsers.py）
+            scraper_parser=os.getenv('SCRAPER_PARSER', 'auto').strip().lower(),
+            # 解析をイベントループの外で行うプール（thread / process / inline）とその大きさ
+            scraper_parse_executor=os.getenv('SCRAPER_PARSE_EXECUTOR', 'thread').strip().lower(),
+            scraper_parse_workers=int(os.getenv('SCRAPER_PARSE_WORKERS', 2)),
+            # スクレイピング結果のキャッシュ秒数（0 で無効）と、期限切れ後に古い値を返しつつ
+            # 裏で取り直す猶予秒数
+            title_cache_ttl=float(os.getenv('TITLE_CACHE_TTL', 3600)),
+            title_cache_stale_ttl=float(os.getenv('TITLE_CACHE_STALE_TTL', 600)),
+            # 生成結果全体のキャッシュ秒数（既定の 0 で無効）と保持件数の上限
+            outcome_cache_ttl=float(os.getenv('OUTCOME_CACHE_TTL', 0)),
+            outcome_cache_max_entries=int(
+                os.getenv('OUTCOME_CACHE_MAX_ENTRIES', OUTCOME_CACHE_MAX_ENTRIES)
+            ),
+            # プロンプトに載せる参照タイトルの推定トークン数の上限（0 で上限なし）。
+            # 近似重複を除いた後、人気順に収まるところまで載せる（app/title_selection.py）
+            reference_title_token_budget=int(os.getenv('REFERENCE_TITLE_TOKEN_BUDGET', 1000)),
+            # 特集キーワードの結果を事前生成する間隔（秒、既定の 0 で定期実行しない）と同時実行数
+            warmer_interval=float(os.getenv('WARMER_INTERVAL', 0)),
+            warmer_concurrency=int(os.getenv('WARMER_CONCURRENCY', 2)),
             secret_key=os.getenv('FLASK_SECRET_KEY', 'dev'),
             debug=os.getenv('FLASK_DEBUG', 'False').lower() == 'true',
             host=os.getenv('FLASK_HOST', '0.0.0.0'),  # Render でのデプロイ用
             port=int(os.getenv('PORT', os.getenv('FLASK_PORT', 5000))),  # Render の PORT を優先
             log_dir=Path(os.getenv('LOG_DIR', PROJECT_ROOT / 'logs')),
+            cache_dir=Path(os.getenv('CACHE_DIR', PROJECT_ROOT / 'cache')),
+            # ワーカー間の共有キャッシュ。無効でもワーカー内のキャッシュは働く
+            shared_cache_enabled=_env_bool('SHARED_CACHE', True),
             featured_keywords_path=Path(
                 os.getenv('FEATURED_KEYWORDS_PATH', APP_DIR / 'data' / 'featured_keywords.json')
             ),
+            # 特集キーワードファイルの変更を確かめる間隔（秒、0 で監視しない）。
+            # 変わっていれば再起動なしで読み込み直す（app/featured_keywords.py）
+            featured_reload_interval=float(os.getenv('FEATURED_RELOAD_INTERVAL', 30)),
+            # /api/generate と /api/featured-keywords を WsgiToAsgi を通さずに
+            # イベントループ上で直接処理する（app/asgi_native.py）
+            native_asgi=_env_bool('NATIVE_ASGI', True),
+            # /api/generate の処理時間の内訳を Server-Timing ヘッダとログに出す（app/timing.py）
+            server_timing=_env_bool('SERVER_TIMING', True),
+            # /metrics（Prometheus のテキスト形式）と、ワーカーの計測値を CACHE_DIR 配下へ
+            # 書き出す間隔（秒）。他のワーカーの値はこの間隔ぶん遅れて /metrics に載る
+            metrics_enabled=_env_bool('METRICS', True),
+            metrics_flush_interval=float(os.getenv('METRICS_FLUSH_INTERVAL', 15)),
+            # Gemini の呼び出しごとのトークン数を CACHE_DIR 配下の台帳へ追記する
+            # （app/usage_ledger.py）。無効でもワーカー内の直近の記録はメモリに残る
+            usage_ledger=_env_bool('USAGE_LEDGER', True),
         )
 
     def flask_config(self) -> dict:
@@ -180,6 +356,10 @@ class Settings:
             'SECRET_KEY': self.secret_key,
             'DEBUG': self.debug,
             'SERVER_NAME': None,
+            # ルート（main.py / asgi_native.py）がリクエストごとの締め切りを作るのに使う
+            'REQUEST_DEADLINE': self.request_deadline,
+            # 処理時間の内訳（app/timing.py）を集計するか
+            'SERVER_TIMING': self.server_timing,
         }
 
 
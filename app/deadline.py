@@ -0,0 +1,79 @@
+"""1 リクエストの締め切り（スクレイピングから Gemini の呼び出しまでを通した残り時間）。
+
+以前は config.py のコメントで「スクレイピング 13 秒 + 生成 84 秒 < gunicorn の 120 秒」と
+手計算した予算に頼っており、MAX_PAGES を増やすと気付かないうちに予算を超え、
+ワーカーごと殺されていた（利用者には応答が返らない）。
+
+/api/generate のハンドラが受け付けた時点で Deadline を作り（REQUEST_DEADLINE 秒）、
+generate_templates_for_request → scrape_titles_async / generate_templates_async へ渡す。
+
+- スクレイピングは Gemini の 1 回分（DEADLINE_GENERATION_RESERVE_SECONDS）を残して打ち切る。
+  2 ページ目以降は取得済みの分で続け、1 ページ目すら取れなければ DeadlineExceededError
+- Gemini の 1 回の待ち時間と再試行回数は残り時間に収まるよう縮める
+  （generator.request_config_within）
+- どの段階でも締め切りを過ぎれば DeadlineExceededError（504）で返す
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+
+from .errors import DeadlineExceededError
+
+logger = logging.getLogger(__name__)
+
+
+class Deadline:
+    """締め切りの時刻（単調時計）と、そこまでの残り秒数。"""
+
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            seconds: 今から締め切りまでの秒数
+            clock: 単調時計。テストから差し替える
+        """
+        self._clock = clock
+        self.seconds = seconds
+        self.expires_at = clock() + seconds
+
+    @classmethod
+    def after(cls, seconds: float) -> 'Deadline | None':
+        """seconds 秒後の締め切り。0 以下なら締め切りを設けない（None）。"""
+        return cls(seconds) if seconds > 0 else None
+
+    def remaining(self, reserve: float = 0.0) -> float:
+        """締め切りの reserve 秒前までの残り秒数（過ぎていれば 0）。"""
+        return max(0.0, self.expires_at - reserve - self._clock())
+
+    def check(self, stage: str, reserve: float = 0.0) -> None:
+        """締め切りの reserve 秒前を過ぎていれば DeadlineExceededError を送出する。"""
+        if self.remaining(reserve) <= 0:
+            self._exceeded(stage)
+
+    @asynccontextmanager
+    async def enforce(self, stage: str) -> AsyncIterator[None]:
+        """ブロックの中の処理を締め切りで取り消し、DeadlineExceededError にする。"""
+        self.check(stage)
+        timeout = asyncio.timeout(self.remaining())
+        try:
+            async with timeout:
+                yield
+        except TimeoutError:
+            # ブロックの中で起きた別のタイムアウト（接続のタイムアウトなど）はそのまま通す
+            if not timeout.expired():
+                raise
+            self._exceeded(stage)
+
+    def _exceeded(self, stage: str) -> None:
+        logger.warning(f'リクエストの締め切り（{self.seconds:.0f} 秒）を過ぎました: 段階={stage}')
+        raise DeadlineExceededError()
+
+
+def enforce(deadline: Deadline | None, stage: str) -> AbstractAsyncContextManager:
+    """deadline.enforce(stage)。締め切りが無ければ何もしない。"""
+    if deadline is None:
+        return contextlib.nullcontext()
+    return deadline.enforce(stage)
@@ -32,6 +32,24 @@ def _json(payload_and_status: tuple[dict, int]) -> ResponseReturnValue:
     return payload, status
 
 
+def error_response(error: BaseException) -> tuple[dict, int]:
+    """例外をログに残し、エラーレスポンスの本文と HTTP ステータスにする。
+
+    Flask のエラーハンドラのほか、SSE の error イベント（app/streaming.py）と
+    ネイティブ ASGI の経路（app/asgi_native.py）も同じ形・同じログの出し方にするために使う。
+    """
+    if isinstance(error, AppError):
+        if error.status_code >= 500:
+            logger.error(f'{error.code}: {error.message}', exc_info=error)
+        else:
+            logger.warning(f'{error.code}: {error.message}')
+        return error.to_payload()
+
+    # 例外の中身はユーザーに出さない。原因はログの exc_info から追う。
+    logger.error(f'予期しないエラー: {error}', exc_info=error)
+    return error_payload(AppError.DEFAULT_MESSAGE, ErrorCode.INTERNAL_SERVER_ERROR, 500)
+
+
 def register_error_handlers(app: Flask) -> None:
     """エラーハンドラをアプリに登録する。
 
@@ -42,11 +60,8 @@ def register_error_handlers(app: Flask) -> None:
 
     @app.errorhandler(AppError)
     def handle_app_error(error: AppError) -> ResponseReturnValue:
-        if error.status_code >= 500:
-            logger.error(f'{error.code}: {error.message}', exc_info=True)
-        else:
-            logger.warning(f'{error.code}: {error.message}')
-        return _json(error.to_payload())
+        payload, status = error_response(error)
+        return payload, status, error.response_headers()
 
     @app.errorhandler(HTTPException)
     def handle_http_exception(error: HTTPException) -> ResponseReturnValue:
@@ -66,12 +81,4 @@ def register_error_handlers(app: Flask) -> None:
 
     @app.errorhandler(Exception)
     def handle_unexpected_error(error: Exception) -> ResponseReturnValue:
-        # 例外の中身はユーザーに出さない。原因はログの exc_info から追う。
-        logger.error(f'予期しないエラー: {error}', exc_info=True)
-        return _json(
-            error_payload(
-                AppError.DEFAULT_MESSAGE,
-                ErrorCode.INTERNAL_SERVER_ERROR,
-                500,
-            )
-        )
+        return _json(error_response(error))
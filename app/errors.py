@@ -7,6 +7,8 @@
 ``AppError`` を送出すれば ``main.py`` の app_errorhandler が上記の形に変換する。
 """
 
+import math
+
 
 class ErrorCode:
     """API レスポンスの error.code に載せる値。"""
@@ -21,6 +23,8 @@ class ErrorCode:
     SCRAPING_ERROR = 'SCRAPING_ERROR'
     GENERATION_ERROR = 'GENERATION_ERROR'
     CONFIGURATION_ERROR = 'CONFIGURATION_ERROR'
+    OVERLOADED = 'OVERLOADED'
+    DEADLINE_EXCEEDED = 'DEADLINE_EXCEEDED'
 
 
 def error_payload(message: str, code: str, status: int) -> tuple[dict, int]:
@@ -52,6 +56,10 @@ class AppError(Exception):
     def to_payload(self) -> tuple[dict, int]:
         return error_payload(self.message, self.code, self.status_code)
 
+    def response_headers(self) -> dict[str, str]:
+        """エラーレスポンスに付ける HTTP ヘッダ（既定はなし）。"""
+        return {}
+
 
 class ValidationError(AppError):
     """リクエスト内容が不正（ユーザー入力の誤り）。"""
@@ -98,6 +106,38 @@ class GenerationError(AppError):
     DEFAULT_MESSAGE = 'テンプレートの生成に失敗しました。しばらく時間をおいて再度お試しください。'
 
 
+class OverloadedError(AppError):
+    """Gemini の呼び出しが混み合っていて、いまは受け付けられない（app/gemini_limiter.py）。
+
+    待てば通るので、Retry-After ヘッダで再試行までの秒数を伝える。
+    """
+
+    code = ErrorCode.OVERLOADED
+    status_code = 503
+    DEFAULT_MESSAGE = 'ただいま混み合っています。しばらく時間をおいて再度お試しください。'
+
+    def __init__(self, retry_after: float, message: str | None = None):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            message
+            or f'ただいま混み合っています。{self.retry_after} 秒ほど待ってから再度お試しください。'
+        )
+
+    def response_headers(self) -> dict[str, str]:
+        return {'Retry-After': str(self.retry_after)}
+
+
+class DeadlineExceededError(AppError):
+    """リクエストの締め切り（REQUEST_DEADLINE）までに処理が終わらなかった（app/deadline.py）。
+
+    ワーカーがタイムアウトで殺される前に打ち切り、応答を返すための例外。
+    """
+
+    code = ErrorCode.DEADLINE_EXCEEDED
+    status_code = 504
+    DEFAULT_MESSAGE = '処理に時間がかかりすぎたため中断しました。時間をおいて再度お試しください。'
+
+
 class ConfigurationError(AppError):
     """サーバー側の設定不備（ユーザーの入力とは無関係）。"""
 
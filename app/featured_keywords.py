@@ -3,17 +3,42 @@ Featured Keywords Manager
 
 Beauty Selection特集キーワードの参照を担うモジュール。
 JSONの読み込みと検証は featured_loader に委譲し、ここは保持と参照に専念する。
+
+読み込み時に正規化済みキーワードの辞書を作っておき、get_keyword_info を O(1) にする。
+返す情報は読み取り専用（MappingProxyType）なので、参照のたびの複製は要らない。
+入力中の特集キーワードを 1 回の走査で見つける KeywordMatcher（app/keyword_matcher.py）と、
+/api/featured-keywords の応答本文も、同じく読み込み時に作っておく。
+
+読み込み 1 回分の内容は FeaturedKeywordsSnapshot にまとめ、作った後は書き換えない。
+FEATURED_RELOAD_INTERVAL 秒ごとにファイルの stat（inode / 更新時刻 / サイズ）を確かめ、
+変わっていればイベントループの外で読み込み直して、スナップショットを丸ごと差し替える。
+リクエストの処理中にファイル I/O は起きず、参照の途中で新旧の内容が混ざることもない。
+スナップショットは内容から決まる版（get_version）を持ち、生成結果のキャッシュはこれを
+キーに含める。差し替え前の特集の条件で生成した結果は、差し替え後には引かれない。
 """
 
+import asyncio
 import copy
+import hashlib
+import json
 import logging
 import os
+import threading
+import time
+from collections.abc import Mapping
+from types import MappingProxyType
 from typing import Any, Protocol
 
 from flask import current_app
 
 from . import config
-from .featured_loader import load_featured_keywords
+from .featured_loader import load_featured_keywords, normalize_keyword
+from .keyword_matcher import KeywordMatch, KeywordMatcher
+from .services.featured_service import (
+    FeaturedKeywordsPayload,
+    list_featured_keywords,
+    render_payload,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -26,12 +51,12 @@ class FeaturedKeywordRepository(Protocol):
 
     型検査器は入れていないので強制力はない。実効的な検証は
     tests/conftest.py の FakeRepository が担う。
-    ここに書く価値は「サービス層が実際に呼ぶのはこの 5 つだけ」を明示すること。
+    ここに書く価値は「サービス層が実際に呼ぶのはこの 7 つだけ」を明示すること。
     """
 
     def is_available(self) -> bool: ...
 
-    def get_keyword_info(self, keyword: str) -> dict | None: ...
+    def find_featured_keywords(self, text: str) -> list[KeywordMatch[Mapping[str, Any]]]: ...
 
     def get_all_keywords(self) -> list[dict]: ...
 
@@ -39,33 +64,206 @@ class FeaturedKeywordRepository(Protocol):
 
     def get_health_status(self) -> dict[str, Any]: ...
 
+    def get_payload(self, gender: str) -> FeaturedKeywordsPayload: ...
+
+    def get_version(self) -> str: ...
+
+
+def snapshot_version(keywords: list[dict]) -> str:
+    """特集キーワードの内容のハッシュ。同じ内容なら、どのワーカーが読んでも同じ値になる。"""
+    body = json.dumps(keywords, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(body.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _file_signature(path) -> tuple[int, int, int] | None:
+    """ファイルが変わったかを見分けるための値。読めなければ None。
+
+    置き換え（別ファイルへ書いて rename）は inode で、その場での上書きは
+    更新時刻とサイズで気づく。
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class FeaturedKeywordsSnapshot:
+    """読み込み 1 回分の特集キーワード。作った後は書き換えない。"""
+
+    def __init__(self, json_path, keywords: list[dict], last_error: Exception | None):
+        self.json_path = json_path
+        self.keywords = keywords
+        self.last_error = last_error
+        # 生成結果のキャッシュのキーに含める版。ファイルの stat ではなく内容で決めるので、
+        # 中身の同じ書き直しでは変わらず、ワーカー間・事前生成のプロセスとも一致する
+        self.version = snapshot_version(keywords)
+        # 正規化後の重複は featured_loader が弾いているので、キーの衝突は起きない。
+        # keywords（get_all_keywords の元）と値を共有しないよう複製してから包む
+        self.index: dict[str, Mapping[str, Any]] = {
+            normalize_keyword(item['keyword']): MappingProxyType(copy.deepcopy(item))
+            for item in keywords
+        }
+        self.matcher = KeywordMatcher(self.index)
+        # 一覧は読み込んだ内容だけで決まるので、ここで一度だけ組み立てる。
+        # list_featured_keywords が呼ぶのはこのスナップショット自身の参照メソッド
+        self.payloads: dict[str, FeaturedKeywordsPayload] = {
+            gender: render_payload(list_featured_keywords(self, gender))
+            for gender in config.GENDERS
+        }
+
+    def is_available(self) -> bool:
+        return len(self.keywords) > 0
+
+    def get_all_keywords(self) -> list[dict]:
+        return copy.deepcopy(self.keywords)
+
+    def get_last_error(self) -> Exception | None:
+        return self.last_error
+
+    def get_health_status(self) -> dict[str, Any]:
+        return {
+            'is_available': self.is_available(),
+            'keywords_count': len(self.keywords),
+            'file_path': str(self.json_path),
+            'file_exists': os.path.exists(self.json_path),
+            'last_error': str(self.last_error) if self.last_error else None,
+            'error_type': type(self.last_error).__name__ if self.last_error else None,
+        }
+
 
 class FeaturedKeywordsManager:
     """特集キーワードのリポジトリ
 
-    起動時に一度 JSON を読み込み、以降は読み込み済みのデータを参照する。
+    起動時に JSON を読み込み、以降は読み込み済みのスナップショットを参照する。
+    start() するとファイルの変更を監視し、変わっていれば読み込み直す。
     """
 
-    def __init__(self, json_path=None):
+    def __init__(self, json_path=None, reload_interval: float = 0):
         """FeaturedKeywordsManagerの初期化
 
         Args:
             json_path: 特集キーワードJSONファイルのパス。
                        省略時は config の既定値（パッケージ内の絶対パス）。
+            reload_interval: start() 後にファイルの変更を確かめる間隔（秒）。0 以下なら監視しない
         """
         self.json_path = (
             json_path if json_path is not None else config.get_settings().featured_keywords_path
         )
-        self.keywords: list[dict] = []
-        self._last_error: Exception | None = None
-        self._load_keywords()
-
-    def _load_keywords(self) -> None:
+        self.reload_interval = reload_interval
+        self._watcher: asyncio.Task | None = None
+        # 読み込み直しは監視タスクから 1 つずつ行うが、直接呼ばれても重ならないようにする
+        self._reload_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(('checks', 'reloads', 'failures'), 0)
+        self._last_reload_ms: float | None = None
+        self._reload_ms_total = 0.0
+        self._last_reload_error: str | None = None
+        # 読み込む前に stat しておく。読み込み中に書き換えられても、次の確認で気づける
+        self._signature = _file_signature(self.json_path)
+        self._snapshot = self._load_keywords()
+
+    def _load_keywords(self) -> FeaturedKeywordsSnapshot:
         """JSONファイルから特集キーワードを読み込む
 
         エラーが発生した場合は空のリストを設定し、特集キーワード機能を無効化する。
         """
-        self.keywords, self._last_error = load_featured_keywords(self.json_path)
+        result = load_featured_keywords(self.json_path)
+        return FeaturedKeywordsSnapshot(self.json_path, result.keywords, result.error)
+
+    @property
+    def keywords(self) -> list[dict]:
+        """現在のスナップショットの特集キーワード（読み込んだ順）。"""
+        return self._snapshot.keywords
+
+    def reload_if_changed(self) -> bool:
+        """ファイルが変わっていれば読み込み直す。ブロッキングなのでループからは to_thread で呼ぶ。
+
+        検証で 1 件でも問題が見つかれば差し替えず、読み込み済みの内容を使い続ける
+        （起動時と違い、すでに正しい内容を配信しているので、欠けた内容に置き換えない）。
+        同じ内容のまま失敗を繰り返さないよう、次にファイルが変わるまでは読み込み直さない。
+
+        Returns:
+            bool: 新しい内容に差し替えた場合 True
+        """
+        with self._reload_lock:
+            self._count('checks')
+            signature = _file_signature(self.json_path)
+            if signature == self._signature:
+                return False
+            self._signature = signature
+
+            started = time.perf_counter()
+            result = load_featured_keywords(self.json_path)
+            if result.error is not None or result.skipped:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                reason = str(result.error) if result.error else f'検証エラー {result.skipped} 件'
+                self._record_reload(elapsed_ms, 'failures', reason)
+                logger.warning(
+                    f'特集キーワードの再読み込みに失敗したため、読み込み済みの内容を使い続けます: '
+                    f'{reason}'
+                )
+                return False
+
+            snapshot = FeaturedKeywordsSnapshot(self.json_path, result.keywords, None)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            # 参照側はメソッドの先頭で self._snapshot を 1 回だけ読むので、
+            # 代入 1 回で新旧が混ざらずに切り替わる
+            self._snapshot = snapshot
+            self._record_reload(elapsed_ms, 'reloads', None)
+            logger.info(
+                f'特集キーワードを再読み込みしました: {len(snapshot.keywords)}件 ({elapsed_ms:.1f}ms)'
+            )
+            return True
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    def _record_reload(self, elapsed_ms: float, outcome: str, error: str | None) -> None:
+        with self._lock:
+            self._counts[outcome] += 1
+            self._last_reload_ms = elapsed_ms
+            self._reload_ms_total += elapsed_ms
+            self._last_reload_error = error
+
+    async def start(self) -> None:
+        """ファイルの監視を始める。冪等。"""
+        if self._watcher is not None or self.reload_interval <= 0:
+            return
+        self._watcher = asyncio.create_task(self._watch())
+        logger.info(f'特集キーワードファイルの監視を開始しました（{self.reload_interval}秒ごと）')
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await asyncio.to_thread(self.reload_if_changed)
+            except Exception as e:
+                # 監視が止まると以降の変更が反映されなくなるので、ここで受け止めて続ける
+                logger.error(f'特集キーワードの再読み込み中にエラー: {e}', exc_info=True)
+
+    async def close(self) -> None:
+        """ファイルの監視を止める。冪等。"""
+        watcher, self._watcher = self._watcher, None
+        if watcher is None:
+            return
+        watcher.cancel()
+        try:
+            await watcher
+        except asyncio.CancelledError:
+            pass
+        logger.info(f'特集キーワードの再読み込みの計測値: {self.stats()}')
+
+    def stats(self) -> dict:
+        """再読み込みの計測値のスナップショット。"""
+        with self._lock:
+            return {
+                **self._counts,
+                'last_reload_ms': self._last_reload_ms,
+                'reload_ms_total': self._reload_ms_total,
+                'last_reload_error': self._last_reload_error,
+            }
 
     def is_featured_keyword(self, keyword: str) -> bool:
         """指定されたキーワードが特集キーワードかを判定する
@@ -78,37 +276,50 @@ class FeaturedKeywordsManager:
         """
         return self.get_keyword_info(keyword) is not None
 
-    def get_keyword_info(self, keyword: str) -> dict | None:
+    def get_keyword_info(self, keyword: str) -> Mapping[str, Any] | None:
         """特集キーワードの詳細情報を取得する
 
         Args:
             keyword (str): 取得対象のキーワード
 
         Returns:
-            Optional[Dict]: 特集キーワードの詳細情報。見つからない場合はNone
+            Optional[Mapping]: 特集キーワードの詳細情報（読み取り専用）。見つからない場合はNone。
+                書き換えたい呼び出し元は dict(info) で複製すること
         """
         if not keyword or not isinstance(keyword, str):
             logger.debug(f"無効なキーワード入力: {keyword} (型: {type(keyword)})")
             return None
 
-        if not self.keywords:
+        index = self._snapshot.index
+        if not index:
             logger.debug("特集キーワードが読み込まれていません")
             return None
 
-        keyword_lower = keyword.lower().strip()
+        keyword_lower = normalize_keyword(keyword)
         if not keyword_lower:
             logger.debug("空のキーワードです")
             return None
 
-        # keywords の各要素が keyword / name を持つ dict であることは
-        # featured_loader._validate_item が保証済みなので、ここでの防御は不要。
-        for item in self.keywords:
-            if item['keyword'].lower().strip() == keyword_lower:
-                logger.debug(f"特集キーワード情報取得成功: '{keyword}' -> '{item['name']}'")
-                return copy.deepcopy(item)
+        info = index.get(keyword_lower)
+        if info is None:
+            logger.debug(f"特集キーワード情報が見つかりません: '{keyword}'")
+            return None
+
+        logger.debug(f"特集キーワード情報取得成功: '{keyword}' -> '{info['name']}'")
+        return info
 
-        logger.debug(f"特集キーワード情報が見つかりません: '{keyword}'")
-        return None
+    def find_featured_keywords(self, text: str) -> list[KeywordMatch[Mapping[str, Any]]]:
+        """入力に含まれる特集キーワードを、区切り文字の有無に関わらずすべて見つける
+
+        重なる一致は長いものを優先し、入力中の出現順に返す。
+
+        Args:
+            text (str): ユーザーが入力したキーワード（複合キーワードもあり得る）
+
+        Returns:
+            List[KeywordMatch]: 一致した位置と、その特集キーワードの詳細情報（読み取り専用）
+        """
+        return self._snapshot.matcher.find(text)
 
     def get_all_keywords(self) -> list[dict]:
         """すべての特集キーワード情報を取得する
@@ -116,7 +327,7 @@ class FeaturedKeywordsManager:
         Returns:
             List[Dict]: すべての特集キーワードのリスト
         """
-        return copy.deepcopy(self.keywords)
+        return self._snapshot.get_all_keywords()
 
     def is_available(self) -> bool:
         """特集キーワード機能が利用可能かを確認する
@@ -124,15 +335,34 @@ class FeaturedKeywordsManager:
         Returns:
             bool: 利用可能な場合True、そうでなければFalse
         """
-        return len(self.keywords) > 0
+        return self._snapshot.is_available()
 
     def get_last_error(self) -> Exception | None:
         """最後に発生したエラーを取得する
 
+        再読み込みの失敗はここには出さない（読み込み済みの内容は有効なままのため）。
+        それは stats() の last_reload_error で見る。
+
         Returns:
             Optional[Exception]: 最後に発生したエラー。エラーがない場合はNone
         """
-        return self._last_error
+        return self._snapshot.get_last_error()
+
+    def get_payload(self, gender: str) -> FeaturedKeywordsPayload:
+        """読み込み時に作った、指定された性別の一覧の応答本文を返す
+
+        Args:
+            gender (str): 'ladies' または 'mens'（検証はルート側で済んでいる）
+        """
+        return self._snapshot.payloads[gender]
+
+    def get_version(self) -> str:
+        """現在のスナップショットの版（内容のハッシュ）。
+
+        再読み込みで内容が変われば値も変わる。生成結果のキャッシュはこれをキーに含め、
+        特集の条件が変わる前の結果を返さない。
+        """
+        return self._snapshot.version
 
     def get_health_status(self) -> dict[str, Any]:
         """特集キーワード機能の健全性状態を取得する
@@ -140,14 +370,7 @@ class FeaturedKeywordsManager:
         Returns:
             Dict[str, Any]: 健全性状態の情報
         """
-        return {
-            'is_available': self.is_available(),
-            'keywords_count': len(self.keywords),
-            'file_path': str(self.json_path),
-            'file_exists': os.path.exists(self.json_path),
-            'last_error': str(self._last_error) if self._last_error else None,
-            'error_type': type(self._last_error).__name__ if self._last_error else None,
-        }
+        return {**self._snapshot.get_health_status(), 'reload': self.stats()}
 
 
 def get_featured_repository() -> FeaturedKeywordsManager:
@@ -26,10 +26,17 @@ class LoadResult(NamedTuple):
     """読み込み結果。
 
     keywords が空でも error が None のことがある（ファイルが空配列の場合など）。
+    skipped は検証で弾いてスキップした件数。
     """
 
     keywords: list[dict]
     error: Exception | None
+    skipped: int = 0
+
+
+def normalize_keyword(keyword: str) -> str:
+    """照合用に正規化したキーワード。重複判定と検索の両方でこれを使う。"""
+    return keyword.lower().strip()
 
 
 def _validate_item(item, index: int) -> str | None:
@@ -142,7 +149,7 @@ def load_featured_keywords(path) -> LoadResult:
             error_msg = _validate_item(item, index)
 
             if error_msg is None:
-                normalized = item['keyword'].lower().strip()
+                normalized = normalize_keyword(item['keyword'])
                 if normalized in seen_keywords:
                     error_msg = f"特集キーワード[{index}]: 重複するキーワード '{item['keyword']}'"
                 else:
@@ -171,4 +178,4 @@ def load_featured_keywords(path) -> LoadResult:
     else:
         logger.info(f"特集キーワードを正常に読み込みました: {len(validated)}件")
 
-    return LoadResult(validated, None)
+    return LoadResult(validated, None, len(validation_errors))
@@ -0,0 +1,378 @@
+"""Gemini 呼び出しの受け付け（同時実行数・待ち行列・1 分あたりの呼び出し数とトークン数）。
+
+以前はワーカーが同時に送る generate_content の数に上限が無く、アクセスが集中すると
+Gemini のクォータを使い切り、SDK の HttpRetryOptions による再試行がさらに呼び出しを増やしていた。
+GeminiLimiter は TemplateGenerator の呼び出しの前後を囲み、
+
+- ワーカー内の同時実行数を max_concurrency までに抑える（再試行は 1 つの枠の中で行われる）
+- 空きを待てるのは max_queue 件・max_wait 秒まで。待ち行列が満杯か待ちきれなければ、
+  すぐに OverloadedError（503 + Retry-After）で断る。リクエストの締め切りの残り時間の方が
+  短く、そちらで待ちきれなかったときは DeadlineExceededError（504）で断る
+- 直近 1 分の呼び出し数（rpm）とトークン数（tpm）が上限に達していれば、空くまで待つ
+  （max_wait 秒で空かなければ断る）。呼び出し数は受け付けた分だけを数える
+- global_slots を渡すと、ワーカー全体の同時実行数も CACHE_DIR 配下のロックファイルで数える
+  （ロックファイルの操作はイベントループを止めないようスレッドで行う）
+
+待ち時間などの計測値は stats() で見られる。
+
+待ち合わせは TokenBucket（app/rate_limit.py）と同じく asyncio.Lock を使わずに行う。
+開発サーバーでは生成がリクエストごとに別のイベントループで動くため、待っている呼び出しには
+そのループの Future を持たせ、空いたら call_soon_threadsafe で知らせる。
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from flask import current_app
+
+from . import config
+from .errors import AppError, DeadlineExceededError, OverloadedError
+
+logger = logging.getLogger(__name__)
+
+# Flask の app.extensions に登録する際のキー
+EXTENSION_KEY = 'gemini_limiter'
+
+
+class GlobalSlots:
+    """ワーカー間で共有する同時実行の枠。枠 1 つがロックファイル 1 つに対応する。"""
+
+    def __init__(self, directory: Path, size: int):
+        self.directory = directory
+        self.size = size
+
+    def try_acquire(self) -> int | None:
+        """空いている枠を 1 つ取り、そのファイル記述子を返す。空きが無ければ None（待たない）。"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for index in range(self.size):
+            fd = os.open(self.directory / f'slot-{index}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return fd
+        return None
+
+    @staticmethod
+    def release(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+class Permit:
+    """受け付けた 1 回の呼び出し。使ったトークン数を record_usage で知らせる。"""
+
+    def __init__(self, limiter: 'GeminiLimiter', waited: float):
+        self._limiter = limiter
+        # 受け付けまでに待った秒数
+        self.waited = waited
+
+    def record_usage(self, usage) -> None:
+        """Gemini の usage_metadata を tpm の計算に加える（無ければ何もしない）。"""
+        tokens = getattr(usage, 'total_token_count', None) if usage is not None else None
+        if tokens:
+            self._limiter._record_tokens(int(tokens))
+
+
+class GeminiLimiter:
+    """Gemini 呼び出しの同時実行数と、1 分あたりの呼び出し数・トークン数を制限する。"""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int = 16,
+        max_wait: float = 20.0,
+        rpm: int = 0,
+        tpm: int = 0,
+        global_slots: GlobalSlots | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], object] = asyncio.sleep,
+    ):
+        """
+        Args:
+            max_concurrency: ワーカー内で同時に実行できる呼び出し数（0 以下なら制限しない）
+            max_queue: 空きを待てる呼び出しの数。これを超えたら待たせずに断る
+            max_wait: 受け付けまで待てる秒数
+            rpm: 直近 1 分の呼び出し数の上限（0 以下なら制限しない）
+            tpm: 直近 1 分のトークン数の上限（0 以下なら制限しない）
+            global_slots: ワーカー間で共有する同時実行の枠
+            clock: 現在時刻（秒）を返す関数。テストから差し替える
+            sleep: 待つための関数。テストから差し替える
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.rpm = rpm
+        self.tpm = tpm
+        self.global_slots = global_slots
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # 空きを待っている呼び出し（ループ, Future）。先に来たものから通す
+        self._waiters: deque[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        # 直近の呼び出しの時刻と、(時刻, トークン数)
+        self._calls: deque[float] = deque()
+        self._tokens: deque[tuple[float, int]] = deque()
+        self._token_total = 0
+        self._counts = dict.fromkeys(
+            (
+                'admitted',
+                'rejected_queue_full',
+                'rejected_timeout',
+                'rejected_budget',
+                'rejected_deadline',
+            ),
+            0,
+        )
+        self._wait_ms_total = 0.0
+        self._wait_ms_max = 0.0
+
+    @classmethod
+    def from_settings(cls, settings: config.Settings) -> 'GeminiLimiter':
+        global_slots = None
+        if settings.gemini_global_concurrency > 0:
+            global_slots = GlobalSlots(
+                settings.cache_dir / config.GEMINI_SLOT_DIRNAME, settings.gemini_global_concurrency
+            )
+        return cls(
+            settings.gemini_max_concurrency,
+            settings.gemini_queue_size,
+            settings.gemini_queue_timeout,
+            settings.gemini_rpm,
+            settings.gemini_tpm,
+            global_slots,
+        )
+
+    @asynccontextmanager
+    async def admit(self, max_wait: float | None = None) -> AsyncIterator[Permit]:
+        """呼び出しを受け付ける。抜けるまで枠を使う。
+
+        Args:
+            max_wait: 待てる秒数をこれより短くする（リクエストの締め切りの残り時間など）
+
+        Raises:
+            OverloadedError: 待ち行列が満杯、または max_wait（limiter の既定）以内に受け付けられなかった
+            DeadlineExceededError: 引数の max_wait の方が短く、その秒数以内に受け付けられなかった
+        """
+        started = self._clock()
+        queue_deadline = started + self.max_wait
+        deadline = queue_deadline if max_wait is None else min(queue_deadline, started + max_wait)
+        reserved = await self._wait_for_budget(deadline, queue_deadline)
+        local = False
+        slot = None
+        try:
+            await self._acquire_local(deadline, queue_deadline)
+            local = True
+            if self.global_slots:
+                slot = await self._acquire_global(deadline, queue_deadline)
+        except BaseException:
+            # 受け付けなかった呼び出しは 1 分あたりの呼び出し数に数えない
+            self._unreserve(reserved)
+            if local:
+                self._release_local()
+            raise
+        try:
+            waited = self._clock() - started
+            self._record_admitted(waited)
+            yield Permit(self, waited)
+        finally:
+            if slot is not None:
+                self.global_slots.release(slot)
+            self._release_local()
+
+    def _timed_out(self, counter: str, deadline: float, queue_deadline: float) -> AppError:
+        """待ちきれなかったときの例外。リクエストの締め切りで待てなかったなら 504 にする。"""
+        by_request = deadline < queue_deadline
+        with self._lock:
+            self._counts['rejected_deadline' if by_request else counter] += 1
+        if by_request:
+            return DeadlineExceededError()
+        return OverloadedError(config.GEMINI_RETRY_AFTER_SECONDS)
+
+    # --- 1 分あたりの呼び出し数・トークン数 ---
+
+    def _prune(self, now: float) -> None:
+        """窓から出た記録を捨てる（ロックを持って呼ぶ。記録を足すたびに呼び、溜め込まない）。"""
+        horizon = now - config.GEMINI_BUDGET_WINDOW_SECONDS
+        while self._calls and self._calls[0] <= horizon:
+            self._calls.popleft()
+        while self._tokens and self._tokens[0][0] <= horizon:
+            self._token_total -= self._tokens.popleft()[1]
+
+    def _budget_wait(self, now: float) -> float:
+        """上限に空きができるまでの秒数（ロックを持って呼ぶ）。"""
+        self._prune(now)
+        window = config.GEMINI_BUDGET_WINDOW_SECONDS
+        wait = 0.0
+        if self.rpm > 0 and len(self._calls) >= self.rpm:
+            wait = self._calls[len(self._calls) - self.rpm] + window - now
+        if self.tpm > 0 and self._token_total >= self.tpm:
+            remaining = self._token_total
+            for at, tokens in self._tokens:
+                remaining -= tokens
+                if remaining < self.tpm:
+                    wait = max(wait, at + window - now)
+                    break
+        return max(0.0, wait)
+
+    async def _wait_for_budget(self, deadline: float, queue_deadline: float) -> float | None:
+        """上限に空きができるまで待ち、この呼び出しの分を予約する。予約した時刻を返す。
+
+        上限が無ければ何も数えず None を返す。
+        """
+        if self.rpm <= 0 and self.tpm <= 0:
+            return None
+        while True:
+            with self._lock:
+                now = self._clock()
+                wait = self._budget_wait(now)
+                if wait <= 0:
+                    # 枠を待つ前に予約しておく（待っている間に他の呼び出しが割り込まないように）。
+                    # 枠を取れずに断ったときは _unreserve で取り消す
+                    self._calls.append(now)
+                    return now
+                if now + wait > queue_deadline:
+                    self._counts['rejected_budget'] += 1
+                    raise OverloadedError(wait)
+                if now + wait > deadline:
+                    self._counts['rejected_deadline'] += 1
+                    raise DeadlineExceededError()
+            await self._sleep(wait)
+
+    def _unreserve(self, reserved: float | None) -> None:
+        if reserved is None:
+            return
+        with self._lock:
+            try:
+                self._calls.remove(reserved)
+            except ValueError:
+                # 待っている間に窓から出ていた
+                pass
+
+    def _record_tokens(self, tokens: int) -> None:
+        if self.tpm <= 0:
+            return
+        with self._lock:
+            now = self._clock()
+            self._prune(now)
+            self._tokens.append((now, tokens))
+            self._token_total += tokens
+
+    # --- ワーカー内の同時実行数 ---
+
+    async def _acquire_local(self, deadline: float, queue_deadline: float) -> None:
+        with self._lock:
+            unlimited = self.max_concurrency <= 0
+            if unlimited or (self._in_flight < self.max_concurrency and not self._waiters):
+                self._in_flight += 1
+                return
+            if len(self._waiters) >= self.max_queue:
+                self._counts['rejected_queue_full'] += 1
+                raise OverloadedError(config.GEMINI_RETRY_AFTER_SECONDS)
+            loop = asyncio.get_running_loop()
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+
+        future = waiter[1]
+        try:
+            await asyncio.wait_for(future, max(0.0, deadline - self._clock()))
+        except BaseException as e:
+            with self._lock:
+                granted = waiter not in self._waiters
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted and future.done() and not future.cancelled():
+                # 枠を渡された直後に諦めた。受け取った枠は次へ回す
+                self._release_local()
+            if isinstance(e, TimeoutError):
+                raise self._timed_out('rejected_timeout', deadline, queue_deadline) from None
+            raise
+
+    def _release_local(self) -> None:
+        with self._lock:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                if loop.is_closed():
+                    continue
+                # 枠は in_flight を減らさずにそのまま渡す
+                loop.call_soon_threadsafe(self._grant, future)
+                return
+            self._in_flight -= 1
+
+    def _grant(self, future: asyncio.Future) -> None:
+        if future.done():
+            # 待つのをやめた呼び出しだった。枠を次へ回す
+            self._release_local()
+            return
+        future.set_result(None)
+
+    # --- ワーカー間の同時実行数 ---
+
+    async def _acquire_global(self, deadline: float, queue_deadline: float) -> int:
+        while True:
+            slot = await self._try_acquire_global()
+            if slot is not None:
+                return slot
+            if self._clock() >= deadline:
+                raise self._timed_out('rejected_timeout', deadline, queue_deadline)
+            await self._sleep(config.GEMINI_SLOT_POLL_SECONDS)
+
+    async def _try_acquire_global(self) -> int | None:
+        """ロックファイルを開いて LOCK_NB で試す。ファイル操作はイベントループの外で行う。"""
+        attempt = asyncio.ensure_future(asyncio.to_thread(self.global_slots.try_acquire))
+        try:
+            return await asyncio.shield(attempt)
+        except asyncio.CancelledError:
+            # スレッドは止められない。取れてしまった枠は取り終えたところで返す
+            attempt.add_done_callback(self._release_abandoned_slot)
+            raise
+
+    def _release_abandoned_slot(self, attempt: asyncio.Future) -> None:
+        if not attempt.cancelled() and attempt.exception() is None and attempt.result() is not None:
+            self.global_slots.release(attempt.result())
+
+    # --- 計測値 ---
+
+    def _record_admitted(self, waited: float) -> None:
+        waited_ms = waited * 1000
+        with self._lock:
+            self._counts['admitted'] += 1
+            self._wait_ms_total += waited_ms
+            self._wait_ms_max = max(self._wait_ms_max, waited_ms)
+        if waited_ms >= 1000:
+            logger.info(f'Gemini の呼び出しが受け付けまで {waited:.1f} 秒待ちました')
+
+    def stats(self) -> dict:
+        """受け付けの計測値のスナップショット。"""
+        with self._lock:
+            self._prune(self._clock())
+            admitted = self._counts['admitted']
+            return {
+                'in_flight': self._in_flight,
+                'waiting': len(self._waiters),
+                **self._counts,
+                'queue_wait_ms_total': round(self._wait_ms_total, 1),
+                'queue_wait_ms_avg': round(self._wait_ms_total / admitted, 1) if admitted else None,
+                'queue_wait_ms_max': round(self._wait_ms_max, 1),
+                # rpm / tpm を設けていなければ数えないので 0 のまま
+                'calls_last_minute': len(self._calls),
+                'tokens_last_minute': self._token_total,
+            }
+
+
+def get_gemini_limiter() -> GeminiLimiter:
+    """現在のアプリに紐づく Gemini 呼び出しの受け付けを返す。
+
+    サービス層はこれを直接呼ばず、引数で受け取ること。
+    """
+    return current_app.extensions[EXTENSION_KEY]
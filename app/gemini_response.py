@@ -10,7 +10,8 @@ from google.genai import types
 from pydantic import ValidationError
 
 from .errors import GenerationError
-from .schemas import GenerationResult
+from .schemas import GeneratedTemplate, GenerationResult, TrendingKeyword
+from .timing import PARSE, timed
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +45,18 @@ def check_finish_reason(response) -> None:
     raise GenerationError(messages.get(finish_reason))
 
 
+def log_usage(usage) -> None:
+    """トークン使用量をログに残す（usage_metadata が無ければ何もしない）。"""
+    if usage is None:
+        return
+    logger.info(
+        f"Gemini トークン使用量: prompt={getattr(usage, 'prompt_token_count', '不明')}, "
+        f"candidates={getattr(usage, 'candidates_token_count', '不明')}, "
+        f"total={getattr(usage, 'total_token_count', '不明')}"
+    )
+
+
+@timed(PARSE)
 def extract_result(response) -> tuple[list[dict], list[dict]]:
     """Gemini のレスポンスからテンプレートとトレンドキーワードを取り出す。
 
@@ -79,13 +92,7 @@ def extract_result(response) -> tuple[list[dict], list[dict]]:
             logger.debug(f"エラーが発生したレスポンスの一部: {response_text[:200]}...")
             raise GenerationError() from e
 
-    usage = getattr(response, 'usage_metadata', None)
-    if usage is not None:
-        logger.info(
-            f"Gemini トークン使用量: prompt={getattr(usage, 'prompt_token_count', '不明')}, "
-            f"candidates={getattr(usage, 'candidates_token_count', '不明')}, "
-            f"total={getattr(usage, 'total_token_count', '不明')}"
-        )
+    log_usage(getattr(response, 'usage_metadata', None))
 
     trending_keywords = [kw.model_dump() for kw in result.trending_keywords]
     if trending_keywords:
@@ -94,3 +101,102 @@ def extract_result(response) -> tuple[list[dict], list[dict]]:
         )
 
     return [t.model_dump() for t in result.templates], trending_keywords
+
+
+class TemplateStreamParser:
+    """ストリーミングで届く JSON テキストから、完成したテンプレートを順に取り出す。
+
+    構造化出力は {"trending_keywords": [...], "templates": [{...}, ...]} の形で
+    少しずつ届く。templates 配列の要素が閉じた時点で、その 1 件だけを解釈して返す。
+    文字列の中の括弧を数えないよう、引用符とエスケープだけを追う最小の走査にしている
+    （各文字は 1 回しか見ないので、全体で受信テキスト長に比例する）。
+    """
+
+    def __init__(self):
+        self._text = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        # 最上位オブジェクトで直前に読んだ文字列（= キー）
+        self._last_key: str | None = None
+        # templates 配列の内側の深さ。配列の外にいる間は None
+        self._templates_depth: int | None = None
+        self._object_start: int | None = None
+        self.template_count = 0
+
+    @property
+    def text(self) -> str:
+        """これまでに受け取ったテキスト全体。"""
+        return self._text
+
+    def feed(self, chunk: str) -> list[dict]:
+        """テキストの断片を追加し、新たに閉じたテンプレートを返す。
+
+        Raises:
+            GenerationError: 閉じたテンプレートがスキーマに合わない場合
+        """
+        self._text += chunk
+        text = self._text
+        completed = []
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = text[self._string_start + 1 : i]
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in '{[':
+                self._depth += 1
+                if ch == '[' and self._depth == 2 and self._last_key == 'templates':
+                    self._templates_depth = self._depth
+                elif ch == '{' and self._templates_depth is not None:
+                    if self._depth == self._templates_depth + 1:
+                        self._object_start = i
+            elif ch in '}]':
+                if (
+                    ch == '}'
+                    and self._object_start is not None
+                    and self._depth == self._templates_depth + 1
+                ):
+                    completed.append(self._parse_template(text[self._object_start : i + 1]))
+                    self._object_start = None
+                elif ch == ']' and self._depth == self._templates_depth:
+                    self._templates_depth = None
+                self._depth -= 1
+        self._pos = len(text)
+        return completed
+
+    def _parse_template(self, fragment: str) -> dict:
+        try:
+            template = GeneratedTemplate.model_validate_json(fragment)
+        except ValidationError as e:
+            logger.error(f"ストリーミング中のテンプレートの解釈に失敗: {e}")
+            logger.debug(f"解釈できなかった断片: {fragment[:200]}...")
+            raise GenerationError() from e
+        self.template_count += 1
+        return template.model_dump()
+
+    def trending_keywords(self) -> list[dict]:
+        """受信し終えたテキストからトレンドキーワードを取り出す。
+
+        トレンドキーワードは付随情報なので、読めなければ空として扱う
+        （テンプレートは届いた分だけで成立している）。
+        """
+        try:
+            data = json.loads(self._text)
+            raw = data.get('trending_keywords') if isinstance(data, dict) else None
+            return [TrendingKeyword.model_validate(kw).model_dump() for kw in raw or []]
+        except (json.JSONDecodeError, ValidationError) as e:
+            logger.warning(f"トレンドキーワードを解釈できませんでした: {e}")
+            return []
@@ -7,29 +7,129 @@
 - 季節・カラーの付加 …… seasons.py
 """
 
+import copy
+import functools
 import logging
+import time
+from collections.abc import Callable, Mapping
 
 from google import genai
 from google.genai import types
 
 from . import config
-from .errors import AppError, ConfigurationError, GenerationError, ValidationError
-from .gemini_response import extract_result
+from .deadline import Deadline, enforce
+from .errors import (
+    AppError,
+    ConfigurationError,
+    DeadlineExceededError,
+    GenerationError,
+    ValidationError,
+)
+from .gemini_limiter import GeminiLimiter
+from .gemini_response import TemplateStreamParser, check_finish_reason, extract_result, log_usage
+from .metrics import GEMINI_REQUEST_SECONDS, record_usage
 from .prompts import build_generation_prompt
 from .schemas import GenerationResult
-from .seasons import apply_season_keywords
+from .seasons import SeasonApplier, apply_season_keywords
+from .stages import (
+    GEMINI_DONE,
+    GEMINI_FIRST_BYTE,
+    PROMPT_BUILT,
+    VALIDATION_DONE,
+    report_stage,
+)
 from .template_validation import validate_template
+from .timing import GEMINI, GEMINI_QUEUE, PROMPT, VALIDATE, record, span
+from .title_selection import select_reference_titles
+from .usage_ledger import UsageLedger
 
 logger = logging.getLogger(__name__)
 
 
+@functools.cache
+def build_request_config() -> types.GenerateContentConfig:
+    """generate_content に渡す設定（すべて定数由来なのでプロセスで 1 つを共有する）。
+
+    以前はリクエストごとに組み立て直していた。SDK は渡された設定を書き換えない。
+    """
+    return types.GenerateContentConfig(
+        temperature=config.GEMINI_TEMPERATURE,
+        max_output_tokens=config.GEMINI_MAX_OUTPUT_TOKENS,
+        thinking_config=types.ThinkingConfig(
+            thinking_level=types.ThinkingLevel.MINIMAL  # 高速化のため思考プロセスを最小化
+        ),
+        response_mime_type='application/json',
+        response_schema=GenerationResult,
+        http_options=_http_options(config.GEMINI_REQUEST_TIMEOUT_MS, config.GEMINI_RETRY_ATTEMPTS),
+    )
+
+
+def _http_options(timeout_ms: int, attempts: int) -> types.HttpOptions:
+    return types.HttpOptions(
+        timeout=timeout_ms,
+        retry_options=types.HttpRetryOptions(
+            attempts=attempts,
+            initial_delay=config.GEMINI_RETRY_INITIAL_DELAY,
+            max_delay=config.GEMINI_RETRY_MAX_DELAY,
+        ),
+    )
+
+
+def request_config_within(remaining: float) -> types.GenerateContentConfig:
+    """残り remaining 秒に収まるよう、1 回の待ち時間と再試行回数を縮めた設定。
+
+    既定の予算（1 回 GEMINI_REQUEST_TIMEOUT_MS × GEMINI_RETRY_ATTEMPTS 回 + 間の待ち）が
+    収まるなら共有の設定をそのまま返す。収まらなければ残り時間を回数で割り、1 回が
+    GEMINI_MIN_ATTEMPT_SECONDS を割るなら回数を減らす（最低 1 回）。
+    """
+    base = build_request_config()
+    timeout = config.GEMINI_REQUEST_TIMEOUT_MS / 1000
+    attempts = config.GEMINI_RETRY_ATTEMPTS
+
+    def per_attempt(attempts: int) -> float:
+        # 再試行の間の待ちは、多めに見積もって毎回 GEMINI_RETRY_MAX_DELAY とする
+        return (remaining - (attempts - 1) * config.GEMINI_RETRY_MAX_DELAY) / attempts
+
+    if per_attempt(attempts) >= timeout:
+        return base
+    while attempts > 1 and per_attempt(attempts) < config.GEMINI_MIN_ATTEMPT_SECONDS:
+        attempts -= 1
+    timeout_ms = int(min(timeout, per_attempt(attempts)) * 1000)
+    logger.info(
+        f"締め切りに合わせて Gemini の待ち時間を縮めます: 1 回 {timeout_ms}ms × {attempts} 回"
+    )
+    return base.model_copy(update={'http_options': _http_options(timeout_ms, attempts)})
+
+
+def resolve_model_name(model_name: str | None) -> str:
+    """サポート外・未指定のモデル名を既定のモデルに置き換える。"""
+    model_name = model_name or config.DEFAULT_MODEL
+    if model_name not in config.SUPPORTED_MODELS:
+        logger.warning(f"Unsupported model: {model_name}, falling back to {config.DEFAULT_MODEL}")
+        return config.DEFAULT_MODEL
+    return model_name
+
+
 class TemplateGenerator:
-    def __init__(self, model_name: str | None = None, settings: config.Settings | None = None):
+    def __init__(
+        self,
+        model_name: str | None = None,
+        settings: config.Settings | None = None,
+        client: genai.Client | None = None,
+        limiter: GeminiLimiter | None = None,
+        ledger: UsageLedger | None = None,
+    ):
         """テンプレート生成器を初期化する。
 
         Args:
             model_name: 使用する Gemini モデル。省略時は config.DEFAULT_MODEL。
             settings: 使用する設定。省略時はプロセス共有の設定を使う。
+            client: 使用する Gemini クライアント（GeneratorRegistry が共有のものを渡す）。
+                    省略時はこの生成器専用に作る。
+            limiter: Gemini 呼び出しの受け付け（GeneratorRegistry がワーカー共有のものを渡す）。
+                     省略時は制限しない。
+            ledger: トークン使用量の台帳（GeneratorRegistry がワーカー共有のものを渡す）。
+                    省略時は記録しない。
         """
         self.settings = settings or config.get_settings()
 
@@ -40,37 +140,95 @@ class TemplateGenerator:
             )
 
         # サポートされているモデルの検証
-        model_name = model_name or config.DEFAULT_MODEL
-        if model_name not in config.SUPPORTED_MODELS:
-            logger.warning(
-                f"Unsupported model: {model_name}, falling back to {config.DEFAULT_MODEL}"
-            )
-            model_name = config.DEFAULT_MODEL
-
-        self.model_name = model_name
+        self.model_name = resolve_model_name(model_name)
 
         # Google GenAI SDKクライアント初期化
-        self.client = genai.Client(api_key=self.settings.gemini_api_key)
-        logger.info(f"TemplateGeneratorが初期化されました（モデル: {model_name}）")
-
-    def _build_request_config(self) -> types.GenerateContentConfig:
-        return types.GenerateContentConfig(
-            temperature=config.GEMINI_TEMPERATURE,
-            max_output_tokens=config.GEMINI_MAX_OUTPUT_TOKENS,
-            thinking_config=types.ThinkingConfig(
-                thinking_level=types.ThinkingLevel.MINIMAL  # 高速化のため思考プロセスを最小化
-            ),
-            response_mime_type='application/json',
-            response_schema=GenerationResult,
-            http_options=types.HttpOptions(
-                timeout=config.GEMINI_REQUEST_TIMEOUT_MS,
-                retry_options=types.HttpRetryOptions(
-                    attempts=config.GEMINI_RETRY_ATTEMPTS,
-                    initial_delay=config.GEMINI_RETRY_INITIAL_DELAY,
-                    max_delay=config.GEMINI_RETRY_MAX_DELAY,
-                ),
-            ),
+        self.client = client or genai.Client(api_key=self.settings.gemini_api_key)
+        self.request_config = build_request_config()
+        self.limiter = limiter or GeminiLimiter(0)
+        self.ledger = ledger
+        logger.info(f"TemplateGeneratorが初期化されました（モデル: {self.model_name}）")
+
+    def _build_prompt(
+        self,
+        titles: list[str],
+        keyword: str,
+        selected_seasons: list[str],
+        gender: str,
+        featured_info: Mapping | None,
+        generation_context: dict | None,
+    ) -> str:
+        if not titles:
+            logger.error("タイトルリストが空です")
+            raise ValidationError("タイトルリストが空です")
+        if not keyword:
+            logger.error("キーワードが指定されていません")
+            raise ValidationError("キーワードが指定されていません")
+
+        context = generation_context or {}
+        logger.info(
+            f"非同期テンプレート生成開始: タイトル数: {len(titles)}, キーワード: '{keyword}', "
+            f"季節・カラー選択: {selected_seasons}, 性別: '{gender}', "
+            f"特集対応: {featured_info is not None}, "
+            f"キーワードタイプ: {context.get('keyword_type', 'normal')}, "
+            f"処理モード: {context.get('processing_mode', 'standard')}"
+        )
+        with span(PROMPT):
+            selection = select_reference_titles(
+                titles, self.model_name, self.settings.reference_title_token_budget
+            )
+            prompt = build_generation_prompt(
+                selection.titles,
+                keyword,
+                selected_seasons,
+                gender,
+                featured_info,
+                generation_context,
+            )
+        # プロンプト全文は数KBあり毎リクエスト出すとログが肥大するため、規模だけ記録する
+        logger.debug(
+            f"プロンプト長: {len(prompt)} 文字（参照タイトル {len(selection.titles)} 件、"
+            f"推定 {selection.estimated_tokens} トークン）"
         )
+        report_stage(PROMPT_BUILT, prompt_chars=len(prompt))
+        return prompt
+
+    def _request_config(self, deadline: Deadline | None) -> types.GenerateContentConfig:
+        """締め切りの残り時間に合わせた設定。1 回分の時間も残っていなければ呼び出さない。"""
+        if deadline is None:
+            return self.request_config
+        remaining = deadline.remaining()
+        if remaining < config.GEMINI_MIN_ATTEMPT_SECONDS:
+            logger.warning(f"締め切りまで {remaining:.1f} 秒しかないため、Gemini を呼び出しません")
+            raise DeadlineExceededError()
+        return request_config_within(remaining)
+
+    def _record_usage(
+        self, usage, mode: str, generation_context: dict | None, started: float
+    ) -> None:
+        """使用量を /metrics と台帳に残す。started は Gemini を呼び出した時刻（perf_counter）。"""
+        record_usage(usage, self.model_name)
+        if self.ledger is not None:
+            keyword_type = (generation_context or {}).get('keyword_type', 'normal')
+            latency_ms = (time.perf_counter() - started) * 1000
+            self.ledger.record(usage, self.model_name, keyword_type, mode, latency_ms)
+
+    @staticmethod
+    def _check_valid_count(valid_count: int, received_count: int) -> None:
+        if not valid_count:
+            logger.error("有効なテンプレートがありません")
+            raise GenerationError(
+                '生成されたテンプレートがすべて条件を満たしませんでした。再度お試しください。'
+            )
+
+        if valid_count < config.MAX_TEMPLATES:
+            # 自動リトライはしない（レイテンシが倍増し、生成品質の方針も変わるため）。
+            # 件数が減った事実は運用で追えるようログに残す。
+            logger.warning(
+                f"有効テンプレートが要求数に達しませんでした: "
+                f"要求={config.MAX_TEMPLATES}件 / 受信={received_count}件 / "
+                f"有効={valid_count}件"
+            )
 
     async def generate_templates_async(
         self,
@@ -78,8 +236,10 @@ class TemplateGenerator:
         keyword: str,
         seasons: list[str] | None = None,
         gender: str = 'ladies',
-        featured_info: dict | None = None,
+        featured_info: Mapping | None = None,
         generation_context: dict | None = None,
+        raw_templates: list[dict] | None = None,
+        deadline: Deadline | None = None,
     ) -> tuple[list[dict[str, str]], list[dict], list[str]]:
         """テンプレートの非同期生成
 
@@ -90,69 +250,57 @@ class TemplateGenerator:
             gender: 'ladies' または 'mens'
             featured_info: 特集キーワード情報
             generation_context: キーワード解析の結果
+            raw_templates: 渡されると、季節・カラーを付加する前の有効なテンプレートの複製を
+                           ここへ追加する（別の選択で付加し直すためのキャッシュ用）
+            deadline: リクエストの締め切り。受け付けの待ち、1 回の待ち時間と再試行回数を
+                      残り時間に収め、過ぎれば DeadlineExceededError を送出する
 
         Returns:
             (valid_templates, trending_keywords, unapplied_seasons) のタプル。
             unapplied_seasons はどのタイトルにも含まれなかった季節・カラーのキー。
         """
-        if not titles:
-            logger.error("タイトルリストが空です")
-            raise ValidationError("タイトルリストが空です")
-        if not keyword:
-            logger.error("キーワードが指定されていません")
-            raise ValidationError("キーワードが指定されていません")
-
         selected_seasons = seasons or []
-        context = generation_context or {}
-
-        logger.info(
-            f"非同期テンプレート生成開始: タイトル数: {len(titles)}, キーワード: '{keyword}', "
-            f"季節・カラー選択: {selected_seasons}, 性別: '{gender}', "
-            f"特集対応: {featured_info is not None}, "
-            f"キーワードタイプ: {context.get('keyword_type', 'normal')}, "
-            f"処理モード: {context.get('processing_mode', 'standard')}"
-        )
-        prompt = build_generation_prompt(
+        prompt = self._build_prompt(
             titles, keyword, selected_seasons, gender, featured_info, generation_context
         )
 
         try:
-            # プロンプト全文は数KBあり毎リクエスト出すとログが肥大するため、規模だけ記録する
-            logger.debug(f"プロンプト長: {len(prompt)} 文字")
             logger.info("Gemini APIリクエスト送信中（thinkingLevel=MINIMAL, 構造化出力）...")
 
-            response = await self.client.aio.models.generate_content(
-                model=self.model_name, contents=prompt, config=self._build_request_config()
+            # SDK の再試行（HttpRetryOptions）も受け付けた 1 枠の中で行われる
+            async with self.limiter.admit(_admission_wait(deadline)) as permit:
+                record(GEMINI_QUEUE, permit.waited)
+                request_config = self._request_config(deadline)
+                called = time.perf_counter()
+                with span(GEMINI), GEMINI_REQUEST_SECONDS.time(model=self.model_name, mode='json'):
+                    async with enforce(deadline, 'gemini'):
+                        response = await self.client.aio.models.generate_content(
+                            model=self.model_name, contents=prompt, config=request_config
+                        )
+                permit.record_usage(getattr(response, 'usage_metadata', None))
+            self._record_usage(
+                getattr(response, 'usage_metadata', None), 'json', generation_context, called
             )
             logger.info("Gemini API応答受信")
+            report_stage(GEMINI_DONE)
 
             templates, trending_keywords = extract_result(response)
             logger.info(f"APIから {len(templates)} 件のテンプレートを受信")
 
             valid_templates = []
-            for i, template in enumerate(templates):
-                logger.debug(f"テンプレート {i + 1} の検証: {template.get('title', '不明')}")
-                if validate_template(template, keyword):
-                    valid_templates.append(template)
-                else:
-                    logger.warning(f"テンプレート {i + 1} は検証に失敗しました")
-
-            if not valid_templates:
-                logger.error("有効なテンプレートがありません")
-                raise GenerationError(
-                    '生成されたテンプレートがすべて条件を満たしませんでした。再度お試しください。'
-                )
-
-            if len(valid_templates) < config.MAX_TEMPLATES:
-                # 自動リトライはしない（レイテンシが倍増し、生成品質の方針も変わるため）。
-                # 件数が減った事実は運用で追えるようログに残す。
-                logger.warning(
-                    f"有効テンプレートが要求数に達しませんでした: "
-                    f"要求={config.MAX_TEMPLATES}件 / 受信={len(templates)}件 / "
-                    f"有効={len(valid_templates)}件"
-                )
+            with span(VALIDATE):
+                for i, template in enumerate(templates):
+                    logger.debug(f"テンプレート {i + 1} の検証: {template.get('title', '不明')}")
+                    if validate_template(template, keyword):
+                        valid_templates.append(template)
+                    else:
+                        logger.warning(f"テンプレート {i + 1} は検証に失敗しました")
 
+            self._check_valid_count(len(valid_templates), len(templates))
+            report_stage(VALIDATION_DONE, valid=len(valid_templates), received=len(templates))
             result_templates = valid_templates[: config.MAX_TEMPLATES]
+            if raw_templates is not None:
+                raw_templates.extend(copy.deepcopy(result_templates))
 
             # 季節・カラーはプロンプトに入れず、ここで後処理として付加する。
             # apply_season_keywords は上限文字数を超えない範囲でしか付加しないので、
@@ -168,3 +316,123 @@ class TemplateGenerator:
         except Exception as e:
             logger.error(f"テンプレート生成エラー: {str(e)}", exc_info=True)
             raise GenerationError() from e
+
+    async def generate_templates_stream(
+        self,
+        titles: list[str],
+        keyword: str,
+        on_template: Callable[[dict], None],
+        seasons: list[str] | None = None,
+        gender: str = 'ladies',
+        featured_info: Mapping | None = None,
+        generation_context: dict | None = None,
+        raw_templates: list[dict] | None = None,
+        deadline: Deadline | None = None,
+    ) -> tuple[list[dict[str, str]], list[dict], list[str]]:
+        """テンプレートをストリーミングで生成し、1 件確定するたびに on_template を呼ぶ。
+
+        引数と戻り値は generate_templates_async と同じ。テンプレートは Gemini の出力が
+        1 件分閉じた時点で検証し、季節・カラーを付加してから on_template へ渡す
+        （付加は届いた順に確定させる SeasonApplier で行う）。
+
+        出力トークン上限や締め切りで途中で打ち切られた場合も、それまでに渡した有効な
+        テンプレートがあればエラーにせず、その件数で完了とする（警告ログを残す）。
+        """
+        selected_seasons = seasons or []
+        prompt = self._build_prompt(
+            titles, keyword, selected_seasons, gender, featured_info, generation_context
+        )
+        parser = TemplateStreamParser()
+        applier = SeasonApplier(selected_seasons)
+        result_templates: list[dict] = []
+        last_chunk = None
+        # finish_reason は候補を持つ最後の断片で見る（使用量だけの断片が続くことがある）
+        finish_chunk = None
+        # 途中で打ち切られた（送信済みのテンプレートがあるので、その件数で完了とする）
+        truncated = False
+
+        try:
+            logger.info("Gemini APIストリーミングリクエスト送信中（構造化出力）...")
+            # 出力を受け取り終えるまで 1 枠を使う
+            async with self.limiter.admit(_admission_wait(deadline)) as permit:
+                record(GEMINI_QUEUE, permit.waited)
+                request_config = self._request_config(deadline)
+                called = time.perf_counter()
+                try:
+                    # 検証と季節の付加は出力の受信と交互に行うので、GEMINI に含まれる
+                    with (
+                        span(GEMINI),
+                        GEMINI_REQUEST_SECONDS.time(model=self.model_name, mode='stream'),
+                    ):
+                        async with enforce(deadline, 'gemini'):
+                            stream = await self.client.aio.models.generate_content_stream(
+                                model=self.model_name, contents=prompt, config=request_config
+                            )
+                            async for chunk in stream:
+                                if last_chunk is None:
+                                    logger.info("Gemini API最初の応答を受信")
+                                    report_stage(GEMINI_FIRST_BYTE)
+                                last_chunk = chunk
+                                if getattr(chunk, 'candidates', None):
+                                    finish_chunk = chunk
+                                for template in parser.feed(chunk.text or ''):
+                                    if len(result_templates) >= config.MAX_TEMPLATES:
+                                        continue
+                                    if not validate_template(template, keyword):
+                                        logger.warning(
+                                            f"テンプレート {parser.template_count} は検証に失敗しました"
+                                        )
+                                        continue
+                                    if raw_templates is not None:
+                                        raw_templates.append(copy.deepcopy(template))
+                                    applier.apply(template)
+                                    result_templates.append(template)
+                                    on_template(template)
+                except DeadlineExceededError:
+                    if not result_templates:
+                        raise
+                    truncated = True
+                permit.record_usage(getattr(last_chunk, 'usage_metadata', None))
+            self._record_usage(
+                getattr(last_chunk, 'usage_metadata', None), 'stream', generation_context, called
+            )
+
+            report_stage(GEMINI_DONE)
+            if last_chunk is None:
+                raise GenerationError(
+                    'Gemini から空のレスポンスが返されました。再度お試しください。'
+                )
+            try:
+                check_finish_reason(finish_chunk)
+            except GenerationError:
+                if not result_templates:
+                    raise
+                truncated = True
+            if truncated:
+                logger.warning(
+                    f"生成が途中で打ち切られましたが、{len(result_templates)} 件は送信済みのため"
+                    f"その件数で完了とします"
+                )
+
+            log_usage(getattr(last_chunk, 'usage_metadata', None))
+            logger.info(f"APIから {parser.template_count} 件のテンプレートを受信")
+            self._check_valid_count(len(result_templates), parser.template_count)
+            report_stage(
+                VALIDATION_DONE, valid=len(result_templates), received=parser.template_count
+            )
+
+            trending_keywords = parser.trending_keywords()
+            unapplied_seasons = applier.unapplied()
+            logger.info(f"テンプレート生成完了: {len(result_templates)} 件の有効なテンプレート")
+            return result_templates, trending_keywords, unapplied_seasons
+
+        except AppError:
+            raise
+        except Exception as e:
+            logger.error(f"テンプレート生成エラー: {str(e)}", exc_info=True)
+            raise GenerationError() from e
+
+
+def _admission_wait(deadline: Deadline | None) -> float | None:
+    """Gemini の呼び出しの受け付けを待てる秒数（締め切りが無ければ limiter の既定）。"""
+    return deadline.remaining() if deadline is not None else None
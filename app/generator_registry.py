@@ -0,0 +1,152 @@
+"""ワーカー存続期間で共有する TemplateGenerator の置き場。
+
+以前は /api/generate のたびに TemplateGenerator を作っており、そのたびに
+genai.Client（certifi の CA バンドルの読み込みを含む）と、Gemini エンドポイントへの
+新しい接続（TCP + TLS ハンドシェイク）を払っていた。
+
+GeneratorRegistry は genai.Client を 1 つだけ作り、モデルごとの TemplateGenerator を
+使い回す。genai.Client の非同期セッション（aiohttp）は最初に使ったイベントループに紐づき、
+そのループが閉じるまで作り直されない。そのため ScraperPool と同じく、共有の生成器を返すのは
+start() したのと同じループ上の呼び出しに限り、それ以外（開発サーバーやテストクライアント、
+start() 前）では従来どおりリクエスト単位の生成器を作る。
+
+GEMINI_WARMUP=true なら、lifespan startup で Gemini へ軽い問い合わせ（モデル情報の取得）を
+1 回行い、最初のリクエストより前に接続を張っておく。
+"""
+
+import asyncio
+import logging
+import threading
+from collections.abc import Callable
+
+from flask import current_app
+from google import genai
+
+from . import config
+from .gemini_limiter import GeminiLimiter
+from .generator import TemplateGenerator, resolve_model_name
+from .usage_ledger import UsageLedger
+
+logger = logging.getLogger(__name__)
+
+# Flask の app.extensions に登録する際のキー
+EXTENSION_KEY = 'generator_registry'
+
+
+class GeneratorRegistry:
+    """モデルごとの TemplateGenerator を共有する。"""
+
+    def __init__(
+        self,
+        settings: config.Settings | None = None,
+        client_factory: Callable[[], genai.Client] | None = None,
+        limiter: GeminiLimiter | None = None,
+        ledger: UsageLedger | None = None,
+    ):
+        """
+        Args:
+            settings: 使用する設定。省略時はプロセス共有の設定を使う
+            client_factory: genai.Client を作る関数。ベンチマークで接続先を差し替えるために使う。
+                            省略時は GEMINI_API_KEY で本番のエンドポイントへつなぐ
+            limiter: Gemini 呼び出しの受け付け。共有の生成器にもリクエスト単位の生成器にも渡す
+                     （どちらの経路の呼び出しも同じ上限で数える）。省略時は制限しない
+            ledger: トークン使用量の台帳。limiter と同じくどちらの生成器にも渡す。省略時は記録しない
+        """
+        self.settings = settings or config.get_settings()
+        self.limiter = limiter
+        self.ledger = ledger
+        self._client_factory = client_factory or self._default_client
+        self._client: genai.Client | None = None
+        self._generators: dict[str, TemplateGenerator] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock = threading.Lock()
+
+    def _default_client(self) -> genai.Client:
+        return genai.Client(api_key=self.settings.gemini_api_key)
+
+    @property
+    def is_started(self) -> bool:
+        return self._loop is not None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop | None:
+        """共有を始めたイベントループ。start() 前と close() 後は None。"""
+        return self._loop
+
+    async def start(self) -> None:
+        """実行中のイベントループで共有を始める。冪等。"""
+        if self.is_started:
+            return
+        self._loop = asyncio.get_running_loop()
+        if self.settings.gemini_warmup:
+            await self.warm_up()
+
+    async def warm_up(self, model_name: str = config.DEFAULT_MODEL) -> None:
+        """Gemini への接続を先に張る。失敗しても起動は止めない。"""
+        if not self.settings.gemini_api_key:
+            logger.warning('GEMINI_API_KEY が未設定のためウォームアップを省略します')
+            return
+        generator = self.get(model_name)
+        try:
+            await generator.client.aio.models.get(model=generator.model_name)
+        except Exception as e:
+            logger.warning(f'Gemini へのウォームアップに失敗しました（起動は続行します）: {e}')
+            return
+        logger.info(f'Gemini への接続をウォームアップしました（モデル: {generator.model_name}）')
+
+    def _on_shared_loop(self) -> bool:
+        if self._loop is None:
+            return False
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def get(self, model_name: str | None = None) -> TemplateGenerator:
+        """モデルに対応する生成器を返す。
+
+        共有できない経路では、従来どおりプロセス共有の設定で生成器を作る
+        （API キーが未設定なら TemplateGenerator が ConfigurationError を送出する）。
+        """
+        if not self._on_shared_loop() or not self.settings.gemini_api_key:
+            return TemplateGenerator(
+                model_name=model_name, limiter=self.limiter, ledger=self.ledger
+            )
+
+        model_name = resolve_model_name(model_name)
+        with self._lock:
+            generator = self._generators.get(model_name)
+            if generator is None:
+                if self._client is None:
+                    self._client = self._client_factory()
+                generator = TemplateGenerator(
+                    model_name,
+                    self.settings,
+                    client=self._client,
+                    limiter=self.limiter,
+                    ledger=self.ledger,
+                )
+                self._generators[model_name] = generator
+            return generator
+
+    async def close(self) -> None:
+        """共有クライアントの接続を閉じる。冪等。"""
+        with self._lock:
+            client, self._client = self._client, None
+            self._generators.clear()
+        self._loop = None
+        if client is not None:
+            await client.aio.aclose()
+            logger.info('Gemini の共有クライアントを閉じました')
+        if self.limiter is not None:
+            logger.info(f'Gemini 呼び出しの受け付けの計測値: {self.limiter.stats()}')
+        if self.ledger is not None:
+            logger.info(f'トークン使用量の台帳の計測値: {self.ledger.stats()}')
+
+
+def get_generator_registry() -> GeneratorRegistry:
+    """現在のアプリに紐づく生成器の置き場を返す。
+
+    サービス層はこれを直接呼ばず、引数で受け取ること。
+    """
+    return current_app.extensions[EXTENSION_KEY]
@@ -0,0 +1,150 @@
+"""検索結果ページの HTML 解析（パーサーの差し替え口）。
+
+1 ページから必要なのは 20 件ほどのタイトル文字列と「次へ」リンクの有無だけなので、
+Python の DOM を丸ごと組み立てる BeautifulSoup + html.parser は重すぎる。
+インストールされていれば C 実装のパーサーを使い、無ければ html.parser に戻る。
+
+- selectolax … lexbor の CSS セレクタエンジン。最速
+- lxml …………… lxml.html + XPath（CSS セレクタと同じ意味の XPath を下に持つ）
+- html.parser … BeautifulSoup + soupsieve（追加の依存なし。従来の実装）
+
+どれも任意依存で、requirements.txt には入れていない。どの実装でも結果が一致することは
+tests/test_html_parsers.py が保存済みの HTML フィクスチャで確認する。
+
+解析関数は I/O もインスタンス状態も持たないトップレベル関数にしてある
+（プロセスプールへ渡すときに pickle できる必要があるため）。
+"""
+
+import functools
+import logging
+from typing import NamedTuple
+
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+# セレクタ定数（HotPepperScraper からも参照される）
+STYLE_TITLE_SELECTOR = "#jsiHoverAlphaLayerScope > li > div.mT5 > a > p > span"
+NEXT_PAGE_SELECTOR = (
+    "#searchList > div:nth-child(2) > div.pT5.pr.cFix > div > ul > li.pa.top0.right0.afterPage > a"
+)
+
+PARSER_AUTO = 'auto'
+PARSER_SELECTOLAX = 'selectolax'
+PARSER_LXML = 'lxml'
+PARSER_HTML = 'html.parser'
+# auto のときに試す順（速い順）
+PARSER_PREFERENCE = (PARSER_SELECTOLAX, PARSER_LXML, PARSER_HTML)
+
+
+def _has_classes(*names: str) -> str:
+    """XPath で「class 属性にこれらのクラスをすべて含む」を表す述語。"""
+    return ' and '.join(
+        f'contains(concat(" ", normalize-space(@class), " "), " {name} ")' for name in names
+    )
+
+
+# 上の CSS セレクタと同じ意味の XPath。lxml に cssselect を要求しないために手で書いている。
+# 片方だけ変えると解析結果が食い違うので、変更時は test_html_parsers のパリティテストを通すこと。
+STYLE_TITLE_XPATH = f'//*[@id="jsiHoverAlphaLayerScope"]/li/div[{_has_classes("mT5")}]/a/p/span'
+NEXT_PAGE_XPATH = (
+    '//*[@id="searchList"]/*[2][self::div]'
+    f'/div[{_has_classes("pT5", "pr", "cFix")}]/div/ul'
+    f'/li[{_has_classes("pa", "top0", "right0", "afterPage")}]/a'
+)
+
+
+class ParsedPage(NamedTuple):
+    """検索結果 1 ページの解析結果。"""
+
+    titles: list[str]
+    has_next: bool
+
+
+def _parse_with_html_parser(html_text: str) -> ParsedPage:
+    soup = BeautifulSoup(html_text, 'html.parser')
+    titles = [item.get_text(strip=True) for item in soup.select(STYLE_TITLE_SELECTOR)]
+    return ParsedPage(titles, soup.select_one(NEXT_PAGE_SELECTOR) is not None)
+
+
+def _parse_with_lxml(html_text: str) -> ParsedPage:
+    import lxml.html
+
+    root = lxml.html.fromstring(html_text)
+    # bs4 の get_text(strip=True) と同じく、テキスト片ごとに strip して連結する
+    titles = [
+        ''.join(part.strip() for part in item.itertext()) for item in root.xpath(STYLE_TITLE_XPATH)
+    ]
+    return ParsedPage(titles, bool(root.xpath(NEXT_PAGE_XPATH)))
+
+
+def _parse_with_selectolax(html_text: str) -> ParsedPage:
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html_text)
+    titles = [item.text(strip=True) for item in tree.css(STYLE_TITLE_SELECTOR)]
+    return ParsedPage(titles, tree.css_first(NEXT_PAGE_SELECTOR) is not None)
+
+
+_PARSERS = {
+    PARSER_SELECTOLAX: _parse_with_selectolax,
+    PARSER_LXML: _parse_with_lxml,
+    PARSER_HTML: _parse_with_html_parser,
+}
+# 実装が依存するモジュール（インストール有無の判定に使う）
+_REQUIRED_MODULES = {
+    PARSER_SELECTOLAX: 'selectolax.lexbor',
+    PARSER_LXML: 'lxml.html',
+    PARSER_HTML: 'bs4',
+}
+
+
+def is_available(backend: str) -> bool:
+    """そのパーサーが使えるか（依存モジュールが import できるか）。"""
+    module = _REQUIRED_MODULES.get(backend)
+    if module is None:
+        return False
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def available_backends() -> list[str]:
+    """使えるパーサーを速い順に返す。html.parser は常に含まれる。"""
+    return [backend for backend in PARSER_PREFERENCE if is_available(backend)]
+
+
+@functools.cache
+def resolve_backend(requested: str) -> str:
+    """設定値（SCRAPER_PARSER）から実際に使うパーサーを決める。
+
+    auto なら使える中で最速のもの。指定されたものが未知・未インストールなら
+    警告を出して html.parser に戻す（スクレイピングそのものは止めない）。
+    結果はキャッシュするので、警告はプロセスあたり 1 回だけ出る。
+    """
+    if requested == PARSER_AUTO:
+        return available_backends()[0]
+    if requested not in _PARSERS:
+        logger.warning(f'未知の SCRAPER_PARSER "{requested}" - {PARSER_HTML} を使用します')
+        return PARSER_HTML
+    if not is_available(requested):
+        logger.warning(
+            f'SCRAPER_PARSER "{requested}" はインストールされていません - {PARSER_HTML} を使用します'
+        )
+        return PARSER_HTML
+    return requested
+
+
+def parse_search_page(html_text: str, backend: str = PARSER_HTML) -> ParsedPage:
+    """検索結果ページからタイトルと次ページの有無を取り出す。
+
+    Args:
+        html_text: ページの HTML
+        backend: resolve_backend() で決めたパーサー名
+    """
+    # lxml は空文字列を「文書なし」として例外にするので、実装に渡す前に揃える
+    if not html_text.strip():
+        return ParsedPage([], False)
+    return _PARSERS[backend](html_text)
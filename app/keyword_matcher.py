@@ -0,0 +1,137 @@
+"""入力文字列に含まれる特集キーワードを、区切り文字の有無に関わらず 1 回の走査で見つける。
+
+以前は入力を区切り文字で分割し、分割した語ごとに完全一致で引いていたため、
+「ダークパープルボブ」のように区切らずに書かれた特集キーワードは検出できなかった。
+KeywordMatcher は全キーワードから Aho-Corasick オートマトンを作り、入力を 1 文字ずつ
+1 回たどるだけで、どの位置に現れるキーワードもすべて見つける（入力長 + 一致数に比例）。
+
+重なり合う一致からは長いものを優先して選ぶ（「くびれヘア」と「ヘア」が重なれば
+「くびれヘア」）。大文字小文字は区別しない。作った後は書き換えないので、
+スレッド間で共有してよい。
+
+1 文字のキーワード（「夏」など）だけは、前後が入力の端か区切り文字
+（config.KEYWORD_SEPARATORS。split_keywords と同じ）のときに限って一致とみなす。
+1 文字は他の語の一部になりやすく（「真夏」「夏色」）、語の途中でも拾うと誤検出になるため。
+2 文字以上は従来どおり区切りの有無を問わない（「ダークパープルボブ」も検出する）。
+"""
+
+from collections.abc import Iterable, Iterator, Mapping
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+from . import config
+
+V = TypeVar('V')
+
+
+@dataclass(frozen=True)
+class KeywordMatch(Generic[V]):
+    """入力中の一致 1 件。start / end は入力文字列の位置（text[start:end] が一致部分）。"""
+
+    start: int
+    end: int
+    value: V
+
+
+class KeywordMatcher(Generic[V]):
+    """キーワード -> 値 の対応から作る、複数キーワードの同時検索。"""
+
+    def __init__(
+        self, keywords: Mapping[str, V], separators: Iterable[str] = config.KEYWORD_SEPARATORS
+    ):
+        """
+        Args:
+            keywords: 小文字化済みのキーワードと、一致したときに返す値
+            separators: 1 文字のキーワードの前後に要る区切り文字（1 文字ずつ）
+        """
+        self._separators = frozenset(separators)
+        # ノード 0 が根。_goto[node][文字] = 次のノード
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        # そのノードで終わるキーワード（失敗リンクの先で終わるものも含む）の (長さ, 値)
+        self._outputs: list[tuple[tuple[int, V], ...]] = [()]
+        self._size = 0
+
+        for keyword, value in keywords.items():
+            if not keyword:
+                continue
+            node = 0
+            for char in keyword:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append(())
+                node = next_node
+            self._outputs[node] = ((len(keyword), value),)
+            self._size += 1
+
+        self._link_failures()
+
+    def _link_failures(self) -> None:
+        # 幅優先で、各ノードに「一致が途切れたときに移る、最長の接尾辞のノード」を張る
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                # 接尾辞側で終わるキーワードもここで終わる
+                self._outputs[child] += self._outputs[self._fail[child]]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _scan(self, text: str) -> Iterator[tuple[int, int, V]]:
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # まれに lower() で長さが変わる文字がある。そのときは 1 文字ずつ小文字化して
+            # 入力との位置を合わせる（その文字自体は一致しなくなるだけ）
+            lowered = [char.lower() for char in text]
+        node = 0
+        for index, char in enumerate(lowered):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, value in outputs[node]:
+                yield index + 1 - length, index + 1, value
+
+    def iter_matches(self, text: str) -> Iterator[KeywordMatch[V]]:
+        """重なりも含め、text に現れるすべての一致を終端位置の順に返す。"""
+        for start, end, value in self._scan(text):
+            yield KeywordMatch(start, end, value)
+
+    def _is_delimited(self, text: str, start: int, end: int) -> bool:
+        """text[start:end] の前後が入力の端か区切り文字か。"""
+        return (start == 0 or text[start - 1] in self._separators) and (
+            end == len(text) or text[end] in self._separators
+        )
+
+    def find(self, text: str) -> list[KeywordMatch[V]]:
+        """重ならない一致を、長いものを優先して選び、入力中の出現順に返す。
+
+        語の途中にある 1 文字のキーワードの一致は候補にしない。
+        """
+        if not self._size or not text:
+            return []
+        candidates = [
+            (start, end, value)
+            for start, end, value in self._scan(text)
+            if end - start > 1 or self._is_delimited(text, start, end)
+        ]
+        if len(candidates) > 1:
+            candidates.sort(key=lambda m: (m[0] - m[1], m[0]))
+            taken = [False] * len(text)
+            selected = []
+            for start, end, value in candidates:
+                if any(taken[start:end]):
+                    continue
+                taken[start:end] = [True] * (end - start)
+                selected.append((start, end, value))
+            candidates = sorted(selected, key=lambda m: m[0])
+        return [KeywordMatch(start, end, value) for start, end, value in candidates]
@@ -0,0 +1,83 @@
+"""ASGI の lifespan イベントで、ワーカー存続期間のリソースを開始・終了する。
+
+asgiref の WsgiToAsgi は http スコープしか扱わず、lifespan スコープを受けると
+例外を送出する（uvicorn は「lifespan 非対応」とみなして黙って先へ進む）。
+そのため asgi.py では WsgiToAsgi をこのミドルウェアで包み、lifespan だけをここで処理する。
+
+startup はサーバーのイベントループ上で実行される。WsgiToAsgi 経由の async ビューも
+同じループで動くので、ここで作った aiohttp セッションや Gemini クライアントを
+リクエストから共有できる。
+"""
+
+import asyncio
+import logging
+
+from flask import Flask
+
+from .featured_keywords import EXTENSION_KEY as FEATURED_KEYWORDS_KEY
+from .generator_registry import EXTENSION_KEY as GENERATOR_REGISTRY_KEY
+from .metrics_exporter import EXTENSION_KEY as METRICS_EXPORTER_KEY
+from .scraper_pool import EXTENSION_KEY as SCRAPER_POOL_KEY
+from .shared_cache import EXTENSION_KEY as SHARED_CACHE_KEY
+from .usage_ledger import EXTENSION_KEY as USAGE_LEDGER_KEY
+from .warmer import EXTENSION_KEY as CACHE_WARMER_KEY
+
+logger = logging.getLogger(__name__)
+
+
+async def startup(app: Flask) -> None:
+    """ワーカー起動時に共有リソースを開始する。"""
+    await app.extensions[SCRAPER_POOL_KEY].start()
+    await app.extensions[GENERATOR_REGISTRY_KEY].start()
+    await app.extensions[FEATURED_KEYWORDS_KEY].start()
+    # 事前生成はスクレイパーと生成器の共有を始めてから
+    await app.extensions[CACHE_WARMER_KEY].start()
+    await app.extensions[METRICS_EXPORTER_KEY].start()
+
+
+async def shutdown(app: Flask) -> None:
+    """ワーカー終了時に共有リソースを閉じる。"""
+    await app.extensions[CACHE_WARMER_KEY].close()
+    await app.extensions[FEATURED_KEYWORDS_KEY].close()
+    await app.extensions[SCRAPER_POOL_KEY].close()
+    await app.extensions[GENERATOR_REGISTRY_KEY].close()
+    # 生成器を閉じた後なので、もう記録は増えない。書き残しをスレッドで書き終える
+    await asyncio.to_thread(app.extensions[USAGE_LEDGER_KEY].close)
+    shared_cache = app.extensions.get(SHARED_CACHE_KEY)
+    if shared_cache is not None:
+        shared_cache.close()
+    # 終了したワーカーの計測値は archive へ移し、ほかのワーカーの /metrics に残す
+    await app.extensions[METRICS_EXPORTER_KEY].close()
+
+
+class LifespanMiddleware:
+    """lifespan スコープを処理し、それ以外は包んだ ASGI アプリへ渡す。"""
+
+    def __init__(self, asgi_app, flask_app: Flask):
+        self.asgi_app = asgi_app
+        self.flask_app = flask_app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'lifespan':
+            await self.asgi_app(scope, receive, send)
+            return
+
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await startup(self.flask_app)
+                except Exception as e:
+                    logger.error(f'起動時の初期化に失敗しました: {e}', exc_info=True)
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                try:
+                    await shutdown(self.flask_app)
+                except Exception as e:
+                    logger.error(f'終了処理に失敗しました: {e}', exc_info=True)
+                    await send({'type': 'lifespan.shutdown.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -1,15 +1,37 @@
 import logging
+from collections.abc import Callable
 from dataclasses import dataclass
 
-from flask import Blueprint, jsonify, render_template, request
+from flask import Blueprint, Response, current_app, jsonify, render_template, request
 from flask.typing import ResponseReturnValue
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.exceptions import NotFound
 
-from .config import CHAR_LIMITS, DEFAULT_MODEL, GENDERS, SEASON_COLOR_CHOICES, SEASON_UI_LABELS
+from .config import (
+    CHAR_LIMITS,
+    FEATURED_KEYWORDS_MAX_AGE_SECONDS,
+    GENDERS,
+    MAX_TEMPLATES,
+    SEASON_COLOR_CHOICES,
+    SEASON_UI_LABELS,
+)
+from .deadline import Deadline
 from .errors import InvalidJsonError, ValidationError
 from .featured_keywords import get_featured_repository
+from .generator import resolve_model_name
+from .generator_registry import get_generator_registry
+from .metrics_exporter import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from .metrics_exporter import get_metrics_exporter
+from .outcome_cache import get_outcome_cache
+from .scraper_pool import get_scraper_pool
 from .seasons import normalize_seasons
-from .services.featured_service import list_featured_keywords
+from .services.featured_service import FeaturedKeywordsPayload, get_featured_keywords_payload
 from .services.template_service import GenerationOutcome, generate_templates_for_request
+from .single_flight import get_single_flight
+from .streaming import MIMETYPE as EVENT_STREAM_MIMETYPE
+from .streaming import RESPONSE_HEADERS as EVENT_STREAM_HEADERS
+from .streaming import EventChannel, error_event_data
+from .timing import timing
 
 # app/__init__.py が root ロガーにハンドラを付けているので、
 # current_app.logger を使わなくても出力先は同じになる。
@@ -30,7 +52,10 @@ class GenerateRequest:
     keyword: str
     gender: str
     seasons: list[str]
+    # サポート外・未指定は既定のモデルに解決済み（resolve_model_name）
     model: str
+    # True なら生成結果のキャッシュを読まずに生成し直す
+    regenerate: bool = False
 
 
 def parse_generate_request(data: object) -> GenerateRequest:
@@ -61,16 +86,40 @@ def parse_generate_request(data: object) -> GenerateRequest:
     if not isinstance(seasons, list):
         raise ValidationError('季節・カラーの指定形式が正しくありません。配列で指定してください。')
 
+    # 文字列の "false" などを真と取り違えないよう、真偽値だけを受け付ける
+    regenerate = data.get('regenerate', False)
+    if not isinstance(regenerate, bool):
+        raise ValidationError('regenerate は true または false で指定してください。')
+
+    # 未指定（キーなし・null）は既定のモデル。文字列以外（配列など）は弾く。
+    # サポート外の名前はここで既定のモデルに置き換え、single_flight や生成結果の
+    # キャッシュのキーが実際に使うモデル名だけで決まるようにする
+    model = data.get('model')
+    if model is not None and not isinstance(model, str):
+        raise ValidationError('model は文字列で指定してください。')
+
     return GenerateRequest(
         keyword=keyword,
         gender=gender,
         # 未知の値と重複を除き、config の定義順に揃える。
         # メンズでは季節カラー／ブリーチなしカラーを扱わないため常に空になる。
         seasons=normalize_seasons(seasons, gender),
-        model=data.get('model', DEFAULT_MODEL),
+        model=resolve_model_name(model),
+        regenerate=regenerate,
     )
 
 
+def prefers_event_stream(accept: MIMEAccept) -> bool:
+    """Accept ヘッダが JSON より SSE（text/event-stream）での応答を求めているか。"""
+    best = accept.best_match(['application/json', EVENT_STREAM_MIMETYPE])
+    return best == EVENT_STREAM_MIMETYPE
+
+
+def wants_event_stream() -> bool:
+    """クライアントが SSE（Accept: text/event-stream）での応答を求めているか。"""
+    return prefers_event_stream(request.accept_mimetypes)
+
+
 def _featured_keyword_info(outcome: GenerationOutcome) -> dict | None:
     """フロントエンドが表示に使う特集キーワード情報。"""
     if not outcome.is_featured or not outcome.featured_info:
@@ -93,58 +142,185 @@ def index() -> str:
         'index.html',
         char_limits=CHAR_LIMITS,
         season_labels=SEASON_UI_LABELS,
+        # ストリーミング生成の進捗（届いた件数 / この件数）に使う
+        max_templates=MAX_TEMPLATES,
     )
 
 
-@main_bp.route('/api/featured-keywords', methods=['GET'])
-def get_featured_keywords() -> ResponseReturnValue:
-    """特集キーワード一覧を取得するAPIエンドポイント（性別フィルタ対応）"""
-    gender = request.args.get('gender', 'ladies')
+@main_bp.route('/metrics')
+def metrics() -> ResponseReturnValue:
+    """全ワーカーの計測値（Prometheus のテキスト形式。app/metrics_exporter.py）
+
+    METRICS=false なら 404 を返す。
+    """
+    exporter = get_metrics_exporter()
+    if not exporter.enabled:
+        raise NotFound()
+    return Response(exporter.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+def featured_keywords_payload(gender: str) -> FeaturedKeywordsPayload:
+    """gender を検証し、その性別の特集キーワード一覧の応答本文を返す。
+
+    Flask のビューと、ネイティブ ASGI の経路（app/asgi_native.py）で共有する。
+
+    Raises:
+        ValidationError: gender が ladies / mens 以外
+    """
     if gender not in GENDERS:
         raise ValidationError('無効な性別が指定されました。ladies または mens を指定してください。')
 
     logger.info(f'特集キーワード取得リクエストを受信しました (性別: {gender})')
 
-    view = list_featured_keywords(get_featured_repository(), gender)
+    return get_featured_keywords_payload(get_featured_repository(), gender)
 
-    return jsonify(
-        {
-            'success': True,
-            'keywords': view.keywords,
-            # 降格時のみ文言が入る。フロントエンドは常にこのキーを読む。
-            'message': view.message,
-        }
-    )
 
+@main_bp.route('/api/featured-keywords', methods=['GET'])
+def get_featured_keywords() -> ResponseReturnValue:
+    """特集キーワード一覧を取得するAPIエンドポイント（性別フィルタ対応）
+
+    本文はリポジトリが読み込み時に作ったバイト列をそのまま返す。
+    If-None-Match が ETag と一致すれば本文なしの 304 を返す。
+    """
+    payload = featured_keywords_payload(request.args.get('gender', 'ladies'))
+
+    response = Response(payload.body, mimetype='application/json')
+    response.set_etag(payload.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = FEATURED_KEYWORDS_MAX_AGE_SECONDS
+    return response.make_conditional(request)
+
+
+def _outcome_metadata(outcome: GenerationOutcome) -> dict:
+    """テンプレート以外の、リクエスト単位の結果。JSON 応答と SSE の done イベントで共有する。"""
+    return {
+        'is_featured': outcome.is_featured,
+        'featured_keyword_info': _featured_keyword_info(outcome),
+        # どのタイトルにも含まれなかった季節・カラーの付加語文言（「春カラー」など）。
+        # フロントエンドは常にこのキーを読み、空なら注釈バナーを隠す。
+        'unapplied_season_keywords': [
+            SEASON_COLOR_CHOICES[key] for key in outcome.unapplied_seasons
+        ],
+        # 生成結果のキャッシュから返したか（hit）と、その結果が生成されてからの秒数
+        'cache': {
+            'hit': outcome.cache_age is not None,
+            'age_seconds': round(outcome.cache_age, 1) if outcome.cache_age is not None else None,
+        },
+    }
 
-@main_bp.route('/api/generate', methods=['POST'])
-async def generate() -> ResponseReturnValue:
-    """テンプレート生成のAPIエンドポイント"""
-    req = parse_generate_request(request.get_json(silent=True))
 
+def generation_dependencies() -> dict:
+    """generate_templates_for_request に渡す、現在のアプリに紐づく共有リソース。
+
+    Flask のビューと、ネイティブ ASGI の経路（app/asgi_native.py）で共有する。
+    """
+    return {
+        'repository': get_featured_repository(),
+        'scraper_pool': get_scraper_pool(),
+        'single_flight': get_single_flight(),
+        'generators': get_generator_registry(),
+        'outcome_cache': get_outcome_cache(),
+    }
+
+
+def log_generate_request(req: GenerateRequest) -> None:
+    """受け付けた生成リクエストの内容をログに残す。"""
     logger.info(
         f'テンプレート生成リクエスト - キーワード: "{req.keyword}", 性別: "{req.gender}", '
-        f'季節・カラー選択: {req.seasons}, モデル: "{req.model}"'
+        f'季節・カラー選択: {req.seasons}, モデル: "{req.model}", 再生成: {req.regenerate}'
     )
 
+
+async def generate_response_body(
+    req: GenerateRequest, dependencies: dict, deadline: Deadline | None = None
+) -> dict:
+    """全件そろってから返す JSON 応答の本文。"""
     outcome = await generate_templates_for_request(
         req.keyword,
         req.gender,
-        repository=get_featured_repository(),
         seasons=req.seasons,
         model=req.model,
+        regenerate=req.regenerate,
+        deadline=deadline,
+        **dependencies,
     )
+    return {'success': True, 'templates': outcome.templates, **_outcome_metadata(outcome)}
 
-    return jsonify(
-        {
-            'success': True,
-            'templates': outcome.templates,
-            'is_featured': outcome.is_featured,
-            'featured_keyword_info': _featured_keyword_info(outcome),
-            # どのタイトルにも含まれなかった季節・カラーの付加語文言（「春カラー」など）。
-            # フロントエンドは常にこのキーを読み、空なら注釈バナーを隠す。
-            'unapplied_season_keywords': [
-                SEASON_COLOR_CHOICES[key] for key in outcome.unapplied_seasons
-            ],
-        }
-    )
+
+async def produce_generation_events(
+    req: GenerateRequest,
+    dependencies: dict,
+    emit: Callable[[str, object], None],
+    deadline: Deadline | None = None,
+) -> None:
+    """テンプレートを 1 件ずつ SSE のイベントとして emit(event, data) に渡す。
+
+    イベント:
+        stage:    処理段階への到達（app/stages.py。段階名・開始からの経過ミリ秒・時刻など）
+        template: 確定したテンプレート 1 件（JSON 応答の templates の要素と同じ形）
+        done:     success / count と、JSON 応答のテンプレート以外のキー
+        error:    JSON のエラー応答と同じ形（{'success': False, 'error': {...}, 'status': N}）
+
+    ストリーミングでは同じ内容のリクエストへの相乗り（single_flight）は使われない。
+    """
+    try:
+        outcome = await generate_templates_for_request(
+            req.keyword,
+            req.gender,
+            seasons=req.seasons,
+            model=req.model,
+            on_template=lambda template: emit('template', template),
+            on_stage=lambda stage: emit('stage', stage),
+            regenerate=req.regenerate,
+            deadline=deadline,
+            **dependencies,
+        )
+    except Exception as e:
+        emit('error', error_event_data(e))
+        return
+    emit('done', {'success': True, 'count': len(outcome.templates), **_outcome_metadata(outcome)})
+
+
+def _stream_generation(req: GenerateRequest, deadline: Deadline | None) -> Response:
+    """テンプレートを 1 件ずつ SSE で返す（イベントは produce_generation_events）。
+
+    入力の検証エラーはストリームを始める前に送出するので、通常の JSON エラーになる。
+    """
+    dependencies = generation_dependencies()
+    # ヘッダは先に送るので、処理時間の内訳はログにだけ残す
+    timed = current_app.config['SERVER_TIMING']
+
+    async def produce(channel: EventChannel) -> None:
+        with timing(timed):
+            await produce_generation_events(req, dependencies, channel.emit, deadline)
+
+    channel = EventChannel()
+    # lifespan で共有を始めたループがあればそこで動かし、共有の接続を使う
+    channel.start(produce, dependencies['generators'].loop)
+    return Response(iter(channel), mimetype=EVENT_STREAM_MIMETYPE, headers=EVENT_STREAM_HEADERS)
+
+
+@main_bp.route('/api/generate', methods=['POST'])
+async def generate() -> ResponseReturnValue:
+    """テンプレート生成のAPIエンドポイント
+
+    Accept: text/event-stream で呼ばれたら、テンプレートを 1 件ずつ SSE で返す
+    （_stream_generation）。それ以外は全件そろってから JSON で返す。
+    本番の ASGI ワーカーでは app/asgi_native.py が同じ処理を直接受け持つ。
+
+    締め切り（REQUEST_DEADLINE 秒、app/deadline.py）は受け付けた時点から数える。
+    JSON 応答には処理時間の内訳（app/timing.py）を Server-Timing ヘッダで付ける。
+    """
+    deadline = Deadline.after(current_app.config['REQUEST_DEADLINE'])
+    req = parse_generate_request(request.get_json(silent=True))
+    log_generate_request(req)
+
+    if wants_event_stream():
+        return _stream_generation(req, deadline)
+
+    with timing(current_app.config['SERVER_TIMING']) as timings:
+        body = await generate_response_body(req, generation_dependencies(), deadline)
+    response = jsonify(body)
+    if timings is not None:
+        response.headers['Server-Timing'] = timings.header()
+    return response
@@ -0,0 +1,235 @@
+"""/metrics で公開する計測値（カウンタとヒストグラム）の定義と記録。
+
+以前は app.log のほかに運用の手がかりが無く、各部品の stats() も終了時のログにしか出なかった。
+ここではプロセス内で値を数えるだけにし、Prometheus のテキスト形式への書き出しと
+gunicorn の複数ワーカーの合算は app/metrics_exporter.py が受け持つ。
+
+記録する側は、このモジュールのメトリクスに直接加える（Flask にもリクエストにも依存しない）。
+
+- HTTP_REQUEST_SECONDS: ルートごとの応答時間（応答を送り終えるまで。SSE はストリームの終わりまで）。
+  ASGI の経路（asgi.py）で測るので、開発サーバー（run.py）では記録されない
+- SCRAPE_PAGE_SECONDS: スクレイピングの 1 ページ分（取得と解析）
+- GEMINI_REQUEST_SECONDS: Gemini の 1 回の呼び出し（SDK の再試行を含む）
+- GEMINI_RETRIES: SDK の再試行の回数（google-genai のログを数える。count_gemini_retries）
+- GEMINI_TOKENS: usage_metadata のトークン数
+- TEMPLATE_REJECTIONS: テンプレートの検証で落とした件数（理由ごと）
+"""
+
+import logging
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# 名前の先頭に付ける（他のアプリの計測値と混ざらないように）
+NAMESPACE = 'title_generator'
+
+# ルートのラベル。これ以外のパスはまとめる（ラベルの種類が URL の数だけ増えないように）
+ROUTE_LABELS = frozenset({'/', '/api/generate', '/api/featured-keywords', '/metrics'})
+STATIC_ROUTE_LABEL = '/static'
+OTHER_ROUTE_LABEL = 'other'
+
+
+class Counter:
+    """ラベルの組ごとに増えるだけの値。"""
+
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = f'{NAMESPACE}_{name}'
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = _label_values(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(_label_values(self.labelnames, labels), 0)
+
+    def samples(self) -> list:
+        """[[ラベルの値, 値], ...]（JSON にそのまま書ける形）。"""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    @staticmethod
+    def merge(into: dict, samples: list) -> None:
+        for key, value in samples:
+            into[tuple(key)] = into.get(tuple(key), 0) + value
+
+
+class Histogram:
+    """ラベルの組ごとの、観測値の分布（区間ごとの件数と合計）。"""
+
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = config.METRICS_LATENCY_BUCKETS,
+    ):
+        self.name = f'{NAMESPACE}_{name}'
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # ラベルの値 → [各区間の件数（最後は +Inf）, 合計]
+        self._values: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_values(self.labelnames, labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """ブロックにかかった秒数を観測する。labelnames に outcome があれば ok / error を入れる。"""
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            yield
+            outcome = 'ok'
+        finally:
+            if 'outcome' in self.labelnames:
+                labels = {**labels, 'outcome': outcome}
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            entry = self._values.get(_label_values(self.labelnames, labels))
+            return sum(entry[0]) if entry else 0
+
+    def samples(self) -> list:
+        """[[ラベルの値, 各区間の件数, 合計], ...]（JSON にそのまま書ける形）。"""
+        with self._lock:
+            return [
+                [list(key), list(counts), total] for key, (counts, total) in self._values.items()
+            ]
+
+    @staticmethod
+    def merge(into: dict, samples: list) -> None:
+        for key, counts, total in samples:
+            entry = into.get(tuple(key))
+            if entry is None:
+                into[tuple(key)] = [list(counts), total]
+            else:
+                entry[0] = [a + b for a, b in zip(entry[0], counts, strict=True)]
+                entry[1] += total
+
+
+def _label_values(labelnames: tuple[str, ...], labels: dict[str, str]) -> tuple[str, ...]:
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def route_label(path: str) -> str:
+    """HTTP_REQUEST_SECONDS の route ラベル。"""
+    if path in ROUTE_LABELS:
+        return path
+    if path.startswith('/static/'):
+        return STATIC_ROUTE_LABEL
+    return OTHER_ROUTE_LABEL
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'HTTP リクエストの応答を送り終えるまでの秒数',
+    ('route', 'method', 'status'),
+    config.METRICS_HTTP_BUCKETS,
+)
+SCRAPE_PAGE_SECONDS = Histogram(
+    'scrape_page_duration_seconds',
+    'スクレイピング 1 ページ分（取得と解析）の秒数',
+    ('outcome',),
+)
+GEMINI_REQUEST_SECONDS = Histogram(
+    'gemini_request_duration_seconds',
+    'Gemini の 1 回の呼び出し（SDK の再試行を含む）の秒数',
+    ('model', 'mode', 'outcome'),
+    config.METRICS_HTTP_BUCKETS,
+)
+GEMINI_RETRIES = Counter('gemini_retries_total', 'Gemini SDK が再試行した回数')
+GEMINI_TOKENS = Counter(
+    'gemini_tokens_total', 'Gemini の usage_metadata のトークン数', ('model', 'kind')
+)
+TEMPLATE_REJECTIONS = Counter(
+    'template_rejections_total', '検証で落としたテンプレートの件数', ('reason',)
+)
+
+# /metrics に書き出す順
+METRICS: tuple[Counter | Histogram, ...] = (
+    HTTP_REQUEST_SECONDS,
+    SCRAPE_PAGE_SECONDS,
+    GEMINI_REQUEST_SECONDS,
+    GEMINI_RETRIES,
+    GEMINI_TOKENS,
+    TEMPLATE_REJECTIONS,
+)
+
+
+def record_usage(usage, model: str) -> None:
+    """usage_metadata のトークン数を GEMINI_TOKENS に加える（無ければ何もしない）。"""
+    if usage is None:
+        return
+    for kind in ('prompt', 'candidates', 'thoughts', 'total'):
+        tokens = getattr(usage, f'{kind}_token_count', None)
+        if isinstance(tokens, int) and tokens > 0:
+            GEMINI_TOKENS.inc(tokens, model=model, kind=kind)
+
+
+class _RetryCounter(logging.Filter):
+    """google-genai の再試行のログ（tenacity の before_sleep）を数える。
+
+    数えるために SDK のロガーのレベルを INFO に下げるので、下げなければ出なかったログは
+    数えたあとここで止め、ハンドラへ渡さない（ログの量は変えない）。
+    """
+
+    def __init__(self, sdk_logger: logging.Logger) -> None:
+        super().__init__()
+        self._logger = sdk_logger
+        # 下げる前にロガー自身に設定されていたレベル（NOTSET なら親のレベルに従う）
+        self._level = sdk_logger.level
+
+    def _threshold(self) -> int:
+        if self._level != logging.NOTSET or self._logger.parent is None:
+            return self._level
+        # 親のレベルは後から変わる（setup_logging など）ので、その都度読む
+        return self._logger.parent.getEffectiveLevel()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.msg, str) and record.msg.startswith('Retrying '):
+            GEMINI_RETRIES.inc()
+        return record.levelno >= self._threshold()
+
+
+def count_gemini_retries() -> None:
+    """GEMINI_RETRIES を数え始める。冪等。
+
+    SDK は再試行のたびに google_genai._api_client のロガーへ INFO で書くだけで、
+    ほかに知る手段が無い。ロガーのフィルタはロガーのレベルを通ったログしか見ないので、
+    ログのレベルが既定の WARNING でも数えられるよう、そのロガーだけを INFO にする。
+    """
+    sdk_logger = logging.getLogger(config.GEMINI_SDK_LOGGER)
+    if any(isinstance(f, _RetryCounter) for f in sdk_logger.filters):
+        return
+    sdk_logger.addFilter(_RetryCounter(sdk_logger))
+    if sdk_logger.level == logging.NOTSET or sdk_logger.level > logging.INFO:
+        sdk_logger.setLevel(logging.INFO)
@@ -0,0 +1,386 @@
+"""/metrics の応答（Prometheus のテキスト形式）と、ワーカー間の計測値の合算。
+
+gunicorn の各ワーカーは自分の計測値（app/metrics.py のカウンタとヒストグラム、各部品の stats()）
+しか持たず、/metrics はどちらのワーカーが受けるか分からない。そこで各ワーカーは
+METRICS_FLUSH_INTERVAL 秒ごとに自分の値を CACHE_DIR/metrics/<pid>.json へ書き出し、
+/metrics を受けたワーカーは自分の最新の値とほかのワーカーのファイルを合わせて返す。
+
+- カウンタとヒストグラムはワーカー全体で合計する
+- stats() と特集キーワードの健全性は合計すると意味が変わる（平均や状態）ので、
+  pid ラベルを付けてワーカーごとに出す（生きているワーカーの分だけ）
+- 終了したワーカーのカウンタとヒストグラムは archive.json へ足し込んでからファイルを消す。
+  再起動（max_requests）のたびに合計が減って見えることはない
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from flask import Flask, current_app
+
+from . import config
+from .featured_keywords import EXTENSION_KEY as FEATURED_KEYWORDS_KEY
+from .gemini_limiter import EXTENSION_KEY as GEMINI_LIMITER_KEY
+from .metrics import HTTP_REQUEST_SECONDS, METRICS, NAMESPACE, Counter, Histogram, route_label
+from .outcome_cache import EXTENSION_KEY as OUTCOME_CACHE_KEY
+from .scraper_pool import EXTENSION_KEY as SCRAPER_POOL_KEY
+from .shared_cache import EXTENSION_KEY as SHARED_CACHE_KEY
+from .single_flight import EXTENSION_KEY as SINGLE_FLIGHT_KEY
+from .usage_ledger import EXTENSION_KEY as USAGE_LEDGER_KEY
+from .warmer import EXTENSION_KEY as CACHE_WARMER_KEY
+
+logger = logging.getLogger(__name__)
+
+# Flask の app.extensions に登録する際のキー
+EXTENSION_KEY = 'metrics_exporter'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+ARCHIVE_FILENAME = 'archive.json'
+ARCHIVE_LOCK_FILENAME = 'archive.lock'
+
+
+class MetricsExporter:
+    """このワーカーの計測値の書き出しと、全ワーカー分の /metrics の組み立て。"""
+
+    def __init__(
+        self,
+        directory: Path | None,
+        gauges: Callable[[], dict[str, float]] = dict,
+        flush_interval: float = 0,
+        enabled: bool = True,
+        pid: int | None = None,
+    ):
+        """
+        Args:
+            directory: ワーカーごとのファイルを置くディレクトリ。None ならこのワーカーの値だけを返す
+            gauges: ワーカーごとに出す値（{名前: 値}）を集める関数
+            flush_interval: start() 後に自分の値を書き出す間隔（秒）。0 以下なら /metrics を
+                            受けたときと close() のときだけ書き出す
+            enabled: False なら /metrics は 404 を返し、何も書き出さない
+            pid: 自分のプロセス ID。テストから差し替える
+        """
+        self.directory = directory
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self._gauges = gauges
+        self.pid = os.getpid() if pid is None else pid
+        self._flusher: asyncio.Task | None = None
+
+    @classmethod
+    def for_app(cls, app: Flask, settings: config.Settings) -> 'MetricsExporter':
+        return cls(
+            settings.cache_dir / config.METRICS_DIRNAME,
+            lambda: component_gauges(app),
+            settings.metrics_flush_interval,
+            settings.metrics_enabled,
+        )
+
+    # --- このワーカーの値 ---
+
+    def snapshot(self) -> dict:
+        """このワーカーの値（JSON にそのまま書ける形）。"""
+        try:
+            gauges = self._gauges()
+        except Exception as e:
+            # 部品の stats() が失敗しても、カウンタとヒストグラムは返す
+            logger.warning(f'計測値の収集に失敗しました: {e}')
+            gauges = {}
+        return {
+            'pid': self.pid,
+            'metrics': {metric.name: metric.samples() for metric in METRICS},
+            'gauges': gauges,
+        }
+
+    def flush(self) -> dict:
+        """このワーカーの値をファイルへ書き出し、その値を返す。"""
+        snapshot = self.snapshot()
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            _write_json(self.directory / f'{self.pid}.json', snapshot)
+        return snapshot
+
+    async def start(self) -> None:
+        """定期的な書き出しを始める。冪等。"""
+        if not self.enabled or self.directory is None or self.flush_interval <= 0:
+            return
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                # 書き出しが止まるとほかのワーカーから見えなくなるので、受け止めて続ける
+                logger.warning(f'計測値の書き出しに失敗しました: {e}')
+            await asyncio.sleep(self.flush_interval)
+
+    async def close(self) -> None:
+        """定期的な書き出しを止め、このワーカーの値を archive へ移す。冪等。"""
+        flusher, self._flusher = self._flusher, None
+        if flusher is not None:
+            flusher.cancel()
+            try:
+                await flusher
+            except asyncio.CancelledError:
+                pass
+        if self.enabled and self.directory is not None:
+            try:
+                await asyncio.to_thread(self.retire)
+            except Exception as e:
+                logger.warning(f'計測値の退避に失敗しました: {e}')
+
+    def retire(self) -> None:
+        """このワーカーのカウンタとヒストグラムを archive へ足し込み、ファイルを消す。
+
+        終了時にだけ呼ぶこと（以降の /metrics では同じ値が二重に数えられる）。
+        """
+        self.flush()
+        with self._archive_lock():
+            self._fold(self.directory / f'{self.pid}.json')
+
+    # --- 全ワーカーの値 ---
+
+    def render(self) -> str:
+        """全ワーカー分の値を Prometheus のテキスト形式で返す。"""
+        workers = [self.flush()]
+        archive: dict = {}
+        if self.directory is not None:
+            others, dead = self._read_workers()
+            workers.extend(others)
+            with self._archive_lock():
+                for path in dead:
+                    self._fold(path)
+                archive = _read_json(self.directory / ARCHIVE_FILENAME) or {}
+        return _render([*workers, archive])
+
+    def _read_workers(self) -> tuple[list[dict], list[Path]]:
+        """ほかの生きているワーカーの値と、終了したワーカーのファイル。"""
+        others, dead = [], []
+        for path in self.directory.glob('*.json'):
+            if not path.stem.isdigit() or int(path.stem) == self.pid:
+                continue
+            if not _pid_alive(int(path.stem)):
+                dead.append(path)
+                continue
+            data = _read_json(path)
+            if data is not None:
+                others.append(data)
+        return others, dead
+
+    @contextmanager
+    def _archive_lock(self) -> Iterator[None]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / ARCHIVE_LOCK_FILENAME, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _fold(self, path: Path) -> None:
+        """path のワーカーの値を archive へ足し込み、path を消す（_archive_lock の中で呼ぶ）。"""
+        data = _read_json(path)
+        if data is None:
+            # ほかのワーカーが先に足し込んだ
+            return
+        archive_path = self.directory / ARCHIVE_FILENAME
+        merged = _merge([_read_json(archive_path) or {}, data])
+        _write_json(
+            archive_path,
+            {'metrics': {name: _samples(metric, merged[name]) for name, metric in _by_name()}},
+        )
+        path.unlink(missing_ok=True)
+        logger.info(f'終了したワーカー（pid {data.get("pid")}）の計測値を archive へ移しました')
+
+
+def component_gauges(app: Flask) -> dict[str, float]:
+    """各部品の stats() と特集キーワードの健全性を {メトリクス名: 値} にする。"""
+    scraper_pool = app.extensions[SCRAPER_POOL_KEY]
+    shared_cache = app.extensions.get(SHARED_CACHE_KEY)
+    components = {
+        'gemini_limiter': app.extensions[GEMINI_LIMITER_KEY].stats(),
+        'single_flight': app.extensions[SINGLE_FLIGHT_KEY].stats(),
+        'outcome_cache': app.extensions[OUTCOME_CACHE_KEY].stats(),
+        'title_cache': scraper_pool.title_cache.stats(),
+        'parse_executor': scraper_pool.parse_executor.stats(),
+        'cache_warmer': app.extensions[CACHE_WARMER_KEY].stats(),
+        'usage_ledger': app.extensions[USAGE_LEDGER_KEY].stats(),
+        'featured_keywords': app.extensions[FEATURED_KEYWORDS_KEY].get_health_status(),
+    }
+    if shared_cache is not None:
+        components['shared_cache'] = shared_cache.stats()
+    gauges: dict[str, float] = {}
+    for component, stats in components.items():
+        _flatten(f'{NAMESPACE}_{component}', stats, gauges)
+    return gauges
+
+
+def _flatten(prefix: str, values: dict, into: dict[str, float]) -> None:
+    """数値（と真偽値）だけを取り出す。文字列や None は Prometheus の値にならないので捨てる。"""
+    for key, value in values.items():
+        name = f'{prefix}_{_sanitize(str(key))}'
+        if isinstance(value, dict):
+            _flatten(name, value, into)
+        elif isinstance(value, bool):
+            into[name] = int(value)
+        elif isinstance(value, int | float):
+            into[name] = value
+
+
+def _sanitize(name: str) -> str:
+    return ''.join(c if c.isascii() and (c.isalnum() or c == '_') else '_' for c in name)
+
+
+class RequestMetricsMiddleware:
+    """HTTP リクエストの応答時間を HTTP_REQUEST_SECONDS に記録する ASGI ミドルウェア。
+
+    NativeRoutes と WsgiToAsgi 経由の Flask の両方を外から包み、包んだアプリが応答を
+    送り終えて戻るまでを測る（SSE はストリームの終わりまで）。Flask の after_request や
+    WSGI の close() は使えない（前者は本文を送る前に呼ばれ、後者は WsgiToAsgi が呼ばない）。
+    """
+
+    def __init__(self, asgi_app: Callable):
+        self.asgi_app = asgi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.asgi_app(scope, receive, send)
+            return
+
+        # 応答を始める前に落ちたら、サーバーが 500 を返す
+        status = 500
+
+        async def send_tracked(message: dict) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.asgi_app(scope, receive, send_tracked)
+        finally:
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                route=route_label(scope['path']),
+                method=scope['method'],
+                status=str(status),
+            )
+
+
+def get_metrics_exporter() -> MetricsExporter:
+    """現在のアプリに紐づく /metrics の組み立て役を返す。"""
+    return current_app.extensions[EXTENSION_KEY]
+
+
+# --- 合算と書き出し ---
+
+
+def _by_name() -> Iterator[tuple[str, Counter | Histogram]]:
+    return ((metric.name, metric) for metric in METRICS)
+
+
+def _merge(workers: list[dict]) -> dict[str, dict]:
+    """ワーカーごとの値のカウンタとヒストグラムを合計する（{名前: {ラベルの値: 値}}）。"""
+    merged: dict[str, dict] = {name: {} for name, _ in _by_name()}
+    for worker in workers:
+        for name, metric in _by_name():
+            samples = worker.get('metrics', {}).get(name)
+            if not samples:
+                continue
+            try:
+                metric.merge(merged[name], samples)
+            except (TypeError, ValueError) as e:
+                # 区間を変えた直後の古いファイルなど。その値だけ捨てる
+                logger.warning(f'計測値 {name} を合算できませんでした: {e}')
+    return merged
+
+
+def _samples(metric: Counter | Histogram, merged: dict) -> list:
+    if isinstance(metric, Histogram):
+        return [[list(key), counts, total] for key, (counts, total) in merged.items()]
+    return [[list(key), value] for key, value in merged.items()]
+
+
+def _render(workers: list[dict]) -> str:
+    merged = _merge(workers)
+    lines: list[str] = []
+    for name, metric in _by_name():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        for key, value in sorted(merged[name].items()):
+            labels = dict(zip(metric.labelnames, key, strict=True))
+            if isinstance(metric, Counter):
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip([*metric.buckets, '+Inf'], counts, strict=True):
+                cumulative += count
+                le = bound if isinstance(bound, str) else _number(bound)
+                lines.append(f'{name}_bucket{_labels({**labels, "le": le})} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(total)}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+
+    # ワーカーごとの値。同じ名前の行はまとめて出す
+    gauges: dict[str, list[tuple[int, float]]] = {}
+    for worker in workers:
+        if 'pid' not in worker:
+            continue
+        for name, value in worker.get('gauges', {}).items():
+            gauges.setdefault(name, []).append((worker['pid'], value))
+    for name in sorted(gauges):
+        lines.append(f'# TYPE {name} gauge')
+        for pid, value in sorted(gauges[name]):
+            lines.append(f'{name}{_labels({"pid": str(pid)})} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_json(path: Path) -> dict | None:
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f'計測値のファイルを読めませんでした: {path}: {e}')
+        return None
+
+
+def _write_json(path: Path, data: dict) -> None:
+    # 書きかけのファイルをほかのワーカーが読まないよう、別名で書いてから置き換える
+    tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+    tmp.write_text(json.dumps(data, separators=(',', ':')), encoding='utf-8')
+    os.replace(tmp, path)
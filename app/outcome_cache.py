@@ -0,0 +1,206 @@
+"""生成結果（GenerationOutcome）全体のキャッシュ。
+
+1 リクエストで最も高くつくのは Gemini の呼び出し（タイムアウト 40 秒 + リトライ）で、
+同じキーワード・性別・季節・モデルの入力にもそのたびに払っていた。
+OutcomeCache は完成した生成結果をリクエストのキー（template_service.request_key）で保持し、
+TTL 内の同じ入力にはスクレイピングも Gemini 呼び出しもせずに複製を返す。
+季節・カラーを付加する前の結果も別のキーで保持し、選択だけが違うリクエストには
+付加をやり直して返す（template_service 側で行う）。
+
+ワーカー内の TTL + LRU に加え、共有キャッシュ（app/shared_cache.py）があれば
+そこにも書き込み、ワーカー内で外れたときに読む。他のワーカーや、別プロセスで動く
+事前生成（app/warmer.py）の結果もこれで使える。
+
+生成結果は毎回違うことに価値がある（「もう一度生成」で別案を見たい）ので既定では無効
+（OUTCOME_CACHE_TTL=0）。有効にしても、/api/generate の regenerate=true で
+キャッシュを読まずに生成し直せる（その結果で置き換える）。
+"""
+
+import asyncio
+import copy
+import threading
+import time
+from collections.abc import Callable, Hashable, Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+from flask import current_app
+
+from .cache import TTLCache
+from .shared_cache import make_key
+
+if TYPE_CHECKING:
+    from .shared_cache import SharedCache
+
+# Flask の app.extensions に登録する際のキー
+EXTENSION_KEY = 'outcome_cache'
+# 共有キャッシュのキーの名前空間
+SHARED_NAMESPACE = 'outcomes'
+
+V = TypeVar('V')
+
+
+@dataclass(frozen=True)
+class CachedValue(Generic[V]):
+    """lookup の結果。"""
+
+    # 呼び出し元が書き換えてよい複製
+    value: V
+    # 格納からの経過秒数
+    age: float
+    # 求めたキーではなく、代わりのキー（alternatives）で見つかったか
+    reused: bool = False
+
+
+class OutcomeCache(Generic[V]):
+    """TTL つきの LRU で生成結果を保持し、取り出すときに格納からの経過秒数を添える。"""
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int = 128,
+        clock: Callable[[], float] = time.monotonic,
+        shared_cache: 'SharedCache | None' = None,
+        encode: Callable[[V], object] | None = None,
+        decode: Callable[[object], V] | None = None,
+        wall_clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            ttl: 結果を使い回す秒数（0 以下ならキャッシュしない）
+            max_entries: ワーカー内に保持する件数の上限。超えたら最も長く使われていないものから捨てる
+            clock: 現在時刻（秒）を返す関数。テストから差し替える
+            shared_cache: ワーカー間で共有するキャッシュ。省略時はワーカー内だけで保持する
+            encode: 共有キャッシュへ書く値（JSON にできるもの）への変換。shared_cache と一緒に渡す
+            decode: encode の逆変換
+            wall_clock: 共有キャッシュに書く格納時刻を返す関数（プロセス間で比べるので壁時計）
+        """
+        self._clock = clock
+        # key -> (結果, 格納時刻)。期限と件数の管理は TTLCache に任せる
+        self._entries: TTLCache[tuple[V, float]] = TTLCache(ttl, 0.0, max_entries, clock)
+        self.shared_cache = shared_cache if encode is not None and decode is not None else None
+        self._encode = encode
+        self._decode = decode
+        self._wall_clock = wall_clock
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(
+            ('hits', 'misses', 'reuses', 'shared_hits', 'bypasses', 'stores'), 0
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self._entries.enabled
+
+    @property
+    def ttl(self) -> float:
+        return self._entries.ttl
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    def get(self, key: Hashable) -> tuple[V, float] | None:
+        """(結果の複製, 格納からの経過秒数) を返す。期限切れ・未登録なら None。
+
+        呼び出し元はテンプレート（dict）を書き換えうるので、保持している値そのものは渡さない。
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self._count('misses')
+            return None
+        value, stored_at = entry
+        self._count('hits')
+        return copy.deepcopy(value), max(0.0, self._clock() - stored_at)
+
+    def find(self, keys: Sequence[Hashable]) -> tuple[V, float] | None:
+        """keys を順に引き、最初に見つかったものを get と同じ形で返す。
+
+        代わりに使える結果を探すためのもので、見つかれば reuses を数える（hits / misses は数えない）。
+        """
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                self._count('reuses')
+                return copy.deepcopy(value), max(0.0, self._clock() - stored_at)
+        return None
+
+    async def lookup(
+        self, key: Hashable, alternatives: Sequence[Hashable] = ()
+    ) -> CachedValue[V] | None:
+        """key、代わりに使える alternatives の順に、ワーカー内 → 共有キャッシュの順で探す。
+
+        共有キャッシュで見つけた値は、元の格納時刻のままワーカー内にも入れる。
+        """
+        found = self.get(key)
+        if found is not None:
+            return CachedValue(*found)
+        found = self.find(alternatives)
+        if found is not None:
+            return CachedValue(*found, reused=True)
+        if self.shared_cache is None:
+            return None
+
+        for candidate in (key, *alternatives):
+            found = await self._get_shared(candidate)
+            if found is not None:
+                reused = candidate != key
+                self._count('shared_hits')
+                if reused:
+                    self._count('reuses')
+                return CachedValue(*found, reused=reused)
+        return None
+
+    async def _get_shared(self, key: Hashable) -> tuple[V, float] | None:
+        stored = await asyncio.to_thread(self.shared_cache.get, make_key(SHARED_NAMESPACE, key))
+        if not isinstance(stored, dict):
+            return None
+        try:
+            value = self._decode(stored['value'])
+            age = max(0.0, self._wall_clock() - float(stored['stored_at']))
+        except (KeyError, TypeError, ValueError):
+            # 別の版が書いた形式などは外れとして扱う
+            return None
+        if age >= self.ttl:
+            return None
+        stored_at = self._clock() - age
+        self._entries.put(key, (value, stored_at), stored_at=stored_at)
+        return copy.deepcopy(value), age
+
+    def put(self, key: Hashable, value: V) -> None:
+        """結果の複製をワーカー内に保持する（同じキーの古い結果は置き換える）。"""
+        if not self.enabled:
+            return
+        self._entries.put(key, (copy.deepcopy(value), self._clock()))
+        self._count('stores')
+
+    async def store(self, key: Hashable, value: V) -> None:
+        """ワーカー内に保持し、共有キャッシュがあればそこにも書く。"""
+        self.put(key, value)
+        if not self.enabled or self.shared_cache is None:
+            return
+        stored = {'value': self._encode(value), 'stored_at': self._wall_clock()}
+        await asyncio.to_thread(
+            self.shared_cache.put, make_key(SHARED_NAMESPACE, key), stored, self.ttl
+        )
+
+    def record_bypass(self) -> None:
+        """regenerate 指定でキャッシュを読まなかったことを数える。"""
+        self._count('bypasses')
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """キャッシュの計測値のスナップショット。"""
+        entries = self._entries.stats()
+        with self._lock:
+            return {'size': entries['size'], 'evictions': entries['evictions'], **self._counts}
+
+
+def get_outcome_cache() -> OutcomeCache:
+    """現在のアプリに紐づく生成結果のキャッシュを返す。
+
+    サービス層はこれを直接呼ばず、引数で受け取ること。
+    """
+    return current_app.extensions[EXTENSION_KEY]
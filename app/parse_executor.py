@@ -0,0 +1,181 @@
+"""検索結果ページの解析をイベントループの外で実行する。
+
+解析は CPU だけを使う同期処理なので、async ビューの中でそのまま呼ぶと、その間は
+同じワーカーの他のリクエスト（/api/generate や /api/featured-keywords）が止まる。
+ParseExecutor は解析を上限つきのプールへ回し、ループには待つだけの処理を残す。
+
+- thread（既定） … ThreadPoolExecutor。lxml は解析中に GIL を手放すので並列に進む。
+  GIL を握る html.parser でも、ループ側は切り替え間隔ごとに処理を進められる
+- process …………… ProcessPoolExecutor（spawn）。html.parser のような CPU の重い
+  パーサーでループのスレッドと GIL を取り合わせたくない場合に使う
+- inline …………… 従来どおりループ上で解析する（比較・切り分け用）
+
+同時に預けられる解析は「ワーカー数 + PARSE_QUEUE_LIMIT」件まで。超えた分はプールに
+積まずループ上で空きを待つ（キューが無制限に伸びてメモリとレイテンシが膨らむのを防ぐ）。
+待ち行列の深さや待ち時間は stats() で取れる。
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import threading
+import time
+import weakref
+
+from . import config
+from .html_parsers import ParsedPage, parse_search_page
+
+logger = logging.getLogger(__name__)
+
+PARSE_MODE_THREAD = 'thread'
+PARSE_MODE_PROCESS = 'process'
+PARSE_MODE_INLINE = 'inline'
+PARSE_MODES = (PARSE_MODE_THREAD, PARSE_MODE_PROCESS, PARSE_MODE_INLINE)
+
+
+def _timed_parse(html_text: str, backend: str) -> tuple[ParsedPage, float, float]:
+    """プール側で実行する解析。開始・終了時刻（time.monotonic）も返す。
+
+    プロセスプールへ渡すため pickle できるトップレベル関数にしている。
+    time.monotonic はプロセス間で共通の時計なので、投入時刻との差がキュー待ち時間になる。
+    """
+    started = time.monotonic()
+    result = parse_search_page(html_text, backend)
+    return result, started, time.monotonic()
+
+
+class ParseExecutor:
+    """解析を預ける上限つきのプール（ワーカー単位で 1 つ）。"""
+
+    def __init__(
+        self,
+        mode: str = PARSE_MODE_THREAD,
+        workers: int = 2,
+        queue_limit: int = config.PARSE_QUEUE_LIMIT,
+    ):
+        """
+        Args:
+            mode: thread / process / inline のいずれか。未知の値は thread として扱う
+            workers: プールのスレッド数・プロセス数
+            queue_limit: 実行待ちとして預けられる件数の上限
+        """
+        if mode not in PARSE_MODES:
+            logger.warning(
+                f'未知の SCRAPER_PARSE_EXECUTOR "{mode}" - {PARSE_MODE_THREAD} を使用します'
+            )
+            mode = PARSE_MODE_THREAD
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.queue_limit = max(0, queue_limit)
+
+        self._executor: concurrent.futures.Executor | None = None
+        # 空き枠はループごとに持つ（asyncio.Semaphore は最初に使ったループに紐づくため）。
+        # 本番はワーカーあたり 1 ループなので、実質ワーカー全体の上限になる
+        self._slots: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = (
+            weakref.WeakKeyDictionary()
+        )
+        # 開発サーバーではリクエストごとに別スレッドのループから呼ばれるので、
+        # プールの生成と計測値の更新はスレッドロックで守る
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._peak_queue_depth = 0
+        self._completed = 0
+        self._failed = 0
+        self._queue_wait_total = 0.0
+        self._parse_total = 0.0
+
+    @classmethod
+    def from_settings(cls, settings: config.Settings) -> 'ParseExecutor':
+        return cls(settings.scraper_parse_executor, settings.scraper_parse_workers)
+
+    def _get_executor(self) -> concurrent.futures.Executor:
+        """プールを返す（初回または shutdown() 後に作る）。"""
+        with self._lock:
+            if self._executor is None:
+                if self.mode == PARSE_MODE_PROCESS:
+                    # fork はスレッドを抱えたワーカー（uvicorn・aiohttp）から行うと
+                    # ロックの状態ごと複製されて固まることがあるので spawn にする
+                    self._executor = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                    )
+                else:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='html-parse'
+                    )
+            return self._executor
+
+    def _slot(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            slot = self._slots.get(loop)
+            if slot is None:
+                slot = self._slots[loop] = asyncio.Semaphore(self.workers + self.queue_limit)
+            return slot
+
+    async def parse(self, html_text: str, backend: str) -> ParsedPage:
+        """検索結果ページを解析する（inline 以外ではプールで実行する）。"""
+        if self.mode == PARSE_MODE_INLINE:
+            result, started, finished = _timed_parse(html_text, backend)
+            self._record(0.0, finished - started, failed=False)
+            return result
+
+        slot = self._slot()
+        if slot.locked():
+            logger.debug('解析キューが上限に達しています。空きを待ちます')
+        async with slot:
+            with self._lock:
+                self._in_flight += 1
+                self._peak_queue_depth = max(self._peak_queue_depth, self._queue_depth())
+            submitted = time.monotonic()
+            try:
+                result, started, finished = await asyncio.get_running_loop().run_in_executor(
+                    self._get_executor(), _timed_parse, html_text, backend
+                )
+            except Exception:
+                self._record(time.monotonic() - submitted, 0.0, failed=True)
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+        self._record(started - submitted, finished - started, failed=False)
+        return result
+
+    def _queue_depth(self) -> int:
+        # 実行中はたかだかワーカー数なので、それを超えた分が実行待ち
+        return max(0, self._in_flight - self.workers)
+
+    def _record(self, queue_wait: float, parse_time: float, failed: bool) -> None:
+        with self._lock:
+            if failed:
+                self._failed += 1
+            else:
+                self._completed += 1
+                self._queue_wait_total += max(0.0, queue_wait)
+                self._parse_total += parse_time
+
+    def stats(self) -> dict:
+        """解析プールの計測値のスナップショット。"""
+        with self._lock:
+            completed = self._completed
+            divisor = completed or 1
+            return {
+                'mode': self.mode,
+                'workers': self.workers,
+                'in_flight': self._in_flight,
+                'queue_depth': self._queue_depth(),
+                'peak_queue_depth': self._peak_queue_depth,
+                'completed': completed,
+                'failed': self._failed,
+                'avg_queue_wait_ms': self._queue_wait_total / divisor * 1000,
+                'avg_parse_ms': self._parse_total / divisor * 1000,
+            }
+
+    def shutdown(self) -> None:
+        """プールを止める。冪等。次に parse() が呼ばれればプールを作り直す。"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -5,13 +5,21 @@ API キーなしでテストでき、文言の変更が generator の変更と
 
 性別ごとに違うのは語彙と例示だけなので、GENDER_VOCABULARY のデータとして持つ。
 （以前は if/else の巨大な2ブロックがミラー構造で並んでいた）
+
+プロンプトの大半は性別と短尺タイトル枠（季節・カラー選択）だけで決まるので、
+その組ごとに一度だけ組み立てたスケルトン（PromptSkeleton）をキャッシュし、
+リクエストごとにはキーワード・参照タイトル・特集の指示を差し込むだけにしている。
 """
 
-import json
+import functools
+import itertools
 import logging
+import re
+from collections.abc import Mapping
 from dataclasses import dataclass
 
 from . import config
+from .title_selection import format_reference_titles
 
 logger = logging.getLogger(__name__)
 
@@ -133,8 +141,61 @@ def short_title_band_max(keyword: str) -> int:
     return min(config.CHAR_LIMITS['title'] - 1 - len(keyword), config.SEASON_APPEND_THRESHOLD - 1)
 
 
+def title_length_profile(selected_seasons: list[str]) -> tuple[tuple[int, int], ...]:
+    """季節・カラー選択がプロンプトに与える影響（短尺タイトル枠）だけを取り出す。
+
+    プロンプトの中で季節・カラーに依存するのは短尺タイトル枠の数と目標帯だけなので、
+    この値が同じ選択どうしは同じプロンプトになる。
+
+    Returns:
+        (目標帯の上限文字数, 枠数) を上限文字数の降順に並べたタプル。選択がなければ空
+    """
+    if not selected_seasons:
+        return ()
+    slots_per_keyword = short_title_slots_per_keyword(len(selected_seasons))
+    bands: dict[int, int] = {}
+    for key in selected_seasons:
+        band_max = short_title_band_max(config.SEASON_COLOR_CHOICES[key])
+        bands[band_max] = bands.get(band_max, 0) + slots_per_keyword
+    return tuple(sorted(bands.items(), reverse=True))
+
+
+@functools.cache
+def _all_title_length_profiles() -> tuple[tuple[tuple[int, int], ...], ...]:
+    """季節・カラーのあらゆる選択から生じうる短尺タイトル枠（重複なし）。"""
+    keys = list(config.SEASON_COLOR_CHOICES)
+    profiles = {
+        title_length_profile(list(combination))
+        for size in range(len(keys) + 1)
+        for combination in itertools.combinations(keys, size)
+    }
+    return tuple(profiles)
+
+
+def compatible_title_length_profiles(
+    selected_seasons: list[str],
+) -> list[tuple[tuple[int, int], ...]]:
+    """この選択の季節・カラーを後から付加できる生成結果の、短尺タイトル枠の候補。
+
+    どの目標帯でも、この選択が求める枠数以上の短尺タイトルを生成させた結果なら、
+    付加先のタイトルが足りる。ただし付加されずに残る短尺タイトル（通常の目標より短い）が
+    SEASON_REUSE_MAX_EXTRA_SHORT_SLOTS を超えるものは除く。残る数が少ない順
+    （同じ枠のものが先頭）に並べる。
+    """
+    required = dict(title_length_profile(selected_seasons))
+    required_slots = sum(required.values())
+    candidates = [
+        profile
+        for profile in _all_title_length_profiles()
+        if all(dict(profile).get(band_max, 0) >= slots for band_max, slots in required.items())
+        and sum(slots for _, slots in profile) - required_slots
+        <= config.SEASON_REUSE_MAX_EXTRA_SHORT_SLOTS
+    ]
+    return sorted(candidates, key=lambda profile: (sum(slots for _, slots in profile), profile))
+
+
 def build_featured_instruction(
-    featured_info: dict | None,
+    featured_info: Mapping | None,
     keyword: str,
     keyword_type: str,
     original_keyword: str,
@@ -147,7 +208,7 @@ def build_featured_instruction(
         return ""
 
     try:
-        if not isinstance(featured_info, dict):
+        if not isinstance(featured_info, Mapping):
             logger.warning(
                 f"特集情報が辞書形式ではありません: {type(featured_info)} - 特集機能をスキップ"
             )
@@ -215,21 +276,21 @@ def build_title_length_rule(selected_seasons: list[str]) -> tuple[str, str]:
     Returns:
         (title_length_rule, short_title_note) のタプル
     """
+    return _title_length_rule(title_length_profile(selected_seasons))
+
+
+@functools.cache
+def _title_length_rule(bands: tuple[tuple[int, int], ...]) -> tuple[str, str]:
+    """build_title_length_rule の本体。短尺タイトル枠ごとに一度だけ組み立てる。"""
     title_target = _target_range(config.TITLE_TARGET)
 
-    if not selected_seasons:
+    if not bands:
         return f"- title: **{title_target}**を目標", ""
 
-    slots_per_keyword = short_title_slots_per_keyword(len(selected_seasons))
-    bands = {}
-    for key in selected_seasons:
-        band_max = short_title_band_max(config.SEASON_COLOR_CHOICES[key])
-        bands[band_max] = bands.get(band_max, 0) + slots_per_keyword
-
-    short_slots = sum(bands.values())
+    short_slots = sum(slots for _, slots in bands)
     band_rules = "、".join(
         f"**{slots}個は{band_max - config.SHORT_TITLE_BAND_WIDTH}〜{band_max}文字**"
-        for band_max, slots in sorted(bands.items(), reverse=True)
+        for band_max, slots in bands
     )
     title_length_rule = (
         f"- title: {config.MAX_TEMPLATES}個中{band_rules}、"
@@ -240,48 +301,57 @@ def build_title_length_rule(selected_seasons: list[str]) -> tuple[str, str]:
         "追記する語句はこちらで決めるため、指定は不要です。"
         "追記後に上限文字数いっぱいまで活用できるよう、指定した文字数の**上限側に寄せて**作成してください。\n"
     )
-    logger.debug(f"短尺タイトル枠 {bands} をプロンプトに追加（選択: {selected_seasons}）")
+    logger.debug(f"短尺タイトル枠 {dict(bands)} のルールを組み立てました")
 
     return title_length_rule, short_title_note
 
 
-def build_generation_prompt(
-    titles: list[str],
-    keyword: str,
-    seasons: list[str] | None = None,
-    gender: str = 'ladies',
-    featured_info: dict | None = None,
-    generation_context: dict | None = None,
-) -> str:
-    """テンプレート生成用のプロンプトを組み立てる。"""
-    titles_json = json.dumps(titles, ensure_ascii=False, indent=2)
+# スケルトンの中で、リクエストごとに差し込む部分の目印
+_SLOT_FEATURED = 'featured_instruction'
+_SLOT_KEYWORD = 'keyword'
+_SLOT_TITLES = 'reference_titles'
+_SLOT_PATTERN = re.compile('\0(featured_instruction|keyword|reference_titles)\0')
 
-    vocabulary = GENDER_VOCABULARY.get(gender, LADIES_VOCABULARY)
-    gender_name = vocabulary.display_name
 
-    selected_seasons = seasons or []
+@dataclass(frozen=True)
+class PromptSkeleton:
+    """差し込み口（スロット）で区切ったプロンプトの固定部分。
 
-    # 混在キーワード処理のための生成コンテキスト解析
-    context = generation_context or {}
-    keyword_type = context.get('keyword_type', 'normal')
-    original_keyword = context.get('original_keyword', keyword)
+    statics[0] + 値[slots[0]] + statics[1] + ... + 値[slots[-1]] + statics[-1] の順につなぐ。
+    """
+
+    statics: tuple[str, ...]
+    slots: tuple[str, ...]
+
+    def render(self, values: Mapping[str, str]) -> str:
+        pieces = [self.statics[0]]
+        for slot, static in zip(self.slots, self.statics[1:], strict=True):
+            pieces.append(values[slot])
+            pieces.append(static)
+        return ''.join(pieces)
 
-    featured_instruction = build_featured_instruction(
-        featured_info, keyword, keyword_type, original_keyword
-    )
-    title_length_rule, short_title_note = build_title_length_rule(selected_seasons)
 
+def _render_prompt(
+    vocabulary: GenderVocabulary,
+    title_length_rule: str,
+    short_title_note: str,
+    featured_instruction: str,
+    keyword: str,
+    reference_titles: str,
+) -> str:
+    """プロンプトの文面。prompt_skeleton() がスロットの目印を渡して一度だけ呼ぶ。"""
+    gender_name = vocabulary.display_name
     menu_target = _target_range(config.MENU_TARGET)
     comment_target = _target_range(config.COMMENT_TARGET)
     hashtag_min = config.HASHTAG_MIN_COUNT
 
-    prompt = f"""あなたは日本の{gender_name}美容トレンドに詳しく、魅力的なコピーライティングが得意なマーケターです。
+    return f"""あなたは日本の{gender_name}美容トレンドに詳しく、魅力的なコピーライティングが得意なマーケターです。
 HotPepper Beautyの人気サロンで使用されている、効果的なタイトルやキャッチコピーの特徴を熟知しています。
 {featured_instruction}
 ## 参照データ
 以下は、HotPepper Beautyで「{keyword}」と検索して得られた{gender_name}ヘアスタイルタイトルです：
 
-{titles_json}
+{reference_titles}
 
 ## 参照データのトレンド分析
 まず上記の参照データを分析し、検索キーワード「{keyword}」と頻繁に組み合わされているキーワードやスタイル名を特定してください。
@@ -387,6 +457,60 @@ Gemini側で**参照データのスタイルを参考に、自由に記号を選
   ]
 }}
 """
+
+
+@functools.cache
+def prompt_skeleton(gender: str, bands: tuple[tuple[int, int], ...]) -> PromptSkeleton:
+    """性別と短尺タイトル枠（title_length_profile）ごとのスケルトン。初回に組み立ててキャッシュする。
+
+    性別は GENDER_VOCABULARY のキー（'ladies' / 'mens'）で渡すこと。
+    """
+    title_length_rule, short_title_note = _title_length_rule(bands)
+    text = _render_prompt(
+        GENDER_VOCABULARY[gender],
+        title_length_rule,
+        short_title_note,
+        featured_instruction=f'\0{_SLOT_FEATURED}\0',
+        keyword=f'\0{_SLOT_KEYWORD}\0',
+        reference_titles=f'\0{_SLOT_TITLES}\0',
+    )
+    parts = _SLOT_PATTERN.split(text)
+    return PromptSkeleton(statics=tuple(parts[0::2]), slots=tuple(parts[1::2]))
+
+
+def build_generation_prompt(
+    titles: list[str],
+    keyword: str,
+    seasons: list[str] | None = None,
+    gender: str = 'ladies',
+    featured_info: Mapping | None = None,
+    generation_context: dict | None = None,
+) -> str:
+    """テンプレート生成用のプロンプトを組み立てる。
+
+    titles はそのまま 1 行 1 件で載せる。近似重複の除去とトークン数の予算は
+    呼び出し側（TemplateGenerator）が select_reference_titles() で済ませておく。
+    """
+    selected_seasons = seasons or []
+
+    # 混在キーワード処理のための生成コンテキスト解析
+    context = generation_context or {}
+    keyword_type = context.get('keyword_type', 'normal')
+    original_keyword = context.get('original_keyword', keyword)
+
+    skeleton = prompt_skeleton(
+        gender if gender in GENDER_VOCABULARY else 'ladies',
+        title_length_profile(selected_seasons),
+    )
+    prompt = skeleton.render(
+        {
+            _SLOT_FEATURED: build_featured_instruction(
+                featured_info, keyword, keyword_type, original_keyword
+            ),
+            _SLOT_KEYWORD: keyword,
+            _SLOT_TITLES: format_reference_titles(titles),
+        }
+    )
     logger.debug(
         f"プロンプト作成: 入力タイトル数: {len(titles)}, キーワード: '{keyword}', "
         f"季節・カラー選択: {selected_seasons}, 性別: '{gender}'"
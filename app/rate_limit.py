@@ -0,0 +1,60 @@
+"""スクレイピングの礼儀正しさを保つためのトークンバケット。
+
+以前はページ間で ``random.uniform(SCRAPING_DELAY_MIN, SCRAPING_DELAY_MAX)`` 秒を
+無条件に待っていた。並行取得ではページごとの待機が意味を持たないため、
+「平均 rate リクエスト/秒・瞬間的には burst 件まで」という上限で送出間隔を決める。
+
+トークンの残量は予約方式で管理する（取得時に先に引き、足りない分だけ待つ）。
+こうすると待機中にロックを握らずに済み、イベントループに依存する asyncio.Lock を
+持たないので、ループの異なる呼び出し元から共有しても壊れない。
+"""
+
+import asyncio
+import threading
+import time
+from collections.abc import Callable
+
+
+class TokenBucket:
+    """非同期のトークンバケット。"""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            rate: 1 秒あたりに補充するトークン数（0 以下なら制限しない）
+            capacity: バケットの容量（連続して即時に送れる件数）
+            clock: 現在時刻（秒）を返す関数。テストから差し替える
+        """
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._clock = clock
+        self._tokens = float(self.capacity)
+        self._updated_at = clock()
+        # 予約の計算だけを守る。待機そのものはロックの外で行う
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """トークンを 1 つ予約し、使えるようになるまでの待ち秒数を返す。"""
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            now = self._clock()
+            elapsed = now - self._updated_at
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    async def acquire(self) -> None:
+        """トークンが使えるようになるまで待つ。"""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
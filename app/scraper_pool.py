@@ -0,0 +1,194 @@
+"""ワーカー存続期間で共有するスクレイパーの接続プール。
+
+以前は /api/generate のたびに ``async with HotPepperScraper()`` で
+ClientSession・TCPConnector・SSL コンテキストを作り直しており、
+毎回 beauty.hotpepper.jp への TCP + TLS ハンドシェイクを払っていた。
+
+ScraperPool は ASGI の lifespan startup でセッションを 1 つ作り、shutdown で閉じる
+（asgi.py → app/lifespan.py）。aiohttp のセッションは作成時のイベントループに
+紐づくため、共有セッションを渡すのは「start() したのと同じループ上の呼び出し」に限る。
+それ以外（開発サーバーやテストクライアントのようにリクエストごとにループが変わる経路、
+または start() 前）では従来どおりリクエスト単位のセッションにフォールバックする。
+
+HTML の解析を預ける ParseExecutor もここが持つ。こちらはループに依存しないので、
+共有セッションを使えない経路のスクレイパーにも渡す。
+
+scrape_titles() はスクレイピング結果を (キーワード, 性別, ページ数) ごとに TTLCache へ
+保持し、同じキーワードの繰り返しでは HotPepper へ取りに行かない。共有キャッシュ
+（SharedCache）を渡されていれば、ワーカー内で外れたときにそちらも見て、取得結果を書き込む。
+"""
+
+import asyncio
+import functools
+import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import NamedTuple
+
+import aiohttp
+from flask import current_app
+
+from . import config
+from .cache import TTLCache
+from .deadline import Deadline
+from .parse_executor import ParseExecutor
+from .scraping import HotPepperScraper, ScrapeOutcome, create_rate_limiter, create_session
+from .shared_cache import SharedCache, make_key
+
+logger = logging.getLogger(__name__)
+
+# Flask の app.extensions に登録する際のキー
+EXTENSION_KEY = 'scraper_pool'
+
+
+class ScrapedTitles(NamedTuple):
+    """タイトルキャッシュに入れる値（読み込み結果）。"""
+
+    titles: tuple[str, ...]
+    # 最後のページまで取得できたか（締め切りや途中のページの失敗で打ち切っていないか）
+    complete: bool
+
+
+class ScraperPool:
+    """ワーカー単位で共有する aiohttp セッションの持ち主。"""
+
+    def __init__(
+        self,
+        settings: config.Settings | None = None,
+        shared_cache: SharedCache | None = None,
+    ):
+        """
+        Args:
+            settings: 使用する設定。省略時はプロセス共有の設定を使う
+            shared_cache: ワーカー間で共有するキャッシュ。省略時はワーカー内のキャッシュだけを使う
+        """
+        self.settings = settings or config.get_settings()
+        self.shared_cache = shared_cache
+        self._session: aiohttp.ClientSession | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # 送出間隔の上限はワーカー全体で 1 つにする（リクエストごとに持つと
+        # 同時リクエスト数に比例してサイトへの負荷が増える）
+        self.rate_limiter = create_rate_limiter(self.settings)
+        self.parse_executor = ParseExecutor.from_settings(self.settings)
+        self.title_cache: TTLCache[ScrapedTitles] = TTLCache(
+            self.settings.title_cache_ttl,
+            self.settings.title_cache_stale_ttl,
+            config.TITLE_CACHE_MAX_ENTRIES,
+        )
+
+    @property
+    def is_started(self) -> bool:
+        return self._session is not None and not self._session.closed
+
+    async def start(self) -> None:
+        """実行中のイベントループ上に共有セッションを作る。冪等。"""
+        if self.is_started:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._session = create_session(self.settings)
+        logger.info(
+            f'スクレイパーの共有セッションを開始しました '
+            f'(上限 {config.SCRAPER_POOL_LIMIT} 接続, '
+            f'ホストあたり {config.SCRAPER_POOL_LIMIT_PER_HOST} 接続)'
+        )
+
+    async def close(self) -> None:
+        """共有セッションと解析プールを閉じる。冪等。"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info('スクレイパーの共有セッションを閉じました')
+            logger.info(f'解析プールの計測値: {self.parse_executor.stats()}')
+            logger.info(f'タイトルキャッシュの計測値: {self.title_cache.stats()}')
+        self.parse_executor.shutdown()
+        self._session = None
+        self._loop = None
+
+    def _shared_session(self) -> aiohttp.ClientSession | None:
+        """現在のループで使える共有セッション。使えなければ None。"""
+        if not self.is_started:
+            return None
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        return self._session if running is self._loop else None
+
+    @asynccontextmanager
+    async def scraper(self) -> AsyncIterator[HotPepperScraper]:
+        """スクレイパーを貸し出す。
+
+        共有セッションが使えればそれに乗せ、使えなければリクエスト単位の
+        セッションを作って抜けるときに閉じる（従来の挙動）。
+        """
+        session = self._shared_session()
+        if session is not None:
+            yield HotPepperScraper(
+                self.settings,
+                session=session,
+                rate_limiter=self.rate_limiter,
+                parse_executor=self.parse_executor,
+            )
+            return
+
+        async with HotPepperScraper(
+            self.settings, rate_limiter=self.rate_limiter, parse_executor=self.parse_executor
+        ) as scraper:
+            yield scraper
+
+    async def scrape_titles(
+        self, keyword: str, gender: str, deadline: Deadline | None = None
+    ) -> list[str]:
+        """キャッシュを通してタイトルをスクレイピングする。
+
+        deadline はこのリクエストがスクレイピングを待つ場合にだけ使い、裏での取り直しには使わない
+        （古い結果を返した後も、取り直しはリクエストの締め切りに縛られず最後まで行う）。
+
+        0 件の結果と、途中で打ち切った結果（締め切り・2 ページ目以降の取得失敗）は
+        キャッシュしない。一時的な取得・解析の不調や、そのリクエストの締め切りで削った
+        一部だけの結果を、ワーカー内にも共有キャッシュにも 1 時間持ち越さないため。
+        期限切れ後の取り直しは裏で行うので、そのリクエストは古い結果ですぐに返る。
+        ワーカー内で外れたとき（取り直しを含む）は、スクレイピングの前に共有キャッシュを見る。
+        """
+        max_pages = self.settings.max_pages
+        key = (keyword.strip(), gender, max_pages)
+        load = functools.partial(self._load_titles, keyword, gender, max_pages)
+
+        scraped = await self.title_cache.get_or_load(
+            key,
+            functools.partial(load, deadline),
+            cache_if=lambda scraped: scraped.complete and bool(scraped.titles),
+            refresh_loader=functools.partial(load, None),
+        )
+        return list(scraped.titles)
+
+    async def _load_titles(
+        self, keyword: str, gender: str, max_pages: int, deadline: Deadline | None
+    ) -> ScrapedTitles:
+        """共有キャッシュを見て、無ければスクレイピングする（完全な結果だけを共有キャッシュへ書く）。"""
+        shared_key = make_key('titles', (keyword.strip(), gender, max_pages))
+        if self.shared_cache is not None:
+            shared = await asyncio.to_thread(self.shared_cache.get, shared_key)
+            if shared:
+                return ScrapedTitles(tuple(shared), complete=True)
+
+        outcome = ScrapeOutcome()
+        async with self.scraper() as scraper:
+            titles = tuple(
+                await scraper.scrape_titles_async(keyword, gender, max_pages, deadline, outcome)
+            )
+
+        if outcome.truncated:
+            logger.info(f"途中で打ち切った {len(titles)} 件のタイトルはキャッシュしません")
+        elif titles and self.shared_cache is not None:
+            await asyncio.to_thread(
+                self.shared_cache.put, shared_key, list(titles), self.settings.title_cache_ttl
+            )
+        return ScrapedTitles(titles, complete=not outcome.truncated)
+
+
+def get_scraper_pool() -> ScraperPool:
+    """現在のアプリに紐づくスクレイパープールを返す。
+
+    サービス層はこれを直接呼ばず、引数でプールを受け取ること。
+    """
+    return current_app.extensions[EXTENSION_KEY]
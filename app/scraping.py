@@ -1,169 +1,260 @@
 import asyncio
+import functools
 import logging
 import random
 import ssl
+from dataclasses import dataclass
 from urllib.parse import quote
 
 import aiohttp
 import certifi
-from bs4 import BeautifulSoup
 
 from . import config
+from .deadline import Deadline
 from .errors import ScrapingError
+from .html_parsers import (
+    NEXT_PAGE_SELECTOR,
+    STYLE_TITLE_SELECTOR,
+    ParsedPage,
+    parse_search_page,
+    resolve_backend,
+)
+from .metrics import SCRAPE_PAGE_SECONDS
+from .parse_executor import ParseExecutor
+from .rate_limit import TokenBucket
+from .stages import PAGE_SCRAPED, report_stage
+from .timing import HTML_PARSE, SCRAPE, span, timed
 
 # ロガーの設定
 logger = logging.getLogger(__name__)
 
 
-class HotPepperScraper:
-    """aiohttpとBeautifulSoupを使用した非同期スクレイパー"""
+# ブラウザ相当のリクエストヘッダー
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
+    'Sec-Ch-Ua': '"Chromium";v="134", "Not(A:Brand";v="24", "Google Chrome";v="134"',
+    'Sec-Ch-Ua-Mobile': '?0',
+    'Sec-Ch-Ua-Platform': '"macOS"',
+    'Upgrade-Insecure-Requests': '1',
+}
 
-    # セレクタ定数
-    STYLE_TITLE_SELECTOR = "#jsiHoverAlphaLayerScope > li > div.mT5 > a > p > span"
-    NEXT_PAGE_SELECTOR = "#searchList > div:nth-child(2) > div.pT5.pr.cFix > div > ul > li.pa.top0.right0.afterPage > a"
 
-    def __init__(self, settings: config.Settings | None = None):
-        self.settings = settings or config.get_settings()
+@dataclass
+class ScrapeOutcome:
+    """scrape_titles_async() が呼び出し元へ知らせる、取得の打ち切り理由。"""
 
-        # 非同期セッションはコンテキストマネージャで管理するため
-        # 初期化時にはセッションを作成しない
-        self.session = None
-
-        # ヘッダー設定
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'ja,en-US;q=0.9,en;q=0.8',
-            'Sec-Ch-Ua': '"Chromium";v="134", "Not(A:Brand";v="24", "Google Chrome";v="134"',
-            'Sec-Ch-Ua-Mobile': '?0',
-            'Sec-Ch-Ua-Platform': '"macOS"',
-            'Upgrade-Insecure-Requests': '1',
-        }
+    # 締め切り、または 2 ページ目以降の取得失敗で途中までしか取れなかった。
+    # 空ページ・次ページボタン無し・max_pages で終えたときは False
+    truncated: bool = False
+
+
+@functools.cache
+def shared_ssl_context(verify: bool) -> ssl.SSLContext:
+    """スクレイパー用の SSL コンテキストを返す（プロセス内で1つを共有する）。
+
+    以前はスクレイパーの生成ごとに certifi の CA バンドルを読み直していた。
+    SSLContext は生成後に変更しない限りスレッド・セッション間で共有してよい。
+
+    SSL 検証は既定で有効。SCRAPER_VERIFY_SSL=false を明示した場合のみ無効化する。
+    CA は certifi のバンドルを使う。OS の証明書ストアに依存すると、
+    macOS の python.org 版のように「unable to get local issuer certificate」で
+    検証が通らない環境が出てくるため。
+    """
+    if verify:
+        return ssl.create_default_context(cafile=certifi.where())
+
+    logger.warning(
+        "SCRAPER_VERIFY_SSL=false のため SSL 証明書検証を無効化します。"
+        "この設定は開発環境でのみ使用してください。"
+    )
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def create_session(settings: config.Settings) -> aiohttp.ClientSession:
+    """スクレイピング用の aiohttp セッションを作る。
+
+    接続プールの上限・DNS キャッシュ・keep-alive は config の SCRAPER_* で決める。
+    セッションは作成時に実行中のイベントループへ紐づくため、
+    ループをまたいで使い回してはいけない（ScraperPool がこれを管理する）。
+    """
+    connector = aiohttp.TCPConnector(
+        ssl=shared_ssl_context(settings.scraper_verify_ssl),
+        limit=config.SCRAPER_POOL_LIMIT,
+        limit_per_host=config.SCRAPER_POOL_LIMIT_PER_HOST,
+        ttl_dns_cache=config.SCRAPER_DNS_CACHE_TTL,
+        keepalive_timeout=config.SCRAPER_KEEPALIVE_TIMEOUT,
+    )
+    return aiohttp.ClientSession(headers=REQUEST_HEADERS, connector=connector)
+
+
+def create_rate_limiter(settings: config.Settings) -> TokenBucket:
+    """並行取得の送出間隔を決めるトークンバケットを作る。"""
+    return TokenBucket(settings.scraping_rate, settings.scraping_burst)
+
+
+# 1 ページの取得失敗として扱う例外（それ以外は想定外として送出する）
+PAGE_ERRORS = (TimeoutError, aiohttp.ClientError)
 
-        # SSL 検証は既定で有効。SCRAPER_VERIFY_SSL=false を明示した場合のみ無効化する。
-        # CA は certifi のバンドルを使う。OS の証明書ストアに依存すると、
-        # macOS の python.org 版のように「unable to get local issuer certificate」で
-        # 検証が通らない環境が出てくるため。
-        if self.settings.scraper_verify_ssl:
-            self.ssl_context = ssl.create_default_context(cafile=certifi.where())
-        else:
-            logger.warning(
-                "SCRAPER_VERIFY_SSL=false のため SSL 証明書検証を無効化します。"
-                "この設定は開発環境でのみ使用してください。"
-            )
-            self.ssl_context = ssl.create_default_context()
-            self.ssl_context.check_hostname = False
-            self.ssl_context.verify_mode = ssl.CERT_NONE
+
+class HotPepperScraper:
+    """aiohttp を使用した非同期スクレイパー（HTML の解析は html_parsers に委譲する）"""
+
+    # セレクタ定数（実体は html_parsers にある）
+    STYLE_TITLE_SELECTOR = STYLE_TITLE_SELECTOR
+    NEXT_PAGE_SELECTOR = NEXT_PAGE_SELECTOR
+
+    def __init__(
+        self,
+        settings: config.Settings | None = None,
+        session: aiohttp.ClientSession | None = None,
+        rate_limiter: TokenBucket | None = None,
+        parse_executor: ParseExecutor | None = None,
+    ):
+        """
+        Args:
+            settings: 使用する設定。省略時はプロセス共有の設定を使う。
+            session: 共有セッション（ScraperPool が渡す）。渡された場合は
+                     このスクレイパーはセッションを閉じない。省略時は
+                     コンテキストマネージャの出入りで自前のセッションを作って閉じる。
+            rate_limiter: 並行取得時の送出間隔を決めるトークンバケット。ワーカー全体で
+                          揃えるために ScraperPool が共有のものを渡す。省略時は自前で持つ。
+            parse_executor: HTML の解析を預けるプール（ScraperPool が渡す）。
+                            省略時はイベントループ上でそのまま解析する。
+        """
+        self.settings = settings or config.get_settings()
+        self.headers = REQUEST_HEADERS
+        self.ssl_context = shared_ssl_context(self.settings.scraper_verify_ssl)
+
+        self.session = session
+        self._owns_session = session is None
+        self.rate_limiter = rate_limiter or create_rate_limiter(self.settings)
+        self.parser_backend = resolve_backend(self.settings.scraper_parser)
+        self.parse_executor = parse_executor
 
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(
-            headers=self.headers, connector=aiohttp.TCPConnector(ssl=self.ssl_context)
-        )
+        if self._owns_session:
+            self.session = create_session(self.settings)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
+        if self._owns_session and self.session:
             await self.session.close()
 
+    def _page_url(self, base_url: str, encoded_keyword: str, page: int) -> str:
+        url = f"{base_url}?keyword={encoded_keyword}"
+        if page > 1:
+            url += f"&pn={page}"
+        return url
+
+    @staticmethod
+    def _page_timeout(deadline: Deadline | None) -> float:
+        """1 ページの待ち時間。締め切りがあれば、Gemini の分を残した残り時間までに縮める。
+
+        Raises:
+            TimeoutError: スクレイピングに使える時間が残っていない（ページの取得失敗として扱う）
+        """
+        if deadline is None:
+            return config.SCRAPER_PAGE_TIMEOUT
+        remaining = deadline.remaining(config.DEADLINE_GENERATION_RESERVE_SECONDS)
+        if remaining <= 0:
+            raise TimeoutError('締め切りまでにスクレイピングに使える時間が残っていません')
+        return min(config.SCRAPER_PAGE_TIMEOUT, remaining)
+
+    async def _fetch_html(self, url: str, timeout: float = config.SCRAPER_PAGE_TIMEOUT) -> str:
+        async with self.session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            # エラーチェック
+            response.raise_for_status()
+
+            # レスポンスの詳細をログに記録
+            logger.debug(
+                f"HTTPステータス: {response.status}, コンテンツタイプ: {response.headers.get('Content-Type')}"
+            )
+
+            return await response.text()
+
+    async def _parse_page(self, html_text: str, page: int) -> ParsedPage:
+        """検索結果ページからタイトルと次ページの有無を取り出す。"""
+        with span(HTML_PARSE):
+            if self.parse_executor is None:
+                result = parse_search_page(html_text, self.parser_backend)
+            else:
+                result = await self.parse_executor.parse(html_text, self.parser_backend)
+
+        logger.info(f"スタイルアイテム数: {len(result.titles)}")
+
+        if not result.titles:
+            logger.warning(f"ページ {page}: スタイルアイテムが見つかりませんでした")
+            # HTMLの一部をログに記録して、セレクタがマッチしない理由を調査
+            logger.debug(f"HTML の先頭部分: {html_text[:500]}")
+            return ParsedPage([], False)
+
+        for title_text in result.titles:
+            logger.debug(f"見つかったタイトル: {title_text}")
+
+        logger.info(f"ページ {page}: {len(result.titles)} 件のタイトルを取得")
+
+        # すべてのタイトルを記録
+        for i, title in enumerate(result.titles):
+            logger.info(f"タイトル {i + 1}: {title}")
+
+        return result
+
+    async def _scrape_page(
+        self, url: str, page: int, deadline: Deadline | None = None
+    ) -> ParsedPage:
+        timeout = self._page_timeout(deadline)
+        logger.info(f"ページ {page} をスクレイピング中: {url}")
+        with SCRAPE_PAGE_SECONDS.time():
+            html_text = await self._fetch_html(url, timeout)
+            result = await self._parse_page(html_text, page)
+        report_stage(PAGE_SCRAPED, page=page, titles=len(result.titles))
+        return result
+
+    @timed(SCRAPE)
     async def scrape_titles_async(
-        self, keyword: str, gender: str = 'ladies', max_pages: int = None
+        self,
+        keyword: str,
+        gender: str = 'ladies',
+        max_pages: int = None,
+        deadline: Deadline | None = None,
+        outcome: ScrapeOutcome | None = None,
     ) -> list[str]:
-        """指定されたキーワードでヘアスタイルのタイトルを非同期で取得する"""
+        """指定されたキーワードでヘアスタイルのタイトルを非同期で取得する
+
+        SCRAPING_CONCURRENCY が 2 以上なら、1 ページ目の後に 2 ページ目以降を
+        並行に取得する（_scrape_concurrently）。1 なら従来どおり 1 ページずつ取得する。
+        どちらの経路でもタイトルはページ順に連結し、最初の空ページで打ち切る。
+
+        deadline を渡すと、Gemini の 1 回分（DEADLINE_GENERATION_RESERVE_SECONDS）を残して
+        打ち切る。2 ページ目以降は取得済みの分で続け、1 ページ目が間に合わなければ
+        DeadlineExceededError を送出する。
+
+        outcome を渡すと、途中で打ち切ったかどうかをそこへ書き込む
+        （キャッシュする側が、一部だけの結果を保持しないために使う）。
+        """
         if max_pages is None:
             max_pages = self.settings.max_pages
 
-        titles = []
-
         # 性別に応じたURLを選択
         base_url = config.MENS_URL if gender == 'mens' else config.LADIES_URL
-        encoded_keyword = quote(keyword)
+        page_urls = {
+            page: self._page_url(base_url, quote(keyword), page) for page in range(1, max_pages + 1)
+        }
 
         logger.info(f"非同期スクレイピング開始: キーワード '{keyword}', 性別 '{gender}'")
 
         try:
-            for page in range(1, max_pages + 1):
-                try:
-                    # ページURLの構築
-                    url = f"{base_url}?keyword={encoded_keyword}"
-                    if page > 1:
-                        url += f"&pn={page}"
-
-                    logger.info(f"ページ {page} をスクレイピング中: {url}")
-
-                    # 非同期HTTPリクエスト
-                    async with self.session.get(
-                        url, timeout=aiohttp.ClientTimeout(total=10)
-                    ) as response:
-                        # エラーチェック
-                        response.raise_for_status()
-
-                        # レスポンスの詳細をログに記録
-                        logger.debug(
-                            f"HTTPステータス: {response.status}, コンテンツタイプ: {response.headers.get('Content-Type')}"
-                        )
-
-                        # テキストを非同期で取得
-                        html_text = await response.text()
-
-                        # HTMLの解析
-                        soup = BeautifulSoup(html_text, 'html.parser')
-                        style_items = soup.select(self.STYLE_TITLE_SELECTOR)
-
-                        logger.info(f"スタイルアイテム数: {len(style_items)}")
-
-                        if len(style_items) == 0:
-                            logger.warning(f"ページ {page}: スタイルアイテムが見つかりませんでした")
-                            # HTMLの部分をログに記録して、セレクタがマッチしない理由を調査
-                            logger.debug(
-                                f"HTML構造の一部: {soup.select('#jsiHoverAlphaLayerScope')}"
-                            )
-                            break
-
-                        # キーワードを含むタイトルをフィルタリング
-                        page_titles = []
-                        for item in style_items:
-                            title_text = item.get_text(strip=True)
-                            logger.debug(f"見つかったタイトル: {title_text}")
-                            page_titles.append(title_text)
-
-                        titles.extend(page_titles)
-                        logger.info(f"ページ {page}: {len(page_titles)} 件のタイトルを取得")
-
-                        # すべてのタイトルを記録
-                        for i, title in enumerate(page_titles):
-                            logger.info(f"タイトル {i + 1}: {title}")
-
-                        # 次のページの有無をチェック
-                        next_button = soup.select_one(self.NEXT_PAGE_SELECTOR)
-                        if not next_button:
-                            logger.info(
-                                "次のページボタンが見つかりません。スクレイピングを終了します"
-                            )
-                            break
-
-                        # レート制限対策の待機（asyncioの非同期待機を使用）
-                        await asyncio.sleep(
-                            random.uniform(
-                                self.settings.scraping_delay_min, self.settings.scraping_delay_max
-                            )
-                        )
-
-                # ClientTimeout(total=...) の超過は asyncio.TimeoutError（= 組み込みの
-                # TimeoutError）で、aiohttp.ClientError のサブクラスではない。
-                # 「サイトが遅い」は最も起きやすい失敗なので、必ず両方を捕捉する。
-                except (TimeoutError, aiohttp.ClientError) as e:
-                    # 1ページ目で失敗した場合は取得結果ゼロ件と区別できないため、
-                    # 「該当なし」に化けないようエラーとして送出する。
-                    # 2ページ目以降は既に有効なデータがあるので、取得済み分で続行する。
-                    if page == 1:
-                        logger.error(f"1ページ目の取得に失敗しました: {str(e)}")
-                        raise ScrapingError() from e
-
-                    logger.warning(
-                        f"ページ {page} の取得中にエラーが発生: {str(e)} "
-                        f"- 取得済みの {len(titles)} 件で続行します"
-                    )
-                    break
+            if self.settings.scraping_concurrency > 1 and max_pages > 1:
+                titles, truncated = await self._scrape_concurrently(page_urls, deadline)
+            else:
+                titles, truncated = await self._scrape_sequentially(page_urls, deadline)
+            if outcome is not None:
+                outcome.truncated = truncated
 
             # 重複を除去して元の順序を維持
             unique_titles = list(dict.fromkeys(titles))
@@ -180,3 +271,119 @@ class HotPepperScraper:
         except Exception as e:
             logger.error(f"スクレイピング中に予期せぬエラーが発生: {str(e)}")
             raise
+
+    async def _scrape_first_page(self, url: str, deadline: Deadline | None) -> ParsedPage:
+        """1 ページ目を取得する。失敗は ScrapingError（締め切りのためなら DeadlineExceededError）にする。"""
+        try:
+            return await self._scrape_page(url, 1, deadline)
+        # ClientTimeout(total=...) の超過は asyncio.TimeoutError（= 組み込みの
+        # TimeoutError）で、aiohttp.ClientError のサブクラスではない。
+        # 「サイトが遅い」は最も起きやすい失敗なので、必ず両方を捕捉する。
+        except PAGE_ERRORS as e:
+            # 1ページ目で失敗した場合は取得結果ゼロ件と区別できないため、
+            # 「該当なし」に化けないようエラーとして送出する。
+            if deadline is not None:
+                deadline.check('scrape', config.DEADLINE_GENERATION_RESERVE_SECONDS)
+            logger.error(f"1ページ目の取得に失敗しました: {str(e)}")
+            raise ScrapingError() from e
+
+    async def _scrape_sequentially(
+        self, page_urls: dict[int, str], deadline: Deadline | None
+    ) -> tuple[list[str], bool]:
+        """1 ページずつ取得し、ページ間でランダムな秒数だけ待つ。(タイトル, 途中で打ち切ったか) を返す。"""
+        titles: list[str] = []
+        last_page = max(page_urls)
+
+        for page, url in page_urls.items():
+            if page == 1:
+                result = await self._scrape_first_page(url, deadline)
+            else:
+                try:
+                    result = await self._scrape_page(url, page, deadline)
+                except PAGE_ERRORS as e:
+                    # 2ページ目以降は既に有効なデータがあるので、取得済み分で続行する。
+                    logger.warning(
+                        f"ページ {page} の取得中にエラーが発生: {str(e)} "
+                        f"- 取得済みの {len(titles)} 件で続行します"
+                    )
+                    return titles, True
+
+            titles.extend(result.titles)
+            if not result.titles:
+                break
+            if not result.has_next:
+                logger.info("次のページボタンが見つかりません。スクレイピングを終了します")
+                break
+
+            # レート制限対策の待機（asyncioの非同期待機を使用）。
+            # 最終ページの後は次の取得が無いので待たない。
+            if page < last_page:
+                delay = random.uniform(
+                    self.settings.scraping_delay_min, self.settings.scraping_delay_max
+                )
+                if (
+                    deadline is not None
+                    and deadline.remaining(config.DEADLINE_GENERATION_RESERVE_SECONDS) <= delay
+                ):
+                    logger.warning(
+                        f"締め切りが近いため、取得済みの {len(titles)} 件でスクレイピングを終了します"
+                    )
+                    return titles, True
+                await asyncio.sleep(delay)
+
+        return titles, False
+
+    async def _scrape_concurrently(
+        self, page_urls: dict[int, str], deadline: Deadline | None
+    ) -> tuple[list[str], bool]:
+        """1 ページ目の後、残りのページを並行に取得する。(タイトル, 途中で打ち切ったか) を返す。
+
+        同時取得数は SCRAPING_CONCURRENCY、送出間隔はトークンバケット
+        （SCRAPING_RATE / SCRAPING_BURST）で抑える。結果はページ順に連結し、
+        空ページ・取得失敗・次ページボタンの無いページのいずれかで打ち切る。
+        打ち切った時点でまだ終わっていないページの取得は取り消す
+        （セマフォ待ちのページはトークンを取らず、サイトへも送らない）。
+        """
+        await self.rate_limiter.acquire()
+        first = await self._scrape_first_page(page_urls[1], deadline)
+        titles = list(first.titles)
+        if not first.titles or not first.has_next:
+            if first.titles:
+                logger.info("次のページボタンが見つかりません。スクレイピングを終了します")
+            return titles, False
+
+        semaphore = asyncio.Semaphore(self.settings.scraping_concurrency)
+
+        async def fetch(page: int) -> ParsedPage:
+            async with semaphore:
+                await self.rate_limiter.acquire()
+                return await self._scrape_page(page_urls[page], page, deadline)
+
+        tasks = {page: asyncio.create_task(fetch(page)) for page in page_urls if page > 1}
+        truncated = False
+        try:
+            for page, task in tasks.items():
+                try:
+                    result = await task
+                except PAGE_ERRORS as e:
+                    logger.warning(
+                        f"ページ {page} の取得中にエラーが発生: {str(e)} "
+                        f"- 取得済みの {len(titles)} 件で続行します"
+                    )
+                    truncated = True
+                    break
+
+                titles.extend(result.titles)
+                if not result.titles:
+                    break
+                if not result.has_next:
+                    logger.info("次のページボタンが見つかりません。スクレイピングを終了します")
+                    break
+        finally:
+            pending = [task for task in tasks.values() if not task.done()]
+            for task in pending:
+                task.cancel()
+            # 取り消したタスクの後始末を待ち、例外を「取得されなかった」ままにしない
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        return titles, truncated
@@ -10,6 +10,7 @@ import logging
 from collections.abc import Sequence
 
 from . import config
+from .timing import SEASONS, timed
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +49,12 @@ def _pick_separator(title: str, rotation_index: int) -> tuple[str, int]:
     return separator, rotation_index
 
 
+def _separator_length() -> int:
+    # 区切り記号は全て1文字だが、将来増えても破綻しないよう最長で見積もる
+    return max(len(s) for s in config.SEASON_APPEND_SEPARATORS + config.SEASON_APPEND_DELIMITERS)
+
+
+@timed(SEASONS)
 def apply_season_keywords(templates: list[dict[str, str]], seasons: Sequence[str]) -> list[str]:
     """選択された季節・カラーキーワードをタイトルへ付加する（テンプレートを直接書き換える）
 
@@ -75,10 +82,7 @@ def apply_season_keywords(templates: list[dict[str, str]], seasons: Sequence[str
     seasons = list(dict.fromkeys(seasons))
 
     title_limit = config.CHAR_LIMITS['title']
-    # 区切り記号は全て1文字だが、将来増えても破綻しないよう最長で見積もる
-    separator_length = max(
-        len(s) for s in config.SEASON_APPEND_SEPARATORS + config.SEASON_APPEND_DELIMITERS
-    )
+    separator_length = _separator_length()
     keywords = {key: config.SEASON_COLOR_CHOICES[key] for key in seasons}
     counts = {key: 0 for key in seasons}
     priority = {key: i for i, key in enumerate(seasons)}
@@ -136,3 +140,82 @@ def apply_season_keywords(templates: list[dict[str, str]], seasons: Sequence[str
             f"選択された季節・カラーのうち付加先が見つからなかったものがあります: {unapplied}"
         )
     return unapplied
+
+
+class SeasonApplier:
+    """テンプレートが 1 件ずつ届くときの季節・カラー付加（ストリーミング生成用）。
+
+    apply_season_keywords は全件を見てから「キーワードごとに収まる中で最も長いタイトル」を
+    選ぶが、ストリーミングでは届いた順にタイトルを確定させて送り出す必要がある。
+    ここでは届いた 1 件ごとに、付加件数が最少のキーワードのうち収まるものを付ける。
+    上限文字数を超えない・均等に配分する・区切り記号の選び方は apply_season_keywords と同じ。
+    """
+
+    def __init__(self, seasons: Sequence[str] | None):
+        self.seasons = list(dict.fromkeys(seasons or ()))
+        self._keywords = {key: config.SEASON_COLOR_CHOICES[key] for key in self.seasons}
+        self._counts = dict.fromkeys(self.seasons, 0)
+        self._priority = {key: i for i, key in enumerate(self.seasons)}
+        # いずれかのタイトルに（付加・元から問わず）含まれたキーワード
+        self._present: set[str] = set()
+        self._rotation_index = 0
+        self._separator_length = _separator_length()
+
+    def apply(self, template: dict[str, str]) -> None:
+        """1 件のタイトルに付加できるキーワードがあれば付ける（テンプレートを直接書き換える）。"""
+        if not self.seasons:
+            return
+
+        title = template.get('title', '')
+        if len(title) < config.SEASON_APPEND_THRESHOLD:
+            title_limit = config.CHAR_LIMITS['title']
+            for key in sorted(self.seasons, key=lambda k: (self._counts[k], self._priority[k])):
+                keyword = self._keywords[key]
+                if keyword in title:
+                    continue
+                if len(title) + self._separator_length + len(keyword) > title_limit:
+                    continue
+                separator, self._rotation_index = _pick_separator(title, self._rotation_index)
+                template['title'] = f"{title}{separator}{keyword}"
+                self._counts[key] += 1
+                break
+
+        for key, keyword in self._keywords.items():
+            if keyword in template.get('title', ''):
+                self._present.add(key)
+
+    def unapplied(self) -> list[str]:
+        """どのタイトルにも含まれなかったキーワードのキー。全件を流し終えてから呼ぶ。"""
+        if not self.seasons:
+            return []
+        logger.info(
+            f"季節・カラーキーワードを {sum(self._counts.values())} 件のタイトルに付加しました: "
+            f"{self._counts}"
+        )
+        unapplied = [key for key in self.seasons if key not in self._present]
+        if unapplied:
+            logger.warning(
+                f"選択された季節・カラーのうち付加先が見つからなかったものがあります: {unapplied}"
+            )
+        return unapplied
+
+
+def reapply_season_keywords(
+    templates: list[dict[str, str]], seasons: Sequence[str], streaming: bool
+) -> list[str]:
+    """付加前のテンプレートに、生成時と同じ方式で季節・カラーを付加し直す（直接書き換える）。
+
+    ストリーミング生成は届いた順に SeasonApplier で、一括の生成は apply_season_keywords で
+    付加する。生成結果のキャッシュから付加し直すときも同じ方式を使わないと、同じリクエストでも
+    キャッシュの有無で付加先のタイトルや未付与のキーワードが変わってしまう。
+    templates は生成時に届いた順に並んでいること。
+
+    Returns:
+        apply_season_keywords と同じ、どのタイトルにも含まれなかったキーワードのキー
+    """
+    if not streaming:
+        return apply_season_keywords(templates, seasons)
+    applier = SeasonApplier(seasons)
+    for template in templates:
+        applier.apply(template)
+    return applier.unapplied()
@@ -2,8 +2,13 @@
 
 性別による絞り込みと、公開フィールドへの投影を行う。
 Flask に依存しないので、アプリケーションコンテキストなしでテストできる。
+
+一覧は読み込んだデータと性別だけで決まるので、リポジトリは読み込み時に
+性別ごとの応答本文（FeaturedKeywordsPayload）を作っておき、リクエストではそれを返す。
 """
 
+import hashlib
+import json
 import logging
 from dataclasses import dataclass
 from typing import TYPE_CHECKING
@@ -33,6 +38,32 @@ class FeaturedKeywordsView:
     message: str | None = None
 
 
+@dataclass(frozen=True)
+class FeaturedKeywordsPayload:
+    """/api/featured-keywords の応答本文（JSON のバイト列）と、その強い ETag。"""
+
+    body: bytes
+    # 本文のハッシュ。引用符は含まない（付けるのは Response.set_etag）
+    etag: str
+
+
+def render_payload(view: FeaturedKeywordsView) -> FeaturedKeywordsPayload:
+    """一覧を応答本文にする。同じ内容からは常に同じバイト列と ETag になる。"""
+    body = json.dumps(
+        {
+            'success': True,
+            'keywords': view.keywords,
+            # 降格時のみ文言が入る。フロントエンドは常にこのキーを読む。
+            'message': view.message,
+        },
+        ensure_ascii=False,
+        separators=(',', ':'),
+    ).encode('utf-8')
+    return FeaturedKeywordsPayload(
+        body=body, etag=hashlib.blake2b(body, digest_size=16).hexdigest()
+    )
+
+
 def _degraded_message(last_error: Exception | None) -> str:
     """降格時にユーザーへ出す文言を決める。
 
@@ -94,3 +125,19 @@ def list_featured_keywords(
 
     logger.info(f'特集キーワード: 全 {len(all_keywords)} 件中 {len(keywords)} 件 (対象: {gender})')
     return FeaturedKeywordsView(keywords=keywords)
+
+
+def get_featured_keywords_payload(
+    repository: 'FeaturedKeywordRepository', gender: str
+) -> FeaturedKeywordsPayload:
+    """指定された性別の一覧の応答本文を返す。
+
+    Raises:
+        FeaturedKeywordsError: リポジトリからの取得自体に失敗した場合
+    """
+    try:
+        return repository.get_payload(gender)
+    except FeaturedKeywordsError:
+        raise
+    except Exception as e:
+        raise FeaturedKeywordsError() from e
@@ -2,11 +2,16 @@
 
 「特集キーワードなのか、通常キーワードなのか、その混在なのか」を判定する。
 I/O を持たない純粋なロジックなので、Flask コンテキストなしでテストできる。
+
+特集キーワードはリポジトリの find_featured_keywords で入力全体から探す
+（区切り文字なしで書かれた「ダークパープルボブ」のような入力にも一致する）。
+一致した部分を除いた残りに語があれば、通常キーワードとの混在とみなす。
 """
 
 import logging
+from collections.abc import Mapping
 from dataclasses import dataclass
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 from .. import config
 
@@ -14,6 +19,7 @@ if TYPE_CHECKING:
     # 実行時に import すると flask 依存が入り、このモジュールの
     # 「Flask コンテキスト不要」という性質が壊れる。
     from ..featured_keywords import FeaturedKeywordRepository
+    from ..keyword_matcher import KeywordMatch
 
 logger = logging.getLogger(__name__)
 
@@ -42,7 +48,8 @@ class KeywordAnalysis:
     keyword_type: str
     processing_mode: str
     is_featured: bool
-    featured_info: dict | None = None
+    # リポジトリが返す読み取り専用の情報をそのまま持つ（複製しない）
+    featured_info: Mapping | None = None
 
     def to_generation_context(self) -> dict:
         """TemplateGenerator に渡すコンテキスト情報。"""
@@ -57,14 +64,25 @@ class KeywordAnalysis:
 def split_keywords(keyword: str) -> list[str]:
     """複合キーワードを個々のキーワードに分割する。
 
-    最初に見つかった区切り文字1種類だけで分割する（既存挙動を維持）。
+    config.KEYWORD_SEPARATORS のどの区切り文字でも分割し、空の語は除く。
     """
     for separator in config.KEYWORD_SEPARATORS:
-        if separator in keyword:
-            parts = [kw.strip() for kw in keyword.split(separator) if kw.strip()]
-            logger.info(f'複数キーワードを検出しました: {parts}')
-            return parts
-    return [keyword]
+        keyword = keyword.replace(separator, ' ')
+    parts = keyword.split()
+    if len(parts) > 1:
+        logger.info(f'複数キーワードを検出しました: {parts}')
+    return parts
+
+
+def _remove_matches(keyword: str, matches: list['KeywordMatch[Mapping[str, Any]]']) -> str:
+    """特集キーワードに一致した部分を区切り文字に置き換えた残り。"""
+    pieces = []
+    cursor = 0
+    for match in matches:
+        pieces.append(keyword[cursor : match.start])
+        cursor = match.end
+    pieces.append(keyword[cursor:])
+    return ' '.join(pieces)
 
 
 def _standard(original: str, normalized: str) -> KeywordAnalysis:
@@ -105,22 +123,18 @@ def analyze_keyword(
             return _standard(original, normalized)
 
         featured_found = []
-        normal_found = []
-
-        for kw in split_keywords(normalized):
-            kw = kw.strip()
-            if not kw:
-                continue
-
-            kw_info = repository.get_keyword_info(kw)
-            if kw_info:
-                featured_found.append({'keyword': kw, 'info': kw_info})
-                logger.info(
-                    f'特集キーワードを検出: "{kw}" -> "{kw_info["name"]}" (性別: {kw_info["gender"]})'
-                )
-            else:
-                normal_found.append(kw)
-                logger.debug(f'通常キーワード: "{kw}"')
+        matches = repository.find_featured_keywords(normalized)
+        for match in matches:
+            kw = normalized[match.start : match.end]
+            kw_info = match.value
+            featured_found.append({'keyword': kw, 'info': kw_info})
+            logger.info(
+                f'特集キーワードを検出: "{kw}" -> "{kw_info["name"]}" (性別: {kw_info["gender"]})'
+            )
+
+        normal_found = split_keywords(_remove_matches(normalized, matches))
+        for kw in normal_found:
+            logger.debug(f'通常キーワード: "{kw}"')
 
         if not featured_found and not normal_found:
             logger.warning(f'有効なキーワードが見つかりませんでした: "{normalized}"')
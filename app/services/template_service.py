@@ -4,14 +4,21 @@
 スクレイパーとジェネレーターを順に呼び出し、結果にメタデータを付けて返す。
 """
 
+import copy
+import dataclasses
 import logging
+from collections.abc import Callable
 from dataclasses import dataclass
 from typing import TYPE_CHECKING
 
-from ..config import DEFAULT_MODEL
+from ..config import DEFAULT_MODEL, MAX_TEMPLATES
 from ..errors import NoResultsError
-from ..generator import TemplateGenerator
+from ..generator import TemplateGenerator, resolve_model_name
+from ..prompts import compatible_title_length_profiles, title_length_profile
 from ..scraping import HotPepperScraper
+from ..seasons import reapply_season_keywords
+from ..stages import KEYWORD_ANALYZED, TITLES_READY, recording, report_stage
+from ..timing import ANALYZE, CACHE, span
 from .keyword_analysis import (
     MODE_FEATURED,
     KeywordAnalysis,
@@ -19,7 +26,12 @@ from .keyword_analysis import (
 )
 
 if TYPE_CHECKING:
+    from ..deadline import Deadline
     from ..featured_keywords import FeaturedKeywordRepository
+    from ..generator_registry import GeneratorRegistry
+    from ..outcome_cache import OutcomeCache
+    from ..scraper_pool import ScraperPool
+    from ..single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +53,28 @@ class GenerationOutcome:
     featured_info: dict | None
     # どのタイトルにも含まれなかった季節・カラーのキー（'spring' など）
     unapplied_seasons: tuple[str, ...] = ()
+    # 生成結果のキャッシュから返したときの、格納からの経過秒数（生成したてなら None）
+    cache_age: float | None = None
+
+
+def outcome_to_json(outcome: GenerationOutcome) -> dict:
+    """共有キャッシュ（JSON）に書く形。cache_age は取り出すときに決まるので含めない。"""
+    return {
+        'templates': outcome.templates,
+        'is_featured': outcome.is_featured,
+        'featured_info': outcome.featured_info,
+        'unapplied_seasons': list(outcome.unapplied_seasons),
+    }
+
+
+def outcome_from_json(data: dict) -> GenerationOutcome:
+    """outcome_to_json の逆変換。"""
+    return GenerationOutcome(
+        templates=list(data['templates']),
+        is_featured=bool(data['is_featured']),
+        featured_info=data['featured_info'],
+        unapplied_seasons=tuple(data['unapplied_seasons']),
+    )
 
 
 def _log_scraped_titles(titles: list[str]) -> None:
@@ -66,42 +100,231 @@ def _attach_metadata(templates: list[dict], analysis: KeywordAnalysis) -> None:
             template['featured_keyword_name'] = featured_name
 
 
+async def _scrape_titles(
+    keyword: str, gender: str, scraper_pool: 'ScraperPool | None', deadline: 'Deadline | None'
+) -> list[str]:
+    """プールがあればキャッシュと共有セッションを通して、無ければ使い捨てのスクレイパーで取得する。"""
+    if scraper_pool is not None:
+        return await scraper_pool.scrape_titles(keyword, gender, deadline)
+    async with HotPepperScraper() as scraper:
+        return await scraper.scrape_titles_async(keyword, gender, deadline=deadline)
+
+
+def request_key(
+    keyword: str,
+    gender: str,
+    seasons: list[str] | None,
+    model: str,
+    featured_version: str,
+    streaming: bool = False,
+) -> tuple:
+    """同じ生成結果になるリクエストを同一視するためのキー。
+
+    seasons は正規化済み（定義順・重複なし）であることを前提にする。
+    featured_version は特集キーワードの版（FeaturedKeywordRepository.get_version）。
+    特集の条件はプロンプトに入るので、再読み込みで内容が変われば別のキーになる。
+    streaming はストリーミング生成か。季節・カラーの付加の方式が違うので
+    （reapply_season_keywords）、付加済みの結果は一括の生成と分けて持つ。
+    """
+    return (keyword.strip(), gender, tuple(seasons or ()), model, featured_version, streaming)
+
+
+def season_free_key(
+    keyword: str, gender: str, profile: tuple, model: str, featured_version: str
+) -> tuple:
+    """季節・カラーを付加する前の生成結果のキー。
+
+    プロンプトのうち季節・カラーに依存するのは短尺タイトル枠（prompts.title_length_profile）
+    だけなので、選択そのものではなく枠で同一視する。featured_version は request_key と同じ。
+    """
+    return ('season_free', keyword.strip(), gender, profile, model, featured_version)
+
+
+async def _cached_outcome(
+    keyword: str,
+    gender: str,
+    seasons: list[str] | None,
+    model: str,
+    featured_version: str,
+    streaming: bool,
+    outcome_cache: 'OutcomeCache[GenerationOutcome]',
+) -> GenerationOutcome | None:
+    """キャッシュから返せる生成結果。無ければ None。
+
+    同じリクエストの結果が無くても、季節・カラーの選択だけが違うリクエストの付加前の結果が
+    あり、その短尺タイトル枠でこの選択の付加先が足りるなら、複製に付加し直して返す。
+    付加前の結果は一括・ストリーミングで共有し、付加し直しは生成時と同じ方式で行う。
+    """
+    selected = seasons or []
+    cached = await outcome_cache.lookup(
+        request_key(keyword, gender, seasons, model, featured_version, streaming),
+        [
+            season_free_key(keyword, gender, profile, model, featured_version)
+            for profile in compatible_title_length_profiles(selected)
+        ],
+    )
+    if cached is None:
+        return None
+    if not cached.reused:
+        return dataclasses.replace(cached.value, cache_age=cached.age)
+
+    unapplied = reapply_season_keywords(cached.value.templates, selected, streaming)
+    logger.info(f'付加前の生成結果に季節・カラー {selected} を付加し直しました')
+    return dataclasses.replace(
+        cached.value, unapplied_seasons=tuple(unapplied), cache_age=cached.age
+    )
+
+
 async def generate_templates_for_request(
     keyword: str,
     gender: str,
     repository: 'FeaturedKeywordRepository',
     seasons: list[str] | None = None,
     model: str = DEFAULT_MODEL,
+    scraper_pool: 'ScraperPool | None' = None,
+    single_flight: 'SingleFlight | None' = None,
+    generators: 'GeneratorRegistry | None' = None,
+    on_template: Callable[[dict], None] | None = None,
+    on_stage: Callable[[dict], None] | None = None,
+    outcome_cache: 'OutcomeCache[GenerationOutcome] | None' = None,
+    regenerate: bool = False,
+    deadline: 'Deadline | None' = None,
 ) -> GenerationOutcome:
     """スクレイピングとテンプレート生成を実行する。
 
+    処理段階（app/stages.py）の到達は常に記録し、終わったら段階ごとの所要時間をログに残す。
+    呼び出し側が app.timing.timing() で集計していれば、キャッシュ・解析・スクレイピング・
+    Gemini などのスパンがそこへ加わる。
+
     Args:
         keyword: 検索キーワード
         gender: 'ladies' または 'mens'
         repository: 特集キーワードのリポジトリ
         seasons: 正規化済みの季節・カラー選択
         model: 使用する Gemini モデル
+        scraper_pool: ワーカー共有のスクレイパープール（タイトルのキャッシュを含む）。
+                      省略時はキャッシュせず、リクエスト単位のセッションでスクレイピングする
+        single_flight: 渡されると、同じ内容のリクエストが実行中ならその結果に相乗りする
+                       （スクレイピングと Gemini 呼び出しを 1 回にまとめる）
+        generators: ワーカー共有の生成器の置き場。省略時はリクエストごとに生成器
+                    （Gemini クライアント）を作る
+        on_template: 渡されると Gemini の出力をストリーミングで受け、テンプレートが
+                     1 件確定するたびに（メタデータを付けて）呼ぶ。この場合は single_flight を
+                     使わない（相乗りした側には途中経過を届けられないため）
+        on_stage: 渡されると、処理段階に到達するたびに記録（段階名・経過ミリ秒・時刻など）を
+                  渡して呼ぶ
+        outcome_cache: 渡されると、同じ内容のリクエストの生成結果が TTL 内に残っていれば
+                       スクレイピングも生成もせずにその複製を返す（cache_age に経過秒数が入る）。
+                       季節・カラーだけが違うリクエストの結果からは、付加だけをやり直して返す
+                       （_cached_outcome）。on_template があれば、テンプレートを順に渡してから返す。
+                       保持するのは有効なテンプレートが MAX_TEMPLATES 件そろった結果だけ
+        regenerate: True ならキャッシュを読まずに生成し、その結果でキャッシュを置き換える
+        deadline: リクエストの締め切り（app/deadline.py）。スクレイピングと Gemini の呼び出しは
+                  その残り時間で動く。single_flight で相乗りしたリクエストは、先に始めた
+                  リクエストの締め切りで打ち切られる（後から来たものより早いので超えることはない）
 
     Raises:
         NoResultsError: キーワードに一致するヘアスタイルが 1 件も無い場合
+        DeadlineExceededError: 締め切りまでに終わらなかった場合
     """
+
+    # キーは実際に使うモデル名で作る（サポート外の名前ごとに別のエントリにしない）
+    model = resolve_model_name(model)
+    featured_version = repository.get_version()
+    streaming = on_template is not None
+    key = request_key(keyword, gender, seasons, model, featured_version, streaming)
+    use_cache = outcome_cache is not None and outcome_cache.enabled
+    if use_cache:
+        if regenerate:
+            outcome_cache.record_bypass()
+            outcome = None
+        else:
+            with span(CACHE):
+                outcome = await _cached_outcome(
+                    keyword, gender, seasons, model, featured_version, streaming, outcome_cache
+                )
+        if outcome is not None:
+            logger.info(
+                f'生成結果をキャッシュから返します: キーワード: "{keyword}", 性別: "{gender}", '
+                f'季節・カラー選択: {seasons}, モデル: "{model}", 経過 {outcome.cache_age:.0f} 秒'
+            )
+            if on_template is not None:
+                for template in outcome.templates:
+                    on_template(template)
+            return outcome
+
+    async def run() -> GenerationOutcome:
+        raw_templates = [] if use_cache else None
+        with recording(on_stage):
+            outcome = await _generate(
+                keyword,
+                gender,
+                repository,
+                seasons,
+                model,
+                scraper_pool,
+                generators,
+                on_template,
+                raw_templates,
+                deadline,
+            )
+        if use_cache and len(outcome.templates) < MAX_TEMPLATES:
+            # 締め切り・出力上限で途中までしか届かなかったストリームや、検証で件数が減った
+            # 結果を TTL の間ずっと返さないよう、どちらのキーにも保持しない
+            logger.info(
+                f'有効なテンプレートが {len(outcome.templates)} 件（要求 {MAX_TEMPLATES} 件）の'
+                f'ため、生成結果をキャッシュしません'
+            )
+        elif use_cache:
+            with span(CACHE):
+                await outcome_cache.store(key, outcome)
+                if raw_templates:
+                    profile = title_length_profile(seasons or [])
+                    await outcome_cache.store(
+                        season_free_key(keyword, gender, profile, model, featured_version),
+                        dataclasses.replace(outcome, templates=raw_templates, unapplied_seasons=()),
+                    )
+        return outcome
+
+    if single_flight is None or on_template is not None:
+        return await run()
+    # テンプレートは dict のリストなので、相乗りしたリクエストには複製を渡す
+    return await single_flight.run(key, run, copy=copy.deepcopy)
+
+
+async def _generate(
+    keyword: str,
+    gender: str,
+    repository: 'FeaturedKeywordRepository',
+    seasons: list[str] | None,
+    model: str,
+    scraper_pool: 'ScraperPool | None',
+    generators: 'GeneratorRegistry | None',
+    on_template: Callable[[dict], None] | None = None,
+    raw_templates: list[dict] | None = None,
+    deadline: 'Deadline | None' = None,
+) -> GenerationOutcome:
     logger.info(
         f'非同期処理開始: キーワード: "{keyword}", 性別: "{gender}", '
         f'季節・カラー選択: {seasons}, モデル: "{model}"'
     )
 
-    analysis = analyze_keyword(keyword, gender, repository)
+    with span(ANALYZE):
+        analysis = analyze_keyword(keyword, gender, repository)
     logger.info(
         f'キーワード処理結果: タイプ={analysis.keyword_type}, '
         f'モード={analysis.processing_mode}, 特集対応={analysis.is_featured}'
     )
     if analysis.processing_mode == MODE_FEATURED:
         logger.info(f'特集情報: {analysis.featured_info["name"]}')
+    report_stage(
+        KEYWORD_ANALYZED, keyword_type=analysis.keyword_type, is_featured=analysis.is_featured
+    )
 
-    async with HotPepperScraper() as scraper:
-        logger.info(f'スクレイピング開始: キーワード: "{keyword}", 性別: "{gender}"')
-        titles = await scraper.scrape_titles_async(keyword, gender)
-        logger.info(f'スクレイピング結果: {len(titles)} 件のタイトルを取得')
+    logger.info(f'スクレイピング開始: キーワード: "{keyword}", 性別: "{gender}"')
+    titles = await _scrape_titles(keyword, gender, scraper_pool, deadline)
+    logger.info(f'スクレイピング結果: {len(titles)} 件のタイトルを取得')
+    report_stage(TITLES_READY, titles=len(titles))
 
     if not titles:
         # 「該当なし」はドメイン上の結果であってエラーではないが、
@@ -116,15 +339,28 @@ async def generate_templates_for_request(
         f'モデル: "{model}", 特集対応: {analysis.is_featured}, '
         f'処理モード: {analysis.processing_mode}'
     )
-    generator = TemplateGenerator(model_name=model)
-    templates, trending_keywords, unapplied_seasons = await generator.generate_templates_async(
-        titles,
-        keyword,
-        seasons=seasons,
-        gender=gender,
-        featured_info=analysis.featured_info,
-        generation_context=analysis.to_generation_context(),
-    )
+    generator = generators.get(model) if generators else TemplateGenerator(model_name=model)
+    generate_kwargs = {
+        'seasons': seasons,
+        'gender': gender,
+        'featured_info': analysis.featured_info,
+        'generation_context': analysis.to_generation_context(),
+        'raw_templates': raw_templates,
+        'deadline': deadline,
+    }
+    if on_template is None:
+        templates, trending_keywords, unapplied_seasons = await generator.generate_templates_async(
+            titles, keyword, **generate_kwargs
+        )
+    else:
+
+        def emit(template: dict) -> None:
+            _attach_metadata([template], analysis)
+            on_template(template)
+
+        templates, trending_keywords, unapplied_seasons = await generator.generate_templates_stream(
+            titles, keyword, emit, **generate_kwargs
+        )
 
     logger.info(f'テンプレート生成成功 - {len(templates)}件のテンプレートを生成')
     if trending_keywords:
@@ -134,10 +370,13 @@ async def generate_templates_for_request(
         )
 
     _attach_metadata(templates, analysis)
+    if raw_templates:
+        _attach_metadata(raw_templates, analysis)
 
     return GenerationOutcome(
         templates=templates,
         is_featured=analysis.is_featured,
-        featured_info=analysis.featured_info,
+        # single_flight が相乗り先へ deepcopy で渡すため、読み取り専用の Mapping は dict にしておく
+        featured_info=dict(analysis.featured_info) if analysis.featured_info else None,
         unapplied_seasons=tuple(unapplied_seasons),
     )
@@ -0,0 +1,182 @@
+"""ワーカー間で共有するキャッシュ（SQLite の WAL モード）。
+
+gunicorn は 2 ワーカーで動くため、ワーカー内の TTLCache（app/cache.py）だけでは
+同じキーワードでも振り分け先のワーカーごとにスクレイピングが走る。
+SharedCache は CACHE_DIR 配下の SQLite ファイルを両ワーカーから読み書きする 2 段目のキャッシュ。
+
+- WAL モードなので読み取りは書き込みを待たない（書き込み同士だけが busy_timeout まで待つ）
+- 値は区切りの空白を削った JSON を zlib で圧縮して保存する
+- 期限（expires_at）を過ぎた行は読まない。書き込みのたびに期限切れを消し、
+  上限件数を超えた分は古い書き込みから捨てる
+
+接続はスレッドごとに持つ（1 つの接続を複数スレッドから同時に使わないため）。
+呼び出しはブロッキングなので、イベントループからは asyncio.to_thread で呼ぶこと。
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import Callable, Hashable
+from pathlib import Path
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Flask の app.extensions に登録する際のキー
+EXTENSION_KEY = 'shared_cache'
+
+# 他ワーカーの書き込みを待つ上限（ミリ秒）。超えたらキャッシュ無しとして扱う
+BUSY_TIMEOUT_MS = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_stored_at ON cache (stored_at);
+"""
+
+
+def encode_value(value: object) -> bytes:
+    return zlib.compress(
+        json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    )
+
+
+def decode_value(blob: bytes) -> object:
+    return json.loads(zlib.decompress(blob))
+
+
+def make_key(namespace: str, parts: Hashable) -> str:
+    """名前空間つきのキー文字列。parts は JSON にできるタプルなど。"""
+    return f'{namespace}:{json.dumps(parts, ensure_ascii=False, separators=(",", ":"))}'
+
+
+class SharedCache:
+    """SQLite ファイルに保存する、プロセス間で共有できるキャッシュ。"""
+
+    def __init__(
+        self,
+        path: Path,
+        max_entries: int = 2048,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            path: SQLite ファイルのパス（親ディレクトリは初回使用時に作る）
+            max_entries: 保持する件数の上限
+            clock: 現在時刻（秒）を返す関数。プロセス間で比べるので壁時計を使う
+        """
+        self.path = Path(path)
+        self.max_entries = max(1, max_entries)
+        self._clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # close() で全スレッドの接続を閉じるために覚えておく
+        self._connections: list[sqlite3.Connection] = []
+        self._counts = dict.fromkeys(('hits', 'misses', 'writes', 'errors'), 0)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path,
+                timeout=BUSY_TIMEOUT_MS / 1000,
+                isolation_level=None,
+                # close() だけは別スレッドから呼ぶ
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            # WAL では NORMAL でも壊れない（電源断で直近の書き込みが失われ得るだけ）
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(_SCHEMA)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    def get(self, key: str) -> object | None:
+        """期限内の値を返す。無い・期限切れ・読めないときは None。"""
+        try:
+            row = (
+                self._connection()
+                .execute(
+                    'SELECT value FROM cache WHERE key = ? AND expires_at > ?',
+                    (key, self._clock()),
+                )
+                .fetchone()
+            )
+            value = None if row is None else decode_value(row[0])
+        except (sqlite3.Error, OSError, ValueError, zlib.error) as e:
+            # 共有キャッシュは速度のためのもの。壊れていても本来の処理は続ける
+            self._count('errors')
+            logger.warning(f'共有キャッシュの読み取りに失敗しました: {e}')
+            return None
+
+        self._count('misses' if value is None else 'hits')
+        return value
+
+    def put(self, key: str, value: object, ttl: float) -> None:
+        """値を保存する。期限切れの行と、上限件数を超えた古い行はここで消す。"""
+        if ttl <= 0:
+            return
+        now = self._clock()
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute('BEGIN IMMEDIATE')
+                connection.execute(
+                    'INSERT OR REPLACE INTO cache (key, value, stored_at, expires_at) '
+                    'VALUES (?, ?, ?, ?)',
+                    (key, encode_value(value), now, now + ttl),
+                )
+                connection.execute('DELETE FROM cache WHERE expires_at <= ?', (now,))
+                connection.execute(
+                    'DELETE FROM cache WHERE key IN '
+                    '(SELECT key FROM cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)',
+                    (self.max_entries,),
+                )
+        except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+            self._count('errors')
+            logger.warning(f'共有キャッシュへの書き込みに失敗しました: {e}')
+            return
+        self._count('writes')
+
+    def clear(self) -> None:
+        try:
+            self._connection().execute('DELETE FROM cache')
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f'共有キャッシュの削除に失敗しました: {e}')
+
+    def stats(self) -> dict:
+        """このプロセスから見た共有キャッシュの計測値。"""
+        with self._lock:
+            return dict(self._counts)
+
+    def close(self) -> None:
+        """すべての接続を閉じる。冪等。次に使われれば接続し直す。"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        # threading.local ごと作り直し、どのスレッドも次に使うときに接続し直すようにする
+        self._local = threading.local()
+
+
+def get_shared_cache() -> SharedCache | None:
+    """現在のアプリに紐づく共有キャッシュ。無効化されていれば None。
+
+    サービス層はこれを直接呼ばず、引数で受け取ること。
+    """
+    return current_app.extensions.get(EXTENSION_KEY)
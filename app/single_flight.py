@@ -0,0 +1,116 @@
+"""同じ内容の処理が同時に走っているとき、後から来た呼び出しを先行の結果に相乗りさせる。
+
+特集キャンペーンの告知直後などは、同じキーワード・性別・季節の生成リクエストが
+ほぼ同時に複数届き、それぞれがスクレイピングと Gemini 呼び出しを行っていた。
+SingleFlight はキーごとに最初の呼び出し（リーダー）だけに処理をさせ、
+実行中に届いた同じキーの呼び出しはその結果を待つ。
+
+結果は concurrent.futures.Future で受け渡す。asyncio.wrap_future はループをまたいで
+待てるので、開発サーバーのようにリクエストごとに別スレッドのループで動く経路でも相乗りできる。
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from collections.abc import Awaitable, Callable, Hashable
+from typing import TypeVar
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Flask の app.extensions に登録する際のキー
+EXTENSION_KEY = 'single_flight'
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """キーごとに実行中の処理を 1 つにまとめる。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: dict[Hashable, concurrent.futures.Future] = {}
+        # 実行中の処理（参照を持たないと GC で消えることがある）
+        self._tasks: set[asyncio.Task] = set()
+        self._leaders = 0
+        self._coalesced = 0
+
+    async def run(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[T]],
+        copy: Callable[[T], T] | None = None,
+    ) -> T:
+        """key の処理が実行中ならその結果を待ち、無ければ fn() を実行する。
+
+        処理はリーダーのリクエストから切り離したタスクで動かすので、リーダーが
+        切断・キャンセルされても相乗りした呼び出しは結果を受け取れる。
+        例外は相乗りした呼び出しすべてに送出する。処理が終わればキーは外れ、
+        次の呼び出しからは改めて実行する（結果を保持するキャッシュではない）。
+
+        Args:
+            key: 処理の同一性を表すキー
+            fn: 処理のコルーチンを返す関数（リーダーのときだけ呼ぶ）
+            copy: 相乗りした呼び出しへ渡す前に結果を複製する関数。結果が変更可能な
+                  オブジェクトで、呼び出し元ごとに書き換えられる可能性がある場合に渡す
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = concurrent.futures.Future()
+                self._leaders += 1
+            else:
+                self._coalesced += 1
+
+        if leader:
+            task = asyncio.create_task(self._lead(key, fn, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._forget)
+            return await asyncio.shield(task)
+
+        logger.info('同じ内容のリクエストが実行中のため、その結果を待ちます')
+        result = await asyncio.wrap_future(future)
+        return copy(result) if copy is not None else result
+
+    async def _lead(self, key: Hashable, fn: Callable[[], Awaitable[T]], future) -> T:
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _forget(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        # リーダーがキャンセル済みだと誰も例外を受け取らないので、ここで回収して
+        # 「Task exception was never retrieved」を出さない（相乗り側には送出済み）
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        """相乗りの計測値のスナップショット。"""
+        with self._lock:
+            return {
+                'in_flight': len(self._in_flight),
+                'leaders': self._leaders,
+                'coalesced': self._coalesced,
+            }
+
+
+def get_single_flight() -> SingleFlight:
+    """現在のアプリに紐づく SingleFlight を返す。
+
+    サービス層はこれを直接呼ばず、引数で受け取ること。
+    """
+    return current_app.extensions[EXTENSION_KEY]
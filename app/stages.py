@@ -0,0 +1,101 @@
+"""生成パイプラインの処理段階（ステージ）の到達を記録し、呼び出し元へ知らせる。
+
+1 リクエストの処理（キーワード解析 → スクレイピング → プロンプト組み立て → Gemini → 検証）の
+どこに何秒かかっているかを、ログと SSE の stage イベントの両方で追えるようにする。
+
+記録先はコンテキスト変数で持つ。スクレイパーや生成器は report_stage() を呼ぶだけでよく、
+記録先を引数で受け渡す必要はない（記録中でなければ何もしない）。
+"""
+
+import contextvars
+import logging
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 段階の名前。フロントエンド（app/static/js/progress.js）の表示と対応する
+KEYWORD_ANALYZED = 'keyword_analyzed'
+PAGE_SCRAPED = 'page_scraped'
+TITLES_READY = 'titles_ready'
+PROMPT_BUILT = 'prompt_built'
+GEMINI_FIRST_BYTE = 'gemini_first_byte'
+GEMINI_DONE = 'gemini_done'
+VALIDATION_DONE = 'validation_done'
+
+_current: contextvars.ContextVar['StageRecorder | None'] = contextvars.ContextVar(
+    'stage_recorder', default=None
+)
+
+
+class StageRecorder:
+    """1 リクエスト分の段階の到達時刻を記録する。"""
+
+    def __init__(
+        self,
+        on_stage: Callable[[dict], None] | None = None,
+        clock: Callable[[], float] = time.perf_counter,
+        wall_clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            on_stage: 段階に到達するたびに、記録した内容（下記 record の戻り値）を渡す関数
+            clock: 経過時間の計測に使う単調時計
+            wall_clock: 到達時刻（UNIX 時間の秒）を返す関数
+        """
+        self._on_stage = on_stage
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._started = clock()
+        self.stages: list[dict] = []
+
+    def record(self, name: str, **detail) -> dict:
+        """段階の到達を記録する。
+
+        Returns:
+            {'stage': 名前, 'elapsed_ms': 開始からの経過ミリ秒, 'at': UNIX 時間, **detail}
+        """
+        stage = {
+            'stage': name,
+            'elapsed_ms': round((self._clock() - self._started) * 1000, 1),
+            'at': round(self._wall_clock(), 3),
+            **detail,
+        }
+        self.stages.append(stage)
+        if self._on_stage is not None:
+            try:
+                self._on_stage(stage)
+            except Exception as e:
+                # 通知先の不具合で生成を止めない
+                logger.warning(f'処理段階の通知に失敗しました: {e}')
+        return stage
+
+    def summary(self) -> str:
+        """段階ごとの所要時間（直前の段階からの差分）を 1 行にまとめる。"""
+        parts = []
+        previous = 0.0
+        for stage in self.stages:
+            parts.append(f'{stage["stage"]}=+{stage["elapsed_ms"] - previous:.0f}ms')
+            previous = stage['elapsed_ms']
+        return f'{", ".join(parts)} (合計 {previous:.0f}ms)'
+
+
+@contextmanager
+def recording(on_stage: Callable[[dict], None] | None = None) -> Iterator[StageRecorder]:
+    """このブロックの中で report_stage() された段階を記録し、抜けるときにログへ残す。"""
+    recorder = StageRecorder(on_stage)
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+        if recorder.stages:
+            logger.info(f'処理段階の所要時間: {recorder.summary()}')
+
+
+def report_stage(name: str, **detail) -> None:
+    """記録中なら段階の到達を記録する。記録中でなければ何もしない。"""
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.record(name, **detail)
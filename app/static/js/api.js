@@ -27,13 +27,56 @@ export class ApiError extends Error {
     }
 }
 
+/** fetch 自体の失敗（タイムアウト・通信断）を ApiError にする */
+function toRequestError(error) {
+    if (error.name === 'AbortError') {
+        return new ApiError('リクエストがタイムアウトしました', 'timeout');
+    }
+    if (error.name === 'TypeError') {
+        return new ApiError('ネットワークエラーが発生しました', 'network');
+    }
+    return new ApiError(error.message, 'app');
+}
+
 /**
- * JSON API を呼び出す。
+ * JSON の応答本文を読んで判定する。
  *
  * 非 2xx でも body を読んでから判定する。以前は body を読む前に throw していたため、
  * サーバーが返すエラーコード（NO_RESULTS_FOUND 等）に応じた案内が
  * 一度もユーザーに表示されていなかった。
  */
+async function readJsonResponse(response) {
+    // 非 2xx でも body を読む。サーバーは {success:false, error:{message, code}} を返す。
+    let data = null;
+    try {
+        data = await response.json();
+    } catch {
+        data = null;
+    }
+
+    const message = data?.error?.message || data?.message;
+    const code = data?.error?.code || null;
+
+    if (!response.ok) {
+        throw new ApiError(
+            message || `サーバーエラー (${response.status})`,
+            'server',
+            { status: response.status, code },
+        );
+    }
+
+    if (data && data.success === false) {
+        throw new ApiError(message || '不明なエラーが発生しました。', 'app', { code });
+    }
+
+    if (!data || typeof data !== 'object') {
+        throw new ApiError('無効なレスポンス形式です', 'app');
+    }
+
+    return data;
+}
+
+/** JSON API を呼び出す。 */
 export async function requestJson(
     url,
     { method = 'GET', body = null, timeoutMs = DEFAULT_TIMEOUT_MS } = {},
@@ -53,45 +96,104 @@ export async function requestJson(
             body: body ? JSON.stringify(body) : undefined,
         });
     } catch (error) {
-        if (error.name === 'AbortError') {
-            throw new ApiError('リクエストがタイムアウトしました', 'timeout');
-        }
-        if (error.name === 'TypeError') {
-            throw new ApiError('ネットワークエラーが発生しました', 'network');
-        }
-        throw new ApiError(error.message, 'app');
+        throw toRequestError(error);
     } finally {
         clearTimeout(timer);
     }
 
-    // 非 2xx でも body を読む。サーバーは {success:false, error:{message, code}} を返す。
-    let data = null;
-    try {
-        data = await response.json();
-    } catch {
-        data = null;
+    return readJsonResponse(response);
+}
+
+/** SSE の 1 フレーム（空行区切りの 1 ブロック）を {event, data} にする。コメント行だけなら null */
+function parseEventFrame(frame) {
+    let event = 'message';
+    const dataLines = [];
+    for (const line of frame.split('\n')) {
+        if (line.startsWith('event: ')) {
+            event = line.slice('event: '.length);
+        } else if (line.startsWith('data: ')) {
+            dataLines.push(line.slice('data: '.length));
+        }
     }
+    if (dataLines.length === 0) return null;
+    return { event, data: JSON.parse(dataLines.join('\n')) };
+}
 
-    const message = data?.error?.message || data?.message;
-    const code = data?.error?.code || null;
+/**
+ * Server-Sent Events で応答する API を POST で呼び出す。
+ *
+ * EventSource は GET しか送れないため、fetch の本文ストリームを読んで自前で区切る。
+ * done イベントの本文を返し、それ以外のイベントは届くたびに onEvent(event, data) を呼ぶ。
+ * error イベントは requestJson と同じ ApiError として送出する。
+ * 入力エラーなどストリーム開始前の失敗は通常の JSON 応答で返るので、そのまま判定する。
+ * timeoutMs はストリームを読み終えるまで全体の上限。
+ */
+export async function requestEventStream(
+    url,
+    { method = 'POST', body = null, timeoutMs = DEFAULT_TIMEOUT_MS, onEvent = () => {} } = {},
+) {
+    const controller = new AbortController();
+    const timer = setTimeout(() => controller.abort(), timeoutMs);
 
-    if (!response.ok) {
-        throw new ApiError(
-            message || `サーバーエラー (${response.status})`,
-            'server',
-            { status: response.status, code },
-        );
-    }
+    try {
+        let response;
+        try {
+            response = await fetch(url, {
+                method,
+                signal: controller.signal,
+                headers: {
+                    'Accept': 'text/event-stream',
+                    'Content-Type': 'application/json',
+                },
+                body: body ? JSON.stringify(body) : undefined,
+            });
+        } catch (error) {
+            throw toRequestError(error);
+        }
 
-    if (data && data.success === false) {
-        throw new ApiError(message || '不明なエラーが発生しました。', 'app', { code });
-    }
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!response.ok || !contentType.startsWith('text/event-stream')) {
+            return await readJsonResponse(response);
+        }
 
-    if (!data || typeof data !== 'object') {
-        throw new ApiError('無効なレスポンス形式です', 'app');
-    }
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        for (;;) {
+            let chunk;
+            try {
+                chunk = await reader.read();
+            } catch (error) {
+                throw toRequestError(error);
+            }
+            if (chunk.done) break;
 
-    return data;
+            buffer += chunk.value;
+            let boundary = buffer.indexOf('\n\n');
+            while (boundary >= 0) {
+                const frame = parseEventFrame(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                boundary = buffer.indexOf('\n\n');
+                if (!frame) continue;
+
+                if (frame.event === 'error') {
+                    throw new ApiError(
+                        frame.data?.error?.message || '不明なエラーが発生しました。',
+                        'server',
+                        { status: frame.data?.status ?? null, code: frame.data?.error?.code || null },
+                    );
+                }
+                if (frame.event === 'done') {
+                    reader.cancel();
+                    return frame.data;
+                }
+                onEvent(frame.event, frame.data);
+            }
+        }
+        // done も error も来ないまま接続が切れた
+        throw new ApiError('ネットワークエラーが発生しました', 'network');
+    } finally {
+        clearTimeout(timer);
+    }
 }
 
 /**
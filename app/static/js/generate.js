@@ -1,14 +1,16 @@
 // 「生成」ボタンのフロー。
+//
+// /api/generate を SSE で呼び、テンプレートが 1 件確定するたびにカードを描き足す。
+// 全 20 件がそろうまで待たせないため、最初のカードは数秒で表示される。
+// 進捗バーはサーバーが送る処理段階（stage イベント）で進める。
 
-import { ApiError, TIMEOUT_GENERATE_MS, requestJson } from './api.js';
+import { ApiError, TIMEOUT_GENERATE_MS, requestEventStream } from './api.js';
 import { el, getSelectedGender, getSelectedSeasons } from './dom.js';
-import {
-    completeProgress, resetProgress, startProgressSimulation, stopProgressSimulation,
-} from './progress.js';
+import { applyStage, completeProgress, resetProgress, setTemplateProgress } from './progress.js';
 import { hideError, hideLoading, hideResults, showError, showLoading, showResults } from './status.js';
 import { showToast } from './toast.js';
 import { updateMensNotice, updateSeasonUnappliedNotice } from './form-controls.js';
-import { displayTemplates } from './template-list.js';
+import { appendTemplate, resetTemplates } from './template-list.js';
 import {
     clearSelection, getSelectedKeyword, showFeaturedErrorFallbackNotification,
 } from './featured-keywords.js';
@@ -28,7 +30,7 @@ function notifySuccess(data) {
     if (data.is_featured && featuredName) {
         showToast({
             title: '特集対応テンプレート生成完了！',
-            message: `「${featuredName}」の特集テンプレート ${data.templates.length}件を生成しました`,
+            message: `「${featuredName}」の特集テンプレート ${data.count}件を生成しました`,
             icon: 'fa-star',
             variant: 'featured',
             duration: 4000,
@@ -75,31 +77,46 @@ async function generate() {
     hideError();
     hideResults();
     resetProgress();
-    startProgressSimulation();
 
     el.generateBtn.disabled = true;
     el.generateBtn.innerHTML = BUTTON_BUSY_HTML;
 
+    resetTemplates();
+    let received = 0;
+
+    /** テンプレートが 1 件届くたびに呼ばれる。最初の 1 件で結果セクションを出す */
+    function onTemplate(template) {
+        received += 1;
+        appendTemplate(template);
+        setTemplateProgress(received);
+        if (received === 1) {
+            showResults();
+            el.results.scrollIntoView({ behavior: 'smooth', block: 'start' });
+        }
+    }
+
     try {
         // model は送らない。UI にモデル選択が無く、サーバー側にデフォルトがあるため。
-        const data = await requestJson('/api/generate', {
+        const data = await requestEventStream('/api/generate', {
             method: 'POST',
             body: { keyword, gender, seasons },
             timeoutMs: TIMEOUT_GENERATE_MS,
+            onEvent: (event, payload) => {
+                if (event === 'stage') applyStage(payload);
+                if (event === 'template') onTemplate(payload);
+            },
         });
 
         completeProgress();
         notifySuccess(data);
         updateMensNotice(gender);
         updateSeasonUnappliedNotice(data.unapplied_season_keywords);
-        displayTemplates(data.templates);
         showResults();
-        el.results.scrollIntoView({ behavior: 'smooth', block: 'start' });
     } catch (error) {
         console.error('テンプレート生成中にエラー:', error);
 
-        // エラー時はシミュレーションのみ停止（一瞬「100% 完了」と見える不具合を回避）
-        stopProgressSimulation();
+        // 途中まで届いたカードは残す（打ち切られた分だけが欠ける）
+        if (received === 0) hideResults();
 
         if (error instanceof ApiError) {
             handleApiError(error);
@@ -114,7 +131,6 @@ async function generate() {
         hideLoading();
         el.generateBtn.disabled = false;
         el.generateBtn.innerHTML = BUTTON_IDLE_HTML;
-        stopProgressSimulation();
     }
 }
 
@@ -1,26 +1,39 @@
-// 生成中のプログレスバー（疑似進捗）。
+// 生成中のプログレスバー。
 //
-// 実測平均 25 秒の生成処理に合わせ、3 ステップ (合計 24 秒) + creep フェーズで構成。
-// 100% は API 応答時にのみ completeProgress() で設定する。
+// サーバーが SSE で送る処理段階（stage イベント。app/stages.py）と、届いたテンプレートの
+// 件数だけで進める。以前はタイマーで 7 秒 / 3 秒 / 14 秒ごとに進める疑似進捗で、
+// 実際の処理とは無関係に動いていた。
+// 100% は done イベント受信時にのみ completeProgress() で設定する。
 
 import { el } from './dom.js';
 
-const STEPS = [
-    { name: 'スクレイピング中...', percent: 25, duration: 7000 },
-    { name: 'トレンド分析中...', percent: 35, duration: 3000 },
-    { name: 'テンプレート生成中...', percent: 90, duration: 14000 },
-];
+// ステップインジケーター（index.html の .step-indicator）の並び
+const STEP_SCRAPING = 0;
+const STEP_ANALYSIS = 1;
+const STEP_GENERATION = 2;
+
+// 段階ごとの表示。percent はその段階に到達した時点の値
+const STAGES = {
+    keyword_analyzed: { step: STEP_SCRAPING, percent: 5, label: 'スクレイピング中...' },
+    titles_ready: { step: STEP_ANALYSIS, percent: 30, label: 'トレンド分析中...' },
+    prompt_built: { step: STEP_ANALYSIS, percent: 35, label: 'Gemini に送信しました...' },
+    gemini_first_byte: { step: STEP_GENERATION, percent: 40, label: 'テンプレート生成中...' },
+    gemini_done: { step: STEP_GENERATION, percent: 95, label: 'テンプレートを検証中...' },
+    validation_done: { step: STEP_GENERATION, percent: 99, label: '仕上げ中...' },
+};
 
-const SUB_ANIMATION_TICK_MS = 100;
-const CREEP_TICK_MS = 1200;
-const CREEP_CEILING = 99;
+// スクレイピング中の 1 ページあたりの進み幅と、その上限（titles_ready の手前）
+const PAGE_PERCENT = 8;
+const SCRAPING_CEILING = 29;
+// テンプレートの到着で埋める範囲（gemini_first_byte 〜 gemini_done）
+const TEMPLATE_PERCENT_START = 40;
+const TEMPLATE_PERCENT_END = 95;
+// #loading の data-expected-templates が読めないときの生成件数（config.MAX_TEMPLATES）
+const DEFAULT_EXPECTED_TEMPLATES = 20;
 
 const state = {
-    currentStep: 0,
+    currentStep: STEP_SCRAPING,
     currentPercent: 0,
-    stepTimer: null,
-    subInterval: null,
-    creepInterval: null,
 };
 
 function updateProgressUI(percent, stepName) {
@@ -46,83 +59,54 @@ function updateStepIndicators() {
     });
 }
 
-/** ステップ内で進捗を滑らかに進める */
-function startSubProgressAnimation(stepIndex) {
-    const currentStep = STEPS[stepIndex];
-    const startPercent = stepIndex > 0 ? STEPS[stepIndex - 1].percent : 0;
-    const endPercent = currentStep.percent;
-    const stepSize = (endPercent - startPercent) / (currentStep.duration / SUB_ANIMATION_TICK_MS);
-
-    state.currentPercent = startPercent;
-
-    clearInterval(state.subInterval);
-    state.subInterval = setInterval(() => {
-        state.currentPercent = Math.min(state.currentPercent + stepSize, endPercent);
-        updateProgressUI(Math.floor(state.currentPercent), currentStep.name);
-
-        if (state.currentPercent >= endPercent) {
-            clearInterval(state.subInterval);
-            state.subInterval = null;
-        }
-    }, SUB_ANIMATION_TICK_MS);
-}
-
-/** 上限に達した後、API 応答待ちの間 99% へ漸近させる */
-function startCreepPhase() {
-    clearInterval(state.subInterval);
-    state.subInterval = null;
-    clearInterval(state.creepInterval);
-
-    state.creepInterval = setInterval(() => {
-        const remaining = CREEP_CEILING - state.currentPercent;
-        if (remaining <= 0.1) return;
-        state.currentPercent += remaining * 0.10;
-        updateProgressUI(Math.floor(state.currentPercent), 'テンプレート生成中...');
-    }, CREEP_TICK_MS);
-}
-
-function moveToNextStep() {
-    state.currentStep = Math.min(state.currentStep + 1, STEPS.length - 1);
+/** 進捗を進める。イベントの到着順が前後しても後戻りはさせない */
+function advance(step, percent, label) {
+    state.currentStep = Math.max(state.currentStep, step);
+    state.currentPercent = Math.max(state.currentPercent, Math.floor(percent));
     updateStepIndicators();
-    startSubProgressAnimation(state.currentStep);
-
-    const duration = STEPS[state.currentStep].duration;
-    const isLastStep = state.currentStep >= STEPS.length - 1;
-    // 最終ステップ完了後は creep フェーズへ移行（API 応答待ちを表現）
-    state.stepTimer = setTimeout(isLastStep ? startCreepPhase : moveToNextStep, duration);
-}
-
-export function stopProgressSimulation() {
-    clearTimeout(state.stepTimer);
-    clearInterval(state.subInterval);
-    clearInterval(state.creepInterval);
-    state.stepTimer = null;
-    state.subInterval = null;
-    state.creepInterval = null;
+    updateProgressUI(state.currentPercent, label);
 }
 
 export function resetProgress() {
-    // 残存タイマーがあれば全停止（連打や前回エラー時の状態汚染を防ぐ）
-    stopProgressSimulation();
-    state.currentStep = 0;
+    state.currentStep = STEP_SCRAPING;
     state.currentPercent = 0;
-    updateProgressUI(0, STEPS[0].name);
-
-    el.stepIndicators.forEach((indicator) => indicator.classList.remove('active', 'completed'));
-    el.stepIndicators[0]?.classList.add('active');
+    updateProgressUI(0, 'キーワードを解析中...');
+    updateStepIndicators();
 }
 
-export function startProgressSimulation() {
-    stopProgressSimulation();
+/** サーバーの stage イベント（{stage, elapsed_ms, at, ...}）を反映する */
+export function applyStage(stage) {
+    if (stage.stage === 'page_scraped') {
+        const percent = Math.min(
+            STAGES.keyword_analyzed.percent + PAGE_PERCENT * stage.page,
+            SCRAPING_CEILING,
+        );
+        advance(
+            STEP_SCRAPING,
+            percent,
+            `スクレイピング中... (${stage.page}ページ目: ${stage.titles}件)`,
+        );
+        return;
+    }
+
+    const view = STAGES[stage.stage];
+    if (!view) return; // 知らない段階は無視する（サーバーが先に増えても壊れない）
+
+    const label = stage.stage === 'titles_ready'
+        ? `トレンド分析中... (参考タイトル ${stage.titles}件)`
+        : view.label;
+    advance(view.step, view.percent, label);
+}
 
-    updateProgressUI(0, STEPS[0].name);
-    el.stepIndicators[0]?.classList.add('active');
-    startSubProgressAnimation(0);
-    state.stepTimer = setTimeout(moveToNextStep, STEPS[0].duration);
+/** 届いたテンプレートの件数で進捗を進める（ストリーミング生成） */
+export function setTemplateProgress(received) {
+    const expected = Number(el.loading.dataset.expectedTemplates) || DEFAULT_EXPECTED_TEMPLATES;
+    const ratio = Math.min(received / expected, 1);
+    const percent = TEMPLATE_PERCENT_START + (TEMPLATE_PERCENT_END - TEMPLATE_PERCENT_START) * ratio;
+    advance(STEP_GENERATION, percent, `テンプレート生成中... (${received}/${expected})`);
 }
 
 export function completeProgress() {
-    stopProgressSimulation();
     updateProgressUI(100, '完了');
     el.stepIndicators.forEach((indicator) => {
         indicator.classList.remove('active');
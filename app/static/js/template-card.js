@@ -71,14 +71,14 @@ export function autoResizeTextarea(textarea) {
     textarea.style.overflowY = textarea.scrollHeight > textarea.clientHeight ? 'auto' : 'hidden';
 }
 
-/** 表示中のすべてのカード内 textarea を返す */
-function allCardTextareas() {
-    return document.querySelectorAll('.template-card textarea');
+/** root 配下（省略時は表示中のすべて）のカード内 textarea を返す */
+function allCardTextareas(root = document) {
+    return root.querySelectorAll('.template-card textarea');
 }
 
 /** 表示中のすべての textarea を初期化する */
-export function initializeTextareas() {
-    allCardTextareas().forEach((textarea) => {
+export function initializeTextareas(root = document) {
+    allCardTextareas(root).forEach((textarea) => {
         autoResizeTextarea(textarea);
         refreshCount(textarea);
     });
@@ -119,12 +119,36 @@ export function displayTemplatesForPage(page) {
     }, RENDER_DELAY_MS);
 }
 
-export function displayTemplates(templates) {
-    state.allTemplates = templates;
-    state.totalPages = Math.ceil(templates.length / ITEMS_PER_PAGE);
+/** ストリーミング生成の開始時に一覧を空にする */
+export function resetTemplates() {
+    clearTimeout(renderTimer);
+    renderTimer = null;
+    state.allTemplates = [];
+    state.currentPage = 1;
+    state.totalPages = 1;
+    el.templateContainer.innerHTML = '';
+    el.templatesLoading.classList.remove('active');
+    updatePaginationUI();
+}
+
+/**
+ * テンプレートを 1 件追加する（ストリーミング生成で届くたびに呼ぶ）。
+ *
+ * 表示中のページに入る分だけ、そのカードを直接描き足す。ページ移動の描画予約が
+ * 残っているときは、予約側が発火時点の全件から描くので何もしない。
+ */
+export function appendTemplate(template) {
+    const index = state.allTemplates.length;
+    state.allTemplates.push(template);
+    state.totalPages = Math.ceil(state.allTemplates.length / ITEMS_PER_PAGE);
+    updatePaginationUI();
+
+    const startIndex = (state.currentPage - 1) * ITEMS_PER_PAGE;
+    if (renderTimer !== null || index < startIndex || index >= startIndex + ITEMS_PER_PAGE) return;
 
-    // ページャの更新は displayTemplatesForPage が同期で行う
-    displayTemplatesForPage(1);
+    const card = createTemplateCard(template, index, updateTemplateField);
+    el.templateContainer.appendChild(card);
+    initializeTextareas(card);
 }
 
 export function initPagination() {
@@ -0,0 +1,146 @@
+"""生成結果を Server-Sent Events（SSE）でブラウザへ送る。
+
+/api/generate は Accept: text/event-stream で呼ばれると、テンプレートを 1 件確定するたびに
+イベントとして送る（全 20 件がそろうまで待たせない）。
+
+Flask は WsgiToAsgi 経由の WSGI アプリなので、レスポンス本文は同期のイテレータでしか返せない。
+一方で生成処理は非同期で動く。EventChannel はその間をスレッド安全なキューでつなぐ:
+
+- 生成処理（プロデューサー）は run_in_background でイベントループ上のタスクとして動かし、
+  emit() でイベントを積む
+- レスポンス本文のイテレータ（WSGI 側のスレッド）はキューから取り出して送る
+
+プロデューサーは GeneratorRegistry / ScraperPool と同じく、lifespan で共有を始めた
+イベントループがあればそこで動かす（共有の接続をそのまま使える）。無ければ
+（開発サーバー・テストクライアント）このリクエスト専用のスレッドでループを回す。
+
+本番の ASGI ワーカーでは app/asgi_native.py が /api/generate を直接受け、
+EventChannel を使わずにイベントループ上のキューから送る（イベントの形は同じ）。
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import logging
+import queue
+import threading
+from collections.abc import Awaitable, Callable, Iterator
+
+from . import config
+from .error_handlers import error_response
+
+logger = logging.getLogger(__name__)
+
+MIMETYPE = 'text/event-stream'
+
+# プロキシに本文をためずに流させるためのヘッダ
+RESPONSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+}
+
+# 送るイベントが無い間、接続を保つために送るコメント行。ブラウザは無視する
+KEEPALIVE = ': keep-alive\n\n'
+
+# 反復の終わりを表す番兵
+_CLOSED = object()
+
+
+def format_event(event: str, data: object) -> str:
+    """1 件の SSE イベント。data は改行を含まない JSON 1 行にする。"""
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return f'event: {event}\ndata: {payload}\n\n'
+
+
+def error_event_data(error: BaseException) -> dict:
+    """例外を error イベントの本文にする。
+
+    形は通常のエラーレスポンス（errors.error_payload）と同じにして、
+    フロントエンドが同じ分岐で扱えるようにする。ログの出し方も error_handlers に揃える。
+    """
+    return error_response(error)[0]
+
+
+class EventChannel:
+    """イベントループ側からレスポンス本文のイテレータへイベントを渡す。"""
+
+    def __init__(self, keepalive: float = config.SSE_KEEPALIVE_SECONDS):
+        self.keepalive = keepalive
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._future: concurrent.futures.Future | None = None
+
+    def emit(self, event: str, data: object) -> None:
+        """イベントを積む。どのスレッドからでも呼べる。
+
+        data はここで JSON にするので、呼び出し後に書き換えられても送る内容は変わらない。
+        """
+        self._queue.put(format_event(event, data))
+
+    def close(self) -> None:
+        """これ以上イベントが無いことを伝える。"""
+        self._queue.put(_CLOSED)
+
+    def start(self, produce: Callable[['EventChannel'], Awaitable[None]], loop=None) -> None:
+        """produce(self) をバックグラウンドで動かす。終われば（失敗しても）チャネルを閉じる。"""
+
+        async def run() -> None:
+            try:
+                await produce(self)
+            finally:
+                self.close()
+
+        self._future = run_in_background(run, loop)
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.keepalive)
+                except queue.Empty:
+                    yield KEEPALIVE
+                    continue
+                if item is _CLOSED:
+                    return
+                yield item
+        finally:
+            # 途中で反復をやめた（クライアントが切断した）ら生成も止める
+            if self._future is not None and not self._future.done():
+                logger.info('ストリーミングの送信が打ち切られたため、生成を取り消します')
+                self._future.cancel()
+
+
+def run_in_background(
+    coro_fn: Callable[[], Awaitable[None]], loop: asyncio.AbstractEventLoop | None = None
+) -> concurrent.futures.Future:
+    """coro_fn() を loop 上のタスクとして動かす。
+
+    loop が無い（閉じている）ときは、このためだけのスレッドでループを回し、
+    処理が終われば片付けて終了する。戻り値の Future を cancel() すればタスクを取り消せる。
+    """
+    if loop is not None and not loop.is_closed():
+        return asyncio.run_coroutine_threadsafe(coro_fn(), loop)
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(
+        target=_run_until_stopped, args=(loop,), name='sse-producer', daemon=True
+    )
+    thread.start()
+    future = asyncio.run_coroutine_threadsafe(coro_fn(), loop)
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(loop.stop))
+    return future
+
+
+def _run_until_stopped(loop: asyncio.AbstractEventLoop) -> None:
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_forever()
+    finally:
+        # asyncio.run と同じ後始末（残ったタスクの取り消し、非同期ジェネレーターの終了）
+        pending = asyncio.all_tasks(loop)
+        for task in pending:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.run_until_complete(loop.shutdown_default_executor())
+        asyncio.set_event_loop(None)
+        loop.close()
@@ -7,19 +7,39 @@ I/O を持たないので API キーなしでテストできる。
 import logging
 
 from . import config
+from .metrics import TEMPLATE_REJECTIONS
 
 logger = logging.getLogger(__name__)
 
 REQUIRED_KEYS = ('title', 'menu', 'comment', 'hashtag')
 
+# 落とした理由（文字数の超過は '<キー>_too_long'）
+REJECT_MISSING_KEY = 'missing_key'
+REJECT_HASHTAG_NOT_LIST = 'hashtag_not_list'
+REJECT_TOO_FEW_HASHTAGS = 'too_few_hashtags'
+REJECT_HASHTAG_TOO_LONG = 'hashtag_too_long'
+REJECT_INVALID_VALUE = 'invalid_value'
+
 
 def validate_template(template: dict[str, str], keyword: str) -> bool:
-    """テンプレートの文字数制限チェックとキーワード含有チェック"""
+    """テンプレートの文字数制限チェックとキーワード含有チェック
+
+    落としたテンプレートは理由ごとに /metrics の TEMPLATE_REJECTIONS に数える。
+    """
+    reason = rejection_reason(template, keyword)
+    if reason is not None:
+        TEMPLATE_REJECTIONS.inc(reason=reason)
+        return False
+    return True
+
+
+def rejection_reason(template: dict[str, str], keyword: str) -> str | None:
+    """テンプレートを落とす理由（REJECT_*）。有効なら None。"""
     try:
         for key in REQUIRED_KEYS:
             if key not in template:
                 logger.warning(f"テンプレートに必須キー '{key}' がありません")
-                return False
+                return REJECT_MISSING_KEY
 
         # キーワードが含まれていなくてもテンプレートは有効とする。
         # 含有を必須にすると、言い換えや語順の入れ替えで軒並み落ちてしまう。
@@ -35,18 +55,18 @@ def validate_template(template: dict[str, str], keyword: str) -> bool:
 
             if len(template[key]) > limit:
                 logger.warning(f"{key}の文字数が制限を超えています: {len(template[key])} > {limit}")
-                return False
+                return f'{key}_too_long'
 
         if not isinstance(template['hashtag'], list):
             logger.warning(f"ハッシュタグがリスト形式ではありません: {type(template['hashtag'])}")
-            return False
+            return REJECT_HASHTAG_NOT_LIST
 
         if len(template['hashtag']) < config.HASHTAG_MIN_COUNT:
             logger.warning(
                 f"ハッシュタグの数が少なすぎます: "
                 f"{len(template['hashtag'])} < {config.HASHTAG_MIN_COUNT}"
             )
-            return False
+            return REJECT_TOO_FEW_HASHTAGS
 
         for tag in template['hashtag']:
             if len(tag) > config.CHAR_LIMITS['hashtag']:
@@ -54,11 +74,11 @@ def validate_template(template: dict[str, str], keyword: str) -> bool:
                     f"ハッシュタグが長すぎます: {tag} "
                     f"({len(tag)} > {config.CHAR_LIMITS['hashtag']})"
                 )
-                return False
+                return REJECT_HASHTAG_TOO_LONG
 
         logger.debug(f"テンプレート検証成功: '{template['title']}'")
-        return True
+        return None
     except (KeyError, AttributeError, TypeError) as e:
         # TypeError: 値が文字列以外（数値・None など）で len() に失敗するケース
         logger.error(f"テンプレート検証エラー: {str(e)}")
-        return False
+        return REJECT_INVALID_VALUE
@@ -0,0 +1,162 @@
+"""1 リクエストの処理時間の内訳（スパン）を集計する。
+
+stages.py は「どの段階にいつ到達したか」を記録するが、スクレイピング・プロンプト組み立て・
+Gemini・応答の解釈・検証・季節の付加のそれぞれに何ミリ秒かかったかは分からなかった。
+
+各処理は span('名前') で囲むか、関数を @timed('名前') で飾るだけでよい
+（集計先はコンテキスト変数で持つので引数で受け渡さない）。
+集計中でなければ span() は共有の nullcontext を返すだけなので、無効時の負荷はほぼ無い。
+同じ名前のスパンは合計する（並行取得したページの解析などは、合計が実時間を超えることがある）。
+
+集計はルート（main.py / asgi_native.py）が timing() で始め、JSON 応答では Server-Timing
+ヘッダに載せる。SSE はヘッダを先に送るのでログだけに残す。どちらの経路でも、抜けるときに
+内訳をログへ出す（extra の server_timing に dict でも載せる）。SERVER_TIMING=false で無効。
+"""
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import logging
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# スパンの名前（Server-Timing のメトリクス名になる）
+CACHE = 'cache'
+ANALYZE = 'analyze'
+SCRAPE = 'scrape'
+HTML_PARSE = 'html_parse'
+PROMPT = 'prompt'
+GEMINI_QUEUE = 'gemini_queue'
+GEMINI = 'gemini'
+PARSE = 'parse'
+VALIDATE = 'validate'
+SEASONS = 'seasons'
+TOTAL = 'total'
+
+_current: contextvars.ContextVar['Timings | None'] = contextvars.ContextVar('timings', default=None)
+
+# 集計中でないときに span() が返す、何もしないコンテキストマネージャ
+_DISABLED = contextlib.nullcontext()
+
+
+class Timings:
+    """1 リクエスト分のスパンの合計時間と回数。"""
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self._clock = clock
+        self._started = clock()
+        self._finished: float | None = None
+        # 名前 → [合計ミリ秒, 回数]（最初に記録した順）
+        self._spans: dict[str, list] = {}
+
+    def add(self, name: str, ms: float) -> None:
+        entry = self._spans.get(name)
+        if entry is None:
+            self._spans[name] = [ms, 1]
+        else:
+            entry[0] += ms
+            entry[1] += 1
+
+    def finish(self) -> None:
+        """total をここまでの時間で確定する。"""
+        self._finished = self._clock()
+
+    def elapsed_ms(self) -> float:
+        end = self._finished if self._finished is not None else self._clock()
+        return (end - self._started) * 1000
+
+    def as_dict(self) -> dict:
+        """{名前: {'ms': 合計ミリ秒, 'count': 回数}, ..., 'total': {...}}"""
+        spans = {
+            name: {'ms': round(ms, 1), 'count': count} for name, (ms, count) in self._spans.items()
+        }
+        spans[TOTAL] = {'ms': round(self.elapsed_ms(), 1), 'count': 1}
+        return spans
+
+    def header(self) -> str:
+        """Server-Timing ヘッダの値（例: 'scrape;dur=812.3, gemini;dur=20411.0, total;dur=21500.2'）。"""
+        return ', '.join(f'{name};dur={span["ms"]}' for name, span in self.as_dict().items())
+
+    def summary(self) -> str:
+        parts = [
+            f'{name}={span["ms"]:.0f}ms' + (f'×{span["count"]}' if span['count'] > 1 else '')
+            for name, span in self.as_dict().items()
+        ]
+        return ', '.join(parts)
+
+
+class _Span:
+    __slots__ = ('_timings', '_name', '_started')
+
+    def __init__(self, timings: Timings, name: str):
+        self._timings = timings
+        self._name = name
+
+    def __enter__(self) -> None:
+        self._started = self._timings._clock()
+
+    def __exit__(self, *exc) -> None:
+        self._timings.add(self._name, (self._timings._clock() - self._started) * 1000)
+
+
+def span(name: str) -> contextlib.AbstractContextManager:
+    """集計中なら、このブロックにかかった時間を name のスパンとして加える。"""
+    timings = _current.get()
+    if timings is None:
+        return _DISABLED
+    return _Span(timings, name)
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """関数（コルーチン関数も可）の呼び出しを name のスパンとして集計するデコレータ。"""
+
+    def decorate(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def record(name: str, seconds: float) -> None:
+    """集計中なら、別の方法で測った秒数を name のスパンとして加える。"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds * 1000)
+
+
+@contextmanager
+def timing(enabled: bool = True) -> Iterator[Timings | None]:
+    """このブロックの中のスパンを集計し、抜けるときに内訳をログへ残す。
+
+    enabled が False なら何も集計せず None を返す。
+    """
+    if not enabled:
+        yield None
+        return
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+        timings.finish()
+        logger.info(
+            f'処理時間の内訳: {timings.summary()}', extra={'server_timing': timings.as_dict()}
+        )
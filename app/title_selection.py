@@ -0,0 +1,123 @@
+"""プロンプトに載せる参照タイトルの選別（ほぼ同じタイトルの除去とトークン数の予算）。
+
+以前はスクレイピングしたタイトルを json.dumps(indent=2) ですべてプロンプトに載せていた。
+検索結果には同じサロンの言い回し違い（記号・空白・全角半角だけが違うもの）が多く、
+インデントと合わせて入力トークンと Gemini の待ち時間を無駄に増やしていた。
+
+select_reference_titles() は検索結果の順（＝人気順）を保ったまま、
+
+1. 記号・空白・全角半角・大文字小文字を無視して同じになるタイトルを除き
+2. 文字バイグラムの Jaccard 係数が TITLE_SIMILARITY_THRESHOLD 以上のものを近似重複として除き
+3. 推定トークン数が予算（REFERENCE_TITLE_TOKEN_BUDGET）に収まるところで打ち切る
+
+トークン数は API を呼ばずに文字の種類ごとの比率で見積もる（estimate_tokens）。
+削減量は benchmarks/bench_title_selection.py で測れる。
+"""
+
+import logging
+import unicodedata
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TitleSelection:
+    """select_reference_titles() の結果。"""
+
+    titles: list[str]
+    # 近似重複として除いた件数
+    duplicates: int
+    # 予算に収まらず落とした件数
+    over_budget: int
+    # titles をプロンプトに載せる形（format_reference_titles）にしたときの推定トークン数
+    estimated_tokens: int
+
+
+def normalize_title(title: str) -> str:
+    """重複判定用の正規化（NFKC、大文字小文字の同一視、文字と数字以外の除去）。"""
+    folded = unicodedata.normalize('NFKC', title).casefold()
+    return ''.join(ch for ch in folded if ch.isalnum())
+
+
+def _bigrams(text: str) -> frozenset[str]:
+    if len(text) < 2:
+        return frozenset((text,))
+    return frozenset(text[i : i + 2] for i in range(len(text) - 1))
+
+
+def _jaccard(a: frozenset[str], b: frozenset[str]) -> float:
+    return len(a & b) / len(a | b)
+
+
+def estimate_tokens(text: str, model: str = config.DEFAULT_MODEL) -> int:
+    """text の入力トークン数の見積もり（ASCII とそれ以外で 1 トークンあたりの文字数を変える）。"""
+    ascii_ratio, other_ratio = config.TOKEN_ESTIMATE_CHARS_PER_TOKEN.get(
+        model, config.TOKEN_ESTIMATE_CHARS_PER_TOKEN[config.DEFAULT_MODEL]
+    )
+    ascii_chars = sum(1 for ch in text if ch.isascii())
+    return round(ascii_chars / ascii_ratio + (len(text) - ascii_chars) / other_ratio)
+
+
+def format_reference_titles(titles: Sequence[str]) -> str:
+    """プロンプトに載せる形（1 行 1 タイトル。JSON の括弧・引用符・インデントを持たない）。"""
+    return '\n'.join(titles)
+
+
+def select_reference_titles(
+    titles: Sequence[str],
+    model: str = config.DEFAULT_MODEL,
+    token_budget: int = 0,
+    similarity_threshold: float = config.TITLE_SIMILARITY_THRESHOLD,
+) -> TitleSelection:
+    """参照タイトルから近似重複を除き、推定トークン数を予算に収める。
+
+    Args:
+        titles: スクレイピングしたタイトル（人気順）
+        model: トークン数を見積もるモデル
+        token_budget: 参照タイトル全体の推定トークン数の上限（0 で上限なし）。
+                      1 件目は予算を超えても残す（参照データが空にならないように）
+        similarity_threshold: これ以上似ていれば重複とみなす（1 を超えると完全一致のみ）
+    """
+    kept: list[str] = []
+    seen: set[str] = set()
+    kept_bigrams: list[frozenset[str]] = []
+    duplicates = 0
+    for title in titles:
+        # 記号だけのタイトルは正規化すると空になるので、そのままの文字列で比べる
+        key = normalize_title(title) or title.strip()
+        if not key:
+            continue
+        if key in seen:
+            duplicates += 1
+            continue
+        bigrams = _bigrams(key)
+        if similarity_threshold <= 1 and any(
+            _jaccard(bigrams, other) >= similarity_threshold for other in kept_bigrams
+        ):
+            duplicates += 1
+            continue
+        seen.add(key)
+        kept_bigrams.append(bigrams)
+        kept.append(title)
+
+    selected: list[str] = []
+    tokens = 0
+    for title in kept:
+        # 区切りの改行ぶんを 1 文字として数える
+        cost = estimate_tokens(title + '\n', model)
+        if token_budget and selected and tokens + cost > token_budget:
+            break
+        selected.append(title)
+        tokens += cost
+    over_budget = len(kept) - len(selected)
+
+    if duplicates or over_budget:
+        logger.debug(
+            f"参照タイトルを選別: {len(titles)} 件 → {len(selected)} 件"
+            f"（近似重複 {duplicates} 件、予算超過 {over_budget} 件、推定 {tokens} トークン）"
+        )
+    return TitleSelection(selected, duplicates, over_budget, tokens)
@@ -0,0 +1,367 @@
+"""Gemini のトークン使用量の台帳と集計（1 日あたりのトークン数、1 回あたりの p50 / p95）。
+
+以前は extract_result（log_usage）が prompt_token_count などを文章としてログに出すだけで、
+プロンプトをどれだけ削れば効くか、クォータがどれだけ残るかを数字で追えなかった。
+
+UsageLedger は TemplateGenerator の呼び出しごとに UsageRecord（モデル・キーワードタイプ・
+トークン数・Gemini の所要時間）を 1 件残す。
+
+- ワーカー内の直近 USAGE_LEDGER_CAPACITY 件はメモリ（リングバッファ）に持つ
+- CACHE_DIR 配下のファイルへ 1 件 1 行の短い JSON 配列で追記する。ワーカー間で同じファイルに
+  書くので、1 行を 1 回の O_APPEND で書き、USAGE_LEDGER_MAX_BYTES を超えたらロックファイルで
+  1 つに絞って <名前>.1 〜 .N へ回す（logging の RotatingFileHandler と同じ並び）
+- ファイルへの書き込み（回すときのロック待ちを含む）は専用のスレッド 1 本で順に行い、
+  record() を呼んだイベントループは待たせない。close() で書き残しを書き終える
+
+集計は summarize()。手動では `python usage_report.py`（--days N、--json）で見られる。
+"""
+
+import argparse
+import concurrent.futures
+import fcntl
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Sequence
+from dataclasses import asdict, astuple, dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+
+from flask import current_app
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# Flask の app.extensions に登録する際のキー
+EXTENSION_KEY = 'usage_ledger'
+
+
+@dataclass(frozen=True)
+class UsageRecord:
+    """Gemini の 1 回の呼び出しの使用量。"""
+
+    # UNIX 時刻（秒）
+    at: float
+    model: str
+    # keyword_analysis のキーワードタイプ（normal / featured / mixed）
+    keyword_type: str
+    # 'json'（generate_templates_async）または 'stream'（generate_templates_stream）
+    mode: str
+    prompt_tokens: int
+    output_tokens: int
+    thoughts_tokens: int
+    total_tokens: int
+    # Gemini の呼び出し（SDK の再試行を含む）にかかったミリ秒
+    latency_ms: float
+
+    @classmethod
+    def from_usage(
+        cls, usage, model: str, keyword_type: str, mode: str, latency_ms: float, at: float
+    ) -> 'UsageRecord | None':
+        """usage_metadata から作る。使用量が無ければ None。"""
+        if usage is None:
+            return None
+        counts = [
+            getattr(usage, f'{kind}_token_count', None) or 0
+            for kind in ('prompt', 'candidates', 'thoughts', 'total')
+        ]
+        if not any(counts):
+            return None
+        prompt, output, thoughts, total = (int(count) for count in counts)
+        return cls(
+            at, model, keyword_type, mode, prompt, output, thoughts, total, round(latency_ms, 1)
+        )
+
+    def to_line(self) -> str:
+        """ファイルの 1 行（キーを持たない JSON 配列。並びはフィールドの順）。"""
+        return json.dumps(astuple(self), ensure_ascii=False, separators=(',', ':')) + '\n'
+
+    @classmethod
+    def from_line(cls, line: str) -> 'UsageRecord':
+        return cls(*json.loads(line))
+
+
+class UsageLedger:
+    """使用量の台帳（ワーカー内のリングバッファと、ワーカー間で共有する追記ファイル）。"""
+
+    def __init__(
+        self,
+        path: Path | None,
+        capacity: int = config.USAGE_LEDGER_CAPACITY,
+        max_bytes: int = config.USAGE_LEDGER_MAX_BYTES,
+        backup_count: int = config.USAGE_LEDGER_BACKUP_COUNT,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            path: 追記するファイル。None ならメモリにだけ残す
+            capacity: メモリに残す件数
+            max_bytes: ファイルを回す大きさ
+            backup_count: 回した古いファイルを残す数（<path>.1 が最も新しい）
+            clock: 現在の UNIX 時刻を返す関数。テストから差し替える
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._recent: deque[UsageRecord] = deque(maxlen=capacity)
+        self._counts = dict.fromkeys(('recorded', 'rotations', 'write_failures'), 0)
+        # ファイルへ書くスレッド（最初の書き込みで作る。close() 後にまた書けば作り直す）
+        self._writer: concurrent.futures.ThreadPoolExecutor | None = None
+
+    @classmethod
+    def from_settings(cls, settings: config.Settings) -> 'UsageLedger':
+        path = settings.cache_dir / config.USAGE_LEDGER_FILENAME if settings.usage_ledger else None
+        return cls(path)
+
+    def record(
+        self, usage, model: str, keyword_type: str, mode: str, latency_ms: float
+    ) -> UsageRecord | None:
+        """Gemini の usage_metadata を 1 件残す（使用量が無ければ何もしない）。
+
+        ファイルへは書き込み用のスレッドに渡すだけで、書き終わるのを待たない。
+        書き込みに失敗しても生成は止めない（警告ログを残して数える）。
+        """
+        record = UsageRecord.from_usage(usage, model, keyword_type, mode, latency_ms, self.clock())
+        if record is None:
+            return None
+        with self._lock:
+            self._recent.append(record)
+            self._counts['recorded'] += 1
+        if self.path is not None:
+            self._get_writer().submit(self._write, record.to_line().encode())
+        return record
+
+    def _get_writer(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._lock:
+            if self._writer is None:
+                # 1 本だけにして、このワーカーの行は記録した順に書く
+                self._writer = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix='usage-ledger'
+                )
+            return self._writer
+
+    def _write(self, line: bytes) -> None:
+        try:
+            self._append(line)
+        except OSError as e:
+            with self._lock:
+                self._counts['write_failures'] += 1
+            logger.warning(f'使用量の台帳に書き込めませんでした: {e}')
+
+    def flush(self) -> None:
+        """渡し済みの書き込みが終わるまで待つ（ブロックする。イベントループからは呼ばないこと）。"""
+        with self._lock:
+            writer = self._writer
+        if writer is not None:
+            writer.submit(lambda: None).result()
+
+    def close(self) -> None:
+        """書き残しを書き終えてスレッドを止める（ブロックする）。"""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.shutdown(wait=True)
+
+    def _append(self, line: bytes) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 1 行を 1 回の write で書く。O_APPEND なら別のワーカーの行と混ざらない
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        with open(self.path.with_name(self.path.name + '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # 待っている間にほかのワーカーが回していれば何もしない
+                if not self.path.exists() or self.path.stat().st_size < self.max_bytes:
+                    return
+                for index in range(self.backup_count - 1, 0, -1):
+                    older = self._backup(index)
+                    if older.exists():
+                        os.replace(older, self._backup(index + 1))
+                if self.backup_count > 0:
+                    os.replace(self.path, self._backup(1))
+                else:
+                    self.path.unlink()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        with self._lock:
+            self._counts['rotations'] += 1
+
+    def _backup(self, index: int) -> Path:
+        return self.path.with_name(f'{self.path.name}.{index}')
+
+    def recent(self) -> list[UsageRecord]:
+        """このワーカーの直近の記録（古い順）。"""
+        with self._lock:
+            return list(self._recent)
+
+    def read(self, since: float | None = None) -> list[UsageRecord]:
+        """ファイルに残っている全ワーカーの記録（古い順）。since 以降（UNIX 時刻）に絞れる。
+
+        ファイルに残さない設定（path が None）なら、このワーカーのメモリの記録を返す。
+        ファイルを読む前に、このインスタンスの書き残しを書き終える（ブロックする）。
+        """
+        if self.path is None:
+            records = self.recent()
+        else:
+            self.flush()
+            paths = [self._backup(i) for i in range(self.backup_count, 0, -1)] + [self.path]
+            records = [record for path in paths for record in _read_lines(path)]
+        if since is not None:
+            records = [record for record in records if record.at >= since]
+        return records
+
+    def stats(self) -> dict:
+        """台帳の計測値のスナップショット。"""
+        with self._lock:
+            return {'recent': len(self._recent), **self._counts}
+
+
+def _read_lines(path: Path) -> list[UsageRecord]:
+    try:
+        text = path.read_text(encoding='utf-8')
+    except FileNotFoundError:
+        return []
+    records = []
+    for line in text.splitlines():
+        try:
+            records.append(UsageRecord.from_line(line))
+        except (TypeError, ValueError):
+            # 書きかけの行や、フィールドを変える前の行。読み飛ばす
+            continue
+    return records
+
+
+# --- 集計 ---
+
+
+@dataclass(frozen=True)
+class TokenSummary:
+    """記録の集まりのトークン数の要約。"""
+
+    requests: int
+    prompt_tokens: int
+    output_tokens: int
+    total_tokens: int
+    # 1 回あたりの total_tokens
+    p50_tokens: int | None
+    p95_tokens: int | None
+    avg_latency_ms: float | None
+
+    @classmethod
+    def of(cls, records: Sequence[UsageRecord]) -> 'TokenSummary':
+        totals = sorted(record.total_tokens for record in records)
+        latency = sum(record.latency_ms for record in records)
+        return cls(
+            requests=len(records),
+            prompt_tokens=sum(record.prompt_tokens for record in records),
+            output_tokens=sum(record.output_tokens for record in records),
+            total_tokens=sum(totals),
+            p50_tokens=percentile(totals, 50),
+            p95_tokens=percentile(totals, 95),
+            avg_latency_ms=round(latency / len(records), 1) if records else None,
+        )
+
+
+@dataclass(frozen=True)
+class UsageReport:
+    """summarize() の結果。日付は UTC。"""
+
+    overall: TokenSummary
+    by_day: dict[str, TokenSummary]
+    by_model: dict[str, TokenSummary]
+    by_keyword_type: dict[str, TokenSummary]
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def lines(self) -> list[str]:
+        """人が読むための表示（CLI 用）。"""
+
+        def line(label: str, summary: TokenSummary) -> str:
+            return (
+                f'{label}: {summary.requests} 回, 合計 {summary.total_tokens} トークン '
+                f'(prompt {summary.prompt_tokens} / output {summary.output_tokens}), '
+                f'1 回あたり p50 {summary.p50_tokens} / p95 {summary.p95_tokens}'
+            )
+
+        lines = [line('全体', self.overall), '', '日ごと（UTC）:']
+        lines += [f'  {line(day, summary)}' for day, summary in self.by_day.items()]
+        lines += ['', 'モデルごと:']
+        lines += [f'  {line(model, summary)}' for model, summary in self.by_model.items()]
+        lines += ['', 'キーワードタイプごと:']
+        lines += [f'  {line(kind, summary)}' for kind, summary in self.by_keyword_type.items()]
+        return lines
+
+
+def summarize(records: Iterable[UsageRecord]) -> UsageReport:
+    """記録を全体・日ごと（UTC）・モデルごと・キーワードタイプごとに集計する。"""
+    records = list(records)
+    by_day: dict[str, list[UsageRecord]] = {}
+    by_model: dict[str, list[UsageRecord]] = {}
+    by_keyword_type: dict[str, list[UsageRecord]] = {}
+    for record in records:
+        day = datetime.fromtimestamp(record.at, UTC).date().isoformat()
+        by_day.setdefault(day, []).append(record)
+        by_model.setdefault(record.model, []).append(record)
+        by_keyword_type.setdefault(record.keyword_type, []).append(record)
+    return UsageReport(
+        overall=TokenSummary.of(records),
+        by_day={day: TokenSummary.of(group) for day, group in sorted(by_day.items())},
+        by_model={model: TokenSummary.of(group) for model, group in sorted(by_model.items())},
+        by_keyword_type={
+            kind: TokenSummary.of(group) for kind, group in sorted(by_keyword_type.items())
+        },
+    )
+
+
+def percentile(sorted_values: Sequence[int], q: float) -> int | None:
+    """昇順に並んだ値の q パーセンタイル（nearest-rank 法）。空なら None。"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def get_usage_ledger() -> UsageLedger:
+    """現在のアプリに紐づく使用量の台帳を返す。
+
+    サービス層はこれを直接呼ばず、引数で受け取ること。
+    """
+    return current_app.extensions[EXTENSION_KEY]
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """CLI（usage_report.py）の本体。"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=float, help='直近の何日分を集計するか（省略時は全件）')
+    parser.add_argument('--json', action='store_true', help='JSON で出力する')
+    args = parser.parse_args(argv)
+
+    settings = config.get_settings()
+    if not settings.usage_ledger:
+        print('USAGE_LEDGER が無効のため、使用量の台帳はありません', file=sys.stderr)
+        return 2
+    ledger = UsageLedger.from_settings(settings)
+    since = time.time() - args.days * 86400 if args.days is not None else None
+    report = summarize(ledger.read(since))
+    if args.json:
+        print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+    else:
+        print('\n'.join(report.lines()))
+    return 0
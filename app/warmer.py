@@ -0,0 +1,383 @@
+"""特集キーワードの生成結果を事前に作り、生成結果のキャッシュへ書き込む。
+
+特集キーワード（app/data/featured_keywords.json）は最も利用が多いのに、朝一番の利用者は
+毎日スクレイピング + 生成の待ち時間をそのまま払っていた。事前生成は特集キーワード × 性別 ×
+よく使われる季節・カラーの組み合わせ（config.WARMER_SEASON_COMBOS）を同時実行数の上限つきで
+生成し、結果を OutcomeCache（共有キャッシュを含む）へ書き込む。
+
+- 一時的な失敗（スクレイピング・生成のエラー）は待ち時間を倍にしながら再試行する
+- 1 件ごとの所要時間と失敗を WarmReport にまとめ、ログ（CLI では標準出力）に出す
+- ワーカー 2 つと CLI が同時に動かないよう、CACHE_DIR 配下のロックファイルで 1 つに絞る。
+  ロックファイルには前回の完了時刻を書き、WARMER_INTERVAL より前なら定期実行を見送る
+
+定期実行は WARMER_INTERVAL（秒）を設定すると lifespan startup から始まる。
+手動では次のように実行する（結果はワーカーと共有キャッシュ経由で共有する）。
+
+    python warm_cache.py
+    python warm_cache.py --force --concurrency 1
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import fcntl
+import logging
+import sys
+import threading
+import time
+from collections.abc import Awaitable, Callable, Iterator, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, TYPE_CHECKING
+
+from flask import Flask
+
+from . import config
+from .errors import AppError, GenerationError, OverloadedError, ScrapingError
+from .featured_keywords import EXTENSION_KEY as FEATURED_KEYWORDS_KEY
+from .generator_registry import EXTENSION_KEY as GENERATOR_REGISTRY_KEY
+from .outcome_cache import EXTENSION_KEY as OUTCOME_CACHE_KEY
+from .scraper_pool import EXTENSION_KEY as SCRAPER_POOL_KEY
+from .seasons import normalize_seasons
+from .services.template_service import generate_templates_for_request
+
+if TYPE_CHECKING:
+    from .featured_keywords import FeaturedKeywordRepository
+
+logger = logging.getLogger(__name__)
+
+# Flask の app.extensions に登録する際のキー
+EXTENSION_KEY = 'cache_warmer'
+
+
+@dataclass(frozen=True)
+class WarmItem:
+    """事前生成する 1 件（/api/generate の 1 リクエストに相当する）。"""
+
+    keyword: str
+    gender: str
+    seasons: tuple[str, ...] = ()
+
+    def __str__(self) -> str:
+        return f'{self.keyword} / {self.gender} / {",".join(self.seasons) or "-"}'
+
+
+@dataclass(frozen=True)
+class WarmResult:
+    """1 件の事前生成の結果。"""
+
+    item: WarmItem
+    elapsed_ms: float
+    attempts: int
+    # 失敗したときの内容（例外のクラス名とメッセージ）。成功なら None
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass(frozen=True)
+class WarmReport:
+    """1 回の事前生成の結果一覧。"""
+
+    results: tuple[WarmResult, ...]
+    elapsed_ms: float
+
+    @property
+    def failures(self) -> tuple[WarmResult, ...]:
+        return tuple(result for result in self.results if not result.ok)
+
+    def lines(self) -> list[str]:
+        """人が読むための要約（1 行目が全体、以降が 1 件ずつ）。"""
+        lines = [
+            f'事前生成: {len(self.results)} 件（成功 {len(self.results) - len(self.failures)} / '
+            f'失敗 {len(self.failures)}）, 合計 {self.elapsed_ms / 1000:.1f} 秒'
+        ]
+        for result in self.results:
+            status = 'ok  ' if result.ok else 'FAIL'
+            line = (
+                f'  {status} {result.elapsed_ms / 1000:6.1f}s  {result.item} ({result.attempts} 回)'
+            )
+            if result.error:
+                line += f' {result.error}'
+            lines.append(line)
+        return lines
+
+
+def warm_items(
+    repository: 'FeaturedKeywordRepository',
+    season_combos: Sequence[Sequence[str]] = config.WARMER_SEASON_COMBOS,
+) -> list[WarmItem]:
+    """特集キーワードごとに、その性別で事前生成する組み合わせを並べる。
+
+    季節・カラーは /api/generate と同じく正規化するので、メンズでは選択なしの 1 件だけになる。
+    """
+    items: dict[WarmItem, None] = {}
+    for info in repository.get_all_keywords():
+        gender = info['gender']
+        for combo in season_combos:
+            seasons = tuple(normalize_seasons(list(combo), gender))
+            items[WarmItem(info['keyword'], gender, seasons)] = None
+    return list(items)
+
+
+def _is_retryable(error: Exception) -> bool:
+    """待てば成功しうる失敗か。該当なし・設定不備などは何度やっても同じなので再試行しない。"""
+    if isinstance(error, (ScrapingError, GenerationError, OverloadedError)):
+        return True
+    return not isinstance(error, AppError)
+
+
+async def warm(
+    items: Sequence[WarmItem],
+    generate: Callable[[WarmItem], Awaitable[object]],
+    concurrency: int = 2,
+    retries: int = config.WARMER_RETRIES,
+    backoff: float = config.WARMER_BACKOFF_SECONDS,
+    sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    clock: Callable[[], float] = time.perf_counter,
+) -> WarmReport:
+    """items を同時に最大 concurrency 件ずつ generate し、結果をまとめる。
+
+    Args:
+        items: 事前生成する組み合わせ
+        generate: 1 件を生成してキャッシュへ書き込むコルーチン関数
+        concurrency: 同時に生成する件数の上限
+        retries: 一時的な失敗の再試行回数
+        backoff: 最初の再試行までの秒数（回ごとに倍にする）
+        sleep: 待ち。テストから差し替える
+        clock: 所要時間の計測に使う単調時計
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(item: WarmItem) -> WarmResult:
+        async with semaphore:
+            started = clock()
+            attempts = 0
+            while True:
+                attempts += 1
+                try:
+                    await generate(item)
+                except Exception as e:
+                    if attempts <= retries and _is_retryable(e):
+                        delay = backoff * 2 ** (attempts - 1)
+                        logger.warning(
+                            f'事前生成に失敗しました（{delay:.0f} 秒後に再試行）: {item}: {e}'
+                        )
+                        await sleep(delay)
+                        continue
+                    error = f'{type(e).__name__}: {e}'
+                    logger.error(f'事前生成に失敗しました: {item}: {error}')
+                    return WarmResult(item, (clock() - started) * 1000, attempts, error)
+                return WarmResult(item, (clock() - started) * 1000, attempts)
+
+    started = clock()
+    results = await asyncio.gather(*(run(item) for item in items))
+    return WarmReport(tuple(results), (clock() - started) * 1000)
+
+
+async def warm_app(app: Flask, items: Sequence[WarmItem] | None = None) -> WarmReport:
+    """アプリの共有リソース（スクレイパープール・生成器・生成結果のキャッシュ）で事前生成する。
+
+    キャッシュに結果が残っていても生成し直して置き換える（期限を延ばすための実行なので）。
+    """
+    repository = app.extensions[FEATURED_KEYWORDS_KEY]
+    scraper_pool = app.extensions[SCRAPER_POOL_KEY]
+    generators = app.extensions[GENERATOR_REGISTRY_KEY]
+    outcome_cache = app.extensions[OUTCOME_CACHE_KEY]
+    settings = scraper_pool.settings
+
+    async def generate(item: WarmItem) -> None:
+        await generate_templates_for_request(
+            item.keyword,
+            item.gender,
+            repository=repository,
+            seasons=list(item.seasons),
+            scraper_pool=scraper_pool,
+            generators=generators,
+            outcome_cache=outcome_cache,
+            regenerate=True,
+        )
+
+    if items is None:
+        items = warm_items(repository)
+    logger.info(f'事前生成を開始します: {len(items)} 件（同時 {settings.warmer_concurrency} 件）')
+    report = await warm(items, generate, settings.warmer_concurrency)
+    for line in report.lines():
+        logger.info(line)
+    return report
+
+
+@contextmanager
+def _exclusive(path: Path) -> Iterator[IO[str] | None]:
+    """ファイルロックを取れればそのファイルを、他が持っていれば None を渡す（待たない）。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a+', encoding='utf-8') as file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield None
+            return
+        try:
+            yield file
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def _read_last_run(file: IO[str]) -> float | None:
+    file.seek(0)
+    try:
+        return float(file.read().strip())
+    except ValueError:
+        return None
+
+
+def _write_last_run(file: IO[str], finished_at: float) -> None:
+    file.seek(0)
+    file.truncate()
+    file.write(f'{finished_at}\n')
+    file.flush()
+
+
+class CacheWarmer:
+    """事前生成の実行を 1 つに絞り、WARMER_INTERVAL ごとに繰り返す。"""
+
+    def __init__(
+        self,
+        run: Callable[[], Awaitable[WarmReport]],
+        lock_path: Path,
+        interval: float = 0,
+        wall_clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            run: 事前生成 1 回分のコルーチン関数（通常は warm_app）
+            lock_path: プロセス間で実行を 1 つに絞るロックファイル（前回の完了時刻も書く）
+            interval: 定期実行の間隔（秒、0 以下なら定期実行しない）
+            wall_clock: 完了時刻に使う時計（プロセス間で比べるので壁時計）
+        """
+        self._run = run
+        self.lock_path = Path(lock_path)
+        self.interval = interval
+        self._wall_clock = wall_clock
+        self._task: asyncio.Task | None = None
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(('runs', 'skipped_locked', 'skipped_recent', 'failures'), 0)
+        self.last_report: WarmReport | None = None
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += amount
+
+    async def run_once(self, force: bool = False) -> WarmReport | None:
+        """ロックを取れて、前回の完了から interval 以上経っていれば（force なら常に）実行する。
+
+        Returns:
+            実行したときはその結果。見送ったときは None
+        """
+        with _exclusive(self.lock_path) as file:
+            if file is None:
+                self._count('skipped_locked')
+                logger.info('別の事前生成が実行中のため見送ります')
+                return None
+            last_run = _read_last_run(file)
+            if not force and last_run is not None:
+                if self._wall_clock() - last_run < self.interval:
+                    self._count('skipped_recent')
+                    return None
+            report = await self._run()
+            self._count('runs')
+            self._count('failures', len(report.failures))
+            self.last_report = report
+            _write_last_run(file, self._wall_clock())
+            return report
+
+    async def start(self) -> None:
+        """定期実行を始める。interval が 0 以下なら何もしない。冪等。"""
+        if self._task is not None or self.interval <= 0:
+            return
+        self._task = asyncio.create_task(self._schedule())
+        logger.info(f'事前生成の定期実行を開始しました（{self.interval:.0f} 秒ごと）')
+
+    async def _schedule(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                # 定期実行が止まると以降の事前生成が行われないので、ここで受け止めて続ける
+                logger.error(f'事前生成の実行中にエラー: {e}', exc_info=True)
+            await asyncio.sleep(min(self.interval, config.WARMER_CHECK_SECONDS))
+
+    async def close(self) -> None:
+        """定期実行を止める。冪等。"""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        logger.info(f'事前生成の計測値: {self.stats()}')
+
+    def stats(self) -> dict:
+        """事前生成の計測値のスナップショット。"""
+        with self._lock:
+            return dict(self._counts)
+
+
+async def _run_cli(app: Flask, force: bool) -> WarmReport | None:
+    scraper_pool = app.extensions[SCRAPER_POOL_KEY]
+    generators = app.extensions[GENERATOR_REGISTRY_KEY]
+    await scraper_pool.start()
+    await generators.start()
+    try:
+        return await app.extensions[EXTENSION_KEY].run_once(force=force)
+    finally:
+        await scraper_pool.close()
+        await generators.close()
+        shared_cache = app.extensions[OUTCOME_CACHE_KEY].shared_cache
+        if shared_cache is not None:
+            shared_cache.close()
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """CLI（warm_cache.py）の本体。失敗が 1 件でもあれば 1 を返す。"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='前回の完了から WARMER_INTERVAL 経っていなくても実行する',
+    )
+    parser.add_argument(
+        '-c', '--concurrency', type=int, help='同時に生成する件数（WARMER_CONCURRENCY）'
+    )
+    args = parser.parse_args(argv)
+
+    # app/__init__.py がこのモジュールを import するので、ここで遅延 import する
+    from . import create_app
+
+    settings = config.get_settings()
+    if args.concurrency is not None:
+        settings = dataclasses.replace(settings, warmer_concurrency=args.concurrency)
+    if settings.outcome_cache_ttl <= 0:
+        print('OUTCOME_CACHE_TTL が 0 のため、生成結果のキャッシュは無効です', file=sys.stderr)
+        return 2
+    if not settings.shared_cache_enabled:
+        # このプロセスのメモリにしか残らず、ワーカーからは使えない
+        print(
+            'SHARED_CACHE が無効のため、事前生成の結果をワーカーと共有できません', file=sys.stderr
+        )
+        return 2
+
+    app = create_app(settings)
+    report = asyncio.run(_run_cli(app, force=args.force))
+    if report is None:
+        print(
+            '別の事前生成が実行中か、前回の完了から WARMER_INTERVAL 経っていません（--force で実行）'
+        )
+        return 1
+    print('\n'.join(report.lines()))
+    return 1 if report.failures else 0
@@ -1,6 +1,11 @@
-from asgiref.wsgi import WsgiToAsgi
-
 from app import create_app
+from app.asgi_native import build_asgi_app
+from app.lifespan import LifespanMiddleware
+from app.metrics_exporter import RequestMetricsMiddleware
 
 flask_app = create_app()
-app = WsgiToAsgi(flask_app)
+# /api/generate と /api/featured-keywords はイベントループ上で直接処理し、それ以外は
+# WsgiToAsgi 経由の Flask へ渡す（app/asgi_native.py）。
+# lifespan（スクレイパーの共有セッションの開始・終了）は WsgiToAsgi が扱えないので外側で受ける。
+# 応答時間（/metrics）はどちらの経路も RequestMetricsMiddleware で測る
+app = LifespanMiddleware(RequestMetricsMiddleware(build_asgi_app(flask_app)), flask_app)
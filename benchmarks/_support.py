@@ -0,0 +1,124 @@
+"""ベンチマーク共通の部品。
+
+- HotPepper の検索結果ページを模した HTML の生成
+- その HTML を返すローカルのスタンドイン HTTP(S) サーバー
+- 計測値の集計と表示
+
+本番のサイトには一切アクセスしない。
+"""
+
+import asyncio
+import datetime
+import os
+import ssl
+import statistics
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from aiohttp import web
+
+# ベンチマークはリポジトリ直下から `python benchmarks/xxx.py` で実行する想定
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def search_page_html(page: int, titles_per_page: int = 20, has_next: bool = True) -> str:
+    """STYLE_TITLE_SELECTOR / NEXT_PAGE_SELECTOR に一致する検索結果ページ。"""
+    items = '\n'.join(
+        f'<li><div class="mT5"><a href="/slnH{page:03d}{i:03d}/"><p>'
+        f'<span>ページ{page}のスタイル{i}◎透明感カラー×くびれヘア</span></p></a></div></li>'
+        for i in range(titles_per_page)
+    )
+    next_link = (
+        '<li class="pa top0 right0 afterPage"><a href="?pn=2">次へ</a></li>' if has_next else ''
+    )
+    return f"""<html><head><title>ヘアカタログ</title></head><body>
+<div id="searchList">
+  <div class="header">検索結果</div>
+  <div><div class="pT5 pr cFix"><div><ul>{next_link}</ul></div></div></div>
+  <ul id="jsiHoverAlphaLayerScope">
+{items}
+  </ul>
+</div>
+</body></html>"""
+
+
+def _self_signed_context() -> ssl.SSLContext:
+    """localhost 用の自己署名証明書でサーバー側 SSL コンテキストを作る。"""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    now = datetime.datetime.now(datetime.UTC)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        cert_path = os.path.join(tmp, 'cert.pem')
+        key_path = os.path.join(tmp, 'key.pem')
+        with open(cert_path, 'wb') as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+        with open(key_path, 'wb') as f:
+            f.write(
+                key.private_bytes(
+                    serialization.Encoding.PEM,
+                    serialization.PrivateFormat.PKCS8,
+                    serialization.NoEncryption(),
+                )
+            )
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+@asynccontextmanager
+async def stand_in_server(*, tls: bool = False, pages: int = 3, latency: float = 0.0):
+    """検索結果ページを返すローカルサーバーを起動し、ベース URL を返す。
+
+    Args:
+        tls: True なら自己署名証明書の HTTPS で待ち受ける
+        pages: 何ページ目まで結果があるか（それ以降は 0 件のページを返す）
+        latency: 1 リクエストあたりに足すサーバー側の待ち時間（秒）
+    """
+
+    async def handler(request: web.Request) -> web.Response:
+        page = int(request.query.get('pn', 1))
+        if latency:
+            await asyncio.sleep(latency)
+        titles = 20 if page <= pages else 0
+        html = search_page_html(page, titles_per_page=titles, has_next=page < pages)
+        return web.Response(text=html, content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/{tail:.*}', handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0, ssl_context=_self_signed_context() if tls else None)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    scheme = 'https' if tls else 'http'
+    try:
+        yield f'{scheme}://127.0.0.1:{port}/search/'
+    finally:
+        await runner.cleanup()
+
+
+def summarize(label: str, samples_ms: list[float]) -> str:
+    """計測値（ミリ秒）を 1 行にまとめる。"""
+    ordered = sorted(samples_ms)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    return (
+        f'{label:<28} n={len(ordered):<4} mean={statistics.fmean(ordered):8.2f}ms '
+        f'p50={statistics.median(ordered):8.2f}ms p95={p95:8.2f}ms'
+    )
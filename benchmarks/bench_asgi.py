@@ -0,0 +1,176 @@
+"""ネイティブ ASGI の経路と WsgiToAsgi の経路で、/api/generate のスループットと遅延を比べる。
+
+同じ Flask アプリを NATIVE_ASGI=true / false の 2 通りの ASGI アプリにして（asgi.py と同じく
+LifespanMiddleware で包む）、ローカルの uvicorn で待ち受け、aiohttp から同時に叩く。
+スクレイピングと Gemini の呼び出しは、--latency 秒待ってから固定の結果を返す偽物に差し替える
+（外部には一切アクセスしない）。同じ内容のリクエストがまとめられないよう、キーワードは毎回変える。
+
+    python benchmarks/bench_asgi.py
+    python benchmarks/bench_asgi.py --requests 1000 --concurrency 100 --latency 0.2
+
+結果は経路ごとに、リクエスト/秒と 1 リクエストの遅延（p50 / p95 / p99）、200 以外の応答の件数。
+
+既定ではリクエストごとに接続を張り直す。--keep-alive で接続を使い回すと、WsgiToAsgi の経路は
+同じ接続の 2 件目以降が 500 になるか、応答が返らなくなる（asgiref の「Single thread executor
+already being used, would deadlock」。ブラウザは接続を使い回すので、本番でも起こりうる）。
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import aiohttp
+import uvicorn
+from _support import summarize
+
+from app import config, create_app
+from app.asgi_native import build_asgi_app
+from app.lifespan import LifespanMiddleware
+
+TITLES = ['大人可愛い◎くびれミディ×透明感グレージュ', '20代30代 小顔レイヤーカット/韓国風']
+TEMPLATES = [
+    {
+        'title': f'透明感グレージュ×くびれミディ{i}',
+        'menu': 'カット+カラー+トリートメント',
+        'comment': '顔周りのレイヤーで小顔見えするスタイルです。',
+        'hashtag': [f'タグ{j}' for j in range(config.HASHTAG_MIN_COUNT)],
+    }
+    for i in range(config.MAX_TEMPLATES)
+]
+
+# これ以上応答が無ければ打ち切る（WsgiToAsgi の経路は接続を使い回すと応答が返らないことがある）
+REQUEST_TIMEOUT_SECONDS = 10
+
+
+def fake_pipeline(latency: float):
+    """スクレイピングと生成を、latency 秒ずつ待つ偽物に差し替える。"""
+
+    async def scrape(self, keyword, gender, *args, **kwargs):
+        await asyncio.sleep(latency)
+        return TITLES
+
+    async def generate(self, titles, keyword, raw_templates=None, **kwargs):
+        await asyncio.sleep(latency)
+        if raw_templates is not None:
+            raw_templates.extend(dict(t) for t in TEMPLATES)
+        return [dict(t) for t in TEMPLATES], [], []
+
+    return (
+        patch('app.services.template_service.HotPepperScraper.scrape_titles_async', scrape),
+        patch('app.services.template_service.TemplateGenerator.generate_templates_async', generate),
+    )
+
+
+class Server:
+    """別スレッドのイベントループで uvicorn を動かす（負荷をかける側と同じループにしない）。"""
+
+    def __init__(self, asgi_app):
+        self.server = uvicorn.Server(
+            uvicorn.Config(
+                asgi_app,
+                host='127.0.0.1',
+                port=0,
+                lifespan='on',
+                log_level='warning',
+                timeout_graceful_shutdown=5,
+            )
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        return f'http://127.0.0.1:{port}'
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self.thread.join()
+
+
+async def load(
+    base_url: str, requests: int, concurrency: int, keep_alive: bool
+) -> tuple[float, list[float], dict]:
+    """(リクエスト/秒, 1 リクエストの遅延ミリ秒のリスト, 200 以外のステータスごとの件数) を返す。
+
+    REQUEST_TIMEOUT_SECONDS 以内に応答が無ければ 'timeout' として数える。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures: dict[int | str, int] = {}
+
+    async def one(session: aiohttp.ClientSession, i: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            payload = {'keyword': f'ボブ{i}', 'gender': 'ladies'}
+            try:
+                async with session.post(f'{base_url}/api/generate', json=payload) as response:
+                    await response.read()
+                    status = response.status
+            except TimeoutError:
+                status = 'timeout'
+            if status != 200:
+                failures[status] = failures.get(status, 0) + 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    connector = aiohttp.TCPConnector(limit=concurrency, force_close=not keep_alive)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        # 接続を張るところまでは計測に含めない
+        await asyncio.gather(*(one(session, -i - 1) for i in range(concurrency)))
+        latencies.clear()
+        failures.clear()
+        started = time.perf_counter()
+        await asyncio.gather(*(one(session, i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+    return requests / elapsed, latencies, failures
+
+
+def p99(samples_ms: list[float]) -> float:
+    ordered = sorted(samples_ms)
+    return ordered[max(0, int(len(ordered) * 0.99) - 1)]
+
+
+def main(requests: int, concurrency: int, latency: float, keep_alive: bool) -> None:
+    os.environ.setdefault('GEMINI_API_KEY', 'bench')
+    config.reset_settings()
+    # 2 つの経路で同じキーワードを使うので、スクレイピング結果のキャッシュは使わない
+    settings = dataclasses.replace(
+        config.get_settings(), title_cache_ttl=0, shared_cache_enabled=False
+    )
+    print(
+        f'{requests} リクエスト, 同時 {concurrency}, '
+        f'スクレイピングと生成にそれぞれ {latency * 1000:.0f}ms, '
+        f'接続の使い回し {"あり" if keep_alive else "なし"}'
+    )
+    scrape, generate = fake_pipeline(latency)
+    with scrape, generate:
+        for label, native in (('WsgiToAsgi', False), ('native ASGI', True)):
+            flask_app = create_app(settings)
+            asgi_app = build_asgi_app(flask_app, dataclasses.replace(settings, native_asgi=native))
+            with Server(LifespanMiddleware(asgi_app, flask_app)) as base_url:
+                rps, latencies, failures = asyncio.run(
+                    load(base_url, requests, concurrency, keep_alive)
+                )
+            print(
+                f'{summarize(label, latencies)} p99={p99(latencies):8.2f}ms {rps:7.1f} req/s '
+                f'失敗 {sum(failures.values())} {failures or ""}'
+            )
+
+
+if __name__ == '__main__':
+    import logging
+
+    logging.disable(logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('-c', '--concurrency', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.05, help='偽の外部呼び出しの待ち秒数')
+    parser.add_argument('--keep-alive', action='store_true', help='接続を使い回す')
+    args = parser.parse_args()
+    main(args.requests, args.concurrency, args.latency, args.keep_alive)
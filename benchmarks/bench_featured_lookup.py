@@ -0,0 +1,96 @@
+"""特集キーワードの参照（get_keyword_info）の費用を、大きな特集ファイルで測る。
+
+件数 N の特集キーワード JSON を作って FeaturedKeywordsManager に読み込ませ、
+「リストを線形に走査して一致したら deepcopy する（以前）」と
+「読み込み時に作った正規化済みキーワードの辞書を引く（現在）」を比べる。
+
+    python benchmarks/bench_featured_lookup.py
+    python benchmarks/bench_featured_lookup.py --entries 10000 -n 200
+
+1 サンプルは --batch 回の参照の合計時間。ヒット（特集キーワード）とミス（通常キーワード）を
+分けて示す。実際のリクエストでは分割語の大半が通常キーワードなので、以前の実装では
+ミスのたびに全件を走査していた。
+"""
+
+import argparse
+import copy
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from _support import summarize
+
+from app import config
+from app.featured_keywords import FeaturedKeywordsManager
+
+
+def legacy_get_keyword_info(keywords: list[dict], keyword: str) -> dict | None:
+    """以前の get_keyword_info（ログ出力を除く）。"""
+    keyword_lower = keyword.lower().strip()
+    for item in keywords:
+        if item['keyword'].lower().strip() == keyword_lower:
+            return copy.deepcopy(item)
+    return None
+
+
+def featured_entries(count: int) -> list[dict]:
+    return [
+        {
+            'name': f'特集{i}',
+            'keyword': f'特集スタイル{i}',
+            'gender': 'ladies' if i % 2 else 'mens',
+            'condition': f'スタイル名に『特集スタイル{i}』を含めること。',
+        }
+        for i in range(count)
+    ]
+
+
+def measure(lookup, queries: list[str], count: int, batch: int) -> list[float]:
+    rng = random.Random(0)
+    samples = []
+    for _ in range(count):
+        chosen = [rng.choice(queries) for _ in range(batch)]
+        started = time.perf_counter()
+        for query in chosen:
+            lookup(query)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main(entries: int, count: int, batch: int) -> None:
+    # 1 万件の特集ファイルは既定の上限（1MB）を超えるので、計測中だけ広げる
+    config.FEATURED_FILE_MAX_BYTES = 64 * 1024 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'featured_keywords.json'
+        path.write_text(json.dumps(featured_entries(entries), ensure_ascii=False), 'utf-8')
+        started = time.perf_counter()
+        manager = FeaturedKeywordsManager(path)
+        load_ms = (time.perf_counter() - started) * 1000
+
+    hits = [f' 特集スタイル{i} ' for i in range(0, entries, max(1, entries // 500))]
+    misses = ['くびれヘア', 'ボブ', '韓国風', 'レイヤーカット', '透明感カラー']
+
+    print(
+        f'特集キーワード {entries} 件（読み込みと索引の作成 {load_ms:.0f}ms）, {batch} 回/サンプル'
+    )
+    for label, queries in (('hit', hits), ('miss', misses)):
+        before = measure(
+            lambda q: legacy_get_keyword_info(manager.keywords, q), queries, count, batch
+        )
+        after = measure(manager.get_keyword_info, queries, count, batch)
+        print(summarize(f'{label}: linear scan + deepcopy', before))
+        print(summarize(f'{label}: dict index', after))
+
+
+if __name__ == '__main__':
+    import logging
+
+    logging.disable(logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=10000)
+    parser.add_argument('-n', '--count', type=int, default=100)
+    parser.add_argument('--batch', type=int, default=100, help='1 サンプルあたりの参照回数')
+    args = parser.parse_args()
+    main(args.entries, args.count, args.batch)
@@ -0,0 +1,109 @@
+"""入力キーワード中の特集キーワード検出の費用と検出数を、大きな特集ファイルで測る。
+
+件数 N の特集キーワードを FeaturedKeywordsManager に読み込ませ、
+「最初の区切り文字で分割し、分割した語ごとに辞書を引く（以前）」と
+「KeywordMatcher（Aho-Corasick）で入力全体を 1 回走査する（現在）」を比べる。
+
+    python benchmarks/bench_featured_matcher.py
+    python benchmarks/bench_featured_matcher.py --entries 20000 -n 50
+
+1 サンプルは 300 件の入力の検出の合計時間。
+入力は 3 種類を同数ずつ混ぜる。
+
+- 区切りあり: 「特集スタイル12 髪質改善」
+- 区切りなし: 「特集スタイル12ミディ」（以前の方式では検出できない）
+- 通常のみ:   「くびれヘア 髪質改善」
+"""
+
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from _support import summarize
+
+from app import config
+from app.featured_keywords import FeaturedKeywordsManager
+
+QUERIES_PER_KIND = 100
+
+
+def legacy_detect(manager: FeaturedKeywordsManager, keyword: str) -> list:
+    """以前の analyze_keyword の検出部分（最初の区切り文字だけで分割して完全一致で引く）。"""
+    parts = [keyword]
+    for separator in config.KEYWORD_SEPARATORS:
+        if separator in keyword:
+            parts = [kw.strip() for kw in keyword.split(separator) if kw.strip()]
+            break
+    return [info for kw in parts if (info := manager.get_keyword_info(kw)) is not None]
+
+
+def featured_entries(count: int) -> list[dict]:
+    return [
+        {
+            'name': f'特集{i}',
+            'keyword': f'特集スタイル{i}',
+            'gender': 'ladies' if i % 2 else 'mens',
+            'condition': f'スタイル名に『特集スタイル{i}』を含めること。',
+        }
+        for i in range(count)
+    ]
+
+
+def inputs(entries: int) -> list[str]:
+    rng = random.Random(0)
+    normal = ['くびれヘア 髪質改善', 'ボブ', '韓国風レイヤーカット', '透明感カラー、ミディ']
+    result = []
+    for _ in range(QUERIES_PER_KIND):
+        kw = f'特集スタイル{rng.randrange(entries)}'
+        result += [f'{kw} 髪質改善', f'{kw}ミディ', rng.choice(normal)]
+    return result
+
+
+def measure(detect, queries: list[str], count: int) -> tuple[list[float], int]:
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        for query in queries:
+            detect(query)
+        samples.append((time.perf_counter() - started) * 1000)
+    detected = sum(bool(detect(query)) for query in queries)
+    return samples, detected
+
+
+def main(entries: int, count: int) -> None:
+    # 大きな特集ファイルは既定の上限（1MB）を超えうるので、計測中だけ広げる
+    config.FEATURED_FILE_MAX_BYTES = 64 * 1024 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'featured_keywords.json'
+        path.write_text(json.dumps(featured_entries(entries), ensure_ascii=False), 'utf-8')
+        started = time.perf_counter()
+        manager = FeaturedKeywordsManager(path)
+        load_ms = (time.perf_counter() - started) * 1000
+
+    queries = inputs(entries)
+    # 通常のみの入力を除いた、特集キーワードを含む入力の数
+    expected = 2 * QUERIES_PER_KIND
+    print(
+        f'特集キーワード {entries} 件（読み込みとオートマトンの作成 {load_ms:.0f}ms）, '
+        f'入力 {len(queries)} 件（うち特集キーワードを含むもの {expected} 件）'
+    )
+    for label, detect in (
+        ('split + dict lookup', lambda q: legacy_detect(manager, q)),
+        ('Aho-Corasick', manager.find_featured_keywords),
+    ):
+        samples, detected = measure(detect, queries, count)
+        print(f'{summarize(label, samples)} 検出 {detected}/{expected}')
+
+
+if __name__ == '__main__':
+    import logging
+
+    logging.disable(logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=5000)
+    parser.add_argument('-n', '--count', type=int, default=100)
+    args = parser.parse_args()
+    main(args.entries, args.count)
@@ -0,0 +1,147 @@
+"""Gemini クライアントの使い回しで、1 リクエストあたり何が省けるかを測る。
+
+ローカルの偽 Gemini エンドポイント（自己署名証明書の HTTPS）に対して
+generate_templates_async を繰り返し、
+「リクエストごとに TemplateGenerator（= genai.Client）を作る（以前）」と
+「GeneratorRegistry の共有クライアント（現在）」を比べる。
+
+    python benchmarks/bench_generator_registry.py
+    python benchmarks/bench_generator_registry.py -n 100 --latency 0.05
+
+偽エンドポイントは固定の応答を返すだけなので、差はクライアントの生成
+（CA バンドルの読み込みを含む）と TCP + TLS の接続確立の費用になる。
+実環境ではこれに Gemini までの RTT 数往復分が加わる。
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import ssl
+import time
+from contextlib import asynccontextmanager
+
+from _support import _self_signed_context, summarize
+from aiohttp import web
+from google import genai
+from google.genai import types
+
+from app import config
+from app.generator import TemplateGenerator
+from app.generator_registry import GeneratorRegistry
+
+TITLES = ['大人可愛い◎くびれミディ×透明感グレージュ', '20代30代 小顔レイヤーカット/韓国風']
+
+
+def _fake_response() -> dict:
+    templates = [
+        {
+            'title': f'くびれヘア◎透明感グレージュ{i}',
+            'menu': 'カット+カラー+トリートメント',
+            'comment': '顔周りのレイヤーで小顔見えするくびれヘアです。',
+            'hashtag': [f'タグ{j}' for j in range(config.HASHTAG_MIN_COUNT)],
+        }
+        for i in range(config.MAX_TEMPLATES)
+    ]
+    text = json.dumps({'trending_keywords': [], 'templates': templates}, ensure_ascii=False)
+    return {
+        'candidates': [
+            {'content': {'role': 'model', 'parts': [{'text': text}]}, 'finishReason': 'STOP'}
+        ],
+        'usageMetadata': {'promptTokenCount': 1000, 'candidatesTokenCount': 2000},
+    }
+
+
+@asynccontextmanager
+async def fake_gemini(latency: float):
+    """generateContent と models.get に固定の応答を返す HTTPS サーバー。"""
+    body = _fake_response()
+
+    async def generate(request: web.Request) -> web.Response:
+        await request.read()
+        if latency:
+            await asyncio.sleep(latency)
+        return web.json_response(body)
+
+    async def get_model(request: web.Request) -> web.Response:
+        return web.json_response({'name': request.match_info['model']})
+
+    app = web.Application()
+    app.router.add_post('/{version}/models/{model}:generateContent', generate)
+    app.router.add_get('/{version}/models/{model}', get_model)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0, ssl_context=_self_signed_context())
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f'https://127.0.0.1:{port}/'
+    finally:
+        await runner.cleanup()
+
+
+def client_factory(base_url: str):
+    # 自己署名証明書なので検証を外したコンテキストを渡す（本番の生成器は certifi で検証する）
+    insecure = ssl.create_default_context()
+    insecure.check_hostname = False
+    insecure.verify_mode = ssl.CERT_NONE
+
+    def create() -> genai.Client:
+        return genai.Client(
+            api_key='bench',
+            http_options=types.HttpOptions(base_url=base_url, async_client_args={'ssl': insecure}),
+        )
+
+    return create
+
+
+async def per_request_generator(settings, create, count: int) -> list[float]:
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        generator = TemplateGenerator(settings=settings, client=create())
+        await generator.generate_templates_async(TITLES, 'くびれヘア')
+        # 以前のコードは閉じずに捨てていた。ここでは計測後に閉じてソケットを溜めない
+        samples.append((time.perf_counter() - started) * 1000)
+        await generator.client.aio.aclose()
+    return samples
+
+
+async def shared_generator(settings, create, count: int) -> list[float]:
+    registry = GeneratorRegistry(settings, client_factory=create)
+    await registry.start()
+    samples = []
+    try:
+        for _ in range(count):
+            started = time.perf_counter()
+            await registry.get().generate_templates_async(TITLES, 'くびれヘア')
+            samples.append((time.perf_counter() - started) * 1000)
+    finally:
+        await registry.close()
+    return samples
+
+
+async def main(count: int, latency: float) -> None:
+    settings = dataclasses.replace(config.get_settings(), gemini_api_key='bench')
+    async with fake_gemini(latency) as base_url:
+        create = client_factory(base_url)
+        await per_request_generator(settings, create, 3)  # 空打ち
+        before = await per_request_generator(settings, create, count)
+        after = await shared_generator(settings, create, count)
+
+    print(
+        f'偽 Gemini エンドポイント: HTTPS, サーバー側の待ち {latency * 1000:.0f}ms, {count} リクエスト'
+    )
+    print(summarize('per-request genai.Client', before))
+    print(summarize('shared GeneratorRegistry', after))
+
+
+if __name__ == '__main__':
+    import logging
+
+    logging.disable(logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--count', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.0, help='サーバー側の待ち時間（秒）')
+    args = parser.parse_args()
+    asyncio.run(main(args.count, args.latency))
@@ -0,0 +1,104 @@
+"""検索結果ページのパーサーごとの解析速度とメモリを測る。
+
+tests/fixtures/hotpepper/ の HTML（実ページの構造を縮めたもの）を各パーサーで繰り返し解析し、
+1 ページあたりの時間とピークメモリを比べる。
+
+    python benchmarks/bench_html_parsers.py
+    python benchmarks/bench_html_parsers.py -n 2000
+
+メモリは 2 通りで示す。
+
+- py-peak: tracemalloc で測った 1 ページ解析中の Python ヒープのピーク。
+  C 実装（lxml / lexbor）が内部で確保する分は含まれない
+- rss-delta: パーサーごとに別プロセスを起こし、import と入力の読み込みを終えた時点から
+  計測終了までに増えた最大 RSS（ru_maxrss）。C 側の確保も含む
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from _support import summarize
+
+from app import html_parsers
+from app.html_parsers import available_backends, parse_search_page
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / 'tests' / 'fixtures' / 'hotpepper'
+
+
+def _max_rss_kib() -> int:
+    # Linux では KiB、macOS ではバイトで返る
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def measure(backend: str, count: int) -> dict:
+    """1 つのパーサーを計測する（worker として別プロセスで呼ばれる）。"""
+    pages = [path.read_text(encoding='utf-8') for path in sorted(FIXTURES_DIR.glob('*.html'))]
+    # import と初回呼び出しのコストを計測から除く
+    for html in pages:
+        parse_search_page(html, backend)
+    rss_before = _max_rss_kib()
+
+    samples = []
+    for i in range(count):
+        html = pages[i % len(pages)]
+        started = time.perf_counter()
+        parse_search_page(html, backend)
+        samples.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    for html in pages:
+        parse_search_page(html, backend)
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'samples': samples,
+        'py_peak_kib': py_peak / 1024,
+        'rss_delta_kib': _max_rss_kib() - rss_before,
+    }
+
+
+def run_worker(backend: str, count: int) -> dict:
+    completed = subprocess.run(
+        [sys.executable, __file__, '--worker', backend, '-n', str(count)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(completed.stdout)
+
+
+def main(count: int) -> None:
+    backends = available_backends()
+    missing = [name for name in html_parsers.PARSER_PREFERENCE if name not in backends]
+    print(f'フィクスチャ: {FIXTURES_DIR}, {count} ページ/パーサー')
+    if missing:
+        print(f'未インストールのため省略: {", ".join(missing)}')
+
+    for backend in backends:
+        result = run_worker(backend, count)
+        print(
+            f'{summarize(backend, result["samples"])} '
+            f'py-peak={result["py_peak_kib"]:8.1f}KiB rss-delta={result["rss_delta_kib"]:6d}KiB'
+        )
+
+
+if __name__ == '__main__':
+    import logging
+
+    logging.disable(logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--count', type=int, default=1000)
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(measure(args.worker, args.count)))
+    else:
+        main(args.count)
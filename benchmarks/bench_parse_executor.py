@@ -0,0 +1,79 @@
+"""解析をどこで実行するかで、イベントループの応答性がどう変わるかを測る。
+
+HTML フィクスチャの解析を並行に流しながら、同じループで 5ms ごとに起きる処理の遅れ
+（ループラグ）を測る。ループラグは、解析中に同じワーカーへ来た他のリクエストが
+待たされる時間の目安になる。
+
+    python benchmarks/bench_parse_executor.py
+    python benchmarks/bench_parse_executor.py --parser lxml -n 400
+
+inline は従来どおりループ上で解析する場合。
+"""
+
+import argparse
+import asyncio
+import time
+from pathlib import Path
+
+from _support import summarize
+
+from app.html_parsers import PARSER_HTML, resolve_backend
+from app.parse_executor import PARSE_MODES, ParseExecutor
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / 'tests' / 'fixtures' / 'hotpepper'
+TICK = 0.005
+
+
+async def measure(mode: str, backend: str, pages: list[str], count: int, concurrency: int):
+    executor = ParseExecutor(mode, workers=2)
+    # プールの起動（process ならプロセスの spawn）を計測から除く
+    await asyncio.gather(*(executor.parse(html, backend) for html in pages))
+
+    lags = []
+    done = False
+
+    async def heartbeat():
+        while not done:
+            expected = time.perf_counter() + TICK
+            await asyncio.sleep(TICK)
+            lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def parse(i: int):
+        async with semaphore:
+            await executor.parse(pages[i % len(pages)], backend)
+
+    task = asyncio.create_task(heartbeat())
+    started = time.perf_counter()
+    await asyncio.gather(*(parse(i) for i in range(count)))
+    elapsed = time.perf_counter() - started
+    done = True
+    await task
+    executor.shutdown()
+    return lags, elapsed, executor.stats()
+
+
+async def main(backend: str, count: int, concurrency: int) -> None:
+    pages = [path.read_text(encoding='utf-8') for path in sorted(FIXTURES_DIR.glob('*.html'))]
+    print(f'パーサー: {backend}, {count} ページ, 同時 {concurrency} 件')
+    for mode in PARSE_MODES:
+        lags, elapsed, stats = await measure(mode, backend, pages, count, concurrency)
+        print(
+            f'{summarize(f"{mode} loop lag", lags)} '
+            f'total={elapsed * 1000:8.1f}ms peak-queue={stats["peak_queue_depth"]}'
+        )
+
+
+if __name__ == '__main__':
+    import logging
+
+    logging.disable(logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--parser', default=PARSER_HTML, help='auto / selectolax / lxml / html.parser'
+    )
+    parser.add_argument('-n', '--count', type=int, default=200)
+    parser.add_argument('-c', '--concurrency', type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(resolve_backend(args.parser), args.count, args.concurrency))
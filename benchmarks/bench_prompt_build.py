@@ -0,0 +1,113 @@
+"""プロンプト 1 件の組み立て時間とメモリ確保を、スケルトンの有無で比べる。
+
+- full: 以前と同じく、毎回 build_title_length_rule() と文面全体の f-string を評価する
+- skeleton: build_generation_prompt()（性別と短尺タイトル枠ごとにキャッシュしたスケルトンへ
+  キーワード・参照タイトル・特集の指示を差し込む）
+
+どちらも同じ文面になることを確かめてから測る。性別 2 通り × 季節・カラーの選択 32 通りの
+64 件を 1 回分として時間を測り、1 件あたりのマイクロ秒も示す。
+
+    python benchmarks/bench_prompt_build.py
+    python benchmarks/bench_prompt_build.py -n 2000
+
+メモリは tracemalloc で測った 1 件の組み立て中の Python ヒープのピーク
+（途中で作る文字列と、できあがったプロンプト自体の分を含む）。
+"""
+
+import argparse
+import itertools
+import statistics
+import time
+import tracemalloc
+from collections.abc import Callable
+
+from _support import summarize
+
+from app import config
+from app.prompts import (
+    GENDER_VOCABULARY,
+    _render_prompt,
+    build_featured_instruction,
+    build_generation_prompt,
+    build_title_length_rule,
+)
+from app.title_selection import format_reference_titles
+
+KEYWORD = 'くびれ'
+TITLES = [f'スタイル{i}◎透明感カラー×くびれヘア' for i in range(60)]
+FEATURED = {'name': 'くびれ特集', 'condition': 'スタイル名に「くびれ」が入っていること'}
+CONTEXT = {'keyword_type': 'featured', 'original_keyword': KEYWORD}
+
+
+def full(seasons: list[str], gender: str) -> str:
+    return _render_prompt(
+        GENDER_VOCABULARY[gender],
+        *build_title_length_rule(seasons),
+        featured_instruction=build_featured_instruction(FEATURED, KEYWORD, 'featured', KEYWORD),
+        keyword=KEYWORD,
+        reference_titles=format_reference_titles(TITLES),
+    )
+
+
+def skeleton(seasons: list[str], gender: str) -> str:
+    return build_generation_prompt(TITLES, KEYWORD, seasons, gender, FEATURED, CONTEXT)
+
+
+def cases() -> list[tuple[list[str], str]]:
+    keys = list(config.SEASON_COLOR_CHOICES)
+    selections = [
+        list(combination)
+        for size in range(len(keys) + 1)
+        for combination in itertools.combinations(keys, size)
+    ]
+    return [(seasons, gender) for gender in GENDER_VOCABULARY for seasons in selections]
+
+
+def measure(build: Callable[[list[str], str], str], count: int) -> tuple[list[float], float]:
+    """(64 件 1 回分ごとのミリ秒, 1 件あたりのピーク KiB)"""
+    all_cases = cases()
+    # キャッシュの作成と初回呼び出しのコストを計測から除く
+    for seasons, gender in all_cases:
+        build(seasons, gender)
+
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        for seasons, gender in all_cases:
+            build(seasons, gender)
+        samples.append((time.perf_counter() - started) * 1000)
+
+    peak = 0
+    tracemalloc.start()
+    for seasons, gender in all_cases:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        build(seasons, gender)
+        peak += tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return samples, peak / len(all_cases) / 1024
+
+
+def main(count: int) -> None:
+    for seasons, gender in cases():
+        assert full(seasons, gender) == skeleton(seasons, gender)
+    print(f'{len(cases())} 通り（性別 × 季節・カラーの選択）, 参照タイトル {len(TITLES)} 件')
+
+    prompt_kib = len(skeleton([], 'ladies').encode('utf-8')) / 1024
+    print(f'プロンプト 1 件の大きさ: 約 {prompt_kib:.1f}KiB（UTF-8）')
+    for label, build in (('full', full), ('skeleton', skeleton)):
+        samples, peak_kib = measure(build, count)
+        per_prompt_us = statistics.median(samples) / len(cases()) * 1000
+        print(
+            f'{summarize(label, samples)} ({per_prompt_us:5.1f}µs/件) py-peak={peak_kib:6.1f}KiB/件'
+        )
+
+
+if __name__ == '__main__':
+    import logging
+
+    logging.disable(logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--count', type=int, default=1000)
+    args = parser.parse_args()
+    main(args.count)
@@ -0,0 +1,85 @@
+"""スクレイパーのセッション共有の効果を測る。
+
+ローカルのスタンドインサーバーに対して 1 ページのスクレイピングを繰り返し、
+「リクエストごとに ClientSession を作る（以前）」と「ScraperPool の共有セッション（現在）」の
+1 リクエストあたりのレイテンシを比べる。
+
+    python benchmarks/bench_scraper_session.py            # HTTP
+    python benchmarks/bench_scraper_session.py --tls      # 自己署名証明書の HTTPS
+
+localhost なので RTT はほぼ 0。実環境の beauty.hotpepper.jp では、ここで測れる
+TCP/TLS のセットアップ費用に加えて 2〜3 往復分の RTT がリクエストごとに上乗せされる。
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import time
+from unittest.mock import patch
+
+from _support import stand_in_server, summarize
+
+from app import config
+from app.scraper_pool import ScraperPool
+from app.scraping import HotPepperScraper
+
+
+def bench_settings(tls: bool) -> config.Settings:
+    return dataclasses.replace(
+        config.get_settings(),
+        scraping_delay_min=0,
+        scraping_delay_max=0,
+        max_pages=1,
+        # スタンドインサーバーは自己署名証明書なので検証は外す
+        scraper_verify_ssl=not tls,
+    )
+
+
+async def per_request_session(settings: config.Settings, count: int) -> list[float]:
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        async with HotPepperScraper(settings) as scraper:
+            await scraper.scrape_titles_async('ボブ', max_pages=1)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def pooled_session(settings: config.Settings, count: int) -> list[float]:
+    pool = ScraperPool(settings)
+    await pool.start()
+    samples = []
+    try:
+        for _ in range(count):
+            started = time.perf_counter()
+            async with pool.scraper() as scraper:
+                await scraper.scrape_titles_async('ボブ', max_pages=1)
+            samples.append((time.perf_counter() - started) * 1000)
+    finally:
+        await pool.close()
+    return samples
+
+
+async def main(tls: bool, count: int) -> None:
+    settings = bench_settings(tls)
+    async with stand_in_server(tls=tls, pages=1) as base_url:
+        with patch.object(config, 'LADIES_URL', base_url):
+            # 初回の import やコネクタ生成のばらつきを除くための空打ち
+            await per_request_session(settings, 3)
+            before = await per_request_session(settings, count)
+            after = await pooled_session(settings, count)
+
+    print(f'スタンドインサーバー: {"HTTPS" if tls else "HTTP"}, {count} リクエスト')
+    print(summarize('per-request ClientSession', before))
+    print(summarize('shared ScraperPool', after))
+
+
+if __name__ == '__main__':
+    import logging
+
+    logging.disable(logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tls', action='store_true', help='HTTPS で計測する')
+    parser.add_argument('-n', '--count', type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.tls, args.count))
@@ -0,0 +1,90 @@
+"""共有キャッシュ（SQLite の WAL モード）の get/put レイテンシを、2 ワーカー同時アクセスで測る。
+
+gunicorn の 2 ワーカーに見立てた 2 プロセスが、同じファイルへ同時に get と put を繰り返す。
+値はスクレイピング結果と同じ形（60 件のタイトル）。
+
+    python benchmarks/bench_shared_cache.py
+    python benchmarks/bench_shared_cache.py --workers 4 -n 5000 --write-ratio 0.2
+"""
+
+import argparse
+import multiprocessing
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from _support import summarize
+
+from app.shared_cache import SharedCache, make_key
+
+KEYS = 200
+TITLES = [f'ページ{i // 20 + 1}のスタイル{i}◎透明感カラー×くびれヘア' for i in range(60)]
+
+
+def worker(path: Path, count: int, write_ratio: float, start, results) -> None:
+    cache = SharedCache(path)
+    rng = random.Random()
+    gets, puts = [], []
+    start.wait()
+    for _ in range(count):
+        key = make_key('titles', (f'キーワード{rng.randrange(KEYS)}', 'ladies', 3))
+        started = time.perf_counter()
+        if rng.random() < write_ratio:
+            cache.put(key, TITLES, ttl=3600)
+            puts.append((time.perf_counter() - started) * 1000)
+        else:
+            cache.get(key)
+            gets.append((time.perf_counter() - started) * 1000)
+    cache.close()
+    results.put((gets, puts, cache.stats()))
+
+
+def run(path: Path, workers: int, count: int, write_ratio: float):
+    context = multiprocessing.get_context('spawn')
+    start = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(path, count, write_ratio, start, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    gets = [sample for result in collected for sample in result[0]]
+    puts = [sample for result in collected for sample in result[1]]
+    errors = sum(result[2]['errors'] for result in collected)
+    return gets, puts, errors
+
+
+def main(workers: int, count: int, write_ratio: float) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'shared_cache.sqlite3'
+        # 半分ほどのキーを先に埋めておく（ヒットとミスが混ざる状態で測る）
+        seed = SharedCache(path)
+        for i in range(0, KEYS, 2):
+            seed.put(make_key('titles', (f'キーワード{i}', 'ladies', 3)), TITLES, ttl=3600)
+        seed.close()
+
+        print(f'{workers} プロセス × {count} 回, 書き込み比率 {write_ratio:.0%}')
+        for label, processes in (('1 process', 1), (f'{workers} processes', workers)):
+            gets, puts, errors = run(path, processes, count, write_ratio)
+            print(summarize(f'get ({label})', gets))
+            print(summarize(f'put ({label})', puts))
+            if errors:
+                print(f'  エラー（busy_timeout 超過など）: {errors} 件')
+
+
+if __name__ == '__main__':
+    import logging
+
+    logging.disable(logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('-n', '--count', type=int, default=2000)
+    parser.add_argument('--write-ratio', type=float, default=0.1)
+    args = parser.parse_args()
+    main(args.workers, args.count, args.write_ratio)
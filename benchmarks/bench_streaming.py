@@ -0,0 +1,136 @@
+"""ストリーミング生成で、最初のテンプレートが届くまでの時間がどれだけ縮むかを測る。
+
+ローカルの偽 Gemini エンドポイントが、テンプレート 20 件ぶんの JSON を --duration 秒かけて
+少しずつ出力する（実際の Gemini がトークンを順に生成するのを模す）。これに対して
+
+- generate_templates_async（全件そろってから返す。以前の /api/generate）
+- generate_templates_stream（1 件確定するたびにコールバック。SSE の /api/generate）
+
+の「最初のテンプレートを受け取るまで」と「全件を受け取るまで」を比べる。
+
+    python benchmarks/bench_streaming.py
+    python benchmarks/bench_streaming.py --duration 20 -n 3
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import time
+from contextlib import asynccontextmanager
+
+from _support import summarize
+from aiohttp import web
+from google import genai
+from google.genai import types
+
+from app import config
+from app.generator import TemplateGenerator
+
+TITLES = ['大人可愛い◎くびれミディ×透明感グレージュ', '20代30代 小顔レイヤーカット/韓国風']
+# 出力を分ける断片の数（Gemini のストリーミングは数十トークンずつ届く）
+CHUNKS = 60
+
+
+def _response_text() -> str:
+    templates = [
+        {
+            'title': f'くびれヘア◎透明感グレージュ{i}',
+            'menu': 'カット+カラー+トリートメント',
+            'comment': '顔周りのレイヤーで小顔見えするくびれヘアです。',
+            'hashtag': [f'タグ{j}' for j in range(config.HASHTAG_MIN_COUNT)],
+        }
+        for i in range(config.MAX_TEMPLATES)
+    ]
+    return json.dumps({'trending_keywords': [], 'templates': templates}, ensure_ascii=False)
+
+
+def _chunk(text: str, finish: bool) -> dict:
+    candidate = {'content': {'role': 'model', 'parts': [{'text': text}]}}
+    if finish:
+        candidate['finishReason'] = 'STOP'
+    return {'candidates': [candidate]}
+
+
+@asynccontextmanager
+async def fake_gemini(duration: float):
+    """generateContent と streamGenerateContent に、duration 秒かけて出力を返すサーバー。"""
+    text = _response_text()
+    size = -(-len(text) // CHUNKS)
+    pieces = [text[i : i + size] for i in range(0, len(text), size)]
+
+    async def generate(request: web.Request) -> web.Response:
+        await request.read()
+        await asyncio.sleep(duration)
+        return web.json_response(_chunk(text, finish=True))
+
+    async def stream(request: web.Request) -> web.StreamResponse:
+        await request.read()
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        for i, piece in enumerate(pieces):
+            await asyncio.sleep(duration / len(pieces))
+            body = json.dumps(_chunk(piece, finish=i == len(pieces) - 1), ensure_ascii=False)
+            await response.write(f'data: {body}\r\n\r\n'.encode())
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post('/{version}/models/{model}:generateContent', generate)
+    app.router.add_post('/{version}/models/{model}:streamGenerateContent', stream)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f'http://127.0.0.1:{port}/'
+    finally:
+        await runner.cleanup()
+
+
+async def measure(generator: TemplateGenerator, streaming: bool) -> tuple[float, float]:
+    """(最初のテンプレートまで, 全件まで) をミリ秒で返す。"""
+    started = time.perf_counter()
+    first = None
+
+    def on_template(template: dict) -> None:
+        nonlocal first
+        if first is None:
+            first = time.perf_counter()
+
+    if streaming:
+        await generator.generate_templates_stream(TITLES, 'くびれヘア', on_template)
+    else:
+        await generator.generate_templates_async(TITLES, 'くびれヘア')
+    finished = time.perf_counter()
+    first = first or finished
+    return (first - started) * 1000, (finished - started) * 1000
+
+
+async def main(count: int, duration: float) -> None:
+    settings = dataclasses.replace(config.get_settings(), gemini_api_key='bench')
+    async with fake_gemini(duration) as base_url:
+        client = genai.Client(api_key='bench', http_options=types.HttpOptions(base_url=base_url))
+        generator = TemplateGenerator(settings=settings, client=client)
+        results = {}
+        for label, streaming in (('non-stream', False), ('stream', True)):
+            samples = [await measure(generator, streaming) for _ in range(count)]
+            results[label] = samples
+        await client.aio.aclose()
+
+    print(f'偽 Gemini: {config.MAX_TEMPLATES} 件の出力を {duration:.1f} 秒かけて返す, {count} 回')
+    for label, samples in results.items():
+        print(summarize(f'{label} first', [first for first, _ in samples]))
+        print(summarize(f'{label} all', [total for _, total in samples]))
+
+
+if __name__ == '__main__':
+    import logging
+
+    logging.disable(logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--count', type=int, default=5)
+    parser.add_argument('--duration', type=float, default=5.0, help='出力全体にかかる秒数')
+    args = parser.parse_args()
+    asyncio.run(main(args.count, args.duration))
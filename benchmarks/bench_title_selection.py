@@ -0,0 +1,133 @@
+"""参照タイトルの選別（app/title_selection.py）でプロンプトの入力トークンがどれだけ減るかを測る。
+
+タイトルの集合ごとに、以前のプロンプト（全タイトルを json.dumps(indent=2)）と
+今のプロンプト（近似重複を除き、予算内で 1 行 1 件）のトークン数を比べ、選別にかかった時間も示す。
+
+    python benchmarks/bench_title_selection.py
+    python benchmarks/bench_title_selection.py --corpus path/to/title_sets/
+    python benchmarks/bench_title_selection.py --count-tokens   # GEMINI_API_KEY が必要
+
+タイトルの集合:
+
+- tests/fixtures/hotpepper/ の各ページ（実ページの構造を縮めたもの）と、その全ページを合わせたもの
+- 上の全ページに、記号・空白・年代の有無だけを変えた言い回し違いを混ぜたもの（合成。
+  検索結果で同じサロンのスタイルが並ぶ状況を模す）
+- --corpus のディレクトリにある *.json（1 ファイル 1 集合。タイトルの文字列の配列）。
+  本番でスクレイピングした結果を置けば、実データでの削減量が分かる
+
+トークン数は既定では estimate_tokens() の見積もり。--count-tokens を付けると
+Gemini の count_tokens API で実際の数を数える（生成はしないので課金されない）。
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+from _support import summarize
+
+from app import config
+from app.html_parsers import parse_search_page
+from app.prompts import build_generation_prompt
+from app.title_selection import estimate_tokens, format_reference_titles, select_reference_titles
+
+FIXTURES_DIR = Path(__file__).resolve().parent.parent / 'tests' / 'fixtures' / 'hotpepper'
+KEYWORD = 'くびれ'
+
+
+def _variants(title: str) -> list[str]:
+    """記号・空白・年代だけが違う言い回し。"""
+    return [
+        title.replace('◎', '/').replace('×', '◆'),
+        title.replace('　', '').replace(' ', '') + '♪',
+        '20代30代 ' + title,
+    ]
+
+
+def title_sets(corpus: Path | None) -> dict[str, list[str]]:
+    sets = {}
+    for path in sorted(FIXTURES_DIR.glob('*.html')):
+        titles = parse_search_page(path.read_text(encoding='utf-8')).titles
+        if titles:
+            sets[path.stem] = titles
+    combined = [title for titles in sets.values() for title in titles]
+    sets['fixtures (全ページ)'] = combined
+    sets['fixtures + 言い回し違い（合成）'] = [
+        variant for title in combined for variant in [title, *_variants(title)]
+    ]
+    if corpus is not None:
+        for path in sorted(corpus.glob('*.json')):
+            sets[path.stem] = json.loads(path.read_text(encoding='utf-8'))
+    return sets
+
+
+def prompts(titles: list[str], model: str, budget: int) -> tuple[str, str, int]:
+    """(以前のプロンプト, 今のプロンプト, 選別後の件数)"""
+    whole = build_generation_prompt(titles, KEYWORD)
+    before = whole.replace(
+        format_reference_titles(titles), json.dumps(titles, ensure_ascii=False, indent=2)
+    )
+    selection = select_reference_titles(titles, model, budget)
+    return before, build_generation_prompt(selection.titles, KEYWORD), len(selection.titles)
+
+
+def main(corpus: Path | None, model: str, budget: int, count_tokens: bool, repeat: int) -> None:
+    if count_tokens:
+        from google import genai
+
+        client = genai.Client(api_key=os.environ['GEMINI_API_KEY'])
+
+        def count(text: str) -> int:
+            return client.models.count_tokens(model=model, contents=text).total_tokens
+
+        print(f'モデル: {model}（count_tokens で計数）, 予算: {budget} トークン')
+    else:
+
+        def count(text: str) -> int:
+            return estimate_tokens(text, model)
+
+        print(f'モデル: {model}（見積もり）, 予算: {budget} トークン')
+
+    total_before = total_after = 0
+    for name, titles in title_sets(corpus).items():
+        before, after, kept = prompts(titles, model, budget)
+        tokens_before, tokens_after = count(before), count(after)
+        total_before += tokens_before
+        total_after += tokens_after
+        print(
+            f'{name:<32} タイトル {len(titles):4d} → {kept:4d} 件  '
+            f'プロンプト {tokens_before:6d} → {tokens_after:6d} トークン '
+            f'({(tokens_after - tokens_before) / tokens_before:+.1%})'
+        )
+
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            select_reference_titles(titles, model, budget)
+            samples.append((time.perf_counter() - started) * 1000)
+        print(f'  {summarize("選別", samples)}')
+
+    print(
+        f'合計: {total_before} → {total_after} トークン '
+        f'({(total_after - total_before) / total_before:+.1%})'
+    )
+
+
+if __name__ == '__main__':
+    import logging
+
+    logging.disable(logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', type=Path, help='タイトルの集合（*.json）を置いたディレクトリ')
+    parser.add_argument('--model', default=config.DEFAULT_MODEL)
+    parser.add_argument(
+        '--budget',
+        type=int,
+        default=config.get_settings().reference_title_token_budget,
+        help='参照タイトルの推定トークン数の上限（既定は REFERENCE_TITLE_TOKEN_BUDGET）',
+    )
+    parser.add_argument('--count-tokens', action='store_true', help='count_tokens API で数える')
+    parser.add_argument('-n', '--repeat', type=int, default=200)
+    args = parser.parse_args()
+    main(args.corpus, args.model, args.budget, args.count_tokens, args.repeat)
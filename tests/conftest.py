@@ -1,8 +1,10 @@
+import copy
 import os
 import shutil
 import sys
 import tempfile
 from contextlib import contextmanager
+from types import MappingProxyType
 from unittest.mock import AsyncMock, patch
 
 import pytest
@@ -14,7 +16,9 @@ from app import (  # noqa: E402
     config,
     create_app,
 )
-from app.featured_keywords import EXTENSION_KEY  # noqa: E402
+from app.featured_keywords import EXTENSION_KEY, snapshot_version  # noqa: E402
+from app.keyword_matcher import KeywordMatcher  # noqa: E402
+from app.services.featured_service import list_featured_keywords, render_payload  # noqa: E402
 
 # ------------------------------------------------------------------
 # 共有のテストデータ
@@ -65,7 +69,10 @@ class FakeRepository:
 
     def __init__(self, keywords=(), *, available=None, last_error=None, raises=None):
         self._keywords = list(keywords)
-        self._by_keyword = {k['keyword'].lower().strip(): k for k in self._keywords}
+        # 実物と同じく読み取り専用の Mapping を返す
+        self._matcher = KeywordMatcher(
+            {k['keyword'].lower().strip(): MappingProxyType(dict(k)) for k in self._keywords}
+        )
         # available を明示しなければ「キーワードが1件以上あるか」で判定する（実物と同じ）
         self._available = bool(self._keywords) if available is None else available
         self._last_error = last_error
@@ -77,10 +84,8 @@ class FakeRepository:
             raise self._raises
         return self._available
 
-    def get_keyword_info(self, keyword):
-        if not keyword or not isinstance(keyword, str):
-            return None
-        return self._by_keyword.get(keyword.lower().strip())
+    def find_featured_keywords(self, text):
+        return self._matcher.find(text)
 
     def get_all_keywords(self):
         if self._raises is not None:
@@ -100,6 +105,21 @@ class FakeRepository:
             'error_type': type(self._last_error).__name__ if self._last_error else None,
         }
 
+    # lifespan が呼ぶ監視の開始・停止。監視するファイルが無いので何もしない
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def get_payload(self, gender):
+        # 実物は読み込み時に作っておくが、ここでは呼ばれるたびに同じ関数で組み立てる
+        # （raises で差し込んだ障害がリクエスト時に表に出るようにするため）
+        return render_payload(list_featured_keywords(self, gender))
+
+    def get_version(self):
+        return snapshot_version(self._keywords)
+
 
 # ------------------------------------------------------------------
 # フィクスチャ
@@ -107,7 +127,7 @@ class FakeRepository:
 
 
 @pytest.fixture(autouse=True)
-def setup_test_env(request, monkeypatch):
+def setup_test_env(request, monkeypatch, tmp_path):
     """テスト用の環境変数を差し込み、設定キャッシュをテストごとに作り直す。
 
     Settings は get_settings() の初回呼び出し時に環境変数から生成されるため、
@@ -117,7 +137,11 @@ def setup_test_env(request, monkeypatch):
 
     integration マーカーが付いたテストは実 API を呼ぶため、
     ダミーキーで上書きせず .env / 環境変数の実値をそのまま使う。
+
+    ワーカー間の共有キャッシュ（SQLite）はテストごとの一時ディレクトリに置き、
+    前のテストのスクレイピング結果が残らないようにする。
     """
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path / 'cache'))
     if not request.node.get_closest_marker('integration'):
         monkeypatch.setenv('GEMINI_API_KEY', 'test_api_key')
         monkeypatch.setenv('SCRAPING_DELAY_MIN', '0')
@@ -170,13 +194,25 @@ def use_repository(app):
     return _use
 
 
+@pytest.fixture
+def full_templates():
+    """MAX_TEMPLATES 件そろったテンプレート（生成結果のキャッシュに保持される件数）。"""
+    return [
+        {**DEFAULT_TEMPLATES[i % len(DEFAULT_TEMPLATES)], 'title': f'くびれヘア{i + 1}'}
+        for i in range(config.MAX_TEMPLATES)
+    ]
+
+
 @pytest.fixture
 def fake_pipeline():
     """スクレイパーと生成器を差し替える。
 
     ここは template_service の内部 import パスを文字列で指すしかないため、
-    その文字列がリポジトリ全体でこの 2 行にしか存在しない状態を保つ。
+    その文字列がリポジトリ全体でこのフィクスチャにしか存在しない状態を保つ。
     template_service の import を変えたときの修正箇所がここだけで済む。
+
+    ストリーミング生成（generate_templates_stream）は generate の結果を 1 件ずつ
+    on_template へ渡してから返す。どちらの経路でも返り値の generate で呼び出しを確認できる。
     """
 
     @contextmanager
@@ -185,14 +221,24 @@ def fake_pipeline():
             return_value=DEFAULT_SCRAPED_TITLES if titles is None else titles,
             side_effect=scrape_error,
         )
-        generate = AsyncMock(
-            return_value=(
-                DEFAULT_TEMPLATES if templates is None else templates,
-                [],
-                list(unapplied),
-            ),
-            side_effect=generate_error,
-        )
+        result = (DEFAULT_TEMPLATES if templates is None else templates, [], list(unapplied))
+
+        async def fake_generate(titles, keyword, raw_templates=None, **kwargs):
+            # 実物と同じく、季節・カラーを付加する前のテンプレートの複製を受け取れるようにする
+            if generate_error is not None:
+                raise generate_error
+            if raw_templates is not None:
+                raw_templates.extend(copy.deepcopy(result[0]))
+            return result
+
+        generate = AsyncMock(side_effect=fake_generate)
+
+        async def stream(titles, keyword, on_template, **kwargs):
+            result = await generate(titles, keyword, **kwargs)
+            for template in result[0]:
+                on_template(template)
+            return result
+
         with (
             patch(
                 'app.services.template_service.HotPepperScraper.scrape_titles_async',
@@ -202,6 +248,10 @@ def fake_pipeline():
                 'app.services.template_service.TemplateGenerator.generate_templates_async',
                 generate,
             ),
+            patch(
+                'app.services.template_service.TemplateGenerator.generate_templates_stream',
+                AsyncMock(side_effect=stream),
+            ),
         ):
             yield generate
 
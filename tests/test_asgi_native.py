@@ -0,0 +1,300 @@
+import asyncio
+import dataclasses
+import json
+
+import pytest
+from asgiref.wsgi import WsgiToAsgi
+
+from app import config
+from app.asgi_native import NativeRoutes, build_asgi_app
+from app.errors import OverloadedError
+from app.metrics import HTTP_REQUEST_SECONDS
+from app.metrics_exporter import RequestMetricsMiddleware
+
+
+class Recorder:
+    """ASGI の send に渡されたメッセージを記録する。"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def __call__(self, message):
+        self.messages.append(message)
+
+    @property
+    def status(self):
+        return self.messages[0]['status']
+
+    @property
+    def headers(self):
+        return {name.decode(): value.decode() for name, value in self.messages[0]['headers']}
+
+    @property
+    def body(self):
+        return b''.join(m.get('body', b'') for m in self.messages[1:])
+
+
+def _scope(method, path, headers=(), query=b''):
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': query,
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 12345),
+    }
+
+
+def _receiver(body, disconnect=None):
+    """本文を 1 回で渡し、その後は disconnect が立つまで（省略時はずっと）切断しないクライアント"""
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await (disconnect or asyncio.Event()).wait()
+        return {'type': 'http.disconnect'}
+
+    return receive
+
+
+async def call(asgi_app, method, path, body=b'', headers=(), query=b''):
+    if body:
+        headers = [*headers, ('Content-Length', str(len(body)))]
+    send = Recorder()
+    await asgi_app(_scope(method, path, headers, query), _receiver(body), send)
+    return send
+
+
+async def post_json(asgi_app, payload, headers=()):
+    return await call(
+        asgi_app,
+        'POST',
+        '/api/generate',
+        json.dumps(payload).encode(),
+        [('Content-Type', 'application/json'), *headers],
+    )
+
+
+def _events(body):
+    """SSE の本文を (event, data) のリストにする（stage とコメント行は除く）"""
+    events = []
+    for block in body.decode().split('\n\n'):
+        lines = [line for line in block.splitlines() if line and not line.startswith(':')]
+        if not lines:
+            continue
+        fields = dict(line.split(': ', 1) for line in lines)
+        if fields['event'] != 'stage':
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@pytest.fixture
+def stacks(app):
+    """同じ Flask アプリの、ネイティブの経路と WsgiToAsgi だけの経路"""
+    settings = config.get_settings()
+    return {
+        'native': build_asgi_app(app, settings),
+        'wsgi': build_asgi_app(app, dataclasses.replace(settings, native_asgi=False)),
+    }
+
+
+def test_build_asgi_app_can_be_turned_off(app):
+    settings = config.get_settings()
+    assert isinstance(build_asgi_app(app, settings), NativeRoutes)
+    assert isinstance(
+        build_asgi_app(app, dataclasses.replace(settings, native_asgi=False)), WsgiToAsgi
+    )
+
+
+@pytest.mark.asyncio
+class TestParity:
+    """ネイティブの経路は、Flask の経路と同じ応答を返す"""
+
+    @pytest.mark.parametrize(
+        'payload',
+        [
+            {'keyword': 'くびれヘア', 'gender': 'ladies', 'seasons': ['spring']},
+            {'keyword': '', 'gender': 'ladies'},
+            {'keyword': 'ボブ', 'gender': 'unknown'},
+            {'keyword': 'ボブ', 'regenerate': 'false'},
+            ['not', 'an', 'object'],
+        ],
+    )
+    async def test_generate_json(self, stacks, fake_pipeline, payload):
+        with fake_pipeline():
+            native = await post_json(stacks['native'], payload)
+            wsgi = await post_json(stacks['wsgi'], payload)
+
+        assert native.status == wsgi.status
+        assert native.headers['content-type'] == wsgi.headers['content-type']
+        assert json.loads(native.body) == json.loads(wsgi.body)
+
+    async def test_server_timing_header(self, stacks, fake_pipeline):
+        payload = {'keyword': 'ボブ', 'gender': 'ladies'}
+        with fake_pipeline():
+            native = await post_json(stacks['native'], payload)
+            wsgi = await post_json(stacks['wsgi'], payload)
+
+        metrics = [
+            [part.split(';')[0] for part in send.headers['server-timing'].split(', ')]
+            for send in (native, wsgi)
+        ]
+        assert metrics[0] == metrics[1]
+        assert metrics[0][-1] == 'total'
+
+    async def test_request_latency_is_recorded_once(self, stacks, fake_pipeline):
+        labels = {'route': '/api/generate', 'method': 'POST', 'status': '200'}
+        before = HTTP_REQUEST_SECONDS.count(**labels)
+        with fake_pipeline():
+            for stack in stacks.values():
+                await post_json(
+                    RequestMetricsMiddleware(stack), {'keyword': 'ボブ', 'gender': 'ladies'}
+                )
+
+        assert HTTP_REQUEST_SECONDS.count(**labels) == before + 2
+
+    async def test_invalid_json_body(self, stacks):
+        headers = [('Content-Type', 'application/json')]
+        native = await call(stacks['native'], 'POST', '/api/generate', b'{broken', headers)
+        wsgi = await call(stacks['wsgi'], 'POST', '/api/generate', b'{broken', headers)
+
+        assert native.status == wsgi.status == 400
+        assert json.loads(native.body) == json.loads(wsgi.body)
+
+    async def test_unexpected_error_is_not_leaked(self, stacks, fake_pipeline):
+        payload = {'keyword': 'ボブ', 'gender': 'ladies'}
+        with fake_pipeline(generate_error=Exception('secret detail')):
+            native = await post_json(stacks['native'], payload)
+
+        assert native.status == 500
+        assert b'secret detail' not in native.body
+        assert json.loads(native.body)['error']['code'] == 'INTERNAL_SERVER_ERROR'
+
+    async def test_overloaded_keeps_retry_after(self, stacks, fake_pipeline):
+        payload = {'keyword': 'ボブ', 'gender': 'ladies'}
+        with fake_pipeline(generate_error=OverloadedError(5)):
+            native = await post_json(stacks['native'], payload)
+            wsgi = await post_json(stacks['wsgi'], payload)
+
+        assert native.status == wsgi.status == 503
+        assert native.headers['retry-after'] == wsgi.headers['retry-after'] == '5'
+        assert json.loads(native.body) == json.loads(wsgi.body)
+
+    async def test_stream(self, stacks, fake_pipeline):
+        payload = {'keyword': 'くびれヘア', 'gender': 'ladies'}
+        headers = [('Accept', 'text/event-stream')]
+        with fake_pipeline():
+            native = await post_json(stacks['native'], payload, headers)
+            wsgi = await post_json(stacks['wsgi'], payload, headers)
+
+        assert native.status == wsgi.status == 200
+        assert native.headers['content-type'] == wsgi.headers['content-type']
+        assert native.headers['cache-control'] == 'no-cache'
+        assert native.headers['x-accel-buffering'] == 'no'
+        assert _events(native.body) == _events(wsgi.body)
+        assert [event for event, _ in _events(native.body)] == ['template', 'template', 'done']
+
+    @pytest.mark.parametrize('query', [b'gender=ladies', b'gender=mens', b'', b'gender=x'])
+    async def test_featured_keywords(self, stacks, query):
+        native = await call(stacks['native'], 'GET', '/api/featured-keywords', query=query)
+        wsgi = await call(stacks['wsgi'], 'GET', '/api/featured-keywords', query=query)
+
+        assert native.status == wsgi.status
+        assert json.loads(native.body) == json.loads(wsgi.body)
+        assert native.headers.get('etag') == wsgi.headers.get('etag')
+        assert native.headers.get('cache-control') == wsgi.headers.get('cache-control')
+
+    async def test_featured_keywords_not_modified(self, stacks):
+        first = await call(stacks['native'], 'GET', '/api/featured-keywords')
+        etag = first.headers['etag']
+
+        native = await call(
+            stacks['native'], 'GET', '/api/featured-keywords', headers=[('If-None-Match', etag)]
+        )
+
+        assert native.status == 304
+        assert native.body == b''
+        assert native.headers['etag'] == etag
+
+
+@pytest.mark.asyncio
+class TestRouting:
+    async def test_other_paths_go_to_flask(self, stacks):
+        index = await call(stacks['native'], 'GET', '/')
+        missing = await call(stacks['native'], 'GET', '/no-such-page')
+
+        assert index.status == 200
+        assert index.headers['content-type'].startswith('text/html')
+        assert missing.status == 404
+
+    async def test_other_methods_go_to_flask(self, stacks):
+        response = await call(stacks['native'], 'GET', '/api/generate')
+
+        assert response.status == 405
+        assert json.loads(response.body)['success'] is False
+
+
+@pytest.mark.asyncio
+class TestStreamDisconnect:
+    async def test_generation_is_cancelled_when_client_disconnects(self, app, fake_scraper):
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def slow_scrape(*args, **kwargs):
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        disconnect = asyncio.Event()
+        receive = _receiver(
+            json.dumps({'keyword': 'ボブ', 'gender': 'ladies'}).encode(), disconnect
+        )
+        headers = [('Content-Type', 'application/json'), ('Accept', 'text/event-stream')]
+        send = Recorder()
+        routes = NativeRoutes(app, fallback=None)
+        with fake_scraper() as scrape:
+            scrape.side_effect = slow_scrape
+            task = asyncio.create_task(
+                routes(_scope('POST', '/api/generate', headers), receive, send)
+            )
+            await started.wait()
+            disconnect.set()
+            await asyncio.wait_for(task, 1)
+
+        assert cancelled.is_set()
+
+    async def test_keepalive_is_sent_while_waiting(self, app, fake_scraper):
+        release = asyncio.Event()
+
+        async def slow_scrape(*args, **kwargs):
+            await release.wait()
+            return []
+
+        send = Recorder()
+        routes = NativeRoutes(app, fallback=None, keepalive=0.01)
+        headers = [('Content-Type', 'application/json'), ('Accept', 'text/event-stream')]
+        receive = _receiver(json.dumps({'keyword': 'ボブ', 'gender': 'ladies'}).encode())
+
+        with fake_scraper() as scrape:
+            scrape.side_effect = slow_scrape
+            task = asyncio.create_task(
+                routes(_scope('POST', '/api/generate', headers), receive, send)
+            )
+            await asyncio.sleep(0.05)
+            release.set()
+            await asyncio.wait_for(task, 1)
+
+        assert b': keep-alive\n\n' in send.body
+        assert _events(send.body)[-1][1]['error']['code'] == 'NO_RESULTS_FOUND'
@@ -0,0 +1,145 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.cache import TTLCache
+from app.stages import recording, report_stage
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.mark.asyncio
+class TestGetOrLoad:
+    async def test_fresh_value_is_served_without_loading(self, clock):
+        cache = TTLCache(ttl=60, clock=clock)
+        loader = AsyncMock(return_value=('A',))
+
+        assert await cache.get_or_load('key', loader) == ('A',)
+        clock.now = 59
+        assert await cache.get_or_load('key', loader) == ('A',)
+
+        loader.assert_awaited_once()
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 1
+
+    async def test_stale_value_is_served_and_refreshed_in_background(self, clock):
+        cache = TTLCache(ttl=60, stale_ttl=30, clock=clock)
+        await cache.get_or_load('key', AsyncMock(return_value='old'))
+        clock.now = 70
+        loader = AsyncMock(return_value='new')
+
+        # 期限切れ・猶予内: 古い値がすぐに返り、取り直しは裏で行われる
+        assert await cache.get_or_load('key', loader) == 'old'
+        assert await cache.get_or_load('key', loader) == 'old'
+        await asyncio.sleep(0)
+
+        assert await cache.get_or_load('key', loader) == 'new'
+        # 取り直しは同じキーで重ねない
+        loader.assert_awaited_once()
+        stats = cache.stats()
+        assert stats['stale_hits'] == 2
+        assert stats['refreshes'] == 1
+
+    async def test_refresh_uses_refresh_loader_when_given(self, clock):
+        """取り直しはリクエストに縛られない refresh_loader で行い、loader は呼ばない"""
+        cache = TTLCache(ttl=60, stale_ttl=30, clock=clock)
+        await cache.get_or_load('key', AsyncMock(return_value='old'))
+        clock.now = 70
+        loader = AsyncMock(return_value='request')
+        refresh_loader = AsyncMock(return_value='new')
+
+        assert await cache.get_or_load('key', loader, refresh_loader=refresh_loader) == 'old'
+        await asyncio.sleep(0)
+
+        assert await cache.get_or_load('key', loader) == 'new'
+        loader.assert_not_awaited()
+        refresh_loader.assert_awaited_once()
+
+    async def test_refresh_does_not_report_to_the_triggering_request(self, clock):
+        """裏の取り直しは、それを引き起こしたリクエストの処理段階として記録されない"""
+        cache = TTLCache(ttl=60, stale_ttl=30, clock=clock)
+        await cache.get_or_load('key', AsyncMock(return_value='old'))
+        clock.now = 70
+
+        async def load():
+            report_stage('page_scraped')
+            return 'new'
+
+        with recording() as recorder:
+            assert await cache.get_or_load('key', load) == 'old'
+            await asyncio.sleep(0)
+
+        assert await cache.get_or_load('key', load) == 'new'
+        assert recorder.stages == []
+
+    async def test_failed_refresh_keeps_stale_value(self, clock):
+        cache = TTLCache(ttl=60, stale_ttl=30, clock=clock)
+        await cache.get_or_load('key', AsyncMock(return_value='old'))
+        clock.now = 70
+
+        assert await cache.get_or_load('key', AsyncMock(side_effect=OSError)) == 'old'
+        await asyncio.sleep(0)
+
+        assert await cache.get_or_load('key', AsyncMock(return_value='unused')) == 'old'
+        assert cache.stats()['refresh_failures'] == 1
+
+    async def test_value_past_stale_window_is_reloaded(self, clock):
+        cache = TTLCache(ttl=60, stale_ttl=30, clock=clock)
+        await cache.get_or_load('key', AsyncMock(return_value='old'))
+        clock.now = 90
+
+        assert await cache.get_or_load('key', AsyncMock(return_value='new')) == 'new'
+        assert cache.stats()['misses'] == 2
+
+    async def test_loader_errors_on_miss_are_raised(self, clock):
+        cache = TTLCache(ttl=60, clock=clock)
+
+        with pytest.raises(OSError):
+            await cache.get_or_load('key', AsyncMock(side_effect=OSError))
+
+        assert cache.stats()['size'] == 0
+
+    async def test_cache_if_rejects_values(self, clock):
+        cache = TTLCache(ttl=60, clock=clock)
+        loader = AsyncMock(return_value=())
+
+        await cache.get_or_load('key', loader, cache_if=bool)
+        await cache.get_or_load('key', loader, cache_if=bool)
+
+        assert loader.await_count == 2
+
+    async def test_zero_ttl_disables_cache(self, clock):
+        cache = TTLCache(ttl=0, clock=clock)
+        loader = AsyncMock(return_value='A')
+
+        await cache.get_or_load('key', loader)
+        await cache.get_or_load('key', loader)
+
+        assert loader.await_count == 2
+        assert cache.stats()['size'] == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(ttl=60, max_entries=2, clock=clock)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')  # a を最近使ったことにする
+
+    cache.put('c', 3)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
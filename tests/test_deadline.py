@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from app.deadline import Deadline, enforce
+from app.errors import DeadlineExceededError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_remaining_counts_down_and_stops_at_zero():
+    clock = FakeClock()
+    deadline = Deadline(10, clock=clock)
+
+    clock.now = 4.0
+    assert deadline.remaining() == pytest.approx(6.0)
+    assert deadline.remaining(reserve=5) == pytest.approx(1.0)
+
+    clock.now = 12.0
+    assert deadline.remaining() == 0
+
+
+def test_check_raises_once_reserve_is_reached():
+    clock = FakeClock()
+    deadline = Deadline(10, clock=clock)
+    deadline.check('scrape', reserve=5)
+
+    clock.now = 5.0
+    with pytest.raises(DeadlineExceededError) as excinfo:
+        deadline.check('scrape', reserve=5)
+
+    assert excinfo.value.status_code == 504
+
+
+def test_non_positive_seconds_means_no_deadline():
+    assert Deadline.after(0) is None
+    assert isinstance(Deadline.after(30), Deadline)
+
+
+@pytest.mark.asyncio
+class TestEnforce:
+    async def test_cancels_work_past_the_deadline(self):
+        with pytest.raises(DeadlineExceededError):
+            async with Deadline(0.01).enforce('gemini'):
+                await asyncio.sleep(1)
+
+    async def test_other_timeouts_pass_through(self):
+        """ブロックの中の処理自身のタイムアウトは締め切り切れと区別する"""
+        with pytest.raises(TimeoutError):
+            async with Deadline(10).enforce('gemini'):
+                raise TimeoutError()
+
+    async def test_without_deadline_does_nothing(self):
+        async with enforce(None, 'gemini'):
+            await asyncio.sleep(0)
@@ -13,6 +13,7 @@ from app.errors import (
     AppError,
     ErrorCode,
     NoResultsError,
+    OverloadedError,
     ScrapingError,
     ValidationError,
     error_payload,
@@ -78,3 +79,12 @@ class TestHttpErrorResponses:
         assert data['error']['code'] == ErrorCode.INTERNAL_SERVER_ERROR
         # 例外の中身がそのまま漏れていないこと
         assert '想定外' not in data['error']['message']
+
+    def test_overloaded_returns_503_with_retry_after(self, client, fake_pipeline):
+        """Gemini の呼び出しが混み合っていれば、再試行までの秒数を添えて 503 で返す"""
+        with fake_pipeline(generate_error=OverloadedError(2.3)):
+            response = client.post('/api/generate', json={'keyword': 'ボブ', 'gender': 'ladies'})
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '3'
+        assert json.loads(response.data)['error']['code'] == ErrorCode.OVERLOADED
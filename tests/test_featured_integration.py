@@ -13,6 +13,8 @@ API拡張機能の統合テスト
 
 import json
 
+from app.services.featured_service import list_featured_keywords, render_payload
+
 FEATURED_LADIES = {
     'name': 'テスト用くびれヘア',
     'keyword': 'くびれヘア',
@@ -126,6 +128,9 @@ class TestFeaturedKeywordsAPI:
             def get_health_status(self):
                 return {}
 
+            def get_payload(self, gender):
+                return render_payload(list_featured_keywords(self, gender))
+
         app.extensions[EXTENSION_KEY] = BrokenOnDegradedPath()
 
         response = client.get('/api/featured-keywords')
@@ -186,6 +191,41 @@ class TestFeaturedKeywordsAPI:
         data = json.loads(response.data)
         assert [k['gender'] for k in data['keywords']] == ['mens']
 
+    def test_response_has_strong_etag_and_cache_control(self, use_repository, client):
+        """応答には強い ETag と Cache-Control が付く"""
+        use_repository([FEATURED_LADIES])
+
+        response = client.get('/api/featured-keywords')
+
+        etag, weak = response.get_etag()
+        assert etag and not weak
+        assert response.cache_control.public is True
+        assert response.cache_control.max_age > 0
+
+    def test_matching_if_none_match_returns_304(self, use_repository, client):
+        """If-None-Match が一致すれば本文なしの 304 を返す"""
+        use_repository([FEATURED_LADIES])
+        etag = client.get('/api/featured-keywords').headers['ETag']
+
+        response = client.get('/api/featured-keywords', headers={'If-None-Match': etag})
+
+        assert response.status_code == 304
+        assert response.data == b''
+        assert response.headers['ETag'] == etag
+
+    def test_etag_differs_by_gender(self, use_repository, client):
+        """性別ごとに本文が違うので ETag も違い、他方の ETag では 304 にならない"""
+        use_repository([FEATURED_LADIES])
+        ladies_etag = client.get('/api/featured-keywords?gender=ladies').headers['ETag']
+
+        response = client.get(
+            '/api/featured-keywords?gender=mens', headers={'If-None-Match': ladies_etag}
+        )
+
+        assert response.status_code == 200
+        assert response.headers['ETag'] != ladies_etag
+        assert json.loads(response.data)['keywords'] == []
+
 
 class TestTemplateGenerationAPI:
     """テンプレート生成API (/api/generate) の特集対応テストクラス"""
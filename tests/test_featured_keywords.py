@@ -8,6 +8,7 @@ FeaturedKeywordsManagerのユニットテスト
 - データ検証機能
 """
 
+import asyncio
 import json
 import logging
 import os
@@ -284,19 +285,32 @@ class TestFeaturedKeywordsManager:
         info = manager.get_keyword_info("存在しないキーワード")
         assert info is None
 
-    def test_get_keyword_info_returns_copy(self, valid_keywords_file):
-        """get_keyword_infoが独立したコピーを返すことのテスト"""
+    def test_get_keyword_info_returns_read_only_record(self, valid_keywords_file):
+        """get_keyword_infoが複製せずに読み取り専用の情報を返すことのテスト"""
         manager = FeaturedKeywordsManager(valid_keywords_file)
 
         info1 = manager.get_keyword_info("くびれヘア")
-        info2 = manager.get_keyword_info("くびれヘア")
+        info2 = manager.get_keyword_info("  くびれヘア ")
 
-        # 異なるオブジェクトであることを確認
-        assert info1 is not info2
+        # 参照のたびに複製しない
+        assert info1 is info2
 
-        # 一方を変更しても他方に影響しないことを確認
-        info1['name'] = "変更されたテスト"
-        assert info2['name'] == "テスト用くびれヘア"
+        # 書き換えはできない
+        with pytest.raises(TypeError):
+            info1['name'] = "変更されたテスト"
+
+        # 呼び出し元が dict にして書き換えても、保持しているデータには影響しない
+        copied = dict(info1)
+        copied['name'] = "変更されたテスト"
+        assert manager.get_keyword_info("くびれヘア")['name'] == "テスト用くびれヘア"
+
+    def test_get_keyword_info_is_independent_of_keywords_list(self, valid_keywords_file):
+        """読み込んだリストを書き換えても参照用の情報は変わらないことのテスト"""
+        manager = FeaturedKeywordsManager(valid_keywords_file)
+
+        manager.keywords[0]['name'] = "変更されたテスト"
+
+        assert manager.get_keyword_info("くびれヘア")['name'] == "テスト用くびれヘア"
 
     def test_get_keyword_info_invalid_inputs(self, valid_keywords_file):
         """get_keyword_infoメソッドの無効な入力のテスト"""
@@ -337,6 +351,32 @@ class TestFeaturedKeywordsManager:
         original_keywords = manager.get_all_keywords()
         assert original_keywords[0]['name'] == "テスト用くびれヘア"
 
+    def test_payloads_are_built_once_per_gender(self, valid_keywords_file):
+        """一覧の応答本文は読み込み時に性別ごとに作られ、リクエストでは使い回されることのテスト"""
+        manager = FeaturedKeywordsManager(valid_keywords_file)
+
+        with patch.object(manager, 'get_all_keywords') as get_all_keywords:
+            ladies = manager.get_payload('ladies')
+            assert manager.get_payload('ladies') is ladies
+            mens = manager.get_payload('mens')
+        get_all_keywords.assert_not_called()
+
+        assert [k['keyword'] for k in json.loads(ladies.body)['keywords']] == ['くびれヘア']
+        assert [k['keyword'] for k in json.loads(mens.body)['keywords']] == ['韓国風マッシュ']
+        assert ladies.etag != mens.etag
+
+    def test_payload_of_unavailable_manager_has_message(self, temp_dir):
+        """読み込みに失敗したときも、降格メッセージ入りの本文が用意されることのテスト"""
+        manager = FeaturedKeywordsManager(os.path.join(temp_dir, 'nonexistent.json'))
+
+        data = json.loads(manager.get_payload('ladies').body)
+
+        assert data == {
+            'success': True,
+            'keywords': [],
+            'message': FeaturedKeywordsLoadError.DEFAULT_MESSAGE,
+        }
+
     def test_is_available(self, valid_keywords_file, temp_dir):
         """is_availableメソッドのテスト"""
         # 有効なキーワードが読み込まれている場合
@@ -547,6 +587,160 @@ class TestFeaturedKeywordsManager:
         assert '有効 1件, エラー 1件' in caplog.text
 
 
+MENS_ONLY = [
+    {
+        'name': '新しいメンズ特集',
+        'keyword': 'ツイストスパイラル',
+        'gender': 'mens',
+        'condition': '新しい掲載条件です。',
+    }
+]
+
+
+def _write(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+class TestFeaturedKeywordsReload:
+    """ファイルの変更を検知した読み込み直し"""
+
+    @pytest.fixture
+    def keywords_file(self, temp_dir, valid_keywords_data):
+        path = os.path.join(temp_dir, 'featured_keywords.json')
+        _write(path, valid_keywords_data)
+        return path
+
+    def test_unchanged_file_is_not_reloaded(self, keywords_file):
+        manager = FeaturedKeywordsManager(keywords_file)
+
+        with patch('app.featured_keywords.load_featured_keywords') as load:
+            assert manager.reload_if_changed() is False
+        load.assert_not_called()
+        assert manager.stats()['checks'] == 1
+        assert manager.stats()['reloads'] == 0
+
+    def test_changed_file_swaps_in_new_keywords(self, keywords_file):
+        manager = FeaturedKeywordsManager(keywords_file)
+        old_payload = manager.get_payload('mens')
+
+        _write(keywords_file, MENS_ONLY)
+
+        assert manager.reload_if_changed() is True
+        assert manager.get_keyword_info('くびれヘア') is None
+        assert manager.get_keyword_info('ツイストスパイラル')['name'] == '新しいメンズ特集'
+        mens = json.loads(manager.get_payload('mens').body)['keywords']
+        assert [k['keyword'] for k in mens] == ['ツイストスパイラル']
+        assert manager.get_payload('mens').etag != old_payload.etag
+        # 差し替え前に受け取った本文は書き換わらない
+        old_mens = json.loads(old_payload.body)['keywords']
+        assert [k['keyword'] for k in old_mens] == ['韓国風マッシュ']
+
+        stats = manager.stats()
+        assert stats['reloads'] == 1
+        assert stats['failures'] == 0
+        assert stats['last_reload_ms'] is not None
+        assert stats['last_reload_error'] is None
+
+    def test_version_changes_only_with_content(self, keywords_file, valid_keywords_data):
+        """版は内容で決まる（生成結果のキャッシュのキーに含め、差し替え前の結果を引かない）"""
+        manager = FeaturedKeywordsManager(keywords_file)
+        version = manager.get_version()
+        assert FeaturedKeywordsManager(keywords_file).get_version() == version
+
+        _write(keywords_file, MENS_ONLY)
+        manager.reload_if_changed()
+        assert manager.get_version() != version
+
+        # 中身の同じ書き直しでは、読み込み直しても元の版に戻る
+        _write(keywords_file, valid_keywords_data)
+        manager.reload_if_changed()
+        assert manager.get_version() == version
+
+    def test_broken_file_keeps_loaded_keywords(self, keywords_file):
+        """壊れたファイルでは差し替えず、次に変わるまで読み込み直さない"""
+        manager = FeaturedKeywordsManager(keywords_file)
+
+        with open(keywords_file, 'w', encoding='utf-8') as f:
+            f.write('[{"name": "書きかけ"')
+
+        assert manager.reload_if_changed() is False
+        assert manager.get_keyword_info('くびれヘア') is not None
+        assert manager.get_last_error() is None
+        assert manager.stats()['failures'] == 1
+        assert 'JSON形式が不正' in manager.stats()['last_reload_error']
+
+        with patch('app.featured_keywords.load_featured_keywords') as load:
+            assert manager.reload_if_changed() is False
+        load.assert_not_called()
+
+        _write(keywords_file, MENS_ONLY)
+        assert manager.reload_if_changed() is True
+        assert manager.stats()['last_reload_error'] is None
+
+    def test_partially_invalid_file_keeps_loaded_keywords(self, keywords_file):
+        """起動時はスキップして読み込む不正な項目も、読み込み直しでは差し替えを止める"""
+        manager = FeaturedKeywordsManager(keywords_file)
+
+        _write(keywords_file, [*MENS_ONLY, {**MENS_ONLY[0], 'keyword': '別', 'gender': 'kids'}])
+
+        assert manager.reload_if_changed() is False
+        assert manager.get_keyword_info('くびれヘア') is not None
+        assert manager.get_keyword_info('ツイストスパイラル') is None
+        assert manager.stats()['last_reload_error'] == '検証エラー 1 件'
+
+    def test_file_created_after_start_is_loaded(self, temp_dir):
+        path = os.path.join(temp_dir, 'featured_keywords.json')
+        manager = FeaturedKeywordsManager(path)
+        assert manager.is_available() is False
+
+        _write(path, MENS_ONLY)
+
+        assert manager.reload_if_changed() is True
+        assert manager.is_available() is True
+        assert manager.get_last_error() is None
+
+    def test_reload_rebuilds_matcher(self, keywords_file):
+        manager = FeaturedKeywordsManager(keywords_file)
+        assert manager.find_featured_keywords('ツイストスパイラルパーマ') == []
+
+        _write(keywords_file, MENS_ONLY)
+        manager.reload_if_changed()
+
+        (match,) = manager.find_featured_keywords('ツイストスパイラルパーマ')
+        assert (match.start, match.end) == (0, 9)
+        assert match.value['name'] == '新しいメンズ特集'
+
+    def test_health_status_includes_reload_stats(self, keywords_file):
+        manager = FeaturedKeywordsManager(keywords_file)
+
+        assert manager.get_health_status()['reload'] == manager.stats()
+
+    @pytest.mark.asyncio
+    async def test_watcher_reloads_in_background(self, keywords_file):
+        manager = FeaturedKeywordsManager(keywords_file, reload_interval=0.01)
+        await manager.start()
+        try:
+            _write(keywords_file, MENS_ONLY)
+            for _ in range(200):
+                if manager.get_keyword_info('ツイストスパイラル') is not None:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await manager.close()
+
+        assert manager.get_keyword_info('ツイストスパイラル') is not None
+        assert manager.stats()['reloads'] == 1
+
+    @pytest.mark.asyncio
+    async def test_zero_interval_does_not_watch(self, keywords_file):
+        manager = FeaturedKeywordsManager(keywords_file, reload_interval=0)
+        await manager.start()
+
+        assert manager._watcher is None
+        await manager.close()
+
+
 class TestFeaturedKeywordsExceptions:
     """特集キーワード例外クラスのテスト"""
 
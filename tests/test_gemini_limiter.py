@@ -0,0 +1,280 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.errors import DeadlineExceededError, OverloadedError
+from app.gemini_limiter import GeminiLimiter, GlobalSlots
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeSleep:
+    """待たずに時計だけ進める"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.waits = []
+
+    async def __call__(self, seconds):
+        self.waits.append(seconds)
+        self.clock.now += seconds
+
+
+@pytest.mark.asyncio
+class TestConcurrency:
+    async def test_in_flight_never_exceeds_max_concurrency(self):
+        limiter = GeminiLimiter(max_concurrency=2, max_queue=10, max_wait=5)
+        active = peak = 0
+
+        async def call():
+            nonlocal active, peak
+            async with limiter.admit():
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*(call() for _ in range(8)))
+
+        assert peak == 2
+        stats = limiter.stats()
+        assert stats['admitted'] == 8
+        assert stats['in_flight'] == 0
+        assert stats['waiting'] == 0
+        assert stats['queue_wait_ms_max'] > 0
+
+    async def test_full_queue_is_rejected_without_waiting(self):
+        limiter = GeminiLimiter(max_concurrency=1, max_queue=1, max_wait=5)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+
+        with pytest.raises(OverloadedError) as excinfo:
+            async with limiter.admit():
+                pass
+
+        assert excinfo.value.status_code == 503
+        assert excinfo.value.response_headers()['Retry-After'].isdigit()
+        release.set()
+        await asyncio.gather(holder, waiter)
+        assert limiter.stats()['rejected_queue_full'] == 1
+        assert limiter.stats()['admitted'] == 2
+
+    async def test_waiting_too_long_is_rejected_and_frees_queue(self):
+        limiter = GeminiLimiter(max_concurrency=1, max_queue=4, max_wait=0.02)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+
+        with pytest.raises(OverloadedError):
+            async with limiter.admit():
+                pass
+
+        assert limiter.stats()['waiting'] == 0
+        release.set()
+        await holder
+        # 諦めた呼び出しが枠を持ち去っていない
+        async with limiter.admit():
+            assert limiter.stats()['in_flight'] == 1
+        assert limiter.stats()['rejected_timeout'] == 1
+
+    async def test_wait_limited_by_request_deadline_is_deadline_exceeded(self):
+        """締め切りの残り時間が limiter の既定より短く、そちらで待ちきれなければ 504"""
+        limiter = GeminiLimiter(max_concurrency=1, max_queue=4, max_wait=5)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+
+        with pytest.raises(DeadlineExceededError) as excinfo:
+            async with limiter.admit(max_wait=0.02):
+                pass
+
+        assert excinfo.value.status_code == 504
+        release.set()
+        await holder
+        stats = limiter.stats()
+        assert stats['rejected_deadline'] == 1
+        assert stats['rejected_timeout'] == 0
+
+    async def test_cancelled_waiter_does_not_leak_slot(self):
+        limiter = GeminiLimiter(max_concurrency=1, max_queue=4, max_wait=5)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        await holder
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert limiter.stats()['in_flight'] == 0
+
+    async def test_zero_disables_concurrency_limit(self):
+        limiter = GeminiLimiter(max_concurrency=0, max_queue=0)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.admit():
+                await release.wait()
+
+        tasks = [asyncio.create_task(hold()) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert limiter.stats()['in_flight'] == 5
+        release.set()
+        await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+class TestBudget:
+    async def test_rpm_waits_for_oldest_call_to_leave_window(self):
+        clock = FakeClock()
+        sleep = FakeSleep(clock)
+        limiter = GeminiLimiter(1, max_wait=120, rpm=2, clock=clock, sleep=sleep)
+
+        for at in (0.0, 10.0, 15.0):
+            clock.now = max(clock.now, at)
+            async with limiter.admit():
+                pass
+
+        # 3 回目は 1 回目（0 秒）が 60 秒の窓から出るまで待つ
+        assert sleep.waits == [pytest.approx(45.0)]
+        assert limiter.stats()['calls_last_minute'] == 2
+
+    async def test_tpm_counts_recorded_usage(self):
+        clock = FakeClock()
+        sleep = FakeSleep(clock)
+        limiter = GeminiLimiter(1, max_wait=120, tpm=1000, clock=clock, sleep=sleep)
+
+        async with limiter.admit() as permit:
+            permit.record_usage(SimpleNamespace(total_token_count=1200))
+        clock.now = 5.0
+        async with limiter.admit() as permit:
+            permit.record_usage(None)
+
+        assert sleep.waits == [pytest.approx(55.0)]
+        assert limiter.stats()['tokens_last_minute'] == 0
+
+    async def test_budget_wait_beyond_max_wait_is_rejected(self):
+        clock = FakeClock()
+        sleep = FakeSleep(clock)
+        limiter = GeminiLimiter(1, max_wait=10, rpm=1, clock=clock, sleep=sleep)
+        async with limiter.admit():
+            pass
+
+        with pytest.raises(OverloadedError) as excinfo:
+            async with limiter.admit():
+                pass
+
+        assert excinfo.value.retry_after == 60
+        assert sleep.waits == []
+        assert limiter.stats()['rejected_budget'] == 1
+
+    async def test_budget_wait_beyond_request_deadline_is_deadline_exceeded(self):
+        clock = FakeClock()
+        sleep = FakeSleep(clock)
+        limiter = GeminiLimiter(1, max_wait=120, rpm=1, clock=clock, sleep=sleep)
+        async with limiter.admit():
+            pass
+
+        with pytest.raises(DeadlineExceededError):
+            async with limiter.admit(max_wait=10):
+                pass
+
+        assert sleep.waits == []
+        assert limiter.stats()['rejected_deadline'] == 1
+
+    async def test_rejected_call_does_not_use_rpm_budget(self):
+        """枠を取れずに断った呼び出しは、1 分あたりの呼び出し数に残らない"""
+        limiter = GeminiLimiter(max_concurrency=1, max_queue=0, max_wait=5, rpm=10)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        for _ in range(3):
+            with pytest.raises(OverloadedError):
+                async with limiter.admit():
+                    pass
+        release.set()
+        await holder
+
+        stats = limiter.stats()
+        assert stats['rejected_queue_full'] == 3
+        assert stats['calls_last_minute'] == 1
+
+    async def test_nothing_is_tracked_without_limits(self):
+        """rpm / tpm を設けなければ、呼び出しとトークン数の記録を溜め込まない"""
+        limiter = GeminiLimiter(max_concurrency=0)
+
+        for _ in range(5):
+            async with limiter.admit() as permit:
+                permit.record_usage(SimpleNamespace(total_token_count=1200))
+
+        assert len(limiter._calls) == 0
+        assert len(limiter._tokens) == 0
+        assert limiter.stats()['admitted'] == 5
+
+    async def test_token_records_are_pruned_on_append(self):
+        clock = FakeClock()
+        limiter = GeminiLimiter(0, tpm=10_000, clock=clock)
+
+        for at in range(0, 600, 30):
+            clock.now = float(at)
+            async with limiter.admit() as permit:
+                permit.record_usage(SimpleNamespace(total_token_count=10))
+
+        # stats() を呼ばなくても、窓（60 秒）の外の記録は捨てている
+        assert len(limiter._tokens) <= 2
+
+
+@pytest.mark.asyncio
+class TestGlobalSlots:
+    async def test_slots_are_shared_between_limiters(self, tmp_path):
+        """別々のワーカー（別の limiter）でも、同じディレクトリの枠を取り合う"""
+        first = GeminiLimiter(4, max_wait=0.05, global_slots=GlobalSlots(tmp_path, 1))
+        second = GeminiLimiter(4, max_wait=0.05, global_slots=GlobalSlots(tmp_path, 1))
+
+        async with first.admit():
+            with pytest.raises(OverloadedError):
+                async with second.admit():
+                    pass
+            # ワーカー内の枠は返している
+            assert second.stats()['in_flight'] == 0
+
+        async with second.admit():
+            pass
+        assert second.stats()['admitted'] == 1
+        assert second.stats()['rejected_timeout'] == 1
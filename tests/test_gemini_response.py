@@ -10,7 +10,7 @@ import pytest
 from google.genai import types
 
 from app.errors import GenerationError
-from app.gemini_response import extract_result
+from app.gemini_response import TemplateStreamParser, extract_result
 from app.schemas import GeneratedTemplate, GenerationResult, TrendingKeyword
 
 
@@ -168,3 +168,65 @@ class TestExtractResult:
 
             assert templates[0]["title"] == "タイトル1"
             assert trending == []
+
+
+class TestTemplateStreamParser:
+    """ストリーミングで届く JSON から、閉じたテンプレートを順に取り出すテスト"""
+
+    TEMPLATES = [
+        # 文字列の中の括弧・引用符で深さの数え方が狂わないこと
+        {
+            "title": "くびれ{ミディ}×[透明感]",
+            "menu": "カット",
+            "comment": '"艶"髪\\',
+            "hashtag": ["a"],
+        },
+        {"title": "ボブ", "menu": "カラー", "comment": "}]{[", "hashtag": ["b", "c"]},
+    ]
+
+    def _text(self):
+        return json.dumps(
+            {
+                "trending_keywords": [{"keyword": "くびれ", "count": 3, "reason": "多い"}],
+                "templates": self.TEMPLATES,
+            },
+            ensure_ascii=False,
+        )
+
+    def test_yields_templates_as_they_close(self):
+        """1 文字ずつ流しても、各テンプレートは閉じた時点でちょうど 1 回返る"""
+        parser = TemplateStreamParser()
+        text = self._text()
+        completed_at = []
+        templates = []
+        for i, ch in enumerate(text):
+            for template in parser.feed(ch):
+                completed_at.append(i)
+                templates.append(template)
+
+        assert templates == self.TEMPLATES
+        assert parser.template_count == 2
+        # 1 件目は全文を受け取る前に返っている
+        assert completed_at[0] < len(text) - 1
+        assert parser.trending_keywords() == [{"keyword": "くびれ", "count": 3, "reason": "多い"}]
+
+    def test_trending_keywords_inside_array_are_not_templates(self):
+        """templates 以外の配列の要素はテンプレートとして返さない"""
+        parser = TemplateStreamParser()
+
+        assert parser.feed(self._text()) == self.TEMPLATES
+
+    def test_truncated_stream_keeps_completed_templates(self):
+        """途中で切れても閉じた分は返り、トレンドキーワードは空として扱う"""
+        text = self._text()
+        cut = text.index('"ボブ"')
+        parser = TemplateStreamParser()
+
+        assert parser.feed(text[:cut]) == self.TEMPLATES[:1]
+        assert parser.trending_keywords() == []
+
+    def test_template_not_matching_schema_raises_generation_error(self):
+        parser = TemplateStreamParser()
+
+        with pytest.raises(GenerationError):
+            parser.feed('{"trending_keywords":[],"templates":[{"title":"ボブ"}')
@@ -5,15 +5,22 @@ Gemini クライアントを差し替える必要があるので、ここだけ
 test_gemini_response にある。
 """
 
+import asyncio
+import json
 from types import SimpleNamespace
 from unittest.mock import AsyncMock, patch
 
 import pytest
 from google.genai import types
 
-from app.errors import GenerationError
-from app.generator import TemplateGenerator
+from app import config
+from app.deadline import Deadline
+from app.errors import DeadlineExceededError, GenerationError
+from app.gemini_limiter import GeminiLimiter
+from app.generator import TemplateGenerator, build_request_config, request_config_within
 from app.schemas import GeneratedTemplate, GenerationResult
+from app.stages import recording
+from app.usage_ledger import UsageLedger
 
 
 class TestGenerateTemplatesAsync:
@@ -85,6 +92,75 @@ class TestGenerateTemplatesAsync:
         assert trending == []
         assert unapplied == []
 
+    @pytest.mark.asyncio
+    async def test_call_is_admitted_by_limiter(self):
+        """Gemini の呼び出しは limiter の枠の中で行い、使ったトークン数を知らせる"""
+        limiter = GeminiLimiter(max_concurrency=1, tpm=100_000)
+        generator = TemplateGenerator(limiter=limiter)
+        observed = []
+
+        async def generate_content(**kwargs):
+            observed.append(limiter.stats()['in_flight'])
+            return SimpleNamespace(
+                candidates=[SimpleNamespace(finish_reason=types.FinishReason.STOP)],
+                parsed=GenerationResult(trending_keywords=[], templates=[]),
+                text=None,
+                usage_metadata=SimpleNamespace(total_token_count=321),
+            )
+
+        with patch.object(generator.client.aio.models, 'generate_content', new=generate_content):
+            with pytest.raises(GenerationError):
+                await generator.generate_templates_async(['タイトル'], 'ボブ')
+
+        assert observed == [1]
+        stats = limiter.stats()
+        assert stats['in_flight'] == 0
+        assert stats['admitted'] == 1
+        assert stats['tokens_last_minute'] == 321
+
+    def test_prompt_uses_selected_reference_titles(self, generator):
+        """近似重複は除いてからプロンプトに載せる"""
+        prompt = generator._build_prompt(
+            ['大人可愛い◎くびれミディ', '大人可愛い／くびれミディ', '韓国風レイヤー'],
+            'くびれ',
+            [],
+            'ladies',
+            None,
+            None,
+        )
+
+        assert '大人可愛い◎くびれミディ\n韓国風レイヤー\n' in prompt
+        assert '大人可愛い／くびれミディ' not in prompt
+
+    @pytest.mark.asyncio
+    async def test_usage_is_recorded_in_ledger(self):
+        """使用量はモデル・キーワードタイプ・呼び出し方とともに台帳に残る"""
+        ledger = UsageLedger(None)
+        generator = TemplateGenerator(ledger=ledger)
+        response = SimpleNamespace(
+            candidates=[SimpleNamespace(finish_reason=types.FinishReason.STOP)],
+            parsed=GenerationResult(trending_keywords=[], templates=[]),
+            text=None,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=1200, candidates_token_count=300, total_token_count=1500
+            ),
+        )
+
+        with patch.object(
+            generator.client.aio.models, 'generate_content', new=AsyncMock(return_value=response)
+        ):
+            with pytest.raises(GenerationError):
+                await generator.generate_templates_async(
+                    ['タイトル'], 'ボブ', generation_context={'keyword_type': 'featured'}
+                )
+
+        [usage] = ledger.recent()
+        assert usage.model == generator.model_name
+        assert usage.keyword_type == 'featured'
+        assert usage.mode == 'json'
+        assert (usage.prompt_tokens, usage.output_tokens, usage.total_tokens) == (1200, 300, 1500)
+        assert usage.latency_ms >= 0
+
     @pytest.mark.asyncio
     async def test_seasons_are_appended_after_generation(self, generator):
         """季節・カラーはプロンプトではなく後処理で付加される"""
@@ -109,12 +185,15 @@ class TestGenerateTemplatesAsync:
         with patch.object(
             generator.client.aio.models, 'generate_content', new=AsyncMock(return_value=response)
         ) as mock_generate:
+            raw = []
             templates, _, unapplied = await generator.generate_templates_async(
-                ['既存タイトル'], 'ボブ', seasons=['spring']
+                ['既存タイトル'], 'ボブ', seasons=['spring'], raw_templates=raw
             )
 
         assert '春カラー' in templates[0]['title']
         assert unapplied == []
+        # 付加前のテンプレートは別の複製として受け取れる
+        assert raw[0]['title'] == 'ボブ'
         # プロンプトには季節・カラーを入れない
         prompt = mock_generate.call_args.kwargs['contents']
         assert '春カラー' not in prompt
@@ -160,3 +239,178 @@ class TestGenerateTemplatesAsync:
 
         with pytest.raises(ValidationError):
             await generator.generate_templates_async(['タイトル'], '')
+
+
+class TestGenerateTemplatesStream:
+    """generate_templates_stream（ストリーミング生成）のテスト"""
+
+    HASHTAGS = ['ボブ', 'カット', '髪型', 'ヘア', 'サロン', 'スタイル', 'トレンド']
+
+    @pytest.fixture
+    def generator(self):
+        return TemplateGenerator()
+
+    def _text(self, titles):
+        templates = [
+            {'title': title, 'menu': 'カット', 'comment': 'コメント', 'hashtag': self.HASHTAGS}
+            for title in titles
+        ]
+        return json.dumps({'trending_keywords': [], 'templates': templates}, ensure_ascii=False)
+
+    @staticmethod
+    def _chunks(text, size=7, finish_reason=types.FinishReason.STOP):
+        pieces = [text[i : i + size] for i in range(0, len(text), size)]
+        chunks = [
+            SimpleNamespace(text=piece, candidates=[SimpleNamespace(finish_reason=None)])
+            for piece in pieces
+        ]
+        chunks[-1].candidates[0].finish_reason = finish_reason
+        chunks[-1].usage_metadata = None
+        return chunks
+
+    @staticmethod
+    def _stream(chunks, received=None):
+        async def stream():
+            for chunk in chunks:
+                if received is not None:
+                    received.append(chunk)
+                yield chunk
+
+        return AsyncMock(return_value=stream())
+
+    @pytest.mark.asyncio
+    async def test_emits_each_template_before_stream_ends(self, generator):
+        chunks = self._chunks(self._text(['ボブ1', 'ボブ2', 'ボブ3']))
+        received = []
+        emitted = []
+
+        def on_template(template):
+            emitted.append((template['title'], len(received)))
+
+        with patch.object(
+            generator.client.aio.models,
+            'generate_content_stream',
+            new=self._stream(chunks, received),
+        ):
+            with recording() as recorder:
+                templates, trending, unapplied = await generator.generate_templates_stream(
+                    ['既存タイトル'], 'ボブ', on_template
+                )
+
+        assert [title for title, _ in emitted] == ['ボブ1', 'ボブ2', 'ボブ3']
+        assert [stage['stage'] for stage in recorder.stages] == [
+            'prompt_built',
+            'gemini_first_byte',
+            'gemini_done',
+            'validation_done',
+        ]
+        assert recorder.stages[-1]['valid'] == 3
+        # 1 件目は最後の断片を受け取る前に渡っている
+        assert emitted[0][1] < len(chunks)
+        assert [t['title'] for t in templates] == ['ボブ1', 'ボブ2', 'ボブ3']
+        assert trending == []
+        assert unapplied == []
+
+    @pytest.mark.asyncio
+    async def test_invalid_templates_are_skipped_and_seasons_applied(self, generator):
+        chunks = self._chunks(self._text(['ボブ', 'あ' * 31]))
+        emitted = []
+
+        with patch.object(
+            generator.client.aio.models, 'generate_content_stream', new=self._stream(chunks)
+        ):
+            raw = []
+            templates, _, unapplied = await generator.generate_templates_stream(
+                ['既存タイトル'], 'ボブ', emitted.append, seasons=['spring'], raw_templates=raw
+            )
+
+        assert [t['title'] for t in emitted] == ['ボブ◎春カラー']
+        assert [t['title'] for t in raw] == ['ボブ']
+        assert templates == emitted
+        assert unapplied == []
+
+    @pytest.mark.asyncio
+    async def test_truncation_after_valid_templates_completes(self, generator):
+        """打ち切られても送信済みの有効なテンプレートがあれば完了とする"""
+        text = self._text(['ボブ1', 'ボブ2'])
+        text = text[: text.index('ボブ2')]
+        chunks = self._chunks(text, finish_reason=types.FinishReason.MAX_TOKENS)
+
+        with patch.object(
+            generator.client.aio.models, 'generate_content_stream', new=self._stream(chunks)
+        ):
+            templates, _, _ = await generator.generate_templates_stream(
+                ['既存タイトル'], 'ボブ', lambda template: None
+            )
+
+        assert [t['title'] for t in templates] == ['ボブ1']
+
+    @pytest.mark.asyncio
+    async def test_truncation_without_templates_raises(self, generator):
+        chunks = self._chunks(
+            '{"trending_keywords":[],"templates":[{"ti', finish_reason=types.FinishReason.MAX_TOKENS
+        )
+
+        with patch.object(
+            generator.client.aio.models, 'generate_content_stream', new=self._stream(chunks)
+        ):
+            with pytest.raises(GenerationError, match='打ち切られました'):
+                await generator.generate_templates_stream(
+                    ['既存タイトル'], 'ボブ', lambda template: None
+                )
+
+    @pytest.mark.asyncio
+    async def test_deadline_keeps_templates_sent_so_far(self, generator):
+        """締め切りで打ち切られても、送信済みのテンプレートがあればその件数で完了とする"""
+        text = self._text(['ボブ1', 'ボブ2'])
+        first, rest = text[: text.index('ボブ2')], text[text.index('ボブ2') :]
+
+        async def stream():
+            yield SimpleNamespace(text=first, candidates=[SimpleNamespace(finish_reason=None)])
+            await asyncio.sleep(1)
+            yield SimpleNamespace(text=rest, candidates=[SimpleNamespace(finish_reason=None)])
+
+        with patch.object(
+            generator.client.aio.models,
+            'generate_content_stream',
+            new=AsyncMock(return_value=stream()),
+        ):
+            with patch.object(config, 'GEMINI_MIN_ATTEMPT_SECONDS', 0):
+                templates, _, _ = await generator.generate_templates_stream(
+                    ['既存タイトル'], 'ボブ', lambda template: None, deadline=Deadline(0.05)
+                )
+
+        assert [t['title'] for t in templates] == ['ボブ1']
+
+
+class TestDeadline:
+    """締め切りに合わせた Gemini の待ち時間と再試行回数"""
+
+    def test_full_budget_uses_shared_config(self):
+        assert request_config_within(120) is build_request_config()
+
+    def test_short_budget_splits_remaining_time_between_attempts(self):
+        options = request_config_within(50).http_options
+
+        assert options.retry_options.attempts == config.GEMINI_RETRY_ATTEMPTS
+        assert options.timeout < config.GEMINI_REQUEST_TIMEOUT_MS
+        assert options.timeout * options.retry_options.attempts <= 50_000
+
+    def test_very_short_budget_drops_retry(self):
+        options = request_config_within(config.GEMINI_MIN_ATTEMPT_SECONDS + 1).http_options
+
+        assert options.retry_options.attempts == 1
+        assert options.timeout == (config.GEMINI_MIN_ATTEMPT_SECONDS + 1) * 1000
+
+    @pytest.mark.asyncio
+    async def test_no_time_for_one_attempt_skips_the_call(self):
+        generator = TemplateGenerator()
+        generate_content = AsyncMock()
+
+        with patch.object(generator.client.aio.models, 'generate_content', new=generate_content):
+            with pytest.raises(DeadlineExceededError):
+                await generator.generate_templates_async(
+                    ['タイトル'], 'ボブ', deadline=Deadline(config.GEMINI_MIN_ATTEMPT_SECONDS - 1)
+                )
+
+        generate_content.assert_not_called()
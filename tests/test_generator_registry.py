@@ -0,0 +1,127 @@
+"""GeneratorRegistry（ワーカー共有の生成器）のテスト。Gemini には接続しない。"""
+
+import asyncio
+import dataclasses
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app import config
+from app.errors import ConfigurationError
+from app.gemini_limiter import GeminiLimiter
+from app.generator_registry import GeneratorRegistry
+from app.usage_ledger import UsageLedger
+
+
+class FakeClientFactory:
+    """genai.Client の代わりに、呼び出しを記録するだけのクライアントを作る"""
+
+    def __init__(self, warm_up_error=None):
+        self.clients = []
+        self.warm_up_error = warm_up_error
+
+    def __call__(self):
+        client = SimpleNamespace(
+            aio=SimpleNamespace(
+                models=SimpleNamespace(get=AsyncMock(side_effect=self.warm_up_error)),
+                aclose=AsyncMock(),
+            )
+        )
+        self.clients.append(client)
+        return client
+
+
+def _settings(**overrides):
+    return dataclasses.replace(config.get_settings(), **overrides)
+
+
+@pytest.mark.asyncio
+class TestGeneratorRegistry:
+    async def test_started_registry_reuses_one_client_across_models(self):
+        factory = FakeClientFactory()
+        registry = GeneratorRegistry(_settings(), client_factory=factory)
+        await registry.start()
+
+        lite = registry.get('gemini-3.1-flash-lite')
+        flash = registry.get('gemini-3-flash-preview')
+
+        assert registry.get('gemini-3.1-flash-lite') is lite
+        # サポート外のモデルは既定のモデルに寄せ、同じ生成器を返す
+        assert registry.get('unknown-model') is lite
+        assert flash.client is lite.client
+        assert len(factory.clients) == 1
+        assert lite.request_config is flash.request_config
+
+    async def test_registry_builds_per_request_generators_before_start(self):
+        factory = FakeClientFactory()
+        registry = GeneratorRegistry(_settings(), client_factory=factory)
+
+        assert registry.get() is not registry.get()
+        assert factory.clients == []
+
+    async def test_shared_and_per_request_generators_use_one_limiter(self):
+        limiter = GeminiLimiter(max_concurrency=2)
+        ledger = UsageLedger(None)
+        registry = GeneratorRegistry(
+            _settings(), client_factory=FakeClientFactory(), limiter=limiter, ledger=ledger
+        )
+        per_request = registry.get()
+        await registry.start()
+
+        assert per_request.limiter is limiter
+        assert registry.get().limiter is limiter
+        assert per_request.ledger is ledger
+        assert registry.get().ledger is ledger
+
+    async def test_other_event_loops_get_per_request_generators(self):
+        """開発サーバーのように別ループから呼ばれたときは共有しない"""
+        registry = GeneratorRegistry(_settings(), client_factory=FakeClientFactory())
+        await registry.start()
+        shared = registry.get()
+
+        async def from_other_loop():
+            return registry.get()
+
+        other = await asyncio.to_thread(asyncio.run, from_other_loop())
+
+        assert other is not shared
+
+    async def test_close_releases_client(self):
+        factory = FakeClientFactory()
+        registry = GeneratorRegistry(_settings(), client_factory=factory)
+        await registry.start()
+        registry.get()
+
+        await registry.close()
+        await registry.close()
+
+        factory.clients[0].aio.aclose.assert_awaited_once()
+        assert not registry.is_started
+
+    async def test_warm_up_on_start(self):
+        factory = FakeClientFactory()
+        registry = GeneratorRegistry(_settings(gemini_warmup=True), client_factory=factory)
+
+        await registry.start()
+
+        factory.clients[0].aio.models.get.assert_awaited_once_with(model=config.DEFAULT_MODEL)
+
+    async def test_warm_up_failure_does_not_stop_start(self, caplog):
+        factory = FakeClientFactory(warm_up_error=OSError('接続できません'))
+        registry = GeneratorRegistry(_settings(gemini_warmup=True), client_factory=factory)
+
+        await registry.start()
+
+        assert registry.is_started
+        assert 'ウォームアップに失敗' in caplog.text
+
+    async def test_missing_api_key_is_configuration_error(self, monkeypatch):
+        monkeypatch.delenv('GEMINI_API_KEY')
+        monkeypatch.setattr('app.config.load_dotenv', lambda: None)
+        config.reset_settings()
+        registry = GeneratorRegistry(client_factory=FakeClientFactory())
+        await registry.start()
+
+        with pytest.raises(ConfigurationError):
+            registry.get()
@@ -0,0 +1,111 @@
+"""検索結果ページのパーサー差し替えのテスト。
+
+tests/fixtures/hotpepper/ の HTML は実際の検索結果ページの構造を縮めて再現したもの
+（script 内の偽マークアップ、エンティティ、全角スペース、下部のページャーなどを含む）。
+インストール済みのすべてのパーサーで同じ結果になることを確かめる。
+"""
+
+import logging
+from pathlib import Path
+
+import pytest
+
+from app import html_parsers
+from app.html_parsers import (
+    PARSER_AUTO,
+    PARSER_HTML,
+    PARSER_LXML,
+    PARSER_SELECTOLAX,
+    ParsedPage,
+    available_backends,
+    parse_search_page,
+    resolve_backend,
+)
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures' / 'hotpepper'
+FIXTURES = sorted(path.name for path in FIXTURES_DIR.glob('*.html'))
+
+
+def _read_fixture(name: str) -> str:
+    return (FIXTURES_DIR / name).read_text(encoding='utf-8')
+
+
+@pytest.fixture(autouse=True)
+def clear_resolve_cache():
+    resolve_backend.cache_clear()
+    yield
+    resolve_backend.cache_clear()
+
+
+def _backend_params():
+    """インストールされていないパーサーは skip として残す（見落とさないように）。"""
+    params = []
+    for backend in html_parsers.PARSER_PREFERENCE:
+        marks = ()
+        if not html_parsers.is_available(backend):
+            marks = pytest.mark.skip(reason=f'{backend} がインストールされていない')
+        params.append(pytest.param(backend, marks=marks))
+    return params
+
+
+class TestFixtureExpectations:
+    """基準実装（html.parser）でフィクスチャの期待値を固定する。"""
+
+    def test_ladies_page_with_next_link(self):
+        result = parse_search_page(_read_fixture('ladies_page1.html'), PARSER_HTML)
+
+        assert len(result.titles) == 20
+        assert result.titles[0] == '大人可愛い◎くびれミディ×透明感グレージュ'
+        # エンティティは復号され、前後の空白・改行は落ちる
+        assert 'インナーカラー×ピンクベージュ&くびれ' in result.titles
+        # script 内やヘッダーの似た構造は拾わない
+        assert 'script内の偽タイトル' not in result.titles
+        assert 'ホットペッパービューティー' not in result.titles
+        assert result.has_next is True
+
+    def test_last_page_has_no_next_link(self):
+        """下部のページャーの「次へ」は対象外（上部のページャーだけを見る）"""
+        result = parse_search_page(_read_fixture('mens_last_page.html'), PARSER_HTML)
+
+        assert len(result.titles) == 9
+        assert result.has_next is False
+
+    def test_no_results_page(self):
+        result = parse_search_page(_read_fixture('no_results.html'), PARSER_HTML)
+
+        assert result == ParsedPage([], False)
+
+
+@pytest.mark.parametrize('backend', _backend_params())
+@pytest.mark.parametrize('fixture', FIXTURES)
+def test_backend_matches_html_parser(backend, fixture):
+    html = _read_fixture(fixture)
+
+    assert parse_search_page(html, backend) == parse_search_page(html, PARSER_HTML)
+
+
+@pytest.mark.parametrize('backend', _backend_params())
+def test_blank_html_is_empty_page(backend):
+    assert parse_search_page('  \n', backend) == ParsedPage([], False)
+
+
+class TestResolveBackend:
+    def test_auto_picks_fastest_available(self):
+        assert resolve_backend(PARSER_AUTO) == available_backends()[0]
+
+    def test_html_parser_is_always_available(self):
+        assert available_backends()[-1] == PARSER_HTML
+        assert resolve_backend(PARSER_HTML) == PARSER_HTML
+
+    def test_unknown_falls_back_with_warning(self, caplog):
+        with caplog.at_level(logging.WARNING, logger='app.html_parsers'):
+            assert resolve_backend('html5lib') == PARSER_HTML
+
+        assert 'html5lib' in caplog.text
+
+    @pytest.mark.parametrize('backend', [PARSER_SELECTOLAX, PARSER_LXML])
+    def test_missing_backend_falls_back(self, monkeypatch, backend):
+        monkeypatch.setattr(html_parsers, 'is_available', lambda name: name == PARSER_HTML)
+
+        assert resolve_backend(backend) == PARSER_HTML
+        assert resolve_backend(PARSER_AUTO) == PARSER_HTML
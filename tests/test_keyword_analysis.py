@@ -6,6 +6,7 @@ Flask のアプリケーションコンテキストなしでテストできる
 
 import pytest
 
+from app.keyword_matcher import KeywordMatcher
 from app.services.keyword_analysis import (
     KEYWORD_TYPE_ERROR,
     KEYWORD_TYPE_FEATURED,
@@ -30,14 +31,14 @@ class FakeRepository:
     """FeaturedKeywordsManager の最小限の代替"""
 
     def __init__(self, keywords=(), available=True):
-        self._by_keyword = {k['keyword'].lower(): k for k in keywords}
+        self._matcher = KeywordMatcher({k['keyword'].lower(): k for k in keywords})
         self._available = available
 
     def is_available(self):
         return self._available
 
-    def get_keyword_info(self, keyword):
-        return self._by_keyword.get(keyword.lower().strip())
+    def find_featured_keywords(self, text):
+        return self._matcher.find(text)
 
 
 class BrokenRepository:
@@ -65,6 +66,10 @@ class TestSplitKeywords:
     def test_ignores_empty_segments(self):
         assert split_keywords('くびれヘア  髪質改善') == ['くびれヘア', '髪質改善']
 
+    def test_splits_on_every_separator(self):
+        """以前は最初に見つかった区切り文字 1 種類だけで分割していた"""
+        assert split_keywords('くびれヘア 髪質改善,ボブ') == ['くびれヘア', '髪質改善', 'ボブ']
+
 
 class TestAnalyzeKeyword:
     def test_pure_featured_keyword(self):
@@ -98,6 +103,38 @@ class TestAnalyzeKeyword:
         assert result.is_featured is True
         assert result.featured_info == LADIES_FEATURED
 
+    def test_featured_keyword_without_separator_is_detected(self):
+        """区切り文字なしで書かれた特集キーワードも検出し、残りは通常キーワードとみなす"""
+        repo = FakeRepository([LADIES_FEATURED])
+
+        result = analyze_keyword('くびれヘアミディ', 'ladies', repo)
+
+        assert result.keyword_type == KEYWORD_TYPE_MIXED
+        assert result.is_featured is True
+        assert result.featured_info == LADIES_FEATURED
+
+    def test_single_character_featured_keyword_inside_a_word_is_not_detected(self):
+        """「夏」のような 1 文字の特集キーワードは「真夏」の一部としては拾わない"""
+        repo = FakeRepository([{**LADIES_FEATURED, 'keyword': '夏'}])
+
+        assert analyze_keyword('真夏ボブ', 'ladies', repo).is_featured is False
+        assert analyze_keyword('夏 ボブ', 'ladies', repo).is_featured is True
+
+    def test_featured_keywords_around_separators_only_are_pure(self):
+        repo = FakeRepository([LADIES_FEATURED, {**LADIES_FEATURED, 'keyword': '韓国風'}])
+
+        result = analyze_keyword('韓国風、くびれヘア', 'ladies', repo)
+
+        assert result.keyword_type == KEYWORD_TYPE_FEATURED
+        # 複数ある場合は入力中で最初に現れたもの
+        assert result.featured_info['keyword'] == '韓国風'
+
+    def test_separators_only_is_error(self):
+        result = analyze_keyword('、、', 'ladies', FakeRepository([LADIES_FEATURED]))
+
+        assert result.keyword_type == KEYWORD_TYPE_ERROR
+        assert result.processing_mode == MODE_FALLBACK
+
     def test_gender_mismatch_still_uses_featured(self):
         """性別が一致しなくても特集キーワードとして処理を継続する（仕様）"""
         repo = FakeRepository([LADIES_FEATURED])
@@ -0,0 +1,77 @@
+"""KeywordMatcher（Aho-Corasick による複数キーワードの同時検索）のテスト。"""
+
+from app.keyword_matcher import KeywordMatcher
+
+
+def spans(matcher, text):
+    return [(m.start, m.end, m.value) for m in matcher.find(text)]
+
+
+class TestKeywordMatcher:
+    def test_finds_keyword_without_separators(self):
+        matcher = KeywordMatcher({'ダークパープル': 'dark', 'ボブ': 'bob'})
+
+        assert spans(matcher, 'ダークパープルボブ') == [(0, 7, 'dark'), (7, 9, 'bob')]
+
+    def test_positions_index_the_input(self):
+        text = '大人 くびれヘア'
+        matcher = KeywordMatcher({'くびれヘア': 1})
+
+        (match,) = matcher.find(text)
+
+        assert text[match.start : match.end] == 'くびれヘア'
+
+    def test_longer_overlapping_match_wins(self):
+        matcher = KeywordMatcher({'くびれヘア': 'long', 'ヘア': 'short'})
+
+        assert spans(matcher, 'くびれヘアミディ') == [(0, 5, 'long')]
+
+    def test_longest_wins_even_when_it_starts_later(self):
+        matcher = KeywordMatcher({'ダーク': 'short', 'クパープルボブ': 'long'})
+
+        assert spans(matcher, 'ダークパープルボブ') == [(2, 9, 'long')]
+
+    def test_earlier_match_wins_between_equal_lengths(self):
+        matcher = KeywordMatcher({'ダークパープル': 'first', 'クパープルボブ': 'second'})
+
+        assert spans(matcher, 'ダークパープルボブ') == [(0, 7, 'first')]
+
+    def test_suffix_keywords_found_through_failure_links(self):
+        matcher = KeywordMatcher({'he': 'he', 'she': 'she', 'his': 'his', 'hers': 'hers'})
+
+        all_matches = {(m.start, m.end, m.value) for m in matcher.iter_matches('ushers')}
+
+        assert all_matches == {(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')}
+        assert spans(matcher, 'ushers') == [(2, 6, 'hers')]
+
+    def test_repeated_keyword_is_found_each_time(self):
+        matcher = KeywordMatcher({'ボブ': 1})
+
+        assert spans(matcher, 'ボブ、ミニボブ') == [(0, 2, 1), (5, 7, 1)]
+
+    def test_single_character_keyword_inside_a_word_is_not_returned(self):
+        """1 文字のキーワードは、前後が区切り文字か入力の端のときだけ一致とみなす"""
+        matcher = KeywordMatcher({'夏': 'summer', 'ダークパープル': 'dark'})
+
+        assert spans(matcher, '真夏') == []
+        assert spans(matcher, '夏色ボブ') == []
+        assert spans(matcher, 'ダークパープルボブ') == [(0, 7, 'dark')]
+        assert spans(matcher, '夏') == [(0, 1, 'summer')]
+        # 区切り文字は split_keywords と同じ
+        assert spans(matcher, '夏＋ダークパープル、真夏') == [(0, 1, 'summer'), (2, 9, 'dark')]
+
+    def test_custom_separators(self):
+        matcher = KeywordMatcher({'夏': 1}, separators='-')
+
+        assert spans(matcher, 'ボブ-夏') == [(3, 4, 1)]
+        assert spans(matcher, 'ボブ 夏') == []
+
+    def test_case_insensitive(self):
+        matcher = KeywordMatcher({'aラインボブ': 1})
+
+        assert spans(matcher, 'Aラインボブ') == [(0, 6, 1)]
+
+    def test_no_keywords_or_no_text(self):
+        assert KeywordMatcher({}).find('くびれヘア') == []
+        assert KeywordMatcher({'くびれヘア': 1}).find('') == []
+        assert len(KeywordMatcher({'': 1, 'ボブ': 2})) == 1
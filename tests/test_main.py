@@ -4,6 +4,8 @@ import logging
 import pytest
 
 from app import config, create_app
+from app.deadline import Deadline
+from app.errors import DeadlineExceededError
 
 
 def test_setup_logging_is_idempotent():
@@ -118,7 +120,9 @@ def test_generate_response_shape_is_stable(client, fake_pipeline):
         'is_featured',
         'featured_keyword_info',
         'unapplied_season_keywords',
+        'cache',
     }
+    assert data['cache'] == {'hit': False, 'age_seconds': None}
     # app/static/js がテンプレート1件ごとに参照するメタデータ
     assert 'is_featured' in data['templates'][0]
 
@@ -229,6 +233,151 @@ def test_generate_templates_route_generation_error(client, fake_pipeline):
         assert data['error']['code'] == 'INTERNAL_SERVER_ERROR'
 
 
+def test_generate_route_passes_request_deadline(app, client, fake_pipeline):
+    with fake_pipeline() as generate:
+        client.post('/api/generate', json={'keyword': 'ボブ', 'gender': 'ladies'})
+
+    deadline = generate.call_args.kwargs['deadline']
+    assert isinstance(deadline, Deadline)
+    assert deadline.seconds == app.config['REQUEST_DEADLINE']
+    assert 0 < deadline.remaining() <= deadline.seconds
+
+
+def test_generate_route_deadline_exceeded_is_504(client, fake_pipeline):
+    with fake_pipeline(generate_error=DeadlineExceededError()):
+        response = client.post('/api/generate', json={'keyword': 'ボブ', 'gender': 'ladies'})
+
+    assert response.status_code == 504
+    assert json.loads(response.data)['error']['code'] == 'DEADLINE_EXCEEDED'
+
+
+def test_generate_route_sets_server_timing_header(client, fake_pipeline):
+    with fake_pipeline():
+        response = client.post('/api/generate', json={'keyword': 'ボブ', 'gender': 'ladies'})
+
+    metrics = [part.split(';')[0] for part in response.headers['Server-Timing'].split(', ')]
+    assert 'analyze' in metrics
+    assert metrics[-1] == 'total'
+
+
+def test_server_timing_can_be_disabled(app, client, fake_pipeline):
+    app.config['SERVER_TIMING'] = False
+    with fake_pipeline():
+        response = client.post('/api/generate', json={'keyword': 'ボブ', 'gender': 'ladies'})
+
+    assert response.status_code == 200
+    assert 'Server-Timing' not in response.headers
+
+
+class TestGenerateStream:
+    """Accept: text/event-stream での /api/generate（テンプレートを 1 件ずつ SSE で返す）"""
+
+    HEADERS = {'Accept': 'text/event-stream'}
+
+    @staticmethod
+    def _events(response):
+        """SSE の本文を (event, data) のリストにする（keep-alive のコメント行は除く）"""
+        events = []
+        for block in response.get_data(as_text=True).split('\n\n'):
+            lines = [line for line in block.splitlines() if line and not line.startswith(':')]
+            if not lines:
+                continue
+            fields = dict(line.split(': ', 1) for line in lines)
+            events.append((fields['event'], json.loads(fields['data'])))
+        return events
+
+    def test_streams_templates_then_done(self, client, fake_pipeline):
+        with fake_pipeline():
+            response = client.post(
+                '/api/generate',
+                json={'keyword': 'くびれヘア', 'gender': 'ladies'},
+                headers=self.HEADERS,
+            )
+            events = self._events(response)
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        assert response.headers['Cache-Control'] == 'no-cache'
+        events = [(event, data) for event, data in events if event != 'stage']
+        assert [event for event, _ in events] == ['template', 'template', 'done']
+        assert events[0][1]['title'] == '大人可愛いくびれヘア'
+        # テンプレートごとのメタデータは JSON 応答と同じく付いている
+        assert events[0][1]['is_featured'] is True
+        done = events[-1][1]
+        assert done['success'] is True
+        assert done['count'] == 2
+        assert done['featured_keyword_info']['name'] == 'くびれヘア特集'
+        assert set(done) == {
+            'success',
+            'count',
+            'is_featured',
+            'featured_keyword_info',
+            'unapplied_season_keywords',
+            'cache',
+        }
+
+    def test_pipeline_error_is_sent_as_error_event(self, client, fake_scraper):
+        """ストリーム開始後の失敗は、JSON のエラー応答と同じ形の error イベントになる"""
+        with fake_scraper(titles=[]):
+            response = client.post(
+                '/api/generate',
+                json={'keyword': '存在しないキーワード', 'gender': 'ladies'},
+                headers=self.HEADERS,
+            )
+            events = self._events(response)
+
+        event, data = events[-1]
+        assert event == 'error'
+        assert data['success'] is False
+        assert data['error']['code'] == 'NO_RESULTS_FOUND'
+        assert data['error']['message']
+        assert data['status'] == 404
+
+    def test_unexpected_error_is_not_leaked(self, client, fake_pipeline):
+        with fake_pipeline(generate_error=Exception('secret detail')):
+            response = client.post(
+                '/api/generate', json={'keyword': '髪質改善'}, headers=self.HEADERS
+            )
+            events = self._events(response)
+
+        assert events[-1][0] == 'error'
+        assert events[-1][1]['error']['code'] == 'INTERNAL_SERVER_ERROR'
+        assert 'secret detail' not in response.get_data(as_text=True)
+
+    def test_stage_events_precede_templates(self, client, fake_pipeline):
+        """処理段階は到達順に、経過時間と時刻つきで届く"""
+        with fake_pipeline():
+            response = client.post(
+                '/api/generate', json={'keyword': 'くびれヘア'}, headers=self.HEADERS
+            )
+            events = self._events(response)
+
+        stages = [data for event, data in events if event == 'stage']
+        assert [stage['stage'] for stage in stages] == ['keyword_analyzed', 'titles_ready']
+        assert stages[0]['is_featured'] is True
+        assert stages[1]['titles'] == 3
+        assert stages[0]['elapsed_ms'] <= stages[1]['elapsed_ms']
+        assert all(stage['at'] > 0 for stage in stages)
+        # 段階はテンプレートより先に届く
+        assert [event for event, _ in events][:2] == ['stage', 'stage']
+
+    def test_validation_error_is_plain_json(self, client):
+        """入力の検証はストリームを始める前なので、通常の JSON エラーで返す"""
+        response = client.post('/api/generate', json={'gender': 'ladies'}, headers=self.HEADERS)
+
+        assert response.status_code == 400
+        assert response.get_json()['error']['code'] == 'VALIDATION_ERROR'
+
+    def test_streaming_does_not_coalesce(self, app, client, fake_pipeline):
+        """途中経過を届けられないので、ストリーミングは相乗りの対象にしない"""
+        from app.single_flight import EXTENSION_KEY
+
+        with fake_pipeline():
+            client.post('/api/generate', json={'keyword': '髪質改善'}, headers=self.HEADERS)
+
+        assert app.extensions[EXTENSION_KEY].stats()['leaders'] == 0
+
+
 def test_generate_templates_route_passes_seasons(client, fake_pipeline):
     """季節・カラー選択が正規化されてジェネレーターに渡されるテスト"""
     with fake_pipeline() as mock_generate:
@@ -281,6 +430,14 @@ def test_generate_templates_route_invalid_json(client):
     assert data['error']['code'] == 'INVALID_JSON'
 
 
+def test_non_string_model_returns_400_not_500(client):
+    """配列のモデル名は 400。以前は single_flight のキーに使われ TypeError で 500 になっていた"""
+    response = client.post('/api/generate', json={'keyword': 'ボブ', 'model': ['x']})
+
+    assert response.status_code == 400
+    assert json.loads(response.data)['error']['code'] == 'VALIDATION_ERROR'
+
+
 class TestParseGenerateRequest:
     """リクエストのパースは Flask コンテキスト無しで検証できる"""
 
@@ -322,6 +479,22 @@ class TestParseGenerateRequest:
         assert req.gender == 'ladies'
         assert req.seasons == []
         assert req.model == DEFAULT_MODEL
+        assert req.regenerate is False
+
+    @pytest.mark.parametrize('model', [None, '', 'gemini-unknown'])
+    def test_unsupported_model_falls_back_to_default(self, model):
+        """サポート外のモデル名はキーを作る前に既定のモデルへ置き換える"""
+        from app.config import DEFAULT_MODEL
+        from app.main import parse_generate_request
+
+        assert parse_generate_request({'keyword': 'ボブ', 'model': model}).model == DEFAULT_MODEL
+
+    def test_supported_model_is_kept(self):
+        from app.config import SUPPORTED_MODELS
+        from app.main import parse_generate_request
+
+        model = SUPPORTED_MODELS[-1]
+        assert parse_generate_request({'keyword': 'ボブ', 'model': model}).model == model
 
     @pytest.mark.parametrize('body', [[1, 2], 'ただの文字列', 42, None])
     def test_non_object_body_is_invalid_json(self, body):
@@ -344,6 +517,12 @@ class TestParseGenerateRequest:
             {'keyword': 'ボブ', 'seasons': False},
             {'keyword': 'ボブ', 'seasons': ''},
             {'keyword': 'ボブ', 'seasons': {}},
+            # 文字列の "false" を真と取り違えないよう、真偽値以外は弾く
+            {'keyword': 'ボブ', 'regenerate': 'false'},
+            {'keyword': 'ボブ', 'regenerate': 1},
+            # 以前は配列のままキーに使われ、single_flight で TypeError（500）になっていた
+            {'keyword': 'ボブ', 'model': ['x']},
+            {'keyword': 'ボブ', 'model': 1},
         ],
     )
     def test_invalid_values(self, body):
@@ -354,6 +533,79 @@ class TestParseGenerateRequest:
             parse_generate_request(body)
 
 
+class TestOutcomeCache:
+    """OUTCOME_CACHE_TTL を設定したときの /api/generate の生成結果キャッシュ"""
+
+    @pytest.fixture
+    def client(self, monkeypatch, repository):
+        from app.featured_keywords import EXTENSION_KEY
+
+        monkeypatch.setenv('OUTCOME_CACHE_TTL', '600')
+        config.reset_settings()
+        app = create_app()
+        app.config['TESTING'] = True
+        app.extensions[EXTENSION_KEY] = repository
+        return app.test_client()
+
+    def test_identical_request_is_served_from_cache(self, client, fake_pipeline, full_templates):
+        body = {'keyword': '髪質改善', 'gender': 'ladies'}
+        with fake_pipeline(templates=full_templates) as generate:
+            first = client.post('/api/generate', json=body).get_json()
+            second = client.post('/api/generate', json=body).get_json()
+
+        assert generate.await_count == 1
+        assert first['cache'] == {'hit': False, 'age_seconds': None}
+        assert second['cache']['hit'] is True
+        assert second['cache']['age_seconds'] >= 0
+        assert second['templates'] == first['templates']
+
+    def test_regenerate_bypasses_cache(self, client, fake_pipeline, full_templates):
+        body = {'keyword': '髪質改善', 'gender': 'ladies'}
+        with fake_pipeline(templates=full_templates) as generate:
+            client.post('/api/generate', json=body)
+            data = client.post('/api/generate', json={**body, 'regenerate': True}).get_json()
+
+        assert generate.await_count == 2
+        assert data['cache']['hit'] is False
+
+    def test_outcome_is_shared_between_workers(
+        self, client, repository, fake_pipeline, full_templates
+    ):
+        """別のワーカー（同じ CACHE_DIR を使う別のアプリ）が生成した結果も使える"""
+        from app.featured_keywords import EXTENSION_KEY
+
+        other = create_app()
+        other.extensions[EXTENSION_KEY] = repository
+        body = {'keyword': '髪質改善', 'gender': 'ladies'}
+        with fake_pipeline(templates=full_templates) as generate:
+            client.post('/api/generate', json=body)
+            data = other.test_client().post('/api/generate', json=body).get_json()
+
+        assert generate.await_count == 1
+        assert data['cache']['hit'] is True
+
+    def test_cache_is_disabled_by_default(self, app, fake_pipeline, full_templates):
+        """既定（OUTCOME_CACHE_TTL=0）では毎回生成する"""
+        client = app.test_client()
+        body = {'keyword': '髪質改善', 'gender': 'ladies'}
+        with fake_pipeline(templates=full_templates) as generate:
+            client.post('/api/generate', json=body)
+            data = client.post('/api/generate', json=body).get_json()
+
+        assert generate.await_count == 2
+        assert data['cache']['hit'] is False
+
+    def test_short_outcome_is_not_cached(self, client, fake_pipeline):
+        """要求数に満たない結果（途中で打ち切られたストリームなど）は次のリクエストへ返さない"""
+        body = {'keyword': '髪質改善', 'gender': 'ladies'}
+        with fake_pipeline() as generate:
+            client.post('/api/generate', json=body)
+            data = client.post('/api/generate', json=body).get_json()
+
+        assert generate.await_count == 2
+        assert data['cache']['hit'] is False
+
+
 def test_empty_body_returns_400_not_500(client):
     """Content-Type なしの空ボディは 400。以前は get_json() が 415 を投げ 500 になっていた"""
     response = client.post('/api/generate')
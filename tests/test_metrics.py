@@ -0,0 +1,230 @@
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from app import config, create_app
+from app.metrics import (
+    GEMINI_RETRIES,
+    GEMINI_TOKENS,
+    HTTP_REQUEST_SECONDS,
+    TEMPLATE_REJECTIONS,
+    Counter,
+    Histogram,
+    count_gemini_retries,
+    record_usage,
+    route_label,
+)
+from app.metrics_exporter import ARCHIVE_FILENAME, MetricsExporter
+from app.template_validation import validate_template
+
+# プロセスが存在しない pid（Linux の pid_max より大きい）
+DEAD_PID = 2**30
+
+
+def _value(text: str, line_prefix: str) -> float:
+    """/metrics の本文から、line_prefix で始まる行の値を読む。"""
+    for line in text.splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    raise AssertionError(f'{line_prefix} が見つからない:\n{text}')
+
+
+class TestPrimitives:
+    def test_histogram_counts_each_bucket_and_outcome(self):
+        histogram = Histogram('test_seconds', 'テスト', ('outcome',), buckets=(1, 5))
+        histogram.observe(0.5, outcome='ok')
+        histogram.observe(3, outcome='ok')
+        with pytest.raises(ValueError), histogram.time():
+            raise ValueError
+
+        assert histogram.samples() == [
+            [['ok'], [1, 1, 0], 3.5],
+            [['error'], [1, 0, 0], pytest.approx(0, abs=1)],
+        ]
+        assert histogram.count(outcome='error') == 1
+
+    def test_merge_sums_samples_from_workers(self):
+        merged: dict = {}
+        Counter.merge(merged, [[['a'], 2]])
+        Counter.merge(merged, [[['a'], 3], [['b'], 1]])
+        assert merged == {('a',): 5, ('b',): 1}
+
+        merged = {}
+        Histogram.merge(merged, [[['x'], [1, 0], 0.5]])
+        Histogram.merge(merged, [[['x'], [0, 2], 9.0]])
+        assert merged == {('x',): [[1, 2], 9.5]}
+
+    @pytest.mark.parametrize(
+        'path,label',
+        [
+            ('/api/generate', '/api/generate'),
+            ('/static/js/main.js', '/static'),
+            ('/wp-login.php', 'other'),
+        ],
+    )
+    def test_route_label_keeps_cardinality_bounded(self, path, label):
+        assert route_label(path) == label
+
+
+def test_validate_template_counts_rejections_by_reason():
+    template = {'title': 'ボブ' * 20, 'menu': 'm', 'comment': 'c', 'hashtag': ['a'] * 7}
+    before = TEMPLATE_REJECTIONS.value(reason='title_too_long')
+
+    assert validate_template(template, 'ボブ') is False
+    assert validate_template({'title': 'ボブ'}, 'ボブ') is False
+
+    assert TEMPLATE_REJECTIONS.value(reason='title_too_long') == before + 1
+    assert TEMPLATE_REJECTIONS.value(reason='missing_key') >= 1
+
+
+def test_record_usage_adds_tokens_per_kind():
+    before = GEMINI_TOKENS.value(model='test-model', kind='prompt')
+    usage = SimpleNamespace(
+        prompt_token_count=1200,
+        candidates_token_count=800,
+        thoughts_token_count=None,
+        total_token_count=2000,
+    )
+
+    record_usage(usage, 'test-model')
+    record_usage(None, 'test-model')
+
+    assert GEMINI_TOKENS.value(model='test-model', kind='prompt') == before + 1200
+    assert GEMINI_TOKENS.value(model='test-model', kind='thoughts') == 0
+
+
+@pytest.fixture
+def sdk_logger():
+    """フィルタもレベルも付いていない SDK のロガー（テスト後に元へ戻す）。"""
+    sdk_logger = logging.getLogger(config.GEMINI_SDK_LOGGER)
+    level, filters = sdk_logger.level, sdk_logger.filters[:]
+    sdk_logger.filters.clear()
+    sdk_logger.setLevel(logging.NOTSET)
+    yield sdk_logger
+    sdk_logger.filters[:] = filters
+    sdk_logger.setLevel(level)
+
+
+def test_sdk_retry_log_is_counted(sdk_logger, caplog):
+    count_gemini_retries()
+    count_gemini_retries()
+    before = GEMINI_RETRIES.value()
+
+    with caplog.at_level(logging.INFO, logger=config.GEMINI_SDK_LOGGER):
+        sdk_logger.info('Retrying _async_request in 1.2 seconds as it raised ServerError: 503.')
+        sdk_logger.info('unrelated')
+
+    assert GEMINI_RETRIES.value() == before + 1
+
+
+def test_sdk_retry_log_is_counted_at_default_log_level(sdk_logger):
+    """ログのレベルが既定の WARNING でも数え、出力されなかった INFO ログは出さない"""
+    root = logging.getLogger()
+    level = root.level
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    root.setLevel(logging.WARNING)
+    root.addHandler(handler)
+    count_gemini_retries()
+    before = GEMINI_RETRIES.value()
+
+    try:
+        sdk_logger.info('Retrying _async_request in 1.2 seconds as it raised ServerError: 503.')
+        sdk_logger.warning('warning from sdk')
+    finally:
+        root.removeHandler(handler)
+        root.setLevel(level)
+
+    assert GEMINI_RETRIES.value() == before + 1
+    assert [r.getMessage() for r in records] == ['warning from sdk']
+
+
+class TestExporter:
+    @staticmethod
+    def _write_worker(directory, pid, tokens, gauges=None):
+        directory.mkdir(parents=True, exist_ok=True)
+        data = {
+            'pid': pid,
+            'metrics': {GEMINI_TOKENS.name: [[['other-model', 'total'], tokens]]},
+            'gauges': gauges or {},
+        }
+        (directory / f'{pid}.json').write_text(json.dumps(data))
+
+    def test_render_sums_counters_and_labels_gauges_by_pid(self, tmp_path):
+        other_pid = os.getppid()
+        self._write_worker(tmp_path, other_pid, 100, {'title_generator_x_in_flight': 2})
+        exporter = MetricsExporter(tmp_path, lambda: {'title_generator_x_in_flight': 1})
+        before = GEMINI_TOKENS.value(model='other-model', kind='total')
+        GEMINI_TOKENS.inc(5, model='other-model', kind='total')
+
+        text = exporter.render()
+
+        total = 'title_generator_gemini_tokens_total{model="other-model",kind="total"}'
+        assert _value(text, total) == before + 105
+        assert _value(text, f'title_generator_x_in_flight{{pid="{os.getpid()}"}}') == 1
+        assert _value(text, f'title_generator_x_in_flight{{pid="{other_pid}"}}') == 2
+        assert text.count('# TYPE title_generator_x_in_flight gauge') == 1
+        # 自分の値も書き出し、ほかのワーカーから読めるようにする
+        assert (tmp_path / f'{os.getpid()}.json').exists()
+
+    def test_dead_worker_counters_move_to_archive(self, tmp_path):
+        self._write_worker(tmp_path, DEAD_PID, 40, {'title_generator_x_in_flight': 3})
+        exporter = MetricsExporter(tmp_path)
+        before = GEMINI_TOKENS.value(model='other-model', kind='total')
+
+        first = exporter.render()
+        second = exporter.render()
+
+        total = 'title_generator_gemini_tokens_total{model="other-model",kind="total"}'
+        assert _value(first, total) == _value(second, total) == before + 40
+        assert not (tmp_path / f'{DEAD_PID}.json').exists()
+        assert (tmp_path / ARCHIVE_FILENAME).exists()
+        # 終了したワーカーのゲージは出さない
+        assert f'pid="{DEAD_PID}"' not in second
+
+    def test_retire_moves_own_values_to_archive(self, tmp_path):
+        exporter = MetricsExporter(tmp_path, pid=DEAD_PID + 1)
+        asyncio.run(exporter.close())
+
+        archive = json.loads((tmp_path / ARCHIVE_FILENAME).read_text())
+        assert GEMINI_TOKENS.name in archive['metrics']
+        assert not (tmp_path / f'{DEAD_PID + 1}.json').exists()
+
+    def test_histogram_is_rendered_cumulatively(self):
+        exporter = MetricsExporter(None)
+        HTTP_REQUEST_SECONDS.observe(0.07, route='/metrics', method='PUT', status='418')
+        HTTP_REQUEST_SECONDS.observe(200, route='/metrics', method='PUT', status='418')
+
+        text = exporter.render()
+
+        labels = 'route="/metrics",method="PUT",status="418"'
+        name = 'title_generator_http_request_duration_seconds'
+        assert _value(text, f'{name}_bucket{{{labels},le="0.05"}}') == 0
+        assert _value(text, f'{name}_bucket{{{labels},le="0.1"}}') == 1
+        assert _value(text, f'{name}_bucket{{{labels},le="+Inf"}}') == 2
+        assert _value(text, f'{name}_count{{{labels}}}') == 2
+
+
+class TestMetricsRoute:
+    def test_metrics_route_reports_component_stats(self, client):
+        response = client.get('/metrics')
+
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain; version=0.0.4')
+        text = response.get_data(as_text=True)
+        assert '# TYPE title_generator_http_request_duration_seconds histogram' in text
+        pid = f'{{pid="{os.getpid()}"}}'
+        assert f'title_generator_gemini_limiter_in_flight{pid}' in text
+        assert _value(text, f'title_generator_featured_keywords_keywords_count{pid}') == 2
+
+    def test_metrics_can_be_disabled(self):
+        settings = dataclasses.replace(config.get_settings(), metrics_enabled=False)
+        response = create_app(settings).test_client().get('/metrics')
+
+        assert response.status_code == 404
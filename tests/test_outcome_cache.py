@@ -0,0 +1,145 @@
+import pytest
+
+from app.outcome_cache import OutcomeCache
+from app.shared_cache import SharedCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_returns_copy_with_age():
+    clock = FakeClock()
+    cache = OutcomeCache(ttl=60, clock=clock)
+    value = {'templates': [{'title': 'A'}]}
+
+    cache.put('key', value)
+    clock.now = 12.5
+    cached, age = cache.get('key')
+
+    assert cached == value
+    assert age == 12.5
+    # 呼び出し元が書き換えても、保持している値には影響しない
+    cached['templates'][0]['title'] = 'B'
+    value['templates'].clear()
+    assert cache.get('key')[0] == {'templates': [{'title': 'A'}]}
+
+
+def test_expired_value_is_not_returned():
+    clock = FakeClock()
+    cache = OutcomeCache(ttl=60, clock=clock)
+    cache.put('key', 'value')
+
+    clock.now = 60
+    assert cache.get('key') is None
+    assert cache.stats()['size'] == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = OutcomeCache(ttl=60, max_entries=2, clock=FakeClock())
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == (1, 0.0)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_find_returns_first_available_key():
+    clock = FakeClock()
+    cache = OutcomeCache(ttl=60, clock=clock)
+    cache.put('b', 'B')
+    cache.put('c', 'C')
+    clock.now = 5
+
+    assert cache.find(['a', 'b', 'c']) == ('B', 5)
+    assert cache.find(['a']) is None
+    assert cache.stats()['reuses'] == 1
+    assert cache.stats()['misses'] == 0
+
+
+def test_disabled_cache_keeps_nothing():
+    cache = OutcomeCache(ttl=0)
+    cache.put('key', 'value')
+
+    assert not cache.enabled
+    assert cache.get('key') is None
+    assert cache.stats()['stores'] == 0
+
+
+def test_stats():
+    cache = OutcomeCache(ttl=60, clock=FakeClock())
+    cache.get('key')
+    cache.put('key', 'value')
+    cache.get('key')
+    cache.record_bypass()
+
+    assert cache.stats() == {
+        'size': 1,
+        'evictions': 0,
+        'hits': 1,
+        'misses': 1,
+        'reuses': 0,
+        'shared_hits': 0,
+        'bypasses': 1,
+        'stores': 1,
+    }
+
+
+@pytest.mark.asyncio
+class TestSharedTier:
+    """共有キャッシュ（他のワーカーや事前生成が書いた結果）"""
+
+    @staticmethod
+    def _cache(shared, wall_clock, clock=None):
+        return OutcomeCache(
+            ttl=600,
+            clock=clock or FakeClock(),
+            shared_cache=shared,
+            encode=list,
+            decode=tuple,
+            wall_clock=wall_clock,
+        )
+
+    async def test_value_stored_by_another_worker_is_found(self, tmp_path):
+        shared = SharedCache(tmp_path / 'shared.sqlite3')
+        wall = FakeClock()
+        wall.now = 1000.0
+        writer = self._cache(shared, wall)
+        reader = self._cache(shared, wall)
+
+        await writer.store('key', ('A', 'B'))
+        wall.now = 1030.0
+        found = await reader.lookup('key')
+
+        assert found.value == ('A', 'B')
+        assert found.age == 30.0
+        assert found.reused is False
+        assert reader.stats()['shared_hits'] == 1
+        # 2 回目はワーカー内で当たる
+        assert (await reader.lookup('key')).value == ('A', 'B')
+        assert reader.stats()['hits'] == 1
+
+    async def test_alternative_key_is_reused(self, tmp_path):
+        shared = SharedCache(tmp_path / 'shared.sqlite3')
+        wall = FakeClock()
+        await self._cache(shared, wall).store('other', ('A',))
+
+        found = await self._cache(shared, wall).lookup('key', ['missing', 'other'])
+
+        assert found.value == ('A',)
+        assert found.reused is True
+
+    async def test_value_older_than_ttl_is_ignored(self, tmp_path):
+        shared = SharedCache(tmp_path / 'shared.sqlite3')
+        wall = FakeClock()
+        await self._cache(shared, wall).store('key', ('A',))
+
+        wall.now = 600.0
+        assert await self._cache(shared, wall).lookup('key') is None
@@ -0,0 +1,138 @@
+"""ParseExecutor（解析をイベントループの外で行うプール）のテスト。"""
+
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from app import parse_executor as parse_executor_module
+from app.html_parsers import PARSER_HTML, ParsedPage, parse_search_page
+from app.parse_executor import (
+    PARSE_MODE_INLINE,
+    PARSE_MODE_PROCESS,
+    PARSE_MODE_THREAD,
+    ParseExecutor,
+)
+
+FIXTURE = Path(__file__).parent / 'fixtures' / 'hotpepper' / 'ladies_page1.html'
+
+
+@pytest.fixture
+def executor():
+    executor = ParseExecutor(PARSE_MODE_THREAD, workers=1, queue_limit=1)
+    yield executor
+    executor.shutdown()
+
+
+def _slow_parse(seconds: float):
+    def parse(html_text, backend):
+        time.sleep(seconds)
+        return ParsedPage([html_text], False)
+
+    return parse
+
+
+async def _ticks_during(coro) -> int:
+    """coro の実行中に、ループが 10ms 間隔の処理を何回進められたか。"""
+    ticks = 0
+    done = False
+
+    async def heartbeat():
+        nonlocal ticks
+        while not done:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0)
+    try:
+        await coro
+    finally:
+        done = True
+        await task
+    return ticks
+
+
+@pytest.mark.asyncio
+class TestParseExecutor:
+    async def test_thread_mode_keeps_loop_responsive(self, executor, monkeypatch):
+        monkeypatch.setattr(parse_executor_module, 'parse_search_page', _slow_parse(0.2))
+
+        ticks = await _ticks_during(executor.parse('<html>', PARSER_HTML))
+
+        assert ticks >= 5
+
+    async def test_inline_mode_blocks_loop(self, monkeypatch):
+        """比較用: inline は従来どおりループ上で解析するので、その間ループは止まる"""
+        monkeypatch.setattr(parse_executor_module, 'parse_search_page', _slow_parse(0.2))
+
+        ticks = await _ticks_during(ParseExecutor(PARSE_MODE_INLINE).parse('<html>', PARSER_HTML))
+
+        assert ticks <= 1
+
+    async def test_thread_mode_returns_parser_result(self, executor):
+        html = FIXTURE.read_text(encoding='utf-8')
+
+        assert await executor.parse(html, PARSER_HTML) == parse_search_page(html, PARSER_HTML)
+
+    async def test_process_mode_returns_parser_result(self):
+        html = FIXTURE.read_text(encoding='utf-8')
+        executor = ParseExecutor(PARSE_MODE_PROCESS, workers=1)
+        try:
+            result = await executor.parse(html, PARSER_HTML)
+        finally:
+            executor.shutdown()
+
+        assert result == parse_search_page(html, PARSER_HTML)
+
+    async def test_submissions_beyond_queue_limit_wait_on_loop(self, executor, monkeypatch):
+        """ワーカー 1・キュー 1 なら、同時に預けられるのは 2 件まで"""
+        release = threading.Event()
+        in_flight = []
+
+        def blocking_parse(html_text, backend):
+            in_flight.append(executor.stats()['in_flight'])
+            release.wait(5)
+            return ParsedPage([html_text], False)
+
+        monkeypatch.setattr(parse_executor_module, 'parse_search_page', blocking_parse)
+
+        tasks = [asyncio.create_task(executor.parse(str(i), PARSER_HTML)) for i in range(4)]
+        await asyncio.sleep(0.05)
+        assert executor.stats()['in_flight'] == 2
+        assert executor.stats()['queue_depth'] == 1
+
+        release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert [r.titles for r in results] == [['0'], ['1'], ['2'], ['3']]
+        assert max(in_flight) <= 2
+        stats = executor.stats()
+        assert stats['completed'] == 4
+        assert stats['in_flight'] == 0
+        assert stats['peak_queue_depth'] == 1
+
+    async def test_parse_errors_are_counted_and_raised(self, executor, monkeypatch):
+        def broken_parse(html_text, backend):
+            raise ValueError('壊れた HTML')
+
+        monkeypatch.setattr(parse_executor_module, 'parse_search_page', broken_parse)
+
+        with pytest.raises(ValueError):
+            await executor.parse('<html>', PARSER_HTML)
+
+        assert executor.stats()['failed'] == 1
+        assert executor.stats()['in_flight'] == 0
+
+    async def test_executor_is_recreated_after_shutdown(self, executor):
+        await executor.parse('<html></html>', PARSER_HTML)
+        executor.shutdown()
+        executor.shutdown()
+
+        assert await executor.parse('<html></html>', PARSER_HTML) == ParsedPage([], False)
+
+
+def test_unknown_mode_falls_back_to_thread():
+    assert ParseExecutor('fork').mode == PARSE_MODE_THREAD
@@ -23,10 +23,19 @@ class TestBuildGenerationPrompt:
 
         # プロンプトに必要な要素が含まれているか確認
         assert keyword in prompt
-        assert "[\n  \"" + titles[0] + "\"\n]" in prompt
+        assert "タイトルです：\n\n" + titles[0] + "\n\n## " in prompt
         assert "文字以内" in prompt  # 文字数制限の指示が含まれているか
         assert "JSON形式" in prompt  # 出力形式の指示が含まれているか
 
+    def test_reference_titles_are_one_per_line(self):
+        """参照タイトルは JSON ではなく 1 行 1 件で載せる（括弧・引用符・インデントのぶん短い）"""
+        titles = ["くびれミディ×透明感グレージュ", "韓国風レイヤーカット"]
+
+        prompt = build_generation_prompt(titles, "くびれ")
+
+        assert "タイトルです：\n\nくびれミディ×透明感グレージュ\n韓国風レイヤーカット\n\n" in prompt
+        assert '"くびれミディ×透明感グレージュ"' not in prompt
+
     def test_create_prompt_has_no_pv_boost_rules(self):
         """PV向上キーワードの強制配置ルールが撤廃されているかテスト"""
         titles = ["★髪質改善トリートメントで艶髪ストレート"]
@@ -255,3 +264,87 @@ class TestPromptTargetsMatchConfig:
         assert f"{config.COMMENT_TARGET[0]}〜{config.COMMENT_TARGET[1]}文字" in prompt
         assert f"{config.TITLE_TARGET[0]}〜{config.TITLE_TARGET[1]}文字" in prompt
         assert f"{config.HASHTAG_MIN_COUNT}個以上" in prompt
+
+
+class TestTitleLengthProfile:
+    """季節・カラー選択のうちプロンプトに効く部分（短尺タイトル枠）"""
+
+    def test_same_length_keywords_share_profile_and_prompt(self):
+        """春カラーと夏カラーは同じ長さなので、プロンプトも同じになる"""
+        from app.prompts import title_length_profile
+
+        assert title_length_profile(['spring']) == title_length_profile(['summer'])
+        assert build_generation_prompt(['タイトル'], 'ボブ', ['spring']) == build_generation_prompt(
+            ['タイトル'], 'ボブ', ['summer']
+        )
+        assert title_length_profile(['spring']) != title_length_profile(['bleach_free'])
+        assert title_length_profile([]) == ()
+
+    def test_compatible_profiles_cover_required_slots(self):
+        from app import config
+        from app.prompts import compatible_title_length_profiles, title_length_profile
+
+        profiles = compatible_title_length_profiles(['spring'])
+
+        # 同じ枠が先頭
+        assert profiles[0] == title_length_profile(['spring'])
+        assert title_length_profile(['spring', 'summer']) in profiles
+        assert title_length_profile(['bleach_free']) not in profiles
+        # 付加されずに残る短尺タイトルが多すぎるものは使わない
+        required = sum(slots for _, slots in profiles[0])
+        for profile in profiles:
+            extra = sum(slots for _, slots in profile) - required
+            assert extra <= config.SEASON_REUSE_MAX_EXTRA_SHORT_SLOTS
+
+
+class TestPromptSkeleton:
+    """性別と短尺タイトル枠ごとにキャッシュしたスケルトンへの差し込み"""
+
+    @pytest.mark.parametrize("gender", ["ladies", "mens"])
+    def test_skeleton_matches_full_rendering_for_every_season_choice(self, gender):
+        """どの季節・カラーの組み合わせでも、毎回全体を組み立てた場合と同じ文面になる"""
+        import itertools
+
+        from app import config
+        from app.prompts import (
+            GENDER_VOCABULARY,
+            _render_prompt,
+            build_title_length_rule,
+        )
+
+        keys = list(config.SEASON_COLOR_CHOICES)
+        for size in range(len(keys) + 1):
+            for combination in itertools.combinations(keys, size):
+                seasons = list(combination)
+                expected = _render_prompt(
+                    GENDER_VOCABULARY[gender],
+                    *build_title_length_rule(seasons),
+                    featured_instruction="",
+                    keyword="ボブ",
+                    reference_titles="タイトル",
+                )
+
+                assert build_generation_prompt(["タイトル"], "ボブ", seasons, gender) == expected
+
+    def test_skeleton_is_built_once_per_gender_and_profile(self):
+        from app.prompts import prompt_skeleton, title_length_profile
+
+        profile = title_length_profile(["spring"])
+
+        assert prompt_skeleton("ladies", profile) is prompt_skeleton("ladies", profile)
+        assert prompt_skeleton("ladies", profile) is not prompt_skeleton("mens", profile)
+
+    def test_user_input_is_spliced_verbatim(self):
+        """キーワードやタイトルに波括弧や目印と同じ文字があっても、そのまま差し込む"""
+        keyword = "{ボブ}\0keyword\0"
+        titles = ["{0}タイトル", "\0reference_titles\0"]
+
+        prompt = build_generation_prompt(titles, keyword)
+
+        assert prompt.count(keyword) == 3
+        assert "{0}タイトル\n\0reference_titles\0" in prompt
+
+    def test_unknown_gender_uses_ladies_skeleton(self):
+        assert build_generation_prompt(["タイトル"], "ボブ", gender="unknown") == (
+            build_generation_prompt(["タイトル"], "ボブ", gender="ladies")
+        )
@@ -0,0 +1,46 @@
+import pytest
+
+from app.rate_limit import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_is_served_without_waiting():
+    bucket = TokenBucket(rate=1, capacity=2, clock=FakeClock())
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+
+
+def test_requests_beyond_burst_wait_for_refill():
+    """予約方式なので、待ち時間は先に予約した件数ぶん積み上がる"""
+    bucket = TokenBucket(rate=2, capacity=1, clock=FakeClock())
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_tokens_refill_over_time_up_to_capacity():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=2, clock=clock)
+    bucket.reserve()
+    bucket.reserve()
+
+    clock.now = 100.0  # 長時間空いても容量を超えては貯まらない
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_non_positive_rate_disables_limit():
+    bucket = TokenBucket(rate=0, capacity=1, clock=FakeClock())
+
+    assert all(bucket.reserve() == 0 for _ in range(10))
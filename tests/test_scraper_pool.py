@@ -0,0 +1,171 @@
+"""ScraperPool と lifespan のテスト。
+
+ネットワークには出ない。共有セッションの受け渡しと、開始前・終了後の
+フォールバック、タイトルのキャッシュを検証する。
+"""
+
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app import config
+from app.lifespan import LifespanMiddleware
+from app.scraper_pool import EXTENSION_KEY, ScraperPool
+from app.scraping import HotPepperScraper, shared_ssl_context
+from app.shared_cache import SharedCache
+
+
+def test_ssl_context_is_shared():
+    """SSL コンテキストは毎回作り直さず共有する"""
+    assert shared_ssl_context(True) is shared_ssl_context(True)
+
+
+@pytest.mark.asyncio
+class TestScraperPool:
+    async def test_started_pool_lends_shared_session(self):
+        pool = ScraperPool(config.get_settings())
+        await pool.start()
+        try:
+            async with pool.scraper() as first:
+                pass
+            async with pool.scraper() as second:
+                pass
+
+            # 2 回の貸し出しで同じセッションを使い、スクレイパー側では閉じない
+            assert first.session is second.session
+            assert not first.session.closed
+        finally:
+            await pool.close()
+
+        assert first.session.closed
+
+    async def test_pool_falls_back_to_per_request_session_before_start(self):
+        pool = ScraperPool(config.get_settings())
+
+        async with pool.scraper() as scraper:
+            session = scraper.session
+            assert not session.closed
+
+        # 共有セッションが無いときは従来どおり抜けるときに閉じる
+        assert session.closed
+        assert not pool.is_started
+
+    async def test_start_and_close_are_idempotent(self):
+        pool = ScraperPool(config.get_settings())
+        await pool.start()
+        await pool.start()
+        assert pool.is_started
+
+        await pool.close()
+        await pool.close()
+        assert not pool.is_started
+
+
+@pytest.mark.asyncio
+async def test_lifespan_starts_and_closes_pool(app):
+    """asgi.py の lifespan で共有セッションが開始・終了される"""
+    messages = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+    sent = []
+    pool = app.extensions[EXTENSION_KEY]
+    started_during_lifespan = []
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message['type'])
+        started_during_lifespan.append(pool.is_started)
+
+    async def unused_app(scope, receive, send):
+        raise AssertionError('lifespan を下のアプリへ渡してはいけない')
+
+    await LifespanMiddleware(unused_app, app)({'type': 'lifespan'}, receive, send)
+
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+    assert started_during_lifespan == [True, False]
+
+
+@pytest.mark.asyncio
+async def test_pool_lends_its_parse_executor_on_both_paths():
+    """解析プールはループに依存しないので、フォールバック経路のスクレイパーにも渡す"""
+    pool = ScraperPool(config.get_settings())
+
+    async with pool.scraper() as fallback:
+        assert fallback.parse_executor is pool.parse_executor
+
+    await pool.start()
+    try:
+        async with pool.scraper() as shared:
+            assert shared.parse_executor is pool.parse_executor
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+class TestTitleCache:
+    async def test_repeated_keyword_is_scraped_once(self):
+        pool = ScraperPool(config.get_settings())
+        scrape = AsyncMock(return_value=['A', 'B'])
+
+        with patch.object(HotPepperScraper, 'scrape_titles_async', scrape):
+            first = await pool.scrape_titles('ボブ', 'ladies')
+            second = await pool.scrape_titles(' ボブ ', 'ladies')
+            await pool.scrape_titles('ボブ', 'mens')
+
+        assert first == second == ['A', 'B']
+        assert scrape.await_count == 2  # 性別が違えば別のキー
+        assert pool.title_cache.stats()['hits'] == 1
+
+    async def test_empty_results_are_not_cached(self):
+        pool = ScraperPool(config.get_settings())
+        scrape = AsyncMock(return_value=[])
+
+        with patch.object(HotPepperScraper, 'scrape_titles_async', scrape):
+            await pool.scrape_titles('ボブ', 'ladies')
+            await pool.scrape_titles('ボブ', 'ladies')
+
+        assert scrape.await_count == 2
+
+    async def test_cache_can_be_disabled(self, monkeypatch):
+        monkeypatch.setenv('TITLE_CACHE_TTL', '0')
+        config.reset_settings()
+        pool = ScraperPool(config.get_settings())
+        scrape = AsyncMock(return_value=['A'])
+
+        with patch.object(HotPepperScraper, 'scrape_titles_async', scrape):
+            await pool.scrape_titles('ボブ', 'ladies')
+            await pool.scrape_titles('ボブ', 'ladies')
+
+        assert scrape.await_count == 2
+
+    async def test_titles_are_shared_between_workers(self, tmp_path):
+        """ワーカー内で外れても、別ワーカーが共有キャッシュへ書いた結果を使う"""
+        path = tmp_path / 'shared.sqlite3'
+        worker1 = ScraperPool(config.get_settings(), SharedCache(path))
+        worker2 = ScraperPool(config.get_settings(), SharedCache(path))
+        scrape = AsyncMock(return_value=['A', 'B'])
+
+        with patch.object(HotPepperScraper, 'scrape_titles_async', scrape):
+            assert await worker1.scrape_titles('ボブ', 'ladies') == ['A', 'B']
+            assert await worker2.scrape_titles('ボブ', 'ladies') == ['A', 'B']
+
+        scrape.assert_awaited_once()
+        assert worker2.shared_cache.stats()['hits'] == 1
+
+    async def test_truncated_results_are_not_cached_in_either_tier(self, tmp_path):
+        """締め切りや途中のページの失敗で削れた結果は、次のリクエストへ持ち越さない"""
+        pool = ScraperPool(config.get_settings(), SharedCache(tmp_path / 'shared.sqlite3'))
+
+        async def truncated(self, keyword, gender, max_pages, deadline, outcome):
+            outcome.truncated = True
+            return ['A']
+
+        with patch.object(
+            HotPepperScraper, 'scrape_titles_async', autospec=True, side_effect=truncated
+        ) as scrape:
+            assert await pool.scrape_titles('ボブ', 'ladies') == ['A']
+            assert await pool.scrape_titles('ボブ', 'ladies') == ['A']
+
+        assert scrape.await_count == 2
+        assert pool.title_cache.stats()['size'] == 0
+        assert pool.shared_cache.stats()['hits'] == 0
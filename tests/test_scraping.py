@@ -1,10 +1,14 @@
+import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import aiohttp
 import pytest
 
-from app.errors import ScrapingError
-from app.scraping import HotPepperScraper
+from app import config
+from app.deadline import Deadline
+from app.errors import DeadlineExceededError, ScrapingError
+from app.scraping import HotPepperScraper, ScrapeOutcome
+from app.stages import recording
 
 
 @pytest.mark.asyncio
@@ -134,3 +138,280 @@ class TestHotPepperScraper:
                 mock_session_class.assert_called_once()
 
             mock_session_instance.close.assert_called_once()
+
+
+def _page_html(titles, has_next):
+    """STYLE_TITLE_SELECTOR / NEXT_PAGE_SELECTOR に一致する最小の検索結果ページ"""
+    items = ''.join(
+        f'<li><div class="mT5"><a><p><span>{title}</span></p></a></div></li>' for title in titles
+    )
+    next_link = '<li class="pa top0 right0 afterPage"><a href="#">次へ</a></li>' if has_next else ''
+    return (
+        f'<html><body><div id="jsiHoverAlphaLayerScope">{items}</div>'
+        f'<div id="searchList"><div>dummy</div>'
+        f'<div><div class="pT5 pr cFix"><div><ul>{next_link}</ul></div></div></div>'
+        f'</div></body></html>'
+    )
+
+
+def _get_by_page(pages):
+    """URL の pn= から返すページを選ぶ session.get の代替。
+
+    pages は {ページ番号: HTML または送出する例外}。並行取得では呼び出し順が
+    ページ順と一致しないので、side_effect のリストでは表現できない。
+    """
+
+    def get(url, **kwargs):
+        page = int(url.split('&pn=')[1]) if '&pn=' in url else 1
+        body = pages[page]
+
+        cm = MagicMock()
+        if isinstance(body, BaseException):
+            cm.__aenter__ = AsyncMock(side_effect=body)
+        else:
+            response = AsyncMock(spec=aiohttp.ClientResponse)
+            response.status = 200
+            response.text.return_value = body
+            response.raise_for_status = MagicMock()
+            cm.__aenter__ = AsyncMock(return_value=response)
+        cm.__aexit__ = AsyncMock(return_value=False)
+        return cm
+
+    return MagicMock(side_effect=get)
+
+
+@pytest.mark.asyncio
+class TestConcurrentScraping:
+    """SCRAPING_CONCURRENCY>=2 のときの並行取得"""
+
+    @pytest.fixture
+    def scraper(self, monkeypatch):
+        monkeypatch.setenv('SCRAPING_CONCURRENCY', '3')
+        # テストではトークンバケットで待たせない
+        monkeypatch.setenv('SCRAPING_RATE', '0')
+        config.reset_settings()
+        return HotPepperScraper()
+
+    async def test_pages_are_merged_in_page_order(self, scraper):
+        mock_get = _get_by_page(
+            {
+                1: _page_html(['A', 'B'], has_next=True),
+                2: _page_html(['C', 'A'], has_next=True),
+                3: _page_html(['D'], has_next=True),
+            }
+        )
+
+        with patch('aiohttp.ClientSession.get', mock_get):
+            async with scraper:
+                titles = await scraper.scrape_titles_async('ボブ', max_pages=3)
+
+        # ページ順に連結し、dict.fromkeys で重複を除く
+        assert titles == ['A', 'B', 'C', 'D']
+        assert mock_get.call_count == 3
+
+    async def test_each_page_is_reported_as_a_stage(self, scraper):
+        mock_get = _get_by_page(
+            {1: _page_html(['A', 'B'], has_next=True), 2: _page_html(['C'], has_next=False)}
+        )
+
+        with patch('aiohttp.ClientSession.get', mock_get), recording() as recorder:
+            async with scraper:
+                await scraper.scrape_titles_async('ボブ', max_pages=2)
+
+        pages = sorted((stage['page'], stage['titles']) for stage in recorder.stages)
+        assert pages == [(1, 2), (2, 1)]
+
+    async def test_stops_at_first_empty_page(self, scraper):
+        """空ページより後のページは取得できていても使わない"""
+        mock_get = _get_by_page(
+            {
+                1: _page_html(['A'], has_next=True),
+                2: _page_html([], has_next=False),
+                3: _page_html(['X'], has_next=True),
+                4: _page_html(['Y'], has_next=True),
+            }
+        )
+
+        outcome = ScrapeOutcome()
+        with patch('aiohttp.ClientSession.get', mock_get):
+            async with scraper:
+                titles = await scraper.scrape_titles_async('ボブ', max_pages=4, outcome=outcome)
+
+        assert titles == ['A']
+        assert not outcome.truncated
+
+    async def test_pages_after_empty_page_are_cancelled(self, scraper):
+        """空ページが分かったら、まだ終わっていない後続ページの取得を取り消す"""
+        never = asyncio.Event()
+        requested = []
+        get_page = _get_by_page(
+            {
+                1: _page_html(['A'], has_next=True),
+                2: _page_html([], has_next=False),
+                **{page: _page_html(['X'], has_next=True) for page in range(3, 7)},
+            }
+        )
+
+        def get(url, **kwargs):
+            page = int(url.split('&pn=')[1]) if '&pn=' in url else 1
+            requested.append(page)
+            cm = get_page(url, **kwargs)
+            if page > 2:
+                # 3 ページ目以降は応答しない（以前は全ページの完了を待っていた）
+                cm.__aenter__ = AsyncMock(side_effect=never.wait)
+            return cm
+
+        with patch('aiohttp.ClientSession.get', MagicMock(side_effect=get)):
+            async with scraper:
+                titles = await asyncio.wait_for(
+                    scraper.scrape_titles_async('ボブ', max_pages=6), timeout=1
+                )
+
+        assert titles == ['A']
+        # 応答しない 3 ページが同時取得数 3 の枠を埋めるので、6 ページ目は送られない
+        assert 6 not in requested
+
+    async def test_does_not_fetch_more_pages_without_next_button(self, scraper):
+        mock_get = _get_by_page({1: _page_html(['A'], has_next=False)})
+
+        with patch('aiohttp.ClientSession.get', mock_get):
+            async with scraper:
+                titles = await scraper.scrape_titles_async('ボブ', max_pages=3)
+
+        assert titles == ['A']
+        assert mock_get.call_count == 1
+
+    async def test_later_page_error_keeps_earlier_pages(self, scraper):
+        mock_get = _get_by_page(
+            {
+                1: _page_html(['A'], has_next=True),
+                2: TimeoutError(),
+                3: _page_html(['C'], has_next=True),
+            }
+        )
+
+        outcome = ScrapeOutcome()
+        with patch('aiohttp.ClientSession.get', mock_get):
+            async with scraper:
+                titles = await scraper.scrape_titles_async('ボブ', max_pages=3, outcome=outcome)
+
+        assert titles == ['A']
+        # 途中のページの失敗で削れた結果は、キャッシュする側が保持しないように知らせる
+        assert outcome.truncated
+
+    async def test_first_page_error_raises(self, scraper):
+        mock_get = _get_by_page({1: aiohttp.ClientConnectionError()})
+
+        with patch('aiohttp.ClientSession.get', mock_get):
+            async with scraper:
+                with pytest.raises(ScrapingError):
+                    await scraper.scrape_titles_async('ボブ', max_pages=3)
+
+
+@pytest.mark.asyncio
+async def test_sequential_mode_does_not_sleep_after_last_page(monkeypatch):
+    """最終ページの後に待機しない（以前は次の取得が無いのに待っていた）"""
+    monkeypatch.setenv('SCRAPING_DELAY_MIN', '5')
+    monkeypatch.setenv('SCRAPING_DELAY_MAX', '5')
+    config.reset_settings()
+    scraper = HotPepperScraper()
+    mock_get = _get_by_page(
+        {1: _page_html(['A'], has_next=True), 2: _page_html(['B'], has_next=True)}
+    )
+
+    with (
+        patch('aiohttp.ClientSession.get', mock_get),
+        patch('app.scraping.asyncio.sleep', new=AsyncMock()) as sleep,
+    ):
+        async with scraper:
+            titles = await scraper.scrape_titles_async('ボブ', max_pages=2)
+
+    assert titles == ['A', 'B']
+    sleep.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+class TestDeadline:
+    """締め切りがあるときは、Gemini の 1 回分を残してスクレイピングを打ち切る"""
+
+    @staticmethod
+    def _deadline(scraping_seconds):
+        return Deadline(config.DEADLINE_GENERATION_RESERVE_SECONDS + scraping_seconds)
+
+    async def test_page_timeout_shrinks_to_remaining_time(self):
+        scraper = HotPepperScraper()
+        mock_get = _get_by_page({1: _page_html(['A'], has_next=False)})
+
+        with patch('aiohttp.ClientSession.get', mock_get):
+            async with scraper:
+                await scraper.scrape_titles_async('ボブ', max_pages=1, deadline=self._deadline(3))
+
+        assert mock_get.call_args.kwargs['timeout'].total <= 3
+
+    async def test_sequential_mode_stops_instead_of_waiting_past_deadline(self, monkeypatch):
+        monkeypatch.setenv('SCRAPING_DELAY_MIN', '5')
+        monkeypatch.setenv('SCRAPING_DELAY_MAX', '5')
+        config.reset_settings()
+        scraper = HotPepperScraper()
+        mock_get = _get_by_page(
+            {1: _page_html(['A'], has_next=True), 2: _page_html(['B'], has_next=True)}
+        )
+        outcome = ScrapeOutcome()
+
+        with (
+            patch('aiohttp.ClientSession.get', mock_get),
+            patch('app.scraping.asyncio.sleep', new=AsyncMock()) as sleep,
+        ):
+            async with scraper:
+                titles = await scraper.scrape_titles_async(
+                    'ボブ', max_pages=2, deadline=self._deadline(3), outcome=outcome
+                )
+
+        assert titles == ['A']
+        assert outcome.truncated
+        sleep.assert_not_awaited()
+
+    async def test_no_time_for_first_page_is_deadline_error(self):
+        scraper = HotPepperScraper()
+        mock_get = _get_by_page({1: _page_html(['A'], has_next=False)})
+
+        with patch('aiohttp.ClientSession.get', mock_get):
+            async with scraper:
+                with pytest.raises(DeadlineExceededError):
+                    await scraper.scrape_titles_async(
+                        'ボブ', max_pages=3, deadline=self._deadline(0)
+                    )
+
+        mock_get.assert_not_called()
+
+    async def test_concurrent_pages_past_deadline_keep_earlier_pages(self, monkeypatch):
+        monkeypatch.setenv('SCRAPING_CONCURRENCY', '3')
+        monkeypatch.setenv('SCRAPING_RATE', '0')
+        config.reset_settings()
+        scraper = HotPepperScraper()
+        clock = [0.0]
+        deadline = Deadline(config.DEADLINE_GENERATION_RESERVE_SECONDS + 5, clock=lambda: clock[0])
+        pages = {1: _page_html(['A'], has_next=True), 2: _page_html(['B'], has_next=True)}
+
+        def get(url, **kwargs):
+            # 1 ページ目の取得で締め切りの直前まで時間を使い切る
+            clock[0] = 5.0
+            return _get_by_page(pages)(url, **kwargs)
+
+        outcome = ScrapeOutcome()
+        with patch('aiohttp.ClientSession.get', MagicMock(side_effect=get)) as mock_get:
+            async with scraper:
+                titles = await scraper.scrape_titles_async(
+                    'ボブ', max_pages=2, deadline=deadline, outcome=outcome
+                )
+
+        assert titles == ['A']
+        assert outcome.truncated
+        assert mock_get.call_count == 1
+
+
+def test_scraper_uses_configured_parser(monkeypatch):
+    monkeypatch.setenv('SCRAPER_PARSER', ' HTML.Parser ')
+    config.reset_settings()
+
+    assert HotPepperScraper().parser_backend == 'html.parser'
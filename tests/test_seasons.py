@@ -3,10 +3,17 @@
 純粋なロジックなので TemplateGenerator（＝API キー）を必要としない。
 """
 
+import copy
+
 import pytest
 
 from app import config
-from app.seasons import apply_season_keywords, normalize_seasons
+from app.seasons import (
+    SeasonApplier,
+    apply_season_keywords,
+    normalize_seasons,
+    reapply_season_keywords,
+)
 
 
 class TestSeasonKeywordAppend:
@@ -272,3 +279,80 @@ class TestNormalizeSeasons:
     def test_empty_input(self):
         assert normalize_seasons(None, "ladies") == []
         assert normalize_seasons([], "ladies") == []
+
+
+class TestSeasonApplier:
+    """SeasonApplier のテスト（ストリーミングで 1 件ずつ届くときの付加）"""
+
+    def test_appends_one_by_one_within_limit(self):
+        applier = SeasonApplier(["spring", "bleach_free"])
+        templates = [{"title": "あ" * n} for n in (10, 20, 25, 18, 26)]
+
+        for template in templates:
+            applier.apply(template)
+
+        assert all(len(t["title"]) <= config.CHAR_LIMITS["title"] for t in templates)
+        assert templates[4]["title"] == "あ" * 26  # 閾値以上は対象外
+        assert applier.unapplied() == []
+
+    def test_distributes_evenly(self):
+        """付加件数の少ないキーワードから順に割り当てる"""
+        applier = SeasonApplier(["spring", "summer"])
+        templates = [{"title": f"ボブ{i}"} for i in range(4)]
+
+        for template in templates:
+            applier.apply(template)
+
+        titles = [t["title"] for t in templates]
+        assert sum("春カラー" in t for t in titles) == 2
+        assert sum("夏カラー" in t for t in titles) == 2
+
+    def test_reports_unapplied_unless_already_in_title(self):
+        """付加できなくても既にタイトルに含まれていれば未付与と数えない"""
+        applier = SeasonApplier(["spring", "winter"])
+        applier.apply({"title": "春カラー" + "あ" * 24})
+
+        assert applier.unapplied() == ["winter"]
+
+    def test_no_selection_is_noop(self):
+        applier = SeasonApplier([])
+        template = {"title": "ボブ"}
+
+        applier.apply(template)
+
+        assert template["title"] == "ボブ"
+        assert applier.unapplied() == []
+
+
+class TestReapplySeasonKeywords:
+    """reapply_season_keywords のテスト（キャッシュからの付加し直し）"""
+
+    SEASONS = ["summer", "bleach_free"]
+
+    @staticmethod
+    def _templates():
+        # 一括の付加と届いた順の付加とで付加先が変わる長さの並び
+        return [{"title": "あ" * n} for n in (12, 20, 8, 22, 15, 10, 18, 24, 9, 14)]
+
+    def test_streaming_matches_season_applier(self):
+        """ストリーミング生成と同じく、届いた順に SeasonApplier で付加する"""
+        expected = self._templates()
+        applier = SeasonApplier(self.SEASONS)
+        for template in expected:
+            applier.apply(template)
+        templates = self._templates()
+
+        unapplied = reapply_season_keywords(templates, self.SEASONS, streaming=True)
+
+        assert templates == expected
+        assert unapplied == applier.unapplied()
+
+    def test_non_streaming_matches_apply_season_keywords(self):
+        expected = self._templates()
+        expected_unapplied = apply_season_keywords(expected, self.SEASONS)
+        templates = copy.deepcopy(self._templates())
+
+        unapplied = reapply_season_keywords(templates, self.SEASONS, streaming=False)
+
+        assert templates == expected
+        assert unapplied == expected_unapplied
@@ -0,0 +1,116 @@
+"""ワーカー間で共有するキャッシュ（SQLite）のテスト。"""
+
+import json
+import multiprocessing
+
+import pytest
+
+from app.shared_cache import SharedCache, decode_value, encode_value, make_key
+
+TITLES = ['大人可愛い◎くびれミディ×透明感グレージュ', '韓国風マッシュ×センターパート']
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = SharedCache(tmp_path / 'cache' / 'shared.sqlite3', max_entries=3, clock=clock)
+    yield cache
+    cache.close()
+
+
+def _put_from_other_process(path, key, value):
+    cache = SharedCache(path)
+    cache.put(key, value, ttl=60)
+    cache.close()
+
+
+def test_values_round_trip(cache):
+    cache.put('titles:ボブ', TITLES, ttl=60)
+
+    assert cache.get('titles:ボブ') == TITLES
+    assert cache.get('titles:ショート') is None
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'writes': 1, 'errors': 0}
+
+
+def test_encoding_is_compact():
+    raw = json.dumps(TITLES * 20).encode('utf-8')
+    blob = encode_value(TITLES * 20)
+
+    assert len(blob) < len(raw) / 4
+    assert decode_value(blob) == TITLES * 20
+
+
+def test_make_key_is_stable_for_tuples():
+    assert make_key('titles', ('ボブ', 'ladies', 3)) == 'titles:["ボブ","ladies",3]'
+
+
+def test_expired_values_are_not_returned(cache, clock):
+    cache.put('key', 'value', ttl=60)
+    clock.now += 60
+
+    assert cache.get('key') is None
+
+
+def test_oldest_entries_are_evicted_beyond_cap(cache, clock):
+    for i in range(4):
+        cache.put(f'key{i}', i, ttl=60)
+        clock.now += 1
+
+    assert cache.get('key0') is None
+    assert [cache.get(f'key{i}') for i in (1, 2, 3)] == [1, 2, 3]
+
+
+def test_zero_ttl_is_not_stored(cache):
+    cache.put('key', 'value', ttl=0)
+
+    assert cache.get('key') is None
+
+
+def test_write_from_another_process_is_visible(cache):
+    """gunicorn の別ワーカーの書き込みを読める"""
+    cache.get('warm-up')  # こちらが先にファイルを作っていても問題ない
+    process = multiprocessing.get_context('spawn').Process(
+        target=_put_from_other_process, args=(cache.path, 'titles:ボブ', TITLES)
+    )
+    process.start()
+    process.join(timeout=30)
+
+    assert process.exitcode == 0
+    # 別プロセスは実時間で期限を付けるので、こちらも実時間で読む
+    reader = SharedCache(cache.path)
+    try:
+        assert reader.get('titles:ボブ') == TITLES
+    finally:
+        reader.close()
+
+
+def test_corrupt_file_is_treated_as_miss(tmp_path, caplog):
+    path = tmp_path / 'shared.sqlite3'
+    path.write_bytes(b'not a sqlite database' * 100)
+    cache = SharedCache(path)
+
+    assert cache.get('key') is None
+    cache.put('key', 'value', ttl=60)
+
+    assert cache.stats()['errors'] == 2
+    assert '共有キャッシュ' in caplog.text
+
+
+def test_cache_reconnects_after_close(cache):
+    cache.put('key', 'value', ttl=60)
+    cache.close()
+    cache.close()
+
+    assert cache.get('key') == 'value'
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.single_flight import SingleFlight
+
+
+class Work:
+    """呼ばれた回数を数え、release されるまで終わらない処理"""
+
+    def __init__(self, result=None, error=None):
+        self.calls = 0
+        self.result = result
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+@pytest.mark.asyncio
+class TestSingleFlight:
+    async def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        work = Work(result={'templates': [1, 2]})
+
+        tasks = [asyncio.create_task(flight.run('key', work, copy=dict)) for _ in range(3)]
+        await asyncio.sleep(0)
+        work.release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert work.calls == 1
+        assert all(result == {'templates': [1, 2]} for result in results)
+        # 相乗りした側には複製が渡る
+        assert results[1] is not results[0]
+        assert flight.stats() == {'in_flight': 0, 'leaders': 1, 'coalesced': 2}
+
+    async def test_different_keys_run_separately(self):
+        flight = SingleFlight()
+        work = Work(result='ok')
+        work.release.set()
+
+        await asyncio.gather(flight.run('a', work), flight.run('b', work))
+
+        assert work.calls == 2
+
+    async def test_key_is_released_after_completion(self):
+        flight = SingleFlight()
+        work = Work(result='ok')
+        work.release.set()
+
+        await flight.run('key', work)
+        await flight.run('key', work)
+
+        assert work.calls == 2
+
+    async def test_errors_are_raised_to_every_caller(self):
+        flight = SingleFlight()
+        work = Work(error=ValueError('生成失敗'))
+
+        tasks = [asyncio.create_task(flight.run('key', work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        work.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert [type(result) for result in results] == [ValueError, ValueError]
+        assert flight.stats()['in_flight'] == 0
+
+    async def test_cancelled_leader_does_not_cancel_followers(self):
+        """リーダーの接続が切れても、相乗りしたリクエストは結果を受け取る"""
+        flight = SingleFlight()
+        work = Work(result='ok')
+
+        leader = asyncio.create_task(flight.run('key', work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.run('key', work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        work.release.set()
+
+        assert await follower == 'ok'
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert work.calls == 1
+
+
+def test_calls_from_different_loops_are_coalesced():
+    """開発サーバーのように、リクエストごとに別スレッドのループで動く経路でも相乗りする"""
+    flight = SingleFlight()
+    calls = []
+    leader_started = threading.Event()
+    release = threading.Event()
+    results = []
+
+    async def work():
+        calls.append(1)
+        leader_started.set()
+        await asyncio.to_thread(release.wait, 5)
+        return 'ok'
+
+    def request():
+        results.append(asyncio.run(flight.run('key', work)))
+
+    leader = threading.Thread(target=request)
+    leader.start()
+    leader_started.wait(5)
+    follower = threading.Thread(target=request)
+    follower.start()
+    # 相乗りの登録を待ってから処理を終わらせる
+    while flight.stats()['coalesced'] == 0:
+        threading.Event().wait(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert results == ['ok', 'ok']
+    assert len(calls) == 1
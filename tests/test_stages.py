@@ -0,0 +1,82 @@
+"""処理段階の記録（app/stages.py）のテスト。"""
+
+import asyncio
+
+import pytest
+
+from app.stages import StageRecorder, recording, report_stage
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_records_elapsed_time_and_detail():
+    clock = FakeClock()
+    received = []
+    recorder = StageRecorder(received.append, clock=clock, wall_clock=lambda: 1700000000.0)
+
+    clock.now = 0.0125
+    recorder.record('titles_ready', titles=60)
+
+    assert received == [
+        {'stage': 'titles_ready', 'elapsed_ms': 12.5, 'at': 1700000000.0, 'titles': 60}
+    ]
+    assert recorder.stages == received
+
+
+def test_summary_shows_time_between_stages():
+    clock = FakeClock()
+    recorder = StageRecorder(clock=clock)
+    clock.now = 0.010
+    recorder.record('keyword_analyzed')
+    clock.now = 2.010
+    recorder.record('titles_ready')
+
+    assert recorder.summary() == 'keyword_analyzed=+10ms, titles_ready=+2000ms (合計 2010ms)'
+
+
+def test_failing_listener_does_not_break_generation():
+    def broken(stage):
+        raise RuntimeError('closed')
+
+    recorder = StageRecorder(broken)
+    recorder.record('prompt_built')
+
+    assert [stage['stage'] for stage in recorder.stages] == ['prompt_built']
+
+
+def test_report_stage_is_noop_outside_recording():
+    report_stage('titles_ready')  # 例外にならない
+
+
+def test_recording_collects_reports_and_restores_previous():
+    with recording() as outer:
+        report_stage('keyword_analyzed')
+        with recording() as inner:
+            report_stage('titles_ready')
+        report_stage('prompt_built')
+
+    assert [stage['stage'] for stage in outer.stages] == ['keyword_analyzed', 'prompt_built']
+    assert [stage['stage'] for stage in inner.stages] == ['titles_ready']
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_record_separately():
+    """同じループ上で並行に動くリクエストの段階が混ざらない"""
+
+    async def request(name):
+        with recording() as recorder:
+            for _ in range(3):
+                report_stage(name)
+                await asyncio.sleep(0)
+        return recorder
+
+    first, second = await asyncio.gather(request('a'), request('b'))
+
+    assert {stage['stage'] for stage in first.stages} == {'a'}
+    assert {stage['stage'] for stage in second.stages} == {'b'}
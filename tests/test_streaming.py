@@ -0,0 +1,96 @@
+"""SSE の送出（EventChannel）のテスト。"""
+
+import asyncio
+import json
+import threading
+
+from app.streaming import EventChannel, format_event, run_in_background
+
+
+def test_format_event_is_single_data_line():
+    """data は改行を含まない JSON 1 行になる（複数行だと SSE の区切りと衝突する）"""
+    frame = format_event('template', {'comment': '1行目\n2行目'})
+
+    event_line, data_line, *rest = frame.split('\n')
+    assert event_line == 'event: template'
+    assert json.loads(data_line.removeprefix('data: ')) == {'comment': '1行目\n2行目'}
+    assert rest == ['', '']
+
+
+def test_channel_relays_events_until_producer_finishes():
+    async def produce(channel):
+        channel.emit('template', {'title': 'ボブ'})
+        await asyncio.sleep(0)
+        channel.emit('done', {'success': True})
+
+    channel = EventChannel()
+    channel.start(produce)
+
+    assert list(channel) == [
+        format_event('template', {'title': 'ボブ'}),
+        format_event('done', {'success': True}),
+    ]
+
+
+def test_channel_closes_even_if_producer_fails():
+    async def produce(channel):
+        raise RuntimeError('boom')
+
+    channel = EventChannel()
+    channel.start(produce)
+
+    assert list(channel) == []
+
+
+def test_keepalive_comment_while_waiting():
+    release = threading.Event()
+
+    async def produce(channel):
+        await asyncio.to_thread(release.wait)
+        channel.emit('done', {})
+
+    channel = EventChannel(keepalive=0.01)
+    channel.start(produce)
+    frames = iter(channel)
+
+    assert next(frames) == ': keep-alive\n\n'
+    release.set()
+    assert format_event('done', {}) in list(frames)
+
+
+def test_abandoned_stream_cancels_producer():
+    """クライアントが切断して反復が閉じられたら、生成のタスクを取り消す"""
+    cancelled = threading.Event()
+
+    async def produce(channel):
+        channel.emit('template', {})
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    channel = EventChannel()
+    channel.start(produce)
+    frames = iter(channel)
+    next(frames)
+    frames.close()
+
+    assert cancelled.wait(timeout=5)
+
+
+def test_run_in_background_uses_given_loop():
+    """共有ループが渡されればそのループ上で動かす"""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+
+        async def running_loop():
+            return asyncio.get_running_loop()
+
+        assert run_in_background(running_loop, loop).result(timeout=5) is loop
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
@@ -4,11 +4,20 @@
 何を付けるかを直接検証するテストが存在しなかった。
 """
 
+import asyncio
+import copy
+from types import MappingProxyType
+
 import pytest
 
+from app.config import DEFAULT_MODEL, MAX_TEMPLATES
 from app.errors import NoResultsError
+from app.keyword_matcher import KeywordMatcher
+from app.outcome_cache import OutcomeCache
+from app.seasons import SeasonApplier
 from app.services.keyword_analysis import KeywordAnalysis, analyze_keyword
 from app.services.template_service import _attach_metadata, generate_templates_for_request
+from app.single_flight import SingleFlight
 
 FEATURED = {
     'name': 'テスト用くびれヘア',
@@ -18,11 +27,11 @@ FEATURED = {
 }
 
 
-def raw_templates(count=2):
+def raw_templates(count=2, title='サンプルタイトル'):
     """生成器が返す素のテンプレート（メタデータなし）"""
     return [
         {
-            'title': f'サンプルタイトル{i}',
+            'title': f'{title}{i}',
             'menu': 'カット',
             'comment': 'コメント',
             'hashtag': ['#タグ'],
@@ -37,8 +46,16 @@ class _FeaturedRepo:
     def is_available(self):
         return True
 
-    def get_keyword_info(self, keyword):
-        return FEATURED if keyword.strip() == 'くびれヘア' else None
+    # 実物と同じく読み取り専用の Mapping を返す
+    _matcher = KeywordMatcher({'くびれヘア': MappingProxyType(FEATURED)})
+    # 特集キーワードの版。書き換えると再読み込みで内容が変わったことになる
+    version = 'v1'
+
+    def find_featured_keywords(self, text):
+        return self._matcher.find(text)
+
+    def get_version(self):
+        return self.version
 
 
 class TestAttachMetadata:
@@ -150,3 +167,287 @@ class TestGenerateTemplatesForRequest:
 
         assert outcome.is_featured is False
         assert outcome.featured_info is None
+
+    async def test_concurrent_identical_requests_are_coalesced(self, fake_pipeline):
+        """同じ内容の同時リクエストはスクレイピングと生成を 1 回にまとめる"""
+        flight = SingleFlight()
+        with fake_pipeline(templates=raw_templates()) as generate:
+            outcomes = await asyncio.gather(
+                *(
+                    generate_templates_for_request(
+                        keyword, 'ladies', repository=_FeaturedRepo(), single_flight=flight
+                    )
+                    for keyword in ('ボブ', ' ボブ', 'ボブ ')
+                )
+            )
+
+        assert generate.await_count == 1
+        assert flight.stats()['coalesced'] == 2
+        assert outcomes[0] == outcomes[1] == outcomes[2]
+        # テンプレートは dict なので、相乗りした側には別の複製が渡る
+        assert outcomes[1].templates[0] is not outcomes[0].templates[0]
+
+    async def test_coalesced_featured_outcome_can_be_copied(self, fake_pipeline):
+        """読み取り専用の特集情報を持つ結果も、相乗りした側へ複製して渡せる"""
+        flight = SingleFlight()
+        with fake_pipeline(templates=raw_templates()) as generate:
+            outcomes = await asyncio.gather(
+                *(
+                    generate_templates_for_request(
+                        'くびれヘア', 'ladies', repository=_FeaturedRepo(), single_flight=flight
+                    )
+                    for _ in range(2)
+                )
+            )
+
+        assert generate.await_count == 1
+        assert outcomes[0].featured_info == outcomes[1].featured_info == FEATURED
+        assert outcomes[1].featured_info is not outcomes[0].featured_info
+
+    async def test_requests_with_different_seasons_are_not_coalesced(self, fake_pipeline):
+        flight = SingleFlight()
+        with fake_pipeline(templates=raw_templates()) as generate:
+            await asyncio.gather(
+                *(
+                    generate_templates_for_request(
+                        'ボブ',
+                        'ladies',
+                        repository=_FeaturedRepo(),
+                        seasons=seasons,
+                        single_flight=flight,
+                    )
+                    for seasons in ([], ['spring'])
+                )
+            )
+
+        assert generate.await_count == 2
+
+    async def test_cached_outcome_is_returned_without_generating(self, fake_pipeline):
+        cache = OutcomeCache(ttl=600)
+        with fake_pipeline(templates=raw_templates(MAX_TEMPLATES)) as generate:
+            first = await generate_templates_for_request(
+                'くびれヘア', 'ladies', repository=_FeaturedRepo(), outcome_cache=cache
+            )
+            second = await generate_templates_for_request(
+                ' くびれヘア', 'ladies', repository=_FeaturedRepo(), outcome_cache=cache
+            )
+
+        assert generate.await_count == 1
+        assert first.cache_age is None
+        assert second.cache_age is not None
+        assert second.templates == first.templates
+        assert second.featured_info == FEATURED
+        # 呼び出し元ごとに別の複製が渡る
+        assert second.templates[0] is not first.templates[0]
+
+    async def test_regenerate_bypasses_and_replaces_cached_outcome(self, fake_pipeline):
+        cache = OutcomeCache(ttl=600)
+        with fake_pipeline(templates=raw_templates(MAX_TEMPLATES)):
+            await generate_templates_for_request(
+                'ボブ', 'ladies', repository=_FeaturedRepo(), outcome_cache=cache
+            )
+        with fake_pipeline(templates=raw_templates(MAX_TEMPLATES, '再生成')) as generate:
+            regenerated = await generate_templates_for_request(
+                'ボブ', 'ladies', repository=_FeaturedRepo(), outcome_cache=cache, regenerate=True
+            )
+            cached = await generate_templates_for_request(
+                'ボブ', 'ladies', repository=_FeaturedRepo(), outcome_cache=cache
+            )
+
+        assert generate.await_count == 1
+        assert regenerated.cache_age is None
+        assert cached.templates[0]['title'].startswith('再生成')
+        assert cache.stats()['bypasses'] == 1
+
+    async def test_cached_templates_are_streamed(self, fake_pipeline):
+        """ストリーミングの呼び出しでも、キャッシュにあったテンプレートを on_template へ渡す"""
+        cache = OutcomeCache(ttl=600)
+        streamed = []
+        with fake_pipeline(templates=raw_templates(MAX_TEMPLATES)) as generate:
+            await generate_templates_for_request(
+                'ボブ', 'ladies', repository=_FeaturedRepo(), outcome_cache=cache
+            )
+            outcome = await generate_templates_for_request(
+                'ボブ',
+                'ladies',
+                repository=_FeaturedRepo(),
+                outcome_cache=cache,
+                on_template=streamed.append,
+            )
+
+        assert generate.await_count == 1
+        assert streamed == outcome.templates
+
+    async def test_truncated_stream_is_not_served_from_cache(self, fake_pipeline):
+        """締め切りなどで途中までしか届かなかったストリームの結果は、どちらのキーにも保持しない"""
+        cache = OutcomeCache(ttl=600)
+        with fake_pipeline(templates=raw_templates(3)) as generate:
+            for seasons in (['spring'], ['spring'], ['summer']):
+                outcome = await generate_templates_for_request(
+                    'ボブ',
+                    'ladies',
+                    repository=_FeaturedRepo(),
+                    seasons=seasons,
+                    outcome_cache=cache,
+                    on_template=lambda template: None,
+                )
+                assert outcome.cache_age is None
+
+        assert generate.await_count == 3
+        assert cache.stats()['size'] == 0
+
+    async def test_unsupported_model_shares_the_default_model_entry(self, fake_pipeline):
+        """キャッシュのキーは解決済みのモデル名で作る（サポート外の名前で別エントリにしない）"""
+        cache = OutcomeCache(ttl=600)
+        with fake_pipeline(templates=raw_templates(MAX_TEMPLATES)) as generate:
+            await generate_templates_for_request(
+                'ボブ',
+                'ladies',
+                repository=_FeaturedRepo(),
+                model='gemini-unknown',
+                outcome_cache=cache,
+            )
+            outcome = await generate_templates_for_request(
+                'ボブ',
+                'ladies',
+                repository=_FeaturedRepo(),
+                model=DEFAULT_MODEL,
+                outcome_cache=cache,
+            )
+
+        assert generate.await_count == 1
+        assert outcome.cache_age is not None
+        assert cache.stats()['size'] == 2  # 季節・カラーの付加前の結果のキーと合わせて 2 件
+
+    async def test_featured_reload_invalidates_cached_outcomes(self, fake_pipeline):
+        """特集キーワードの内容が変わったら、差し替え前の条件で生成した結果は返さない"""
+        cache = OutcomeCache(ttl=600)
+        repository = _FeaturedRepo()
+        with fake_pipeline(templates=raw_templates(MAX_TEMPLATES)) as generate:
+            await generate_templates_for_request(
+                'くびれヘア',
+                'ladies',
+                repository=repository,
+                seasons=['spring'],
+                outcome_cache=cache,
+            )
+            # 同じリクエストのキーでも、季節だけが違う付加前の結果のキーでも引かない
+            for version, seasons in (('v2', ['spring']), ('v3', ['summer'])):
+                repository.version = version
+                outcome = await generate_templates_for_request(
+                    'くびれヘア',
+                    'ladies',
+                    repository=repository,
+                    seasons=seasons,
+                    outcome_cache=cache,
+                )
+                assert outcome.cache_age is None
+
+        assert generate.await_count == 3
+
+    async def test_requests_with_different_seasons_are_cached_separately(self, fake_pipeline):
+        cache = OutcomeCache(ttl=600)
+        with fake_pipeline(templates=raw_templates(MAX_TEMPLATES)) as generate:
+            for seasons in ([], ['spring']):
+                await generate_templates_for_request(
+                    'ボブ',
+                    'ladies',
+                    repository=_FeaturedRepo(),
+                    seasons=seasons,
+                    outcome_cache=cache,
+                )
+
+        assert generate.await_count == 2
+
+    async def test_other_season_selection_reuses_season_free_outcome(self, fake_pipeline):
+        """季節・カラーだけが違うリクエストは、生成し直さずに付加だけをやり直す"""
+        cache = OutcomeCache(ttl=600)
+        with fake_pipeline(templates=raw_templates(MAX_TEMPLATES)) as generate:
+            spring = await generate_templates_for_request(
+                'くびれヘア',
+                'ladies',
+                repository=_FeaturedRepo(),
+                seasons=['spring'],
+                outcome_cache=cache,
+            )
+            summer = await generate_templates_for_request(
+                'くびれヘア',
+                'ladies',
+                repository=_FeaturedRepo(),
+                seasons=['summer'],
+                outcome_cache=cache,
+            )
+
+        assert generate.await_count == 1
+        assert spring.cache_age is None
+        assert summer.cache_age is not None
+        assert any('夏カラー' in t['title'] for t in summer.templates)
+        assert not any('春カラー' in t['title'] for t in summer.templates)
+        assert summer.unapplied_seasons == ()
+        # テンプレートごとのメタデータも付いている
+        assert summer.templates[0]['featured_keyword_name'] == 'テスト用くびれヘア'
+        assert cache.stats()['reuses'] == 1
+
+    async def test_streamed_reuse_applies_seasons_like_streaming_generation(self, fake_pipeline):
+        """ストリーミングで付加し直した結果は、生成し直したときと同じく届いた順の付加になる"""
+        cache = OutcomeCache(ttl=600)
+        # 一括の付加（apply_season_keywords）とは付加先が変わる長さの並び
+        templates = raw_templates(MAX_TEMPLATES)
+        for i, template in enumerate(templates):
+            template['title'] = 'あ' * (8 + i * 7 % 17)
+        expected = copy.deepcopy(templates)
+        applier = SeasonApplier(['summer'])
+        for template in expected:
+            applier.apply(template)
+        with fake_pipeline(templates=templates) as generate:
+            for seasons in (['spring'], ['summer']):
+                outcome = await generate_templates_for_request(
+                    'ボブ',
+                    'ladies',
+                    repository=_FeaturedRepo(),
+                    seasons=seasons,
+                    outcome_cache=cache,
+                    on_template=lambda template: None,
+                )
+
+        assert generate.await_count == 1
+        assert [t['title'] for t in outcome.templates] == [t['title'] for t in expected]
+        assert outcome.unapplied_seasons == tuple(applier.unapplied())
+
+    async def test_streaming_and_json_requests_are_cached_separately(self, fake_pipeline):
+        """付加の方式が違うので、付加済みの結果はストリーミングと一括とで共有しない"""
+        cache = OutcomeCache(ttl=600)
+        with fake_pipeline(templates=raw_templates(MAX_TEMPLATES)):
+            await generate_templates_for_request(
+                'ボブ',
+                'ladies',
+                repository=_FeaturedRepo(),
+                seasons=['spring'],
+                outcome_cache=cache,
+            )
+            await generate_templates_for_request(
+                'ボブ',
+                'ladies',
+                repository=_FeaturedRepo(),
+                seasons=['spring'],
+                outcome_cache=cache,
+                on_template=lambda template: None,
+            )
+
+        # 2 件目は付加前の結果から付加し直す
+        assert cache.stats()['reuses'] == 1
+
+    async def test_season_selection_needing_more_short_titles_is_generated(self, fake_pipeline):
+        """付加先の短尺タイトルが足りない選択（ブリーチなしカラーの枠が無い）は生成し直す"""
+        cache = OutcomeCache(ttl=600)
+        with fake_pipeline(templates=raw_templates(MAX_TEMPLATES)) as generate:
+            for seasons in (['spring'], ['bleach_free']):
+                await generate_templates_for_request(
+                    'ボブ',
+                    'ladies',
+                    repository=_FeaturedRepo(),
+                    seasons=seasons,
+                    outcome_cache=cache,
+                )
+
+        assert generate.await_count == 2
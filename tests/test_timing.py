@@ -0,0 +1,97 @@
+import asyncio
+import logging
+
+import pytest
+
+from app import timing as timing_module
+from app.timing import Timings, record, span, timed, timing
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_spans_with_the_same_name_are_summed():
+    clock = FakeClock()
+    timings = Timings(clock=clock)
+    timings.add('scrape', 100.0)
+    timings.add('gemini', 2000.0)
+    timings.add('scrape', 50.0)
+    clock.now = 2.5
+    timings.finish()
+    clock.now = 9.0
+
+    assert timings.as_dict() == {
+        'scrape': {'ms': 150.0, 'count': 2},
+        'gemini': {'ms': 2000.0, 'count': 1},
+        # finish() 以降に進んだ時計は total に含まない
+        'total': {'ms': 2500.0, 'count': 1},
+    }
+    assert timings.header() == 'scrape;dur=150.0, gemini;dur=2000.0, total;dur=2500.0'
+
+
+def test_span_outside_timing_is_a_shared_noop():
+    """集計中でなければ span() は何も記録せず、毎回同じ nullcontext を返す"""
+    assert span('scrape') is timing_module._DISABLED
+    with span('scrape'):
+        pass
+    record('gemini_queue', 1.0)
+
+
+def test_disabled_timing_yields_none_and_records_nothing():
+    with timing(enabled=False) as timings:
+        assert timings is None
+        assert span('scrape') is timing_module._DISABLED
+
+
+def test_timing_collects_spans_and_record(caplog):
+    with caplog.at_level(logging.INFO, logger='app.timing'):
+        with timing() as timings:
+            with span('scrape'):
+                pass
+            record('gemini_queue', 0.25)
+
+    spans = timings.as_dict()
+    assert spans['scrape']['count'] == 1
+    assert spans['gemini_queue'] == {'ms': 250.0, 'count': 1}
+    assert list(spans)[-1] == 'total'
+    # 抜けたら集計をやめる
+    assert span('scrape') is timing_module._DISABLED
+
+    (log_record,) = [r for r in caplog.records if r.name == 'app.timing']
+    assert log_record.server_timing == timings.as_dict()
+
+
+def test_timed_decorates_sync_and_async_functions():
+    @timed('parse')
+    def parse(value):
+        return value * 2
+
+    @timed('gemini')
+    async def call(value):
+        await asyncio.sleep(0)
+        return value + 1
+
+    async def run():
+        with timing() as timings:
+            assert parse(2) == 4
+            assert parse(3) == 6
+            assert await call(1) == 2
+        return timings
+
+    spans = asyncio.run(run()).as_dict()
+    assert spans['parse']['count'] == 2
+    assert spans['gemini']['count'] == 1
+    assert parse.__name__ == 'parse'
+
+
+def test_span_is_recorded_even_when_the_block_raises():
+    with timing() as timings:
+        with pytest.raises(ValueError), span('validate'):
+            raise ValueError
+
+    assert timings.as_dict()['validate']['count'] == 1
@@ -0,0 +1,97 @@
+import json
+from pathlib import Path
+
+from app import config
+from app.html_parsers import parse_search_page
+from app.title_selection import (
+    estimate_tokens,
+    format_reference_titles,
+    normalize_title,
+    select_reference_titles,
+)
+
+FIXTURES = Path(__file__).parent / 'fixtures' / 'hotpepper'
+
+
+class TestNormalizeTitle:
+    def test_ignores_symbols_spaces_and_width(self):
+        assert normalize_title('【ＢＯＢ】大人可愛い◎くびれ　ミディ') == normalize_title(
+            'bob 大人可愛い/くびれミディ'
+        )
+
+    def test_symbol_only_title_normalizes_to_empty(self):
+        assert normalize_title('◎◆×') == ''
+
+
+class TestSelectReferenceTitles:
+    def test_removes_exact_and_near_duplicates_keeping_order(self):
+        titles = [
+            '大人可愛い◎くびれミディ×透明感グレージュ',
+            '韓国風レイヤーカット/顔周り',
+            '大人可愛いくびれミディ/透明感グレージュ',
+            '大人可愛い◎くびれミディ×透明感グレージュ20代',
+            '韓国風レイヤーカット/顔周り',
+        ]
+
+        selection = select_reference_titles(titles)
+
+        assert selection.titles == [
+            '大人可愛い◎くびれミディ×透明感グレージュ',
+            '韓国風レイヤーカット/顔周り',
+        ]
+        assert selection.duplicates == 3
+        assert selection.over_budget == 0
+
+    def test_threshold_above_one_removes_only_normalized_duplicates(self):
+        titles = [
+            '大人可愛い◎くびれミディ',
+            '大人可愛い/くびれミディ',
+            '大人可愛いくびれミディ20代',
+        ]
+
+        selection = select_reference_titles(titles, similarity_threshold=1.1)
+
+        assert selection.titles == ['大人可愛い◎くびれミディ', '大人可愛いくびれミディ20代']
+
+    def test_distinct_fixture_titles_are_all_kept(self):
+        titles = parse_search_page(
+            (FIXTURES / 'ladies_page1.html').read_text(encoding='utf-8')
+        ).titles
+
+        assert select_reference_titles(titles).titles == titles
+
+    def test_token_budget_keeps_most_popular_titles(self):
+        titles = [f'スタイル{i}◎透明感カラー×くびれヘア' for i in 'あいうえおかきくけこ']
+        per_title = estimate_tokens(titles[0] + '\n')
+
+        selection = select_reference_titles(
+            titles, token_budget=per_title * 3, similarity_threshold=1.1
+        )
+
+        assert selection.titles == titles[:3]
+        assert selection.over_budget == 7
+        assert selection.estimated_tokens <= per_title * 3
+
+    def test_first_title_is_kept_even_over_budget(self):
+        selection = select_reference_titles(['とても長いタイトル' * 5], token_budget=1)
+
+        assert len(selection.titles) == 1
+
+
+class TestEstimateTokens:
+    def test_ascii_is_cheaper_per_character_than_japanese(self):
+        assert estimate_tokens('a' * 40) < estimate_tokens('あ' * 40)
+
+    def test_unknown_model_uses_default_ratio(self):
+        assert estimate_tokens('透明感カラー', 'unknown-model') == estimate_tokens(
+            '透明感カラー', config.DEFAULT_MODEL
+        )
+
+    def test_compact_format_is_smaller_than_indented_json(self):
+        titles = parse_search_page(
+            (FIXTURES / 'ladies_page1.html').read_text(encoding='utf-8')
+        ).titles
+
+        compact = estimate_tokens(format_reference_titles(titles))
+
+        assert compact < estimate_tokens(json.dumps(titles, ensure_ascii=False, indent=2))
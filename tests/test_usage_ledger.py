@@ -0,0 +1,151 @@
+import json
+import threading
+from datetime import UTC, datetime
+from types import SimpleNamespace
+
+from app import config
+from app.usage_ledger import UsageLedger, UsageRecord, main, percentile, summarize
+
+
+def _usage(prompt: int, output: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        prompt_token_count=prompt,
+        candidates_token_count=output,
+        thoughts_token_count=None,
+        total_token_count=prompt + output,
+    )
+
+
+def _at(day: int, hour: int = 12) -> float:
+    return datetime(2026, 10, day, hour, tzinfo=UTC).timestamp()
+
+
+def _record(total: int, at: float = 0, model: str = 'm', keyword_type: str = 'normal'):
+    return UsageRecord(at, model, keyword_type, 'json', total, 0, 0, total, 10.0)
+
+
+class TestUsageLedger:
+    def test_records_are_kept_in_ring_buffer(self):
+        ledger = UsageLedger(None, capacity=2)
+        for prompt in (100, 200, 300):
+            ledger.record(_usage(prompt, 10), 'm', 'normal', 'json', 5.0)
+
+        assert [record.prompt_tokens for record in ledger.recent()] == [200, 300]
+        assert ledger.stats() == {'recent': 2, 'recorded': 3, 'rotations': 0, 'write_failures': 0}
+
+    def test_missing_usage_is_not_recorded(self):
+        ledger = UsageLedger(None)
+
+        assert ledger.record(None, 'm', 'normal', 'json', 5.0) is None
+        assert ledger.record(_usage(0, 0), 'm', 'normal', 'json', 5.0) is None
+        assert ledger.recent() == []
+
+    def test_file_holds_one_compact_line_per_record(self, tmp_path):
+        path = tmp_path / 'usage.jsonl'
+        ledger = UsageLedger(path, clock=lambda: 1000.0)
+        ledger.record(_usage(1200, 300), 'gemini-2.5-flash', 'featured', 'stream', 812.34)
+        ledger.close()
+
+        line = path.read_text(encoding='utf-8')
+        assert line == '[1000.0,"gemini-2.5-flash","featured","stream",1200,300,0,1500,812.3]\n'
+        [record] = UsageLedger(path).read()
+        assert record.keyword_type == 'featured'
+        assert record.total_tokens == 1500
+
+    def test_file_is_rotated_and_read_across_backups(self, tmp_path):
+        path = tmp_path / 'usage.jsonl'
+        clock = iter(range(100))
+        ledger = UsageLedger(path, max_bytes=120, backup_count=2, clock=lambda: float(next(clock)))
+        for _ in range(5):
+            ledger.record(_usage(100, 10), 'm', 'normal', 'json', 5.0)
+        ledger.flush()
+
+        assert path.with_name('usage.jsonl.1').exists()
+        assert ledger.stats()['rotations'] >= 1
+        # 古い順に読める（回しきって消えた分は読めない）
+        ats = [record.at for record in ledger.read()]
+        assert ats == sorted(ats)
+        assert ats[-1] == 4.0
+
+    def test_file_is_written_off_the_calling_thread(self, tmp_path, monkeypatch):
+        """ファイルへの書き込みとロックは専用のスレッドで行い、呼び出し元（イベントループ）を止めない"""
+        ledger = UsageLedger(tmp_path / 'usage.jsonl')
+        threads = []
+        append = ledger._append
+        monkeypatch.setattr(
+            ledger,
+            '_append',
+            lambda line: (threads.append(threading.current_thread().name), append(line)),
+        )
+
+        ledger.record(_usage(100, 10), 'm', 'normal', 'json', 5.0)
+        ledger.close()
+
+        assert len(threads) == 1
+        assert threads[0] != threading.current_thread().name
+        assert threads[0].startswith('usage-ledger')
+        assert len(ledger.read()) == 1
+
+    def test_read_filters_by_since_and_skips_broken_lines(self, tmp_path):
+        path = tmp_path / 'usage.jsonl'
+        path.write_text(
+            _record(100, at=1.0).to_line() + '[2.0,"m"\n' + _record(200, at=3.0).to_line(),
+            encoding='utf-8',
+        )
+
+        assert [record.total_tokens for record in UsageLedger(path).read(since=2.0)] == [200]
+
+
+class TestSummarize:
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile([7], 95) == 7
+        assert percentile([], 50) is None
+
+    def test_report_groups_by_utc_day_model_and_keyword_type(self):
+        records = [
+            _record(1000, at=_at(17, 23), model='flash'),
+            _record(3000, at=_at(18, 0), model='pro', keyword_type='featured'),
+            _record(2000, at=_at(18, 1), model='flash'),
+        ]
+
+        report = summarize(records)
+
+        assert report.overall.requests == 3
+        assert report.overall.total_tokens == 6000
+        assert report.overall.p50_tokens == 2000
+        assert report.overall.p95_tokens == 3000
+        assert list(report.by_day) == ['2026-10-17', '2026-10-18']
+        assert report.by_day['2026-10-18'].total_tokens == 5000
+        assert report.by_model['flash'].requests == 2
+        assert report.by_keyword_type['featured'].p50_tokens == 3000
+
+    def test_empty_report(self):
+        report = summarize([])
+
+        assert report.overall.requests == 0
+        assert report.overall.p95_tokens is None
+        assert report.by_day == {}
+
+
+class TestCli:
+    def test_json_report_reads_ledger_under_cache_dir(self, capsys):
+        ledger = UsageLedger.from_settings(config.get_settings())
+        ledger.record(_usage(1200, 300), 'm', 'normal', 'json', 5.0)
+        ledger.close()
+
+        assert main(['--days', '1', '--json']) == 0
+
+        report = json.loads(capsys.readouterr().out)
+        assert report['overall']['requests'] == 1
+        assert report['by_model']['m']['total_tokens'] == 1500
+
+    def test_disabled_ledger(self, monkeypatch, capsys):
+        monkeypatch.setenv('USAGE_LEDGER', 'false')
+        config.reset_settings()
+
+        assert main([]) == 2
+        assert 'USAGE_LEDGER' in capsys.readouterr().err
@@ -0,0 +1,194 @@
+import asyncio
+import json
+
+import pytest
+
+from app import config, create_app
+from app.errors import GenerationError, NoResultsError
+from app.featured_keywords import EXTENSION_KEY
+from app.warmer import CacheWarmer, WarmItem, WarmReport, warm, warm_app, warm_items
+
+
+class _Repo:
+    def __init__(self, keywords):
+        self._keywords = keywords
+
+    def get_all_keywords(self):
+        return list(self._keywords)
+
+
+class Sleeps:
+    """asyncio.sleep の代わりに待ち時間を記録する"""
+
+    def __init__(self):
+        self.delays = []
+
+    async def __call__(self, delay):
+        self.delays.append(delay)
+
+
+def test_warm_items_pairs_featured_keywords_with_their_gender():
+    repository = _Repo(
+        [
+            {'keyword': 'くびれヘア', 'gender': 'ladies'},
+            {'keyword': '韓国風マッシュ', 'gender': 'mens'},
+        ]
+    )
+
+    items = warm_items(repository, season_combos=((), ('spring',), ('bleach_free',)))
+
+    assert items == [
+        WarmItem('くびれヘア', 'ladies'),
+        WarmItem('くびれヘア', 'ladies', ('spring',)),
+        WarmItem('くびれヘア', 'ladies', ('bleach_free',)),
+        # メンズでは季節・カラーを扱わないので選択なしの 1 件だけ
+        WarmItem('韓国風マッシュ', 'mens'),
+    ]
+
+
+@pytest.mark.asyncio
+class TestWarm:
+    async def test_concurrency_is_bounded(self):
+        running = 0
+        peak = 0
+
+        async def generate(item):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0)
+            running -= 1
+
+        items = [WarmItem(f'キーワード{i}', 'ladies') for i in range(6)]
+        report = await warm(items, generate, concurrency=2)
+
+        assert peak == 2
+        assert len(report.results) == 6
+        assert report.failures == ()
+
+    async def test_transient_failure_is_retried_with_backoff(self):
+        calls = []
+
+        async def generate(item):
+            calls.append(item)
+            if len(calls) < 3:
+                raise GenerationError()
+
+        sleeps = Sleeps()
+        report = await warm(
+            [WarmItem('ボブ', 'ladies')], generate, retries=2, backoff=5, sleep=sleeps
+        )
+
+        assert report.failures == ()
+        assert report.results[0].attempts == 3
+        assert sleeps.delays == [5, 10]
+
+    async def test_failures_are_reported(self):
+        async def generate(item):
+            if item.keyword == '該当なし':
+                raise NoResultsError()
+            raise RuntimeError('boom')
+
+        sleeps = Sleeps()
+        report = await warm(
+            [WarmItem('該当なし', 'ladies'), WarmItem('ボブ', 'ladies')],
+            generate,
+            retries=1,
+            sleep=sleeps,
+        )
+
+        no_results, unexpected = report.results
+        # 該当なしは何度やっても同じなので再試行しない
+        assert no_results.attempts == 1
+        assert no_results.error.startswith('NoResultsError')
+        assert unexpected.attempts == 2
+        assert unexpected.error == 'RuntimeError: boom'
+        assert len(report.failures) == 2
+        assert '失敗 2' in report.lines()[0]
+
+
+def _report():
+    return WarmReport(results=(), elapsed_ms=0.0)
+
+
+class WallClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+class TestCacheWarmer:
+    async def test_run_is_skipped_until_interval_passes(self, tmp_path):
+        runs = []
+
+        async def run():
+            runs.append(1)
+            return _report()
+
+        clock = WallClock()
+        warmer = CacheWarmer(run, tmp_path / 'warmer.lock', interval=3600, wall_clock=clock)
+
+        assert await warmer.run_once() is not None
+        clock.now += 60
+        assert await warmer.run_once() is None
+        assert await warmer.run_once(force=True) is not None
+        clock.now += 3600
+        assert await warmer.run_once() is not None
+
+        assert len(runs) == 3
+        assert warmer.stats()['skipped_recent'] == 1
+
+    async def test_only_one_run_at_a_time(self, tmp_path):
+        """別のワーカー（ロックファイルを開いた別の実行役）が実行中なら見送る"""
+        release = asyncio.Event()
+
+        async def slow_run():
+            await release.wait()
+            return _report()
+
+        lock_path = tmp_path / 'warmer.lock'
+        first = CacheWarmer(slow_run, lock_path)
+        second = CacheWarmer(slow_run, lock_path)
+
+        task = asyncio.create_task(first.run_once())
+        await asyncio.sleep(0)
+        assert await second.run_once() is None
+        release.set()
+        assert await task is not None
+        assert second.stats()['skipped_locked'] == 1
+
+    async def test_last_run_is_shared_through_lock_file(self, tmp_path):
+        async def run():
+            return _report()
+
+        lock_path = tmp_path / 'warmer.lock'
+        clock = WallClock()
+        await CacheWarmer(run, lock_path, interval=3600, wall_clock=clock).run_once()
+
+        other = CacheWarmer(run, lock_path, interval=3600, wall_clock=clock)
+        assert await other.run_once() is None
+
+
+def test_warmed_outcome_is_served_by_api(monkeypatch, repository, fake_pipeline, full_templates):
+    """事前生成した結果は、同じ内容の /api/generate にキャッシュから返る"""
+    monkeypatch.setenv('OUTCOME_CACHE_TTL', '600')
+    config.reset_settings()
+    warmer_app = create_app()
+    warmer_app.extensions[EXTENSION_KEY] = repository
+    api_app = create_app()
+    api_app.extensions[EXTENSION_KEY] = repository
+
+    with fake_pipeline(templates=full_templates) as generate:
+        report = asyncio.run(warm_app(warmer_app, [WarmItem('くびれヘア', 'ladies', ('spring',))]))
+        response = api_app.test_client().post(
+            '/api/generate',
+            json={'keyword': 'くびれヘア', 'gender': 'ladies', 'seasons': ['spring']},
+        )
+
+    assert report.failures == ()
+    assert generate.await_count == 1
+    data = json.loads(response.data)
+    assert data['cache']['hit'] is True
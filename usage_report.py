@@ -0,0 +1,8 @@
+"""Gemini のトークン使用量の台帳（app/usage_ledger.py）を集計して表示する。"""
+
+import sys
+
+from app.usage_ledger import main
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,8 @@
+"""特集キーワードの生成結果の事前生成（app/warmer.py）を手動で、または cron などから実行する。"""
+
+import sys
+
+from app.warmer import main
+
+if __name__ == '__main__':
+    sys.exit(main())